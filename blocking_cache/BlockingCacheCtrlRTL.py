@@ -49,6 +49,12 @@ M0_FSM_STATE_FLUSH_WAIT = b3(5) # Flush, waiting for response
 # Cache flush: TRANS_TYPE_FLUSH_START ->
 #              (TRANS_TYPE_FLUSH_READ -> TRANS_TYPE_FLUSH_WAIT -> TRANS_TYPE_FLUSH_WRITE) x N ->
 #              TRANS_TYPE_REPLAY_INV
+# Hit under miss (more than one MSHR entry):
+#              TRANS_TYPE_PARK -> ... ->
+#              (replayed from the MSHR as a new request)
+# Uncached read: TRANS_TYPE_READ_REQ -> TRANS_TYPE_REPLAY_UNC
+# Uncached write: TRANS_TYPE_WRITE_REQ
+# AMO hit (done in the cache): TRANS_TYPE_AMO_REQ -> TRANS_TYPE_AMO_WRITE
 #
 
 TRANS_TYPE_NBITS = 5
@@ -83,6 +89,15 @@ TRANS_TYPE_FLUSH_WAIT   = 16 # flush req: wait for memresp write ack
 TRANS_TYPE_FLUSH_WRITE  = 17 # flush req: write tag arrays
 TRANS_TYPE_REPLAY_FLUSH = 18 # Replay the flush req after is done
 
+# Hit under miss
+TRANS_TYPE_PARK         = 19 # Park the req in MSHR until misses are done
+
+# Uncached accesses
+TRANS_TYPE_REPLAY_UNC   = 20 # Replay the uncached read with the memresp data
+
+# Atomics done in the cache
+TRANS_TYPE_AMO_WRITE    = 21 # Write the result of an AMO hit, update dirty bits
+
 #=========================================================================
 # BlockingCacheCtrlRTL
 #=========================================================================
@@ -115,16 +130,38 @@ class BlockingCacheCtrlRTL( Component ):
     #=====================================================================
 
     # In Y stage we always set the memresp_rdy to high since we assume
-    # there would be no memresp unless we have sent a memreq
-    s.memresp_rdy //= y
+    # there would be no memresp unless we have sent a memreq. With more
+    # than one MSHR entry this no longer holds (see M0 control signals).
+    if p.num_mshr_entries == 1:
+      s.memresp_rdy //= y
 
     #=====================================================================
     # M0 Stage
     #=====================================================================
 
+    # With critical word first refills the line can come back in several
+    # beats, which the dpath gathers in Y. M0 only sees the memresp that
+    # completes the line.
+    s.memresp_line_en = Wire()
+    if p.critical_word_first:
+      s.memresp_line_en //= lambda: s.memresp_en & s.status.memresp_last_Y
+      s.ctrl.refill_beat_en_Y //= s.memresp_en
+    else:
+      s.memresp_line_en //= s.memresp_en
+      s.ctrl.refill_beat_en_Y //= 0
+
     s.memresp_en_M0 = m = RegEnRst(1)
-    m.in_ //= s.memresp_en
-    m.en  //= s.ctrl.reg_en_M0
+    if p.num_mshr_entries == 1:
+      m.in_ //= s.memresp_line_en
+      m.en  //= s.ctrl.reg_en_M0
+      s.ctrl.memresp_reg_en_M0 //= s.ctrl.reg_en_M0
+    else:
+      # Misses can return while M0 is busy with a hit, so we hold on to
+      # the memresp until M0 is able to process it
+      m.in_ //= lambda: s.memresp_en | ( s.memresp_en_M0.out &
+                                         (s.stall_M0 | s.is_write_hit_clean_M0) )
+      m.en  //= 1
+      s.ctrl.memresp_reg_en_M0 //= s.memresp_en
 
 
     # Checks if memory response if valid
@@ -135,13 +172,67 @@ class BlockingCacheCtrlRTL( Component ):
     s.memresp_wr_ack_M0 = Wire()
     s.memresp_wr_ack_M0 //= lambda: s.memresp_en_M0.out & ( s.status.memresp_type_M0 == WRITE )
 
+    # LR and SC go down the pipeline as reads and writes. An SC that finds
+    # no reservation is caught in M1 (see M1 reservation).
+    s.cachereq_rd_M0 = Wire()
+    s.cachereq_wr_M0 = Wire()
+    s.cachereq_rd_M0 //= lambda: ( (s.status.cachereq_type_M0 == READ) |
+                                   (s.status.cachereq_type_M0 == LR) )
+    s.cachereq_wr_M0 //= lambda: ( (s.status.cachereq_type_M0 == WRITE) |
+                                   (s.status.cachereq_type_M0 == SC) )
+    s.MSHR_rd = Wire()
+    s.MSHR_wr = Wire()
+    s.MSHR_rd //= lambda: (s.status.MSHR_type == READ)  | (s.status.MSHR_type == LR)
+    s.MSHR_wr //= lambda: (s.status.MSHR_type == WRITE) | (s.status.MSHR_type == SC)
+
     # A counter used by FSM
     s.counter_M0 = CounterEnRst(p.bitwidth_num_lines,
                                 reset_value=(p.total_num_cachelines - 1) )
     s.update_way_idx_M0 = Wire(p.bitwidth_num_lines)
 
-    # We need to update the dirty bits, set in M1 stage.
+    # With flash INV the valid bits live in flip-flops and are all cleared
+    # in one cycle, so INV does not need to walk the lines
+    s.flash_inv_M0 = Wire()
+    s.flash_inv_M0 //= b1(p.flash_inv)
+
+    # INV and FLUSH on an address range walk the lines of its sets, from
+    # the start line the counter is loaded with down to the end line we
+    # keep here. INV on a range walks them even with flash INV.
+    s.walk_end_M0 = m = RegEnRst(p.bitwidth_num_lines)
+    m.in_ //= s.status.range_end_line_M0
+    m.en  //= lambda: s.ctrl.reg_en_M0 & ( (s.trans_M0 == TRANS_TYPE_INV_START) |
+                                           (s.trans_M0 == TRANS_TYPE_FLUSH_START) )
+    s.walk_all_M0 = m = RegEnRst(1)
+    m.in_ //= s.status.range_all_M0
+    m.en  //= lambda: s.ctrl.reg_en_M0 & (s.trans_M0 == TRANS_TYPE_INV_START)
+    s.flash_inv_all_M0 = Wire()
+    s.flash_inv_all_M0 //= lambda: s.flash_inv_M0 & s.walk_all_M0.out
+
+    # With way prediction reads and writes only read the tag array of the
+    # MRU way of their set. On a mispredict M1 stalls and M0 rereads all
+    # the tag arrays for the M1 request (see M1 way prediction).
+    s.way_pred_en_M0 = Wire()
+    s.way_pred_en_M0 //= b1(p.way_pred)
+    s.way_retry_M0 = Wire()
+
+    # We need to update the dirty bits, set in M1 stage. AMOs done in the
+    # cache also take this second pass to write their result. With the
+    # dirty bits in flip-flops write hits set them from M1 instead.
     s.is_write_hit_clean_M0 = Wire()
+    s.amo_hit_M1            = Wire()
+    s.dirty_bits_reg_M1     = Wire()
+    s.dirty_bits_reg_M1    //= b1(p.dirty_bits_reg)
+
+    # With 1R1W tag arrays write hits set the dirty bits from M1 through the
+    # write port, unless M0 may write the tags in the same cycle. We only
+    # look at what can start such a transaction so that it does not depend
+    # on the M0 transaction, which depends on the write hit.
+    s.tag_1r1w_M1    = Wire()
+    s.tag_1r1w_M1   //= b1(p.tag_1r1w)
+    s.tag_wr_busy_M0 = Wire()
+    s.tag_wr_busy_M0 //= lambda: ( (s.FSM_state_M0.out != M0_FSM_STATE_READY) |
+                                   s.memresp_val_M0 | s.status.cachereq_init_Y |
+                                   s.status.MSHR_park_ready )
 
     # Flush-related singal
     s.has_flush_sent_M1_bypass  = Wire()
@@ -152,6 +243,81 @@ class BlockingCacheCtrlRTL( Component ):
     s.prev_flush_done_M0 //= lambda: (s.no_flush_needed_M1_bypass | s.memresp_wr_ack_M0
                                     | s.flush_refill_M1_bypass )
 
+    # Fast flush: only walk the sets marked in the dirty set summary, and
+    # send the writebacks back to back instead of waiting on each write ack.
+    # We count the outstanding writebacks and only wait for all of them at
+    # the end of the flush.
+    s.fast_flush_M0 = Wire()
+    s.fast_flush_M0 //= b1(p.fast_flush)
+
+    # Line read by the last FLUSH_READ, since the counter has already moved
+    # on when we write its dirty bits back
+    s.flush_line_M0 = m = RegEnRst(p.bitwidth_num_lines)
+    m.in_ //= s.counter_M0.out
+    m.en  //= lambda: s.ctrl.reg_en_M0 & (s.trans_M0 == TRANS_TYPE_FLUSH_READ)
+
+    BitsWbCount = mk_bits( p.bitwidth_num_lines + 1 )
+    s.flush_wb_count_M0 = RegRst(BitsWbCount)
+    s.flush_wb_sent_M0  = Wire()
+    s.flush_wb_acked_M0 = Wire()
+    s.flush_wb_done_M0  = Wire()
+    s.flush_wb_done_M0 //= lambda: s.flush_wb_count_M0.out == 0
+
+    @update
+    def flush_wb_count_logic_M0():
+      s.flush_wb_sent_M0  @= s.has_flush_sent_M1_bypass & s.ctrl_pipeline_reg_en_M2
+      s.flush_wb_acked_M0 @= ( s.memresp_en & ~s.flush_wb_done_M0 &
+                               ( (s.FSM_state_M0.out == M0_FSM_STATE_FLUSH) |
+                                 (s.FSM_state_M0.out == M0_FSM_STATE_FLUSH_WAIT) ) )
+      s.flush_wb_count_M0.in_ @= s.flush_wb_count_M0.out
+      if s.flush_wb_sent_M0 & ~s.flush_wb_acked_M0:
+        s.flush_wb_count_M0.in_ @= s.flush_wb_count_M0.out + 1
+      elif ~s.flush_wb_sent_M0 & s.flush_wb_acked_M0:
+        s.flush_wb_count_M0.in_ @= s.flush_wb_count_M0.out - 1
+
+    # Last way of the highest dirty set of the range below the set we are
+    # flushing; the end line of the range if there is none left
+    clog_asso = clog2( p.associativity )
+    BitsSet   = mk_bits( p.bitwidth_index + 1 )
+    s.flush_set_bound_M0 = Wire(BitsSet)
+    s.flush_end_line_M0  = Wire(p.bitwidth_num_lines)
+    s.flush_next_line_M0 = Wire(p.bitwidth_num_lines)
+
+    @update
+    def flush_next_line_logic_M0():
+      if s.trans_M0 == TRANS_TYPE_FLUSH_START:
+        s.flush_set_bound_M0 @= zext( s.status.range_start_line_M0[ clog_asso : p.bitwidth_num_lines ],
+                                      p.bitwidth_index + 1 ) + 1
+        s.flush_end_line_M0  @= s.status.range_end_line_M0
+      else:
+        s.flush_set_bound_M0 @= zext( s.counter_M0.out[ clog_asso : p.bitwidth_num_lines ], p.bitwidth_index + 1 )
+        s.flush_end_line_M0  @= s.walk_end_M0.out
+      s.flush_next_line_M0 @= s.flush_end_line_M0
+      for i in range(p.nblocks_per_way):
+        if ( s.status.dirty_sets_M0[i] & ( s.flush_set_bound_M0 > i ) &
+             ( s.flush_end_line_M0[ clog_asso : p.bitwidth_num_lines ] <= i ) ):
+          s.flush_next_line_M0 @= i * p.associativity + p.associativity - 1
+
+    # Hit under miss: with more than one MSHR entry we accept requests while
+    # misses are outstanding. Requests that cannot be served under a miss
+    # are parked in the MSHR and replayed once all the misses are done, or,
+    # when merging misses, once the miss to their set is done (the MSHR
+    # tells us when a parked request is ready).
+    # A request is valid in M0 if it comes from cachereq or is a parked one.
+    s.req_val_M0   = Wire()
+    s.MSHR_idle_M0 = Wire()
+    if p.num_mshr_entries == 1:
+      s.ctrl.MSHR_dealloc_park_M0 //= n
+    else:
+      s.ctrl.MSHR_dealloc_park_M0 //= lambda: (
+        (s.FSM_state_M0.out == M0_FSM_STATE_READY) & ~s.memresp_val_M0 &
+        ~s.is_write_hit_clean_M0 & s.status.MSHR_park_ready &
+        ~s.ctrl.MSHR_alloc_en )
+
+    s.req_val_M0   //= lambda: s.cachereq_en | s.ctrl.MSHR_dealloc_park_M0
+    s.MSHR_idle_M0 //= lambda: ( (s.status.MSHR_empty | s.ctrl.MSHR_dealloc_park_M0)
+                                 & ~s.ctrl.MSHR_alloc_en )
+
     #---------------------------------------------------------------------
     # M0 stage FSM
     #---------------------------------------------------------------------
@@ -173,10 +339,11 @@ class BlockingCacheCtrlRTL( Component ):
           s.FSM_state_M0_next @= M0_FSM_STATE_INIT
 
       elif s.FSM_state_M0.out == M0_FSM_STATE_READY:
-        if s.memresp_val_M0 & ((s.status.MSHR_type == WRITE) | (s.status.MSHR_type == READ)):
+        if ( s.memresp_val_M0 & ~s.is_write_hit_clean_M0 & ~s.status.uncached_M0 &
+             (s.MSHR_wr | s.MSHR_rd) ):
           # Have valid replays in the MSHR
           s.FSM_state_M0_next @= M0_FSM_STATE_REPLAY
-        elif ( s.status.MSHR_empty & s.cachereq_en ):
+        elif ( s.MSHR_idle_M0 & s.req_val_M0 ):
           if s.status.cachereq_type_M0 == INV:
             s.FSM_state_M0_next @= M0_FSM_STATE_INV
           elif s.status.cachereq_type_M0 == FLUSH:
@@ -187,7 +354,7 @@ class BlockingCacheCtrlRTL( Component ):
           s.FSM_state_M0_next @= M0_FSM_STATE_READY
 
       elif s.FSM_state_M0.out == M0_FSM_STATE_INV:
-        if s.counter_M0.out == 0:
+        if (s.counter_M0.out == s.walk_end_M0.out) | s.flash_inv_all_M0:
           s.FSM_state_M0_next @= M0_FSM_STATE_REPLAY
         else:
           s.FSM_state_M0_next @= M0_FSM_STATE_INV
@@ -195,7 +362,7 @@ class BlockingCacheCtrlRTL( Component ):
       elif s.FSM_state_M0.out == M0_FSM_STATE_REPLAY:
         # For flush we need to wait for the final write_ack
         if (~s.status.MSHR_empty) & (s.status.MSHR_type == FLUSH):
-          if s.prev_flush_done_M0:
+          if s.prev_flush_done_M0 | s.fast_flush_M0:
             s.FSM_state_M0_next @= M0_FSM_STATE_READY
           else:
             s.FSM_state_M0_next @= M0_FSM_STATE_FLUSH_WAIT
@@ -204,16 +371,30 @@ class BlockingCacheCtrlRTL( Component ):
           s.FSM_state_M0_next @= M0_FSM_STATE_READY
 
       elif s.FSM_state_M0.out == M0_FSM_STATE_FLUSH:
-        if s.has_flush_sent_M1_bypass:
+        if s.fast_flush_M0:
+          if s.has_flush_sent_M1_bypass:
+            s.FSM_state_M0_next @= M0_FSM_STATE_FLUSH
+          elif s.counter_M0.out == s.walk_end_M0.out:
+            s.FSM_state_M0_next @= M0_FSM_STATE_FLUSH_WAIT
+          else:
+            s.FSM_state_M0_next @= M0_FSM_STATE_FLUSH
+        elif s.has_flush_sent_M1_bypass:
           s.FSM_state_M0_next @= M0_FSM_STATE_FLUSH_WAIT
-        elif s.counter_M0.out == 0:
+        elif s.counter_M0.out == s.walk_end_M0.out:
           s.FSM_state_M0_next @= M0_FSM_STATE_REPLAY
         else:
           s.FSM_state_M0_next @= M0_FSM_STATE_FLUSH
 
       elif s.FSM_state_M0.out == M0_FSM_STATE_FLUSH_WAIT:
-        if s.memresp_wr_ack_M0:
-          if s.counter_M0.out == trunc(Bits32(p.total_num_cachelines - 1), p.bitwidth_num_lines):
+        if s.fast_flush_M0:
+          # Wait for all the writebacks once the last line has been read
+          if s.has_flush_sent_M1_bypass | ~s.flush_wb_done_M0:
+            s.FSM_state_M0_next @= M0_FSM_STATE_FLUSH_WAIT
+          else:
+            s.FSM_state_M0_next @= M0_FSM_STATE_REPLAY
+        elif s.memresp_wr_ack_M0:
+          # The counter has moved past the end line
+          if s.counter_M0.out + 1 == s.walk_end_M0.out:
             s.FSM_state_M0_next @= M0_FSM_STATE_REPLAY
           else:
             s.FSM_state_M0_next @= M0_FSM_STATE_FLUSH
@@ -234,16 +415,19 @@ class BlockingCacheCtrlRTL( Component ):
       if s.FSM_state_M0.out == M0_FSM_STATE_INIT:
         s.trans_M0 @= TRANS_TYPE_CACHE_INIT
       elif s.is_write_hit_clean_M0:
-        s.trans_M0 @= TRANS_TYPE_CLEAN_HIT
+        if s.amo_hit_M1:
+          s.trans_M0 @= TRANS_TYPE_AMO_WRITE
+        else:
+          s.trans_M0 @= TRANS_TYPE_CLEAN_HIT
       elif s.FSM_state_M0.out == M0_FSM_STATE_REPLAY:
-        if (~s.status.MSHR_empty) & (s.status.MSHR_type == WRITE):
+        if (~s.status.MSHR_empty) & s.MSHR_wr:
           s.trans_M0 @= TRANS_TYPE_REPLAY_WRITE
-        elif (~s.status.MSHR_empty) & (s.status.MSHR_type == READ):
+        elif (~s.status.MSHR_empty) & s.MSHR_rd:
           s.trans_M0 @= TRANS_TYPE_REPLAY_READ
         elif (~s.status.MSHR_empty) & (s.status.MSHR_type == INV):
           s.trans_M0 @= TRANS_TYPE_REPLAY_INV
         elif (~s.status.MSHR_empty) & (s.status.MSHR_type == FLUSH):
-          if s.prev_flush_done_M0:
+          if s.prev_flush_done_M0 | s.fast_flush_M0:
             s.trans_M0 @= TRANS_TYPE_REPLAY_FLUSH
           else:
             s.trans_M0 @= TRANS_TYPE_FLUSH_WAIT
@@ -251,45 +435,67 @@ class BlockingCacheCtrlRTL( Component ):
         s.trans_M0 @= TRANS_TYPE_INV_WRITE
       elif s.FSM_state_M0.out == M0_FSM_STATE_FLUSH:
         if s.has_flush_sent_M1_bypass:
-          s.trans_M0 @= TRANS_TYPE_FLUSH_WAIT
+          if s.fast_flush_M0:
+            # Clear the dirty bits while the writeback goes down the pipe
+            s.trans_M0 @= TRANS_TYPE_FLUSH_WRITE
+          else:
+            s.trans_M0 @= TRANS_TYPE_FLUSH_WAIT
         else:
           s.trans_M0 @= TRANS_TYPE_FLUSH_READ
       elif s.FSM_state_M0.out == M0_FSM_STATE_FLUSH_WAIT:
-        if s.memresp_wr_ack_M0:
+        if s.fast_flush_M0:
+          if s.has_flush_sent_M1_bypass:
+            s.trans_M0 @= TRANS_TYPE_FLUSH_WRITE
+          else:
+            s.trans_M0 @= TRANS_TYPE_FLUSH_WAIT
+        elif s.memresp_wr_ack_M0:
           s.trans_M0 @= TRANS_TYPE_FLUSH_WRITE
         else:
           s.trans_M0 @= TRANS_TYPE_FLUSH_WAIT
       elif s.FSM_state_M0.out == M0_FSM_STATE_READY:
         if s.memresp_val_M0 & (~s.status.MSHR_empty):
-          if (s.status.MSHR_type == WRITE) | (s.status.MSHR_type == READ):
+          if s.status.uncached_M0 & s.MSHR_rd:
+            s.trans_M0 @= TRANS_TYPE_REPLAY_UNC
+          elif s.MSHR_wr | s.MSHR_rd:
             s.trans_M0 @= TRANS_TYPE_REFILL
           elif ( (s.status.MSHR_type >= AMO_ADD) &
-                 (s.status.MSHR_type <  INV) ):
+                 (s.status.MSHR_type <= AMO_XOR) ):
             s.trans_M0 @= TRANS_TYPE_REPLAY_AMO
 
-        elif s.status.MSHR_empty & s.cachereq_en:
-          # Request from s.cachereq, not MSHR
+        elif s.MSHR_idle_M0 & s.req_val_M0:
+          # Request from s.cachereq or a parked one from MSHR
           if s.status.cachereq_type_M0 == INIT:
             s.trans_M0 @= TRANS_TYPE_INIT_REQ
-          elif s.status.cachereq_type_M0 == READ:
+          elif s.cachereq_rd_M0:
             s.trans_M0 @= TRANS_TYPE_READ_REQ
-          elif s.status.cachereq_type_M0 == WRITE:
+          elif s.cachereq_wr_M0:
             s.trans_M0 @= TRANS_TYPE_WRITE_REQ
           elif ( (s.status.cachereq_type_M0 >= AMO_ADD) &
-                 (s.status.cachereq_type_M0 < INV) ):
+                 (s.status.cachereq_type_M0 <= AMO_XOR) ):
             s.trans_M0 @= TRANS_TYPE_AMO_REQ
           elif s.status.cachereq_type_M0 == INV:
             s.trans_M0 @= TRANS_TYPE_INV_START
           elif s.status.cachereq_type_M0 == FLUSH:
             s.trans_M0 @= TRANS_TYPE_FLUSH_START
 
+        elif s.req_val_M0:
+          # Hit under miss: only reads and writes can go ahead, everything
+          # else waits in the MSHR
+          if s.cachereq_rd_M0:
+            s.trans_M0 @= TRANS_TYPE_READ_REQ
+          elif s.cachereq_wr_M0:
+            s.trans_M0 @= TRANS_TYPE_WRITE_REQ
+          else:
+            s.trans_M0 @= TRANS_TYPE_PARK
+
     s.counter_en_M0 = Wire(1)
 
     @update
     def up_counter_en_logic_M0():
       s.counter_en_M0 @= 0
-      if ( (s.FSM_state_M0.out == M0_FSM_STATE_INIT) |
-           (s.FSM_state_M0.out == M0_FSM_STATE_INV) ):
+      if s.FSM_state_M0.out == M0_FSM_STATE_INIT:
+        s.counter_en_M0 @= 1
+      elif (s.FSM_state_M0.out == M0_FSM_STATE_INV) & ~s.flash_inv_all_M0:
         s.counter_en_M0 @= 1
       elif s.trans_M0 == TRANS_TYPE_FLUSH_READ:
         s.counter_en_M0 @= 1
@@ -297,13 +503,41 @@ class BlockingCacheCtrlRTL( Component ):
     s.counter_M0.count_down //= 1
     s.counter_M0.en         //= lambda: s.ctrl.reg_en_M0 & s.counter_en_M0
 
+    # INV and FLUSH start from the start line of their range. With fast
+    # flush we jump to the next dirty set at the start of the flush and
+    # after reading the first way of a set
+    @update
+    def counter_load_logic_M0():
+      s.counter_M0.load_value @= s.status.range_start_line_M0
+      s.counter_M0.load       @= 0
+      if s.fast_flush_M0 & ( (s.trans_M0 == TRANS_TYPE_FLUSH_START) |
+          ( (s.trans_M0 == TRANS_TYPE_FLUSH_READ) &
+            (s.counter_M0.out % p.associativity == 0) &
+            (s.counter_M0.out != s.walk_end_M0.out) ) ):
+        s.counter_M0.load_value @= s.flush_next_line_M0
+        s.counter_M0.load       @= s.ctrl.reg_en_M0
+      elif ( (s.trans_M0 == TRANS_TYPE_INV_START) |
+             (s.trans_M0 == TRANS_TYPE_FLUSH_START) ):
+        s.counter_M0.load       @= s.ctrl.reg_en_M0
+    s.ctrl.dirty_sets_clear_M0 //= lambda: ( s.fast_flush_M0 & s.ctrl.reg_en_M0 &
+                                             (s.trans_M0 == TRANS_TYPE_REPLAY_FLUSH) )
+    s.ctrl.valid_clear_M0      //= lambda: ( s.flash_inv_all_M0 &
+                                             (s.trans_M0 == TRANS_TYPE_INV_WRITE) )
+
     # When the flush ack come back, the counter has already been
-    # decremented one extra time, so we need to add it back
+    # decremented one extra time, so we need to add it back. The INV
+    # replay writes the last line of the walk again instead of the line
+    # below it, which is outside of the range.
     @update
     def update_way_idx_M0_loigc():
       s.update_way_idx_M0 @= s.counter_M0.out
       if ( ( s.trans_M0 == TRANS_TYPE_FLUSH_WRITE ) |
            ( s.trans_M0 == TRANS_TYPE_REPLAY_FLUSH ) ):
+        if s.fast_flush_M0:
+          s.update_way_idx_M0 @= s.flush_line_M0.out
+        else:
+          s.update_way_idx_M0 @= s.counter_M0.out + 1
+      elif s.trans_M0 == TRANS_TYPE_REPLAY_INV:
         s.update_way_idx_M0 @= s.counter_M0.out + 1
 
     #---------------------------------------------------------------------
@@ -321,19 +555,46 @@ class BlockingCacheCtrlRTL( Component ):
     # We will select MSHR dealloc output instead of incoming cachereq if:
     # 1. We have a valid memresp ( we prioritize handling refills/replays )
     # 2. We are in a middle of a replay
-    s.ctrl.cachereq_memresp_mux_sel_M0 //= lambda: ((s.FSM_state_M0.out == M0_FSM_STATE_REPLAY)
-                                                   | s.memresp_en_M0.out)
+    # 3. We are replaying a parked request (hit under miss)
+    if p.num_mshr_entries == 1 and not ( p.write_through or p.uncached_ranges ):
+      s.ctrl.cachereq_memresp_mux_sel_M0 //= lambda: ((s.FSM_state_M0.out == M0_FSM_STATE_REPLAY)
+                                                     | s.memresp_en_M0.out)
+    else:
+      # Write acks can come back while we serve hits (or with write through
+      # and uncached writes while we serve anything) so only refills count
+      s.ctrl.cachereq_memresp_mux_sel_M0 //= lambda: ((s.FSM_state_M0.out == M0_FSM_STATE_REPLAY)
+                                                     | s.memresp_val_M0
+                                                     | s.ctrl.MSHR_dealloc_park_M0)
 
     # We will stall for the following conditions:
     # 1. We are initializing cache as a result of a reset
-    # 2. We have a write hit to a clean cache line -> Tag array at M0 must
-    # be updated with the correct dirty bit
+    # 2. We have a write hit to a clean cache line or an AMO hit -> Tag
+    # array at M0 must be updated with the correct dirty bit
     # 3. There is a stall in the cache due to external factors
     # 4. MSHR is not empty (for blocking cache)
     # 5. MSHR is full (for nonblocking cache)
-    s.cachereq_rdy //= lambda: ~( (s.FSM_state_M0.out == M0_FSM_STATE_INIT) |
-             s.is_write_hit_clean_M0 | s.stall_M0 | (~s.status.MSHR_empty ) |
-             s.status.MSHR_full )
+    if p.num_mshr_entries == 1:
+      s.cachereq_rdy //= lambda: ~( (s.FSM_state_M0.out == M0_FSM_STATE_INIT) |
+               s.is_write_hit_clean_M0 | s.stall_M0 | (~s.status.MSHR_empty ) |
+               s.status.MSHR_full )
+    else:
+      # For hit under miss we instead stall if:
+      # 4. M0 is taken by a refill, replay, INV or FLUSH
+      # 5. A request is (being) parked in the MSHR, so that requests behind
+      # it are served in order. When merging misses only parked AMO, INV,
+      # FLUSH and INIT requests block, parked reads and writes are ordered
+      # with the requests to their set by the MSHR.
+      # 6. MSHR is full
+      # 7. A parked request is being replayed
+      s.cachereq_rdy //= lambda: ~( (s.FSM_state_M0.out != M0_FSM_STATE_READY) |
+               s.is_write_hit_clean_M0 | s.stall_M0 | s.memresp_val_M0 |
+               s.status.MSHR_park_block | (s.ctrl.MSHR_alloc_en & s.park_block_M1) |
+               s.status.MSHR_full | s.ctrl.MSHR_dealloc_park_M0 )
+
+      # Only take a new memresp if the last one has been processed and we
+      # are not replaying, since the replay still needs the MSHR entry id
+      s.memresp_rdy //= lambda: ( ~s.memresp_en_M0.out &
+                                  (s.FSM_state_M0.out != M0_FSM_STATE_REPLAY) )
 
     #---------------------------------------------------------------------
     # M0 control signal table
@@ -353,8 +614,12 @@ class BlockingCacheCtrlRTL( Component ):
     BitsVal   = mk_bits(p.bitwidth_val)
     BitsDirty = mk_bits(p.bitwidth_dirty)
     BitsTag   = mk_bits(p.bitwidth_tag)
-    wben_val = concat( BitsVal(-1), BitsDirty(0),  BitsTag(0) )
-    wben_dty = concat( BitsVal(0),  BitsDirty(-1), BitsTag(0) )
+    if p.sectors > 1:
+      wben_val = concat( BitsVal(-1), p.BitsSec(0), BitsDirty(0),  BitsTag(0) )
+      wben_dty = concat( BitsVal(0),  p.BitsSec(0), BitsDirty(-1), BitsTag(0) )
+    else:
+      wben_val = concat( BitsVal(-1), BitsDirty(0),  BitsTag(0) )
+      wben_dty = concat( BitsVal(0),  BitsDirty(-1), BitsTag(0) )
 
     BitsTagWben = mk_bits(p.bitwidth_tag_wben)
     @update
@@ -368,6 +633,7 @@ class BlockingCacheCtrlRTL( Component ):
       rd_refill = UpdateTagArrayUnit_CMD_RD_REFILL
       inv       = UpdateTagArrayUnit_CMD_INV
       flush     = UpdateTagArrayUnit_CMD_FLUSH
+      init      = UpdateTagArrayUnit_CMD_INIT
       #                                                             tag_wben|wdat_mux|addr_mux|tg_ty|tag_update|tidx_sel|up_tag_sel|mshr_de
       s.cs0                                             @= concat( wben_none, b1(0),   b1(0),   rd,   none,      b1(0),   b1(0),     n )
       if   s.trans_M0 == TRANS_TYPE_CACHE_INIT:   s.cs0 @= concat( wben_all,  b1(0),   b1(0),   wr,   clear,     b1(1),   b1(0),     n )
@@ -375,8 +641,10 @@ class BlockingCacheCtrlRTL( Component ):
       elif s.trans_M0 == TRANS_TYPE_REPLAY_READ:  s.cs0 @= concat( wben_dty,      x,   b1(0),   rd,   rd_refill, b1(0),   b1(0),     y )
       elif s.trans_M0 == TRANS_TYPE_REPLAY_WRITE: s.cs0 @= concat( wben_all,  b1(0),   b1(0),   wr,   wr_refill, b1(0),   b1(0),     y )
       elif s.trans_M0 == TRANS_TYPE_REPLAY_AMO:   s.cs0 @= concat( wben_all,  b1(1),   b1(0),   wr,   clear,     b1(0),   b1(0),     y )
+      elif s.trans_M0 == TRANS_TYPE_REPLAY_UNC:   s.cs0 @= concat( wben_none, b1(1),   b1(0),   rd,   none,      b1(0),   b1(0),     y )
       elif s.trans_M0 == TRANS_TYPE_CLEAN_HIT:    s.cs0 @= concat( wben_all,  b1(0),   b1(1),   wr,   wr_hit,    b1(0),   b1(0),     n )
-      elif s.trans_M0 == TRANS_TYPE_INIT_REQ:     s.cs0 @= concat( wben_all,  b1(0),   b1(0),   wr,   rd_refill, b1(0),   b1(0),     n )
+      elif s.trans_M0 == TRANS_TYPE_AMO_WRITE:    s.cs0 @= concat( wben_all,  b1(0),   b1(1),   wr,   wr_hit,    b1(0),   b1(0),     n )
+      elif s.trans_M0 == TRANS_TYPE_INIT_REQ:     s.cs0 @= concat( wben_all,  b1(0),   b1(0),   wr,   init,      b1(0),   b1(0),     n )
       elif s.trans_M0 == TRANS_TYPE_READ_REQ:     s.cs0 @= concat( wben_none, b1(0),   b1(0),   rd,   none,      b1(0),   b1(0),     n )
       elif s.trans_M0 == TRANS_TYPE_WRITE_REQ:    s.cs0 @= concat( wben_none, b1(0),   b1(0),   rd,   none,      b1(0),   b1(0),     n )
       elif s.trans_M0 == TRANS_TYPE_AMO_REQ:      s.cs0 @= concat( wben_none, b1(0),   b1(0),   rd,   none,      b1(0),   b1(0),     n )
@@ -388,6 +656,10 @@ class BlockingCacheCtrlRTL( Component ):
       elif s.trans_M0 == TRANS_TYPE_FLUSH_WAIT:   s.cs0 @= concat( wben_none, b1(0),   b1(0),   rd,   none,      b1(0),   b1(0),     n )
       elif s.trans_M0 == TRANS_TYPE_FLUSH_WRITE:  s.cs0 @= concat( wben_dty,  b1(0),   b1(0),   wr,   flush,     b1(1),   b1(1),     n )
       elif s.trans_M0 == TRANS_TYPE_REPLAY_FLUSH: s.cs0 @= concat( wben_dty,  b1(0),   b1(0),   wr,   flush,     b1(1),   b1(1),     y )
+      elif s.trans_M0 == TRANS_TYPE_PARK:         s.cs0 @= concat( wben_none, b1(0),   b1(0),   rd,   none,      b1(0),   b1(0),     n )
+
+      # Full tag lookup for M1 while M0 is stalled, using the M1 address
+      if s.way_retry_M0:                          s.cs0 @= concat( wben_none, b1(0),   b1(1),   rd,   none,      b1(0),   b1(0),     n )
 
       s.ctrl.tag_array_wben_M0    @= s.cs0[ CS_tag_array_wben_M0     ]
       s.ctrl.wdata_mux_sel_M0     @= s.cs0[ CS_wdata_mux_sel_M0      ]
@@ -396,11 +668,11 @@ class BlockingCacheCtrlRTL( Component ):
       s.ctrl.update_tag_cmd_M0    @= s.cs0[ CS_tag_update_cmd_M0     ]
       s.ctrl.tag_array_idx_sel_M0 @= s.cs0[ CS_tag_array_idx_sel_M0  ]
       s.ctrl.update_tag_sel_M0    @= s.cs0[ CS_update_tag_tag_sel_M0 ]
-      s.ctrl.MSHR_dealloc_en      @= s.cs0[ CS_mshr_dealloc_M0       ] & ~s.stall_M0
+      s.ctrl.MSHR_dealloc_en      @= ( (s.cs0[ CS_mshr_dealloc_M0 ] | s.ctrl.MSHR_dealloc_park_M0)
+                                       & ~s.stall_M0 )
 
     s.ctrl.reg_en_M0 //= lambda: ~s.stall_M0
     # use higher bits of the counter to select index
-    clog_asso = clog2( p.associativity )
     s.ctrl.tag_array_init_idx_M0 //= lambda: s.update_way_idx_M0[ clog_asso : p.bitwidth_num_lines ]
     s.ctrl.is_amo_M0 //= lambda: (( s.trans_M0 == TRANS_TYPE_REPLAY_AMO ) |
                                   ( s.trans_M0 == TRANS_TYPE_AMO_REQ ))
@@ -411,7 +683,10 @@ class BlockingCacheCtrlRTL( Component ):
       s.ctrl.update_tag_way_M0 @= 0
       for i in range(p.associativity):
         s.ctrl.tag_array_val_M0[i] @= n # by default all tag arrays accesses are invalid
-      if ( (s.trans_M0 == TRANS_TYPE_CACHE_INIT) |
+      if s.way_retry_M0:
+        for i in range(p.associativity):
+          s.ctrl.tag_array_val_M0[i] @= y
+      elif ( (s.trans_M0 == TRANS_TYPE_CACHE_INIT) |
            (s.trans_M0 == TRANS_TYPE_INV_WRITE) |
            (s.trans_M0 == TRANS_TYPE_REPLAY_INV) |
            (s.trans_M0 == TRANS_TYPE_FLUSH_READ) |
@@ -428,9 +703,13 @@ class BlockingCacheCtrlRTL( Component ):
       elif (s.trans_M0 == TRANS_TYPE_REPLAY_AMO) & (s.status.amo_hit_M0):
         s.ctrl.tag_array_val_M0[s.status.MSHR_ptr] @= y
       elif s.trans_M0 == TRANS_TYPE_INIT_REQ:
-        s.ctrl.tag_array_val_M0[s.status.ctrl_bit_rep_rd_M1] @= y
-      elif s.trans_M0 == TRANS_TYPE_CLEAN_HIT:
+        s.ctrl.tag_array_val_M0[s.rep_victim_M1] @= y
+      elif ( (s.trans_M0 == TRANS_TYPE_CLEAN_HIT) |
+             (s.trans_M0 == TRANS_TYPE_AMO_WRITE) ):
         s.ctrl.tag_array_val_M0[s.status.hit_way_M1] @= y
+      elif ( ( (s.trans_M0 == TRANS_TYPE_READ_REQ) |
+               (s.trans_M0 == TRANS_TYPE_WRITE_REQ) ) & s.way_pred_en_M0 ):
+        s.ctrl.tag_array_val_M0[s.status.way_pred_M0] @= y
       elif ( (s.trans_M0 == TRANS_TYPE_READ_REQ) |
              (s.trans_M0 == TRANS_TYPE_WRITE_REQ) |
              (s.trans_M0 == TRANS_TYPE_AMO_REQ) ):
@@ -457,22 +736,35 @@ class BlockingCacheCtrlRTL( Component ):
 
     s.hit_M1            = Wire(1)
     s.is_evict_M1       = Wire(1)
+    s.is_park_M1        = Wire(1)
+    s.sc_fail_M1        = Wire(1) # SC without a reservation, a no-op
+    s.park_block_M1     = Wire(1)
+    s.early_resp_M1     = Wire(1)
+    s.way_miss_M1       = Wire(1)
+    s.way_pred_hit_M1   = Wire(1)
     s.stall_M1          = Wire(1)
     s.is_dty_M1         = Wire(1)
+    s.is_victim_val_M1  = Wire(1) # replaced line goes to the victim buffer
+    s.wt_write_M1       = Wire(1) # write through without allocating
+    s.uncached_M1       = Wire(1) # read or write bypassing the arrays
     # EXTRA Logic for accounting for set associative caches
     s.repreq_en_M1      = Wire(1)
     s.repreq_is_hit_M1  = Wire(1)
     s.repreq_hit_ptr_M1 = Wire(p.bitwidth_clog_asso)
+    s.repreq_demote_M1  = Wire(1)
+    s.rep_victim_M1     = Wire(p.bitwidth_clog_asso) # Way to replace on a miss
 
     s.stall_M1 //= lambda: s.ostall_M1 | s.ostall_M2
 
     # TODO: Need more work
-    s.replacement_M1 = m = ReplacementPolicy(p, 0)
+    s.replacement_M1 = m = ReplacementPolicy(p)
     m.repreq_en      //= s.repreq_en_M1
     m.repreq_hit_ptr //= s.repreq_hit_ptr_M1
     m.repreq_is_hit  //= s.repreq_is_hit_M1
-    m.repreq_ptr     //= s.status.ctrl_bit_rep_rd_M1 # Read replacement mask
-    m.represp_ptr    //= s.ctrl.ctrl_bit_rep_wr_M0   # Bypass to M0 stage?
+    m.repreq_demote  //= s.repreq_demote_M1
+    m.repreq_state   //= s.status.ctrl_bit_rep_rd_M1 # Read replacement state
+    m.represp_victim //= s.rep_victim_M1
+    m.represp_state  //= s.ctrl.ctrl_bit_rep_wr_M0   # Bypass to M0 stage?
 
 
     # Selects the index offset for the Data array based on which way to
@@ -490,9 +782,11 @@ class BlockingCacheCtrlRTL( Component ):
           if s.status.inval_hit_M1:
             s.ctrl.way_offset_M1 @= s.status.hit_way_M1
           else:
-            s.ctrl.way_offset_M1 @= s.status.ctrl_bit_rep_rd_M1
+            s.ctrl.way_offset_M1 @= s.rep_victim_M1
       elif s.trans_M1.out == TRANS_TYPE_AMO_REQ:
         s.ctrl.way_offset_M1 @= s.status.amo_hit_way_M1
+      elif s.trans_M1.out == TRANS_TYPE_AMO_WRITE:
+        s.ctrl.way_offset_M1 @= s.amo_way_M2.out
       elif ( (s.trans_M1.out == TRANS_TYPE_FLUSH_READ) |
              (s.trans_M1.out == TRANS_TYPE_CACHE_INIT) ):
         s.ctrl.way_offset_M1 @= s.update_tag_way_M1.out
@@ -519,18 +813,32 @@ class BlockingCacheCtrlRTL( Component ):
     @update
     def status_logic_M1():
       s.is_evict_M1       @= n
-      s.is_dty_M1         @= s.status.ctrl_bit_dty_rd_line_M1[s.status.ctrl_bit_rep_rd_M1]
+      s.is_dty_M1         @= s.status.ctrl_bit_dty_rd_line_M1[s.rep_victim_M1]
       # Bits for set associative caches
       s.repreq_is_hit_M1  @= n
       s.repreq_en_M1      @= n
-      s.repreq_hit_ptr_M1 @= x
+      s.repreq_hit_ptr_M1 @= 0
+      s.repreq_demote_M1  @= n
       s.hit_M1            @= n
       s.is_write_hit_clean_M0 @= n
-
-      if ( (s.trans_M1.out == TRANS_TYPE_INIT_REQ) |
-           (s.trans_M1.out == TRANS_TYPE_WRITE_REQ)|
-           (s.trans_M1.out == TRANS_TYPE_READ_REQ) ):
-        s.hit_M1 @= s.status.hit_M1
+      s.ctrl.dirty_wr_M1  @= n
+      s.is_park_M1        @= n
+
+      if s.trans_M1.out == TRANS_TYPE_PARK:
+        s.is_park_M1 @= y
+
+      elif ( ( (s.trans_M1.out == TRANS_TYPE_WRITE_REQ) |
+               (s.trans_M1.out == TRANS_TYPE_READ_REQ) ) &
+             s.status.MSHR_conflict_M1 ):
+        # Hit under miss: the set has an outstanding miss, so wait in the
+        # MSHR until it has been refilled
+        s.is_park_M1 @= y
+
+      elif ( ( (s.trans_M1.out == TRANS_TYPE_INIT_REQ) |
+               (s.trans_M1.out == TRANS_TYPE_WRITE_REQ)|
+               (s.trans_M1.out == TRANS_TYPE_READ_REQ) ) & ~s.way_miss_M1 &
+             ~s.sc_fail_M1 ):
+        s.hit_M1 @= s.status.hit_M1 & ~s.uncached_M1
         # if hit, dty bit will come from the way where the hit occured
         if s.hit_M1:
           s.is_dty_M1 @= s.status.ctrl_bit_dty_rd_word_M1[s.status.hit_way_M1]
@@ -545,31 +853,109 @@ class BlockingCacheCtrlRTL( Component ):
           # moyang: we are not check s.is_line_valid_M1 because for invalid
           # but dirty cache lines (due to cache invalidation), we still need
           # to evict them
-          if ~s.hit_M1 & s.is_dty_M1:
+          if ( ~s.hit_M1 & ( s.is_dty_M1 | s.is_victim_val_M1 ) & ~s.wt_write_M1 &
+               ~s.uncached_M1 ):
             s.is_evict_M1 @= y
-          elif s.hit_M1 & ~s.is_dty_M1:
+          elif s.hit_M1 & ~s.is_dty_M1 & ~s.wt_write_M1:
             if s.trans_M1.out == TRANS_TYPE_WRITE_REQ:
-              s.is_write_hit_clean_M0 @= y
+              # Setting the bits again while M1 stalls does no harm
+              if s.dirty_bits_reg_M1 | ( s.tag_1r1w_M1 & ~s.tag_wr_busy_M0 ):
+                s.ctrl.dirty_wr_M1 @= y
+              else:
+                s.is_write_hit_clean_M0 @= y
 
         if ~s.is_evict_M1:
           # Better to update replacement bit right away because we need it
           # for nonblocking capability. For blocking, we can also update
           # during a refill for misses
-          s.repreq_en_M1      @= y
+          s.repreq_en_M1      @= s.hit_M1 | ~( s.wt_write_M1 | s.uncached_M1 )
           s.repreq_hit_ptr_M1 @= s.status.hit_way_M1
           s.repreq_is_hit_M1  @= s.hit_M1 | s.status.inval_hit_M1
 
       elif s.trans_M1.out == TRANS_TYPE_AMO_REQ:
         s.hit_M1 @= s.status.hit_M1
         s.is_dty_M1 @= s.status.ctrl_bit_dty_rd_line_M1[s.status.hit_way_M1]
-        s.is_evict_M1 @= s.is_dty_M1 & ( s.hit_M1 | s.status.inval_hit_M1 )
-        if s.hit_M1 | s.status.inval_hit_M1:
+        if s.amo_hit_M1:
+          # Done in the cache: read the line now and write the result with
+          # the dirty bit in a second pass. The line stays valid.
+          s.is_write_hit_clean_M0 @= y
           s.repreq_en_M1      @= y
-          s.repreq_hit_ptr_M1 @= ~s.status.hit_way_M1
+          s.repreq_hit_ptr_M1 @= s.status.hit_way_M1
           s.repreq_is_hit_M1  @= y
+        else:
+          s.is_evict_M1 @= s.is_dty_M1 & ( s.hit_M1 | s.status.inval_hit_M1 )
+        if ~s.amo_hit_M1 & ( s.hit_M1 | s.status.inval_hit_M1 ):
+          s.repreq_en_M1      @= y
+          # The AMO invalidates the line, so its way is replaced next
+          s.repreq_hit_ptr_M1 @= s.status.hit_way_M1
+          s.repreq_is_hit_M1  @= y
+          s.repreq_demote_M1  @= y
 
       s.ctrl.ctrl_bit_rep_en_M1 @= s.repreq_en_M1 & ~s.stall_M2
 
+    # With a victim buffer, read and write misses also write back the clean
+    # valid line they replace (with an empty write mask) so that the buffer
+    # can keep it
+    if p.victim_entries > 0:
+      s.is_victim_val_M1 //= lambda: ( s.status.ctrl_bit_val_rd_line_M1[s.rep_victim_M1] &
+                                       ( (s.trans_M1.out == TRANS_TYPE_READ_REQ) |
+                                         (s.trans_M1.out == TRANS_TYPE_WRITE_REQ) ) )
+    else:
+      s.is_victim_val_M1 //= 0
+
+    # AMOs that hit are done in the cache with amo_in_cache, misses go to
+    # memory as usual
+    if p.amo_in_cache:
+      s.amo_hit_M1 //= lambda: ( s.status.hit_M1 &
+                                 (s.trans_M1.out == TRANS_TYPE_AMO_REQ) )
+    else:
+      s.amo_hit_M1 //= 0
+
+    # M1 reservation: LR reserves its line and SC only writes if the line
+    # is still reserved, otherwise it responds with 1 and leaves the cache
+    # alone. Both take effect when they leave M1, so parked and retried
+    # ones do it on their last pass. Any SC and INV drop the reservation.
+    s.reservation_val = m = RegRst(1)
+    s.req_done_M1     = Wire(1)
+    s.req_done_M1 //= lambda: ( s.ctrl_pipeline_reg_en_M2 & ~s.is_evict_M1 &
+                                ~s.is_park_M1 & ~s.way_miss_M1 )
+    s.sc_fail_M1 //= lambda: ( (s.trans_M1.out == TRANS_TYPE_WRITE_REQ) &
+                               (s.status.cachereq_type_M1 == SC) &
+                               ~( s.reservation_val.out & s.status.reservation_match_M1 ) )
+
+    @update
+    def reservation_logic_M1():
+      s.reservation_val.in_ @= s.reservation_val.out
+      s.ctrl.reserve_M1     @= n
+      if s.trans_M0 == TRANS_TYPE_INV_START:
+        s.reservation_val.in_ @= n
+      elif s.req_done_M1 & (s.trans_M1.out == TRANS_TYPE_READ_REQ) & \
+           (s.status.cachereq_type_M1 == LR):
+        s.reservation_val.in_ @= y
+        s.ctrl.reserve_M1     @= y
+      elif s.req_done_M1 & (s.trans_M1.out == TRANS_TYPE_WRITE_REQ) & \
+           (s.status.cachereq_type_M1 == SC):
+        s.reservation_val.in_ @= n
+
+    # Write through: writes go to memory, hits update the line without
+    # dirtying it and misses do not allocate. A write to a line left dirty
+    # by INV still refills it so that the dirty words stay in one place.
+    if p.write_through:
+      s.wt_write_M1 //= lambda: ( (s.trans_M1.out == TRANS_TYPE_WRITE_REQ) &
+                                  ( ~s.status.inval_hit_M1 | s.uncached_M1 ) )
+    else:
+      s.wt_write_M1 //= lambda: ( (s.trans_M1.out == TRANS_TYPE_WRITE_REQ) &
+                                  s.uncached_M1 )
+
+    # Reads and writes to the uncached ranges never hit. Reads go to memory
+    # like a miss that does not refill and writes like a write through.
+    if p.uncached_ranges:
+      s.uncached_M1 //= lambda: ( s.status.uncached_M1 &
+                                  ( (s.trans_M1.out == TRANS_TYPE_READ_REQ) |
+                                    (s.trans_M1.out == TRANS_TYPE_WRITE_REQ) ) )
+    else:
+      s.uncached_M1 //= 0
+
     s.was_stalled = m = RegRst(1)
     m.in_ //= s.ostall_M2
     s.evict_bypass = Wire(1)
@@ -606,10 +992,16 @@ class BlockingCacheCtrlRTL( Component ):
       elif s.trans_M1.out == TRANS_TYPE_REPLAY_READ:  s.cs1 @= concat( none, rd, y,      n,     b1(0),    n       )
       elif s.trans_M1.out == TRANS_TYPE_REPLAY_WRITE: s.cs1 @= concat(  req, wr, y,      n,     b1(0),    n       )
       elif s.trans_M1.out == TRANS_TYPE_REPLAY_AMO:   s.cs1 @= concat( none, x , n,      n,     b1(0),    n       )
+      elif s.trans_M1.out == TRANS_TYPE_REPLAY_UNC:   s.cs1 @= concat( none, x , n,      n,     b1(0),    n       )
       elif s.trans_M1.out == TRANS_TYPE_REPLAY_INV:   s.cs1 @= concat( none, x , n,      n,     b1(0),    n       )
       elif s.trans_M1.out == TRANS_TYPE_CLEAN_HIT:    s.cs1 @= concat( none, x , n,      n,     b1(0),    n       )
+      elif s.trans_M1.out == TRANS_TYPE_AMO_WRITE:    s.cs1 @= concat(  req, wr, y,      n,     b1(0),    n       )
+      elif s.is_park_M1:                              s.cs1 @= concat( none, x , n,      n,     b1(0),    y       )
+      elif s.way_miss_M1:                             s.cs1 @= concat( none, x , n,      y,     b1(0),    n       )
+      elif s.sc_fail_M1:                              s.cs1 @= concat( none, x , n,      n,     b1(0),    n       )
       elif s.is_evict_M1:                             s.cs1 @= concat( none, rd, y,      y,     b1(1),    y       )
       elif s.trans_M1.out == TRANS_TYPE_INIT_REQ:     s.cs1 @= concat(  req, wr, y,      n,     b1(0),    n       )
+      elif s.amo_hit_M1:                              s.cs1 @= concat( none, rd, y,      n,     b1(0),    n       )
       elif s.trans_M1.out == TRANS_TYPE_AMO_REQ:      s.cs1 @= concat( none, x , n,      n,     b1(0),    y       )
       elif s.trans_M1.out == TRANS_TYPE_INV_START:    s.cs1 @= concat( none, x , n,      n,     b1(0),    y       )
       elif s.trans_M1.out == TRANS_TYPE_INV_WRITE:    s.cs1 @= concat( none, x , n,      n,     b1(0),    n       )
@@ -618,6 +1010,7 @@ class BlockingCacheCtrlRTL( Component ):
       elif s.trans_M1.out == TRANS_TYPE_FLUSH_WAIT:   s.cs1 @= concat( none, x , n,      n,     b1(0),    n       )
       elif s.trans_M1.out == TRANS_TYPE_FLUSH_WRITE:  s.cs1 @= concat( none, x , n,      n,     b1(0),    n       )
       elif s.trans_M1.out == TRANS_TYPE_REPLAY_FLUSH: s.cs1 @= concat( none, x , n,      n,     b1(0),    n       )
+      elif s.wt_write_M1 & ~s.hit_M1:                 s.cs1 @= concat( none, x , n,      n,     b1(0),    n       )
       elif ~s.hit_M1:                                 s.cs1 @= concat( none, x , n,      n,     b1(0),    y       )
       elif s.hit_M1:
         if   s.trans_M1.out == TRANS_TYPE_READ_REQ:   s.cs1 @= concat( none, rd, y,      n,     b1(0),    n       )
@@ -643,6 +1036,78 @@ class BlockingCacheCtrlRTL( Component ):
     s.ctrl.stall_reg_en_M1     //= lambda: ~s.was_stalled.out
     s.ctrl.hit_stall_eng_en_M1 //= lambda: ~s.was_stalled.out & ~s.evict_bypass
     s.ctrl.is_init_M1          //= lambda: s.trans_M1.out == TRANS_TYPE_INIT_REQ
+    s.ctrl.amo_write_M1        //= lambda: s.trans_M1.out == TRANS_TYPE_AMO_WRITE
+    s.ctrl.MSHR_park_M1        //= s.is_park_M1
+
+    # Requests parked in M1 hold off new requests, except for secondary
+    # misses when merging
+    if p.mshr_merge:
+      s.park_block_M1 //= lambda: s.is_park_M1 & (s.trans_M1.out == TRANS_TYPE_PARK)
+    else:
+      s.park_block_M1 //= s.is_park_M1
+
+    # A replayed request must not be parked again behind the requests that
+    # were parked after it in the same set
+    s.is_replay_park_M1 = m = RegEnRst(1)
+    m.in_ //= s.ctrl.MSHR_dealloc_park_M0
+    m.en  //= s.ctrl_pipeline_reg_en_M1
+    s.ctrl.MSHR_conflict_park_M1 //= lambda: ~s.is_replay_park_M1.out
+
+    #---------------------------------------------------------------------
+    # M1 way prediction
+    #---------------------------------------------------------------------
+    # A read or write that only read the predicted way and did not hit in
+    # it is a way miss: it stalls in M1 while M0 rereads all the tag arrays
+    # for it (once M2 is not stalled, so that the new read data is caught
+    # by the tag stall engines next cycle) and then looks up all the ways
+    # like any other request. Misses always go through the full lookup
+    # since they need the tags and dirty bits of the victim. The MRU way is
+    # updated on hits and refills.
+
+    if p.way_pred:
+      s.way_pred_M1 = RegRst(1) # only the predicted way was read
+      s.way_pred_way_M1 = m = RegEnRst(p.bitwidth_clog_asso)
+      m.in_ //= s.status.way_pred_M0
+      m.en  //= s.ctrl_pipeline_reg_en_M1
+
+      @update
+      def way_pred_logic_M1():
+        s.way_pred_M1.in_ @= s.way_pred_M1.out
+        if s.ctrl_pipeline_reg_en_M1:
+          s.way_pred_M1.in_ @= ( (s.trans_M0 == TRANS_TYPE_READ_REQ) |
+                                 (s.trans_M0 == TRANS_TYPE_WRITE_REQ) )
+        elif s.way_retry_M0:
+          s.way_pred_M1.in_ @= 0
+
+      s.way_miss_M1 //= lambda: ( s.way_pred_M1.out & ~s.status.hit_M1 &
+                                  ~s.status.MSHR_conflict_M1 &
+                                  ( (s.trans_M1.out == TRANS_TYPE_READ_REQ) |
+                                    (s.trans_M1.out == TRANS_TYPE_WRITE_REQ) ) )
+      s.way_retry_M0    //= lambda: s.way_miss_M1 & ~s.ostall_M2
+      s.way_pred_hit_M1 //= lambda: s.way_pred_M1.out & s.hit_M1
+
+      BitsAssoc = p.BitsAssoc
+      @update
+      def tag_way_mask_logic_M1():
+        s.ctrl.tag_way_mask_M1 @= BitsAssoc(-1)
+        if s.way_pred_M1.out:
+          s.ctrl.tag_way_mask_M1 @= 0
+          s.ctrl.tag_way_mask_M1[ s.way_pred_way_M1.out ] @= 1
+
+      s.ctrl.way_pred_wen_M1 //= lambda: (
+        ( s.hit_M1 & ( (s.trans_M1.out == TRANS_TYPE_READ_REQ) |
+                       (s.trans_M1.out == TRANS_TYPE_WRITE_REQ) ) ) |
+        (s.trans_M1.out == TRANS_TYPE_REFILL) |
+        (s.trans_M1.out == TRANS_TYPE_REPLAY_READ) |
+        (s.trans_M1.out == TRANS_TYPE_REPLAY_WRITE) )
+      s.ctrl.way_pred_wway_M1 //= s.ctrl.way_offset_M1
+    else:
+      s.way_miss_M1     //= 0
+      s.way_retry_M0    //= 0
+      s.way_pred_hit_M1 //= 0
+      s.ctrl.tag_way_mask_M1  //= p.BitsAssoc(-1)
+      s.ctrl.way_pred_wen_M1  //= 0
+      s.ctrl.way_pred_wway_M1 //= 0
 
     # Flush transaction
     s.ctrl.flush_init_reg_en_M1 //= lambda: s.ctrl_pipeline_reg_en_M1
@@ -659,9 +1124,21 @@ class BlockingCacheCtrlRTL( Component ):
     # M2 Stage
     #=====================================================================
 
+    # Parked requests do not do anything in M2, neither do the read hits
+    # that were answered early from M1 nor way misses waiting for the full
+    # tag lookup
+    s.trans_M1_2 = Wire(TRANS_TYPE_NBITS)
+    @update
+    def trans_M1_2_logic():
+      s.trans_M1_2 @= s.trans_M1.out
+      if s.is_park_M1:
+        s.trans_M1_2 @= TRANS_TYPE_PARK
+      elif s.early_resp_M1 | s.way_miss_M1:
+        s.trans_M1_2 @= TRANS_TYPE_INVALID
+
     s.ctrl_pipeline_reg_en_M2 = Wire(1)
     s.trans_M2 = m = RegEnRst(TRANS_TYPE_NBITS)
-    m.in_ //= s.trans_M1.out
+    m.in_ //= s.trans_M1_2
     m.en  //= s.ctrl_pipeline_reg_en_M2
 
     s.is_evict_M2 = m = RegEnRst(1)
@@ -670,11 +1147,47 @@ class BlockingCacheCtrlRTL( Component ):
 
     s.evict_bypass //= s.is_evict_M2.out
 
+    s.wt_write_M2 = m = RegEnRst(1)
+    m.in_ //= s.wt_write_M1
+    m.en  //= s.ctrl_pipeline_reg_en_M2
+
+    s.wt_memreq_M2 = Wire(1)
+    s.wt_memreq_M2 //= lambda: s.wt_write_M2.out & (s.trans_M2.out == TRANS_TYPE_WRITE_REQ)
+    s.ctrl.memreq_wt_M2 //= s.wt_memreq_M2
+
+    s.uncached_M2 = m = RegEnRst(1)
+    m.in_ //= s.uncached_M1
+    m.en  //= s.ctrl_pipeline_reg_en_M2
+
+    s.ctrl.memreq_uncached_M2 //= lambda: ( s.uncached_M2.out &
+                                            (s.trans_M2.out == TRANS_TYPE_READ_REQ) )
+    s.ctrl.uncached_resp_M2   //= lambda: s.trans_M2.out == TRANS_TYPE_REPLAY_UNC
+
+    s.is_victim_val_M2 = m = RegEnRst(1)
+    m.in_ //= lambda: s.is_evict_M1 & s.is_victim_val_M1
+    m.en  //= s.ctrl_pipeline_reg_en_M2
+    m.out //= s.ctrl.memreq_victim_M2
+
     s.hit_reg_M2 = m = RegEnRst(1)
     m.in_ //= s.hit_M1
     m.en  //= s.ctrl_pipeline_reg_en_M2
     m.out //= s.ctrl.hit_M2[0]
 
+    s.amo_hit_M2 = m = RegEnRst(1)
+    m.in_ //= s.amo_hit_M1
+    m.en  //= s.ctrl_pipeline_reg_en_M2
+    m.out //= s.ctrl.amo_hit_M2
+
+    s.sc_fail_M2 = m = RegEnRst(1)
+    m.in_ //= s.sc_fail_M1
+    m.en  //= s.ctrl_pipeline_reg_en_M2
+    m.out //= s.ctrl.sc_fail_M2
+
+    # Way of the AMO hit in M2, which its AMO_WRITE in M1 writes
+    s.amo_way_M2 = m = RegEnRst(p.bitwidth_clog_asso)
+    m.in_ //= s.ctrl.way_offset_M1
+    m.en  //= s.ctrl_pipeline_reg_en_M2
+
     s.has_flush_sent_M2 = m = RegEnRst(1)
     m.in_ //= s.has_flush_sent_M1_bypass
     m.en  //= s.ctrl_pipeline_reg_en_M2
@@ -687,6 +1200,10 @@ class BlockingCacheCtrlRTL( Component ):
     #---------------------------------------------------------------------
 
     s.cs2 = Wire(9)
+    s.cacheresp_en_M2 = Wire(1)
+    # Refill and replay of a read miss that was already answered from its
+    # refill beat
+    s.cwf_bubble_M2   = Wire(1)
 
     CS_data_size_mux_en_M2  = slice( 8, 9 )
     CS_read_data_mux_sel_M2 = slice( 7, 8 )
@@ -706,24 +1223,31 @@ class BlockingCacheCtrlRTL( Component ):
       elif s.trans_M2.out == TRANS_TYPE_INV_START:    s.cs2 @= concat( n,       b1(1),    n,     READ,       n,     n        )
       elif s.trans_M2.out == TRANS_TYPE_INV_WRITE:    s.cs2 @= concat( n,       b1(1),    n,     READ,       n,     n        )
       elif s.trans_M2.out == TRANS_TYPE_CLEAN_HIT:    s.cs2 @= concat( n,       b1(1),    n,     READ,       n,     n        )
+      elif s.trans_M2.out == TRANS_TYPE_AMO_WRITE:    s.cs2 @= concat( n,       b1(1),    n,     READ,       n,     n        )
       elif s.trans_M2.out == TRANS_TYPE_FLUSH_START:  s.cs2 @= concat( n,       b1(1),    n,     READ,       n,     n        )
       elif s.trans_M2.out == TRANS_TYPE_FLUSH_WAIT:   s.cs2 @= concat( n,       b1(1),    n,     READ,       n,     n        )
       elif s.trans_M2.out == TRANS_TYPE_FLUSH_WRITE:  s.cs2 @= concat( n,       b1(1),    n,     READ,       n,     n        )
+      elif s.trans_M2.out == TRANS_TYPE_PARK:         s.cs2 @= concat( n,       b1(1),    n,     READ,       n,     n        )
+      elif s.cwf_bubble_M2:                           s.cs2 @= concat( n,       b1(1),    n,     READ,       n,     n        )
       elif ~s.memreq_rdy|~s.cacheresp_rdy:            s.cs2 @= concat( n,       b1(1),    y,     READ,       n,     n        )
       elif s.trans_M2.out == TRANS_TYPE_FLUSH_READ:   s.cs2 @= concat( n,      fl_sel,    n,     WRITE,      flush, n        )
       elif s.is_evict_M2.out:                         s.cs2 @= concat( n,       b1(0),    n,     WRITE,      y,     n        )
       elif s.trans_M2.out == TRANS_TYPE_REPLAY_READ:  s.cs2 @= concat( y,       b1(0),    n,     READ,       n,     y        )
       elif s.trans_M2.out == TRANS_TYPE_REPLAY_WRITE: s.cs2 @= concat( n,       b1(1),    n,     WRITE,      n,     y        )
       elif s.trans_M2.out == TRANS_TYPE_REPLAY_AMO:   s.cs2 @= concat( n,       b1(1),    n,     READ,       n,     y        )
+      elif s.trans_M2.out == TRANS_TYPE_REPLAY_UNC:   s.cs2 @= concat( y,       b1(1),    n,     READ,       n,     y        )
       elif s.trans_M2.out == TRANS_TYPE_REPLAY_INV:   s.cs2 @= concat( n,       b1(1),    n,     READ,       n,     y        )
       elif s.trans_M2.out == TRANS_TYPE_REPLAY_FLUSH: s.cs2 @= concat( n,       b1(1),    n,     READ,       n,     y        )
       elif s.trans_M2.out == TRANS_TYPE_INIT_REQ:     s.cs2 @= concat( n,       b1(1),    n,     READ,       n,     y        )
+      elif s.amo_hit_M2.out:                          s.cs2 @= concat( n,       b1(0),    n,     READ,       n,     y        )
+      elif s.sc_fail_M2.out:                          s.cs2 @= concat( n,       b1(1),    n,     READ,       n,     y        )
       elif s.trans_M2.out == TRANS_TYPE_AMO_REQ:      s.cs2 @= concat( n,       b1(1),    n,     AMO,        y,     n        )
       elif s.trans_M2.out == TRANS_TYPE_READ_REQ:
         if    s.ctrl.hit_M2[0]:                       s.cs2 @= concat( y,       b1(0),    n,     READ,       n,     y        )
         elif ~s.ctrl.hit_M2[0]:                       s.cs2 @= concat( n,       b1(1),    n,     READ,       y,     n        )
       elif s.trans_M2.out == TRANS_TYPE_WRITE_REQ:
-        if  s.ctrl.hit_M2[0]:                         s.cs2 @= concat( n,       b1(1),    n,     READ,       n,     y        )
+        if  s.wt_memreq_M2:                           s.cs2 @= concat( n,       b1(1),    n,     WRITE,      y,     y        )
+        elif s.ctrl.hit_M2[0]:                         s.cs2 @= concat( n,       b1(1),    n,     READ,       n,     y        )
         elif ~s.ctrl.hit_M2[0]:                       s.cs2 @= concat( n,       b1(1),    n,     READ,       y,     n        )
 
       s.ctrl.data_size_mux_en_M2  @= s.cs2[ CS_data_size_mux_en_M2  ]
@@ -733,7 +1257,7 @@ class BlockingCacheCtrlRTL( Component ):
         s.ctrl.memreq_type        @= s.status.cachereq_type_M2
       else:
         s.ctrl.memreq_type        @= s.cs2[ CS_memreq_type          ]
-      s.cacheresp_en              @= s.cs2[ CS_cacheresp_en         ]
+      s.cacheresp_en_M2           @= s.cs2[ CS_cacheresp_en         ]
       s.memreq_en                 @= s.cs2[ CS_memreq_en            ]
 
     # dpath pipeline reg en; will only en if we have a stall in M2 and if
@@ -753,7 +1277,144 @@ class BlockingCacheCtrlRTL( Component ):
                                     (s.trans_M2.out == TRANS_TYPE_REPLAY_AMO)) &
                                     (~s.is_evict_M2.out) )
 
-    s.ctrl.hit_M2[1] //= 0 # hit output expects 2 bits but we only use one bit
+    # The second hit bit marks misses refilled from the victim buffer. With
+    # a single MSHR entry the replay in M2 always belongs to the last refill.
+    if p.victim_entries > 0:
+      s.victim_hit_M0 = m = RegEnRst(1)
+      m.in_ //= s.status.memresp_victim_M0
+      m.en  //= s.memresp_val_M0
+
+      s.ctrl.hit_M2[1] //= lambda: ( s.victim_hit_M0.out &
+                                     ( (s.trans_M2.out == TRANS_TYPE_REPLAY_READ) |
+                                       (s.trans_M2.out == TRANS_TYPE_REPLAY_WRITE) ) )
+    else:
+      s.ctrl.hit_M2[1] //= 0 # hit output expects 2 bits but we only use one bit
+
+    #---------------------------------------------------------------------
+    # Early read hits
+    #---------------------------------------------------------------------
+    # A read hit to the line in the dpath line buffer responds from M1 if M2
+    # is neither responding nor stalled this cycle, and then goes down M2
+    # as a bubble. Responses stay in order since M2 can only hold an older
+    # request that has already responded or does not respond here (a miss
+    # blocks new requests unless there are several MSHR entries, in which
+    # case responses may be out of order anyway).
+    # The buffer is filled in M2 by read hits and read miss replays, which
+    # read the data array in M1. A data array write to the set of the
+    # buffered line invalidates it. A fill in the same cycle as any data
+    # array write leaves the buffer invalid, since the fill data was read
+    # before the write. The tag check still has to hit, so INV and AMOs do
+    # not need to invalidate the buffer.
+
+    s.cacheresp_en //= lambda: ( s.cacheresp_en_M2 | s.early_resp_M1 |
+                                 s.ctrl.cwf_resp_send )
+
+    if p.early_read_hit:
+      s.line_buf_val_M2 = RegRst(1)
+      s.line_buf_wr_M1  = Wire(1)
+
+      s.ctrl.line_buf_fill_M2 //= lambda: (
+        ( (s.trans_M2.out == TRANS_TYPE_READ_REQ) & s.ctrl.hit_M2[0] ) |
+        (s.trans_M2.out == TRANS_TYPE_REPLAY_READ) )
+      s.line_buf_wr_M1 //= lambda: ( s.ctrl.data_array_val_M1 &
+                                     (s.ctrl.data_array_type_M1 == wr) )
+
+      @update
+      def line_buf_val_logic_M2():
+        s.line_buf_val_M2.in_ @= s.line_buf_val_M2.out
+        if s.ctrl.line_buf_fill_M2:
+          s.line_buf_val_M2.in_ @= ~s.line_buf_wr_M1
+        elif s.line_buf_wr_M1 & s.status.line_buf_set_match_M1:
+          s.line_buf_val_M2.in_ @= 0
+
+      s.early_resp_M1 //= lambda: ( s.line_buf_val_M2.out & s.status.line_buf_match_M1 &
+        (s.trans_M1.out == TRANS_TYPE_READ_REQ) & s.hit_M1 &
+        ~s.cacheresp_en_M2 & ~s.ostall_M2 & s.cacheresp_rdy )
+    else:
+      s.ctrl.line_buf_fill_M2 //= 0
+      s.early_resp_M1 //= 0
+
+    s.ctrl.early_resp_M1 //= s.early_resp_M1
+
+    #---------------------------------------------------------------------
+    # Critical word first
+    #---------------------------------------------------------------------
+    # A read miss is answered as soon as the refill beat holding its data
+    # arrives. The dpath keeps the response until the response port is free,
+    # which it is unless the proc is not ready, since a miss blocks the
+    # pipeline. Once sent, the refill and replay of the miss go down M2 as
+    # bubbles that do not wait on cacheresp_rdy, since the proc may hold
+    # off responses until it can send a new request. A response still
+    # waiting when the replay reaches M2 is dropped and the replay answers
+    # as usual.
+
+    if p.critical_word_first:
+      s.cwf_pending = RegRst(1)
+      s.cwf_sent    = RegRst(1)
+
+      s.ctrl.cwf_resp_en_Y //= lambda: ( s.memresp_en & ~s.status.memresp_last_Y &
+        s.MSHR_rd & s.status.cwf_word_hit_Y &
+        ~s.cwf_pending.out & ~s.cwf_sent.out )
+      s.ctrl.cwf_resp_send //= lambda: ( s.cwf_pending.out & ~s.cacheresp_en_M2 &
+                                         s.cacheresp_rdy )
+      s.cwf_bubble_M2 //= lambda: s.cwf_sent.out & (
+        (s.trans_M2.out == TRANS_TYPE_REFILL) |
+        (s.trans_M2.out == TRANS_TYPE_REPLAY_READ) )
+
+      @update
+      def cwf_logic():
+        s.cwf_pending.in_ @= s.cwf_pending.out
+        s.cwf_sent.in_    @= s.cwf_sent.out
+        if s.trans_M2.out == TRANS_TYPE_REPLAY_READ:
+          s.cwf_pending.in_ @= 0
+          s.cwf_sent.in_    @= 0
+        elif s.ctrl.cwf_resp_en_Y:
+          s.cwf_pending.in_ @= 1
+        elif s.ctrl.cwf_resp_send:
+          s.cwf_pending.in_ @= 0
+          s.cwf_sent.in_    @= 1
+    else:
+      s.ctrl.cwf_resp_en_Y //= 0
+      s.ctrl.cwf_resp_send //= 0
+      s.cwf_bubble_M2      //= 0
+
+    #=====================================================================
+    # Performance counter events
+    #=====================================================================
+    # Requests are counted once when they move from M1 to M2. A miss that
+    # evicts moves to M2 twice, first for the writeback and then for the
+    # refill request.
+
+    if p.stats:
+      s.stats_events = OutPort(p.StructStatsEvents)
+
+      s.is_req_M1 = Wire()
+      s.req_M1_M2 = Wire()
+      s.is_req_M1 //= lambda: ( (s.trans_M1.out == TRANS_TYPE_READ_REQ) |
+                                (s.trans_M1.out == TRANS_TYPE_WRITE_REQ) )
+      s.req_M1_M2 //= lambda: ( s.ctrl_pipeline_reg_en_M2 & ~s.is_evict_M1 &
+                                ~s.is_park_M1 & ~s.way_miss_M1 )
+
+      @update
+      def stats_events_logic():
+        s.stats_events.hits            @= s.req_M1_M2 & s.is_req_M1 & s.hit_M1
+        s.stats_events.misses          @= s.req_M1_M2 & s.is_req_M1 & ~s.hit_M1
+        s.stats_events.evictions       @= s.ctrl_pipeline_reg_en_M2 & s.is_evict_M1
+        s.stats_events.writebacks      @= s.memreq_en & ( s.ctrl.memreq_type == WRITE )
+        s.stats_events.amos            @= s.req_M1_M2 & ( s.trans_M1.out == TRANS_TYPE_AMO_REQ )
+        s.stats_events.stall_mem       @= s.ostall_M2 & ~s.memreq_rdy
+        s.stats_events.stall_resp      @= s.ostall_M2 & s.memreq_rdy & ~s.cacheresp_rdy
+        s.stats_events.stall_clean_hit @= s.is_write_hit_clean_M0
+        s.stats_events.stall_evict     @= s.ostall_M1 & ~s.ostall_M2
+        s.stats_events.miss_cycles     @= ( ~s.status.MSHR_primary_empty &
+                                            (s.FSM_state_M0.out == M0_FSM_STATE_READY) )
+        s.stats_events.inv_cycles      @= ( (s.trans_M0 == TRANS_TYPE_INV_START) |
+                                            (s.trans_M0 == TRANS_TYPE_INV_WRITE) |
+                                            (s.trans_M0 == TRANS_TYPE_REPLAY_INV) )
+        s.stats_events.flush_cycles    @= ( (s.trans_M0 >= TRANS_TYPE_FLUSH_START) &
+                                            (s.trans_M0 <= TRANS_TYPE_REPLAY_FLUSH) )
+        s.stats_events.way_pred_hits   @= s.req_M1_M2 & s.is_req_M1 & s.way_pred_hit_M1
+        s.stats_events.way_pred_misses @= s.way_retry_M0
 
   #=======================================================================
   # line_trace
@@ -789,6 +1450,8 @@ class BlockingCacheCtrlRTL( Component ):
     elif s.trans_M0 == TRANS_TYPE_CACHE_INIT:   msg_M0 += "ini"
     elif s.trans_M0 == TRANS_TYPE_AMO_REQ:      msg_M0 += "amo"
     elif s.trans_M0 == TRANS_TYPE_REPLAY_AMO:   msg_M0 += "rpa"
+    elif s.trans_M0 == TRANS_TYPE_REPLAY_UNC:   msg_M0 += "rpu"
+    elif s.trans_M0 == TRANS_TYPE_AMO_WRITE:    msg_M0 += "amw"
     elif s.trans_M0 == TRANS_TYPE_INV_WRITE:    msg_M0 += "ivw"
     elif s.trans_M0 == TRANS_TYPE_INV_START:    msg_M0 += "iv0"
     elif s.trans_M0 == TRANS_TYPE_REPLAY_INV:   msg_M0 += "ivp"
@@ -797,6 +1460,7 @@ class BlockingCacheCtrlRTL( Component ):
     elif s.trans_M0 == TRANS_TYPE_FLUSH_WAIT:   msg_M0 += "fl#"
     elif s.trans_M0 == TRANS_TYPE_FLUSH_WRITE:  msg_M0 += "flw"
     elif s.trans_M0 == TRANS_TYPE_REPLAY_FLUSH: msg_M0 += "flp"
+    elif s.trans_M0 == TRANS_TYPE_PARK:         msg_M0 += " pk"
     else:                                       msg_M0 += "   "
 
     if not s.cachereq_rdy: msg_M0 = "#" + msg_M0
@@ -815,6 +1479,8 @@ class BlockingCacheCtrlRTL( Component ):
     elif s.trans_M1.out == TRANS_TYPE_CACHE_INIT:   msg_M1 = "ini"
     elif s.trans_M1.out == TRANS_TYPE_AMO_REQ:      msg_M1 = "amo"
     elif s.trans_M1.out == TRANS_TYPE_REPLAY_AMO:   msg_M1 = "rpa"
+    elif s.trans_M1.out == TRANS_TYPE_REPLAY_UNC:   msg_M1 = "rpu"
+    elif s.trans_M1.out == TRANS_TYPE_AMO_WRITE:    msg_M1 = "amw"
     elif s.trans_M1.out == TRANS_TYPE_INV_WRITE:    msg_M1 = "ivw"
     elif s.trans_M1.out == TRANS_TYPE_INV_START:    msg_M1 = "iv0"
     elif s.trans_M1.out == TRANS_TYPE_REPLAY_INV:   msg_M1 = "ivp"
@@ -823,6 +1489,7 @@ class BlockingCacheCtrlRTL( Component ):
     elif s.trans_M1.out == TRANS_TYPE_FLUSH_WAIT:   msg_M1 = "fl#"
     elif s.trans_M1.out == TRANS_TYPE_FLUSH_WRITE:  msg_M1 = "frw"
     elif s.trans_M1.out == TRANS_TYPE_REPLAY_FLUSH: msg_M1 = "flp"
+    elif s.trans_M1.out == TRANS_TYPE_PARK:         msg_M1 = " pk"
 
     msg_M2 = "   "
     if   s.trans_M2.out == TRANS_TYPE_REFILL:       msg_M2 = " rf"
@@ -836,6 +1503,8 @@ class BlockingCacheCtrlRTL( Component ):
     elif s.trans_M2.out == TRANS_TYPE_CACHE_INIT:   msg_M2 = "ini"
     elif s.trans_M2.out == TRANS_TYPE_AMO_REQ:      msg_M2 = "amo"
     elif s.trans_M2.out == TRANS_TYPE_REPLAY_AMO:   msg_M2 = "rpa"
+    elif s.trans_M2.out == TRANS_TYPE_REPLAY_UNC:   msg_M2 = "rpu"
+    elif s.trans_M2.out == TRANS_TYPE_AMO_WRITE:    msg_M2 = "amw"
     elif s.trans_M2.out == TRANS_TYPE_INV_WRITE:    msg_M2 = "ivw"
     elif s.trans_M2.out == TRANS_TYPE_INV_START:    msg_M2 = "iv0"
     elif s.trans_M2.out == TRANS_TYPE_REPLAY_INV:   msg_M2 = "ivp"
@@ -844,6 +1513,7 @@ class BlockingCacheCtrlRTL( Component ):
     elif s.trans_M2.out == TRANS_TYPE_FLUSH_WAIT:   msg_M2 = "fl#"
     elif s.trans_M2.out == TRANS_TYPE_FLUSH_WRITE:  msg_M2 = "flw"
     elif s.trans_M2.out == TRANS_TYPE_REPLAY_FLUSH: msg_M2 = "flp"
+    elif s.trans_M2.out == TRANS_TYPE_PARK:         msg_M2 = " pk"
 
     msg_memresp = ">" if s.memresp_en else " "
     msg_memreq = ">" if s.memreq_en else " "
@@ -9,13 +9,15 @@ Date   : 20 February 2020
 """
 
 from pymtl3                         import *
-from pymtl3.stdlib.basic_rtl        import Mux, RegisterFile, RegEnRst, RegEn
+from pymtl3.stdlib.basic_rtl        import Mux, RegisterFile, RegEnRst, RegEn, RegRst
 
 # Import generic constants used in the repo
 from constants  import *
 
 # Generic behavioral SRAM model
 from sram.SramPRTL        import SramPRTL
+from sram.Sram1R1WPRTL    import Sram1R1WPRTL
+from sram.BankedSramPRTL  import BankedSramPRTL
 
 # Import cache specific constants
 from .cache_constants import *
@@ -41,10 +43,45 @@ class BlockingCacheDpathRTL( Component ):
     # M0 Stage
     #--------------------------------------------------------------------
 
+    # With critical word first refills the line comes back in beats. Each
+    # beat marks its words in the memresp wr_mask and the beats are gathered
+    # here until they complete the line. Responses without a mask are
+    # whole.
+    s.memresp_line_Y = Wire(p.MemRespType)
+    if p.critical_word_first:
+      all_words = p.BitsDirty( 2**p.bitwidth_dirty - 1 )
+
+      s.refill_data_Y = m = RegEnRst(p.bitwidth_cacheline)
+      m.en //= s.ctrl.refill_beat_en_Y
+
+      s.refill_mask_Y = m = RegEnRst(p.bitwidth_dirty)
+      m.en //= s.ctrl.refill_beat_en_Y
+
+      s.refill_data_next_Y = Wire(p.bitwidth_cacheline)
+      s.refill_mask_next_Y = Wire(p.bitwidth_dirty)
+      s.memresp_last_Y     = Wire()
+
+      @update
+      def refill_beats_logic_Y():
+        s.refill_data_next_Y @= s.memresp_Y.data | s.refill_data_Y.out
+        s.refill_mask_next_Y @= s.memresp_Y.wr_mask | s.refill_mask_Y.out
+        s.memresp_last_Y     @= ( s.memresp_Y.wr_mask == 0 ) | \
+                                ( s.refill_mask_next_Y == all_words )
+        s.memresp_line_Y      @= s.memresp_Y
+        s.memresp_line_Y.data @= s.refill_data_next_Y
+
+      # The gathered beats are cleared by the last one
+      s.refill_data_Y.in_ //= lambda: 0 if s.memresp_last_Y else s.refill_data_next_Y
+      s.refill_mask_Y.in_ //= lambda: 0 if s.memresp_last_Y else s.refill_mask_next_Y
+      s.status.memresp_last_Y //= s.memresp_last_Y
+    else:
+      s.memresp_line_Y //= s.memresp_Y
+      s.status.memresp_last_Y //= 1
+
     # Pipeline Registers
     s.pipeline_reg_M0 = m = RegEnRst(p.MemRespType, p.MemRespType())
-    m.in_ //= s.memresp_Y
-    m.en  //= s.ctrl.reg_en_M0
+    m.in_ //= s.memresp_line_Y
+    m.en  //= s.ctrl.memresp_reg_en_M0
 
     # Forward declaration: output from MSHR
     s.MSHR_dealloc_out = Wire(p.MSHRMsg)
@@ -56,12 +93,28 @@ class BlockingCacheDpathRTL( Component ):
       s.MSHR_dealloc_out.data)
     s.status.amo_hit_M0 //= s.MSHR_dealloc_out.amo_hit
 
+    # Accesses to the uncached ranges bypass the arrays, so the memresp of
+    # the MSHR req and the req in M1 are checked against them
+    if p.uncached_ranges:
+      s.MSHR_addr_M0 = Wire(p.bitwidth_addr)
+      @update
+      def MSHR_addr_bitstruct_to_bits_M0():
+        s.MSHR_addr_M0 @= s.MSHR_dealloc_out.addr
+
+      s.uncached_check_M0 = m = AddrRangeCheck(p, p.uncached_ranges)
+      m.addr //= s.MSHR_addr_M0
+      m.out  //= s.status.uncached_M0
+    else:
+      s.status.uncached_M0 //= 0
+
     # Chooses the cache request from proc or MSHR (memresp)
     s.cachereq_memresp_mux_M0 = m = Mux(p.CacheReqType, 2)
     m.in_[0] //= s.cachereq_Y
     m.in_[1] //= s.MSHR_dealloc_mux_in_M0
     m.sel    //= s.ctrl.cachereq_memresp_mux_sel_M0
 
+    s.status.cachereq_init_Y //= lambda: s.cachereq_Y.type_ == INIT
+
     s.cachereq_M0 = Wire(p.PipelineMsg)
     s.cachereq_M0.type_  //= s.cachereq_memresp_mux_M0.out.type_
     s.cachereq_M0.opaque //= s.cachereq_memresp_mux_M0.out.opaque
@@ -96,7 +149,17 @@ class BlockingCacheDpathRTL( Component ):
     # Dependent on if we have a refill response
     s.write_data_mux_M0 = m = Mux(p.bitwidth_cacheline, 2)
     m.in_[0] //= s.replicator_M0.out
-    m.in_[1] //= s.pipeline_reg_M0.out.data
+    if p.sectors > 1:
+      # A sector refill has its sector at the bottom of the memresp, copy
+      # it to every sector so that it lines up with its place in the line.
+      # AMO and uncached responses keep their data at the bottom.
+      s.refill_data_M0 = Wire(p.bitwidth_cacheline)
+      for j in range(0, p.bitwidth_cacheline, p.bitwidth_sector):
+        s.refill_data_M0[j : j + p.bitwidth_sector] //= \
+          s.pipeline_reg_M0.out.data[0 : p.bitwidth_sector]
+      m.in_[1] //= s.refill_data_M0
+    else:
+      m.in_[1] //= s.pipeline_reg_M0.out.data
     m.sel    //= s.ctrl.wdata_mux_sel_M0
     m.out    //= s.cachereq_M0.data
 
@@ -115,11 +178,23 @@ class BlockingCacheDpathRTL( Component ):
     m.cmd        //= s.ctrl.update_tag_cmd_M0
     m.refill_dty //= s.MSHR_dealloc_out.dirty_bits
     m.wr_len     //= s.cachereq_M0.len
+    if p.sectors > 1:
+      m.refill_sec //= s.MSHR_dealloc_out.sec_bits
 
     s.tag_entries_M1_bypass = [ Wire(p.StructTagArray) for _ in range(p.associativity) ]
     for i in range(p.associativity):
       s.update_tag_unit.old_entries[i] //= s.tag_entries_M1_bypass[i]
 
+    # MRU way of every set for way prediction; written in M1
+    if p.way_pred:
+      s.way_pred_M0 = m = WayPredictorReg(p)
+      m.raddr //= s.cachereq_M0.addr.index
+      m.rdata //= s.status.way_pred_M0
+      m.wdata //= s.ctrl.way_pred_wway_M1
+      m.wen   //= s.ctrl.way_pred_wen_M1
+    else:
+      s.status.way_pred_M0 //= 0
+
     # Index select for the tag array as a result of cache initialization
     s.tag_array_idx_mux_M0 = m = Mux(p.bitwidth_index, 2)
     m.in_[0] //= s.cachereq_M0.addr.index
@@ -137,13 +212,76 @@ class BlockingCacheDpathRTL( Component ):
     s.tag_array_struct_M0.tag //= s.tag_array_tag_mux_M0.out
     s.tag_array_struct_M0.val //= s.update_tag_unit.out.val
     s.tag_array_struct_M0.dty //= s.update_tag_unit.out.dty
+    if p.sectors > 1:
+      s.tag_array_struct_M0.sec //= s.update_tag_unit.out.sec
     s.tag_array_wdata_M0 = Wire(p.bitwidth_tag_array)
     @update
     def tag_array_struct_M0_bits_to_bitstruct():
       s.tag_array_wdata_M0 @= s.tag_array_struct_M0
 
+    # INV and FLUSH carry the number of bytes they apply to from addr in
+    # data, 0 being the whole cache. They only walk the lines of the sets
+    # covered by the range, going down from the last way of its last set to
+    # the first way of its first set, or over all the lines when the range
+    # spans or wraps around all the sets.
+    range_max_bytes = p.nblocks_per_way * p.bitwidth_cacheline // 8
+    idx_lo    = p.bitwidth_offset
+    idx_hi    = p.bitwidth_offset + p.bitwidth_index
+    clog_asso = clog2( p.associativity )
+    s.range_last_addr_M0 = Wire(p.bitwidth_addr)
+    s.range_first_set_M0 = Wire(p.BitsIdx)
+    s.range_last_set_M0  = Wire(p.BitsIdx)
+
+    @update
+    def range_lines_logic_M0():
+      s.range_last_addr_M0 @= ( s.cachereq_memresp_mux_M0.out.addr +
+        trunc( s.cachereq_memresp_mux_M0.out.data - 1, p.bitwidth_addr ) )
+      s.range_first_set_M0 @= s.cachereq_memresp_mux_M0.out.addr[ idx_lo:idx_hi ]
+      s.range_last_set_M0  @= s.range_last_addr_M0[ idx_lo:idx_hi ]
+      s.status.range_all_M0 @= ( ( s.cachereq_memresp_mux_M0.out.data == 0 ) |
+        ( s.cachereq_memresp_mux_M0.out.data >= range_max_bytes ) |
+        ( s.range_last_set_M0 < s.range_first_set_M0 ) )
+      if s.status.range_all_M0:
+        s.status.range_start_line_M0 @= p.total_num_cachelines - 1
+        s.status.range_end_line_M0   @= 0
+      else:
+        s.status.range_start_line_M0 @= ( ( zext( s.range_last_set_M0, p.bitwidth_num_lines )
+                                            << clog_asso ) | ( p.associativity - 1 ) )
+        s.status.range_end_line_M0   @= ( zext( s.range_first_set_M0, p.bitwidth_num_lines )
+                                          << clog_asso )
+
+    # One bit per set that is set whenever a dirty line is written into the
+    # set. Flush uses it to skip over the sets that are entirely clean.
+    if p.fast_flush:
+      dty_lo = p.bitwidth_tag
+      dty_hi = p.bitwidth_tag + p.bitwidth_dirty
+      s.dirty_sets_M0 = m = RegRst(p.BitsNlinesPerWay)
+      m.out //= s.status.dirty_sets_M0
+
+      # The flush replays with its own request, so we clear the sets of
+      # its range
+      @update
+      def dirty_sets_logic_M0():
+        s.dirty_sets_M0.in_ @= s.dirty_sets_M0.out
+        if s.ctrl.dirty_sets_clear_M0:
+          for i in range( p.nblocks_per_way ):
+            if ( s.status.range_all_M0 | ( ( s.range_first_set_M0 <= i ) &
+                                           ( s.range_last_set_M0  >= i ) ) ):
+              s.dirty_sets_M0.in_[i] @= 0
+        elif ( ( s.ctrl.tag_array_type_M0 == wr ) &
+               ( s.ctrl.tag_array_val_M0 != 0 ) &
+               ( s.ctrl.tag_array_wben_M0[dty_lo:dty_hi] != 0 ) &
+               ( s.tag_array_struct_M0.dty != 0 ) ):
+          s.dirty_sets_M0.in_[ s.tag_array_idx_mux_M0.out ] @= 1
+        # Write hits that set their dirty bits from M1 (dirty_bits_reg)
+        if s.ctrl.dirty_wr_M1:
+          s.dirty_sets_M0.in_[ s.cachereq_M1.out.addr.index ] @= 1
+    else:
+      s.status.dirty_sets_M0 //= 0
+
     # Send the M0 status signals to control
     s.status.memresp_type_M0   //= s.pipeline_reg_M0.out.type_
+    s.status.memresp_victim_M0 //= s.pipeline_reg_M0.out.test[0]
     s.status.cachereq_type_M0  //= s.cachereq_memresp_mux_M0.out.type_
 
     #--------------------------------------------------------------------
@@ -155,6 +293,9 @@ class BlockingCacheDpathRTL( Component ):
     m.in_ //= s.cachereq_M0
     m.en  //= s.ctrl.reg_en_M1
 
+    if p.way_pred:
+      s.way_pred_M0.waddr //= s.cachereq_M1.out.addr.index
+
     # Data array idx
     s.flush_idx_M1 = m = RegEnRst(p.bitwidth_index)
     m.in_ //= s.ctrl.tag_array_init_idx_M0
@@ -162,8 +303,25 @@ class BlockingCacheDpathRTL( Component ):
 
     # Send the dty bits to the M1 stage and use for wben mask into data array
     s.dty_bits_mask_M1 = m = RegEnRst(p.bitwidth_dirty)
-    m.in_ //= s.MSHR_dealloc_out.dirty_bits # From M0 stage
     m.en  //= s.ctrl.reg_en_M1
+    if p.sectors > 1:
+      # A refill only writes the words of its sector, the words of the
+      # other sectors are masked like the dirty ones
+      words_per_sector = p.bitwidth_sector // 32
+      s.refill_mask_M0 = Wire(p.bitwidth_dirty)
+
+      @update
+      def refill_mask_logic_M0():
+        s.refill_mask_M0 @= s.MSHR_dealloc_out.dirty_bits
+        if s.ctrl.wdata_mux_sel_M0:
+          for i in range(p.bitwidth_dirty):
+            if ( s.MSHR_dealloc_out.addr[p.bitwidth_sector_offset : p.bitwidth_offset] !=
+                 i // words_per_sector ):
+              s.refill_mask_M0[i] @= 1
+
+      m.in_ //= s.refill_mask_M0
+    else:
+      m.in_ //= s.MSHR_dealloc_out.dirty_bits # From M0 stage
 
     # Foward the M1 addr and len to M0
     @update
@@ -178,20 +336,136 @@ class BlockingCacheDpathRTL( Component ):
     m.wdata //= s.ctrl.ctrl_bit_rep_wr_M0
     m.wen   //= s.ctrl.ctrl_bit_rep_en_M1
 
+    # Dirty bit of the word written by the write hit in M1, for the
+    # options that set it from M1
+    if p.dirty_bits_reg or p.tag_1r1w:
+      s.dirty_word_M1 = Wire(p.bitwidth_dirty)
+
+      @update
+      def dirty_word_logic_M1():
+        s.dirty_word_M1 @= 0
+        s.dirty_word_M1[ s.cachereq_M1.out.addr.offset[2:p.bitwidth_offset] ] @= 1
+        # Double word CIFER hack, see UpdateTagArrayUnit
+        if s.cachereq_M1.out.len == 3:
+          s.dirty_word_M1[ s.cachereq_M1.out.addr.offset[2:p.bitwidth_offset] + 1 ] @= 1
+
     # Tag arrays instantiations
-    s.tag_arrays_M1 = [ SramPRTL( p.bitwidth_tag_array, p.nblocks_per_way )
-                        for _ in range(p.associativity) ]
-    for i, m in enumerate(s.tag_arrays_M1):
-      m.port0_val   //= s.ctrl.tag_array_val_M0[i]
-      m.port0_type  //= s.ctrl.tag_array_type_M0
-      m.port0_idx   //= s.tag_array_idx_mux_M0.out
-      m.port0_wdata //= s.tag_array_wdata_M0
-      m.port0_wben  //= s.ctrl.tag_array_wben_M0
+    dty_lo  = p.bitwidth_tag
+    sec_lo  = p.bitwidth_tag + p.bitwidth_dirty
+    val_bit = sec_lo + p.bitwidth_sec
+    if p.tag_1r1w:
+      # Lookups use the read port and all the writes the write port. The
+      # M0 writes take it when the M0 transaction writes the tags, and the
+      # write hit in M1 sets its dirty bits through it otherwise (the ctrl
+      # only sets dirty_wr_M1 when M0 does not write).
+      BitsTagArray = mk_bits(p.bitwidth_tag_array)
+      s.tag_arrays_M1 = [ Sram1R1WPRTL( p.bitwidth_tag_array, p.nblocks_per_way,
+                                        p.behavioral_sram )
+                          for _ in range(p.associativity) ]
+
+      s.tag_array_widx_mux_M1 = m = Mux(p.bitwidth_index, 2)
+      m.in_[0] //= s.tag_array_idx_mux_M0.out
+      m.in_[1] //= s.cachereq_M1.out.addr.index
+      m.sel    //= s.ctrl.dirty_wr_M1
+
+      s.tag_array_wdata_mux_M1 = m = Mux(p.bitwidth_tag_array, 2)
+      m.in_[0] //= s.tag_array_wdata_M0
+      m.in_[1] //= BitsTagArray(-1)
+      m.sel    //= s.ctrl.dirty_wr_M1
+
+      s.tag_array_wben_mux_M1 = m = Mux(p.bitwidth_tag_array, 2)
+      m.in_[0] //= s.ctrl.tag_array_wben_M0
+      if p.sectors > 1:
+        m.in_[1] //= lambda: concat( p.BitsVal(0), p.BitsSec(0), s.dirty_word_M1, p.BitsTag(0) )
+      else:
+        m.in_[1] //= lambda: concat( p.BitsVal(0), s.dirty_word_M1, p.BitsTag(0) )
+      m.sel    //= s.ctrl.dirty_wr_M1
+
+      for i, m in enumerate(s.tag_arrays_M1):
+        m.port0_val   //= lambda: s.ctrl.tag_array_val_M0[i] & ~s.ctrl.tag_array_type_M0
+        m.port0_idx   //= s.tag_array_idx_mux_M0.out
+        m.port1_val   //= lambda: ( ( s.ctrl.tag_array_val_M0[i] & s.ctrl.tag_array_type_M0 ) |
+                                    ( s.ctrl.dirty_wr_M1 & ( s.tag_array_PU.hit_way == i ) ) )
+        m.port1_idx   //= s.tag_array_widx_mux_M1.out
+        m.port1_wdata //= s.tag_array_wdata_mux_M1.out
+        m.port1_wben  //= s.tag_array_wben_mux_M1.out
+
+      # A lookup of the set written by the write hit in the same cycle reads
+      # the old dirty bits, so we keep the bits that were set to add them
+      # to the read data. Like the read data they only change on a read.
+      s.tag_array_dty_bypass_M1 = [ RegEnRst(p.bitwidth_dirty) for _ in range(p.associativity) ]
+      for i, m in enumerate(s.tag_array_dty_bypass_M1):
+        m.en //= lambda: s.ctrl.tag_array_val_M0[i] & ~s.ctrl.tag_array_type_M0
+
+      @update
+      def tag_array_dty_bypass_logic_M1():
+        for i in range(p.associativity):
+          s.tag_array_dty_bypass_M1[i].in_ @= 0
+          if ( s.ctrl.dirty_wr_M1 & ( s.tag_array_PU.hit_way == i ) &
+               ( s.cachereq_M1.out.addr.index == s.tag_array_idx_mux_M0.out ) ):
+            s.tag_array_dty_bypass_M1[i].in_ @= s.dirty_word_M1
+    else:
+      s.tag_arrays_M1 = [ SramPRTL( p.bitwidth_tag_array, p.nblocks_per_way,
+                                    p.behavioral_sram )
+                          for _ in range(p.associativity) ]
+      for i, m in enumerate(s.tag_arrays_M1):
+        m.port0_val   //= s.ctrl.tag_array_val_M0[i]
+        m.port0_type  //= s.ctrl.tag_array_type_M0
+        m.port0_idx   //= s.tag_array_idx_mux_M0.out
+        m.port0_wdata //= s.tag_array_wdata_M0
+        m.port0_wben  //= s.ctrl.tag_array_wben_M0
 
     # Saves output of the SRAM during stall
     s.tag_array_rdata_M1 = [ StallEngine(p.StructTagArray) for _ in range(p.associativity) ]
+    s.tag_array_val_M1 = [ Wire(p.bitwidth_val)   for _ in range(p.associativity) ]
+    s.tag_array_dty_M1 = [ Wire(p.bitwidth_dirty) for _ in range(p.associativity) ]
+    if p.flash_inv:
+      # The valid bits are kept in flip-flops so that INV can clear all of
+      # them at once. The valid bit read from the tag SRAM is not used.
+      s.valid_bits_M1 = [ ValidBitsReg(p) for _ in range(p.associativity) ]
+      for i, m in enumerate(s.valid_bits_M1):
+        m.port0_val   //= s.ctrl.tag_array_val_M0[i]
+        m.port0_type  //= s.ctrl.tag_array_type_M0
+        m.port0_idx   //= s.tag_array_idx_mux_M0.out
+        m.port0_wdata //= s.tag_array_struct_M0.val
+        m.port0_wben  //= s.ctrl.tag_array_wben_M0[val_bit]
+        m.clear       //= s.ctrl.valid_clear_M0
+        m.port0_rdata //= s.tag_array_val_M1[i]
+    else:
+      for i in range(p.associativity):
+        s.tag_array_val_M1[i] //= s.tag_arrays_M1[i].port0_rdata[val_bit:p.bitwidth_tag_array]
+
+    if p.dirty_bits_reg:
+      # The dirty bits are kept in flip-flops so that a write hit sets them
+      # from M1. The dirty bits read from the tag SRAM are not used.
+      s.dirty_bits_M1 = [ DirtyBitsReg(p) for _ in range(p.associativity) ]
+      for i, m in enumerate(s.dirty_bits_M1):
+        m.port0_val   //= s.ctrl.tag_array_val_M0[i]
+        m.port0_type  //= s.ctrl.tag_array_type_M0
+        m.port0_idx   //= s.tag_array_idx_mux_M0.out
+        m.port0_wdata //= s.tag_array_struct_M0.dty
+        m.port0_wben  //= s.ctrl.tag_array_wben_M0[dty_lo:sec_lo]
+        m.port1_val   //= lambda: s.ctrl.dirty_wr_M1 & ( s.tag_array_PU.hit_way == i )
+        m.port1_idx   //= s.cachereq_M1.out.addr.index
+        m.port1_wdata //= s.dirty_word_M1
+        m.port0_rdata //= s.tag_array_dty_M1[i]
+    elif p.tag_1r1w:
+      for i in range(p.associativity):
+        s.tag_array_dty_M1[i] //= lambda: ( s.tag_arrays_M1[i].port0_rdata[dty_lo:sec_lo] |
+                                            s.tag_array_dty_bypass_M1[i].out )
+    else:
+      for i in range(p.associativity):
+        s.tag_array_dty_M1[i] //= s.tag_arrays_M1[i].port0_rdata[dty_lo:sec_lo]
+
     for i, m in enumerate(s.tag_array_rdata_M1):
-      m.in_ //= lambda: s.tag_arrays_M1[i].port0_rdata
+      if p.sectors > 1:
+        m.in_ //= lambda: concat( s.tag_array_val_M1[i],
+                                  s.tag_arrays_M1[i].port0_rdata[sec_lo:val_bit],
+                                  s.tag_array_dty_M1[i],
+                                  s.tag_arrays_M1[i].port0_rdata[0:dty_lo] )
+      else:
+        m.in_ //= lambda: concat( s.tag_array_val_M1[i], s.tag_array_dty_M1[i],
+                                  s.tag_arrays_M1[i].port0_rdata[0:dty_lo] )
       m.en  //= s.ctrl.stall_reg_en_M1
 
     # An one-entry MSHR for holding the cache request during a miss
@@ -207,17 +481,62 @@ class BlockingCacheDpathRTL( Component ):
     s.MSHR_alloc_in.amo_hit //= s.MSHR_alloc_in_amo_hit_bypass.hit
     s.write_mask_M1 = Wire(p.bitwidth_dirty)
     s.MSHR_alloc_in.dirty_bits //= lambda: (s.write_mask_M1 & s.ctrl.dirty_evict_mask_M1)
-
-    # s.MSHR_alloc_id = Wire( p.BitsOpaque )
-    s.mshr = m = MSHR(p, 1)
-    m.alloc_en    //= s.ctrl.MSHR_alloc_en
-    m.alloc_in    //= s.MSHR_alloc_in
-    # m.alloc_id    //= s.MSHR_alloc_id # don't need for now; only required for nonblocking cache
-    m.full        //= s.status.MSHR_full
-    m.empty       //= s.status.MSHR_empty
-    m.dealloc_id  //= s.pipeline_reg_M0.out.opaque
-    m.dealloc_en  //= s.ctrl.MSHR_dealloc_en
-    m.dealloc_out //= s.MSHR_dealloc_out
+    if p.sectors > 1:
+      # A miss on another sector of a valid line keeps its valid sectors
+      @update
+      def MSHR_alloc_in_sec_bits_M1():
+        s.MSHR_alloc_in.sec_bits @= 0
+        if s.status.inval_hit_M1 & s.tag_array_PU.tag_entires[s.ctrl.way_offset_M1].val:
+          s.MSHR_alloc_in.sec_bits @= s.tag_array_PU.tag_entires[s.ctrl.way_offset_M1].sec
+
+    s.MSHR_alloc_id = Wire( p.BitsOpaque )
+    s.mshr = m = MSHR(p, p.num_mshr_entries, p.mshr_merge)
+    m.alloc_en      //= s.ctrl.MSHR_alloc_en
+    m.alloc_in      //= s.MSHR_alloc_in
+    m.alloc_park    //= s.ctrl.MSHR_park_M1
+    m.alloc_id      //= s.MSHR_alloc_id
+    m.full          //= s.status.MSHR_full
+    m.empty         //= s.status.MSHR_empty
+    m.dealloc_en    //= s.ctrl.MSHR_dealloc_en
+    m.dealloc_out   //= s.MSHR_dealloc_out
+    m.conflict_idx  //= s.cachereq_M1.out.addr.index
+    m.conflict_park //= s.ctrl.MSHR_conflict_park_M1
+    m.conflict      //= s.status.MSHR_conflict_M1
+    m.park_val      //= s.status.MSHR_park_val
+    m.park_ready    //= s.status.MSHR_park_ready
+    m.park_block    //= s.status.MSHR_park_block
+    m.primary_empty //= s.status.MSHR_primary_empty
+
+    if p.num_mshr_entries == 1:
+      m.dealloc_id //= s.pipeline_reg_M0.out.opaque
+    else:
+      # The memreq opaque carries the MSHR entry id, so we keep the id of
+      # the last refill around until its replay deallocates the entry. The
+      # id falls back to 0 afterwards, which is where requests allocated
+      # into an idle MSHR (AMO, INV, FLUSH) always land.
+      s.MSHR_refill_id_M0 = RegRst(p.bitwidth_opaque)
+
+      @update
+      def up_MSHR_refill_id_M0():
+        s.MSHR_refill_id_M0.in_ @= s.MSHR_refill_id_M0.out
+        if s.ctrl.memresp_reg_en_M0 & (s.memresp_Y.type_ != WRITE):
+          s.MSHR_refill_id_M0.in_ @= s.memresp_Y.opaque
+        elif s.ctrl.MSHR_dealloc_en:
+          s.MSHR_refill_id_M0.in_ @= 0
+
+      # Parked requests are replayed by their own entry id
+      s.MSHR_dealloc_id_mux_M0 = m = Mux(p.bitwidth_opaque, 2)
+      m.in_[0] //= s.MSHR_refill_id_M0.out
+      m.in_[1] //= s.mshr.park_id
+      m.sel    //= s.ctrl.MSHR_dealloc_park_M0
+      m.out    //= s.mshr.dealloc_id
+
+    if p.uncached_ranges:
+      s.uncached_check_M1 = m = AddrRangeCheck(p, p.uncached_ranges)
+      m.addr //= s.cachereq_addr_M1_forward
+      m.out  //= s.status.uncached_M1
+    else:
+      s.status.uncached_M1 //= 0
 
     # Combined comparator set for both dirty line detection and hit detection
     # It has an enable to so it doesn't always look at the output of the sram
@@ -233,14 +552,35 @@ class BlockingCacheDpathRTL( Component ):
     m.word_dirty //= s.status.ctrl_bit_dty_rd_word_M1
     m.en         //= s.ctrl.tag_processing_en_M1
 
-    # Send the output of tag array sram into the processing unit
+    # Send the output of tag array sram into the processing unit. With way
+    # prediction only the predicted way may have been read, so the others
+    # are masked off and look like invalid clean lines.
+    if p.way_pred:
+      s.tag_array_masked_M1 = [ Wire(p.StructTagArray) for _ in range(p.associativity) ]
+
+      @update
+      def tag_array_way_mask_M1():
+        for i in range(p.associativity):
+          s.tag_array_masked_M1[i] @= p.StructTagArray()
+          if s.ctrl.tag_way_mask_M1[i]:
+            s.tag_array_masked_M1[i] @= s.tag_array_rdata_M1[i].out
+
+      for i in range(p.associativity):
+        m.tag_array[i] //= s.tag_array_masked_M1[i]
+    else:
+      for i in range(p.associativity):
+        m.tag_array[i] //= s.tag_array_rdata_M1[i].out
+
+    # Bypass the current tag-array entries to M0
     for i in range(p.associativity):
-      m.tag_array[i] //= s.tag_array_rdata_M1[i].out
-
-      # Bypass the current tag-array entries to M0
       s.tag_entries_M1_bypass[i] //= m.tag_entires[i]
 
     s.hit_way_M1_bypass //= s.tag_array_PU.hit_way
+
+    @update
+    def line_valid_M1():
+      for i in range(p.associativity):
+        s.status.ctrl_bit_val_rd_line_M1[i] @= s.tag_array_PU.tag_entires[i].val
     s.write_mask_M1 //= lambda: s.tag_array_PU.tag_entires[s.ctrl.way_offset_M1].dty
 
     # stall engine to save the hit bit into the MSHR for AMO operations only
@@ -277,7 +617,6 @@ class BlockingCacheDpathRTL( Component ):
 
     # Data array inputs
     s.data_array_wdata_M1 = Wire(p.bitwidth_cacheline)
-    s.data_array_wdata_M1 //= s.cachereq_M1.out.data
 
     s.index_offset_M1 = m = Indexer( p )
     m.index  //= s.cachereq_M1_2.addr.index
@@ -294,6 +633,13 @@ class BlockingCacheDpathRTL( Component ):
     s.cachereq_M1_2.type_  //= s.cachereq_M1.out.type_
     s.cachereq_M1_2.opaque //= s.cachereq_M1.out.opaque
 
+    # Line reserved by the last LR. The valid bit is kept in ctrl.
+    s.reservation_M1 = m = RegEn(p.bitwidth_tag + p.bitwidth_index)
+    m.in_ //= lambda: concat( s.cachereq_M1.out.addr.tag, s.cachereq_M1.out.addr.index )
+    m.en  //= s.ctrl.reserve_M1
+    s.status.reservation_match_M1 //= lambda: ( s.reservation_M1.out ==
+      concat( s.cachereq_M1.out.addr.tag, s.cachereq_M1.out.addr.index ) )
+
     # Send the M1 status signals to control
     s.status.ctrl_bit_rep_rd_M1 //= s.replacement_bits_M1.rdata
     s.status.cachereq_type_M1   //= s.cachereq_M1.out.type_
@@ -314,7 +660,19 @@ class BlockingCacheDpathRTL( Component ):
     m.in_ //= s.write_mask_M1
     m.en  //= s.ctrl.reg_en_M2
 
-    s.data_array_M2 = m = SramPRTL(p.bitwidth_cacheline, p.total_num_cachelines)
+    # The MSHR entry id of a miss is sent as the memreq opaque
+    s.MSHR_alloc_id_M2 = m = RegEnRst(p.bitwidth_opaque)
+    m.in_ //= s.MSHR_alloc_id
+    m.en  //= s.ctrl.reg_en_M2
+
+    # The way offset is a multiple of nblocks_per_way, so the low bits of
+    # the data array index are the ones of the set index and pick the bank
+    if p.data_banks > 1:
+      s.data_array_M2 = m = BankedSramPRTL(p.bitwidth_cacheline, p.total_num_cachelines,
+                                           p.data_banks, 1, p.behavioral_sram)
+    else:
+      s.data_array_M2 = m = SramPRTL(p.bitwidth_cacheline, p.total_num_cachelines,
+                                     p.behavioral_sram)
     m.port0_val   //= s.ctrl.data_array_val_M1
     m.port0_type  //= s.ctrl.data_array_type_M1
     m.port0_idx   //= s.index_offset_M1.out
@@ -336,7 +694,12 @@ class BlockingCacheDpathRTL( Component ):
     m.en     //= s.ctrl.data_size_mux_en_M2
     m.amo    //= s.ctrl.is_amo_M2
     m.len_   //= s.cachereq_M2.out.len
-    m.offset //= s.cachereq_M2.out.addr.offset
+
+    # The memresp of an uncached read holds the data at the bottom
+    if p.uncached_ranges:
+      m.offset //= lambda: 0 if s.ctrl.uncached_resp_M2 else s.cachereq_M2.out.addr.offset
+    else:
+      m.offset //= s.cachereq_M2.out.addr.offset
 
     # selects the appropriate offset and len for memreq based on the type
     s.mem_req_off_len_M2 = m = OffsetLenSelector(p)
@@ -344,6 +707,37 @@ class BlockingCacheDpathRTL( Component ):
     m.offset_i //= s.cachereq_M2.out.addr.offset
     m.is_amo   //= s.ctrl.is_amo_M2
 
+    # AMOs that hit are done on the line read in M1. The AMO_WRITE behind it
+    # in M1 writes the result and the AMO responds with the old word.
+    s.cacheresp_data_M2 = Wire(p.bitwidth_data)
+    if p.amo_in_cache:
+      s.amo_alu_M2 = m = AmoAlu(p)
+      m.type_  //= s.cachereq_M2.out.type_
+      m.line   //= s.stall_engine_M2.out
+      m.offset //= s.cachereq_M2.out.addr.offset
+      m.in_    //= s.cachereq_M2.out.data[0:32]
+
+      s.amo_wdata_mux_M1 = m = Mux(p.bitwidth_cacheline, 2)
+      m.in_[0] //= s.cachereq_M1.out.data
+      m.in_[1] //= s.amo_alu_M2.out
+      m.sel    //= s.ctrl.amo_write_M1
+      m.out    //= s.data_array_wdata_M1
+
+      s.amo_resp_mux_M2 = m = Mux(p.bitwidth_data, 2)
+      m.in_[0] //= s.data_size_mux_M2.out
+      m.in_[1] //= s.amo_alu_M2.old
+      m.sel    //= s.ctrl.amo_hit_M2
+      m.out    //= s.cacheresp_data_M2
+    else:
+      s.data_array_wdata_M1 //= s.cachereq_M1.out.data
+      s.cacheresp_data_M2   //= s.data_size_mux_M2.out
+
+    # An SC without a reservation responds with 1
+    s.sc_resp_mux_M2 = m = Mux(p.bitwidth_data, 2)
+    m.in_[0] //= s.cacheresp_data_M2
+    m.in_[1] //= 1
+    m.sel    //= s.ctrl.sc_fail_M2
+
     # Send the M2 status signals to control
     s.status.cachereq_type_M2 //= s.cachereq_M2.out.type_
 
@@ -352,7 +746,71 @@ class BlockingCacheDpathRTL( Component ):
     s.memreq_addr_out = Wire(p.StructAddr)
     s.memreq_addr_out.tag    //= s.cachereq_M2.out.addr.tag
     s.memreq_addr_out.index  //= s.cachereq_M2.out.addr.index
-    s.memreq_addr_out.offset //= s.mem_req_off_len_M2.offset_o
+
+    # Write throughs of whole words go out as line writes with the words in
+    # the write mask. Subword ones write their bytes at their address, as
+    # do uncached reads.
+    s.wt_nbytes_M2  = Wire(p.bitwidth_offset + 1)
+    s.wt_words_M2   = Wire(p.bitwidth_dirty)
+    s.wt_subword_M2 = Wire()
+    if p.write_through or p.uncached_ranges:
+      double_len = 3 if p.bitwidth_data == 32 else 0 # len 3 zero-extends to 64 bits
+      s.wt_last_M2    = Wire(p.bitwidth_offset)
+
+      @update
+      def wt_words_logic_M2():
+        if s.cachereq_M2.out.len == 0:
+          s.wt_nbytes_M2 @= p.bitwidth_data // 8
+        elif s.cachereq_M2.out.len == double_len:
+          s.wt_nbytes_M2 @= 8
+        else:
+          s.wt_nbytes_M2 @= zext( s.cachereq_M2.out.len, p.bitwidth_offset + 1 )
+        s.wt_subword_M2 @= s.ctrl.memreq_wt_M2 & ( s.wt_nbytes_M2 < 4 )
+        s.wt_last_M2 @= s.cachereq_M2.out.addr.offset + trunc( s.wt_nbytes_M2 - 1, p.bitwidth_offset )
+        for i in range( p.bitwidth_dirty ):
+          s.wt_words_M2[i] @= ( ( s.cachereq_M2.out.addr.offset >> 2 ) <= i ) & \
+                              ( i <= ( s.wt_last_M2 >> 2 ) )
+    else:
+      s.wt_nbytes_M2  //= 0
+      s.wt_words_M2   //= 0
+      s.wt_subword_M2 //= 0
+
+    # Refills with critical word first ask for the requested word first and
+    # go out without a mask, so that a line that comes back whole is not
+    # taken for a beat
+    s.cwf_M2 = Wire()
+    s.cwf_M2 //= b1(p.critical_word_first)
+
+    # Refills of sectored lines only ask for the sector of the miss. The
+    # len wraps to 0 (whole line) without sectors.
+    s.sectored_M2 = Wire()
+    s.sectored_M2 //= b1(p.sectors > 1)
+    line_nbytes = p.bitwidth_cacheline // 8
+    sector_len  = p.BitsMemLen( p.bitwidth_sector // 8 % line_nbytes )
+    sector_base = p.BitsOffset( ~( p.bitwidth_sector // 8 - 1 ) & ( line_nbytes - 1 ) )
+
+    @update
+    def memreq_offset_len_M2():
+      s.memreq_addr_out.offset @= s.mem_req_off_len_M2.offset_o
+      s.memreq_M2.len          @= s.mem_req_off_len_M2.len_o
+      s.memreq_M2.wr_mask      @= s.write_mask_M2.out
+      if s.ctrl.memreq_uncached_M2:
+        s.memreq_addr_out.offset @= s.cachereq_M2.out.addr.offset
+        s.memreq_M2.len          @= trunc( s.wt_nbytes_M2, p.bitwidth_mem_len )
+        s.memreq_M2.wr_mask      @= 0
+      elif s.cwf_M2 & ( s.ctrl.memreq_type == READ ):
+        s.memreq_addr_out.offset @= s.cachereq_M2.out.addr.offset
+        s.memreq_M2.wr_mask      @= 0
+      elif s.sectored_M2 & ( s.ctrl.memreq_type == READ ):
+        s.memreq_addr_out.offset @= s.cachereq_M2.out.addr.offset & sector_base
+        s.memreq_M2.len          @= sector_len
+        s.memreq_M2.wr_mask      @= 0
+      elif s.wt_subword_M2:
+        s.memreq_addr_out.offset @= s.cachereq_M2.out.addr.offset
+        s.memreq_M2.len          @= trunc( s.wt_nbytes_M2, p.bitwidth_mem_len )
+        s.memreq_M2.wr_mask      @= 0
+      elif s.ctrl.memreq_wt_M2:
+        s.memreq_M2.wr_mask      @= s.wt_words_M2
 
     s.memreq_addr_bits = Wire(p.bitwidth_addr)
     @update
@@ -360,18 +818,125 @@ class BlockingCacheDpathRTL( Component ):
       s.memreq_addr_bits @= s.memreq_addr_out
 
     s.memreq_M2.type_   //= s.ctrl.memreq_type
-    s.memreq_M2.opaque  //= s.cachereq_M2.out.opaque
+    s.memreq_M2.opaque  //= s.MSHR_alloc_id_M2.out
     s.memreq_M2.addr    //= s.memreq_addr_bits
-    s.memreq_M2.len     //= s.mem_req_off_len_M2.len_o
-    s.memreq_M2.wr_mask //= s.write_mask_M2.out
     s.memreq_M2.data    //= s.read_data_mux_M2.out
 
     # Construct the cacheresp signal
-    s.cacheresp_M2.type_  //= s.cachereq_M2.out.type_
-    s.cacheresp_M2.opaque //= s.cachereq_M2.out.opaque
-    s.cacheresp_M2.test   //= s.ctrl.hit_M2
-    s.cacheresp_M2.len    //= s.cachereq_M2.out.len
-    s.cacheresp_M2.data   //= s.data_size_mux_M2.out
+    s.cacheresp_msg_M2 = Wire(p.CacheRespType)
+    s.cacheresp_msg_M2.type_  //= s.cachereq_M2.out.type_
+    s.cacheresp_msg_M2.opaque //= s.cachereq_M2.out.opaque
+    s.cacheresp_msg_M2.test   //= s.ctrl.hit_M2
+    s.cacheresp_msg_M2.len    //= s.cachereq_M2.out.len
+    s.cacheresp_msg_M2.data   //= s.sc_resp_mux_M2.out
+
+    # Line buffer for early read hits. It holds the last line read from the
+    # data array by a read hit or a read miss replay. A read hit to the
+    # buffered line responds straight from M1 through its own data size
+    # mux. The valid bit is kept in ctrl.
+    if p.early_read_hit:
+      s.line_buf_data_M2 = m = RegEn(p.bitwidth_cacheline)
+      m.in_ //= s.stall_engine_M2.out
+      m.en  //= s.ctrl.line_buf_fill_M2
+
+      s.line_buf_addr_M2 = m = RegEn(p.StructAddr)
+      m.in_ //= s.cachereq_M2.out.addr
+      m.en  //= s.ctrl.line_buf_fill_M2
+
+      if p.sectors > 1:
+        # Only the sector of the buffered read is known to be valid
+        sec_off = p.bitwidth_sector_offset
+        s.status.line_buf_match_M1 //= lambda: (
+          (s.line_buf_addr_M2.out.tag   == s.cachereq_M1.out.addr.tag) &
+          (s.line_buf_addr_M2.out.index == s.cachereq_M1.out.addr.index) &
+          (s.line_buf_addr_M2.out.offset[sec_off:p.bitwidth_offset] ==
+           s.cachereq_M1.out.addr.offset[sec_off:p.bitwidth_offset]) )
+      else:
+        s.status.line_buf_match_M1 //= lambda: (
+          (s.line_buf_addr_M2.out.tag   == s.cachereq_M1.out.addr.tag) &
+          (s.line_buf_addr_M2.out.index == s.cachereq_M1.out.addr.index) )
+      # Any data array write to the set of the buffered line invalidates it
+      s.status.line_buf_set_match_M1 //= lambda: (
+        s.line_buf_addr_M2.out.index == s.cachereq_M1_2.addr.index )
+
+      s.data_size_mux_M1 = m = FastDataSelectMux(p)
+      m.in_    //= s.line_buf_data_M2.out
+      m.en     //= 1
+      m.amo    //= 0
+      m.len_   //= s.cachereq_M1.out.len
+      m.offset //= s.cachereq_M1.out.addr.offset
+
+      s.cacheresp_msg_M1 = Wire(p.CacheRespType)
+      s.cacheresp_msg_M1.type_  //= s.cachereq_M1.out.type_
+      s.cacheresp_msg_M1.opaque //= s.cachereq_M1.out.opaque
+      s.cacheresp_msg_M1.test   //= 1
+      s.cacheresp_msg_M1.len    //= s.cachereq_M1.out.len
+      s.cacheresp_msg_M1.data   //= s.data_size_mux_M1.out
+
+      s.cacheresp_mux_M2 = m = Mux(p.CacheRespType, 2)
+      m.in_[0] //= s.cacheresp_msg_M2
+      m.in_[1] //= s.cacheresp_msg_M1
+      m.sel    //= s.ctrl.early_resp_M1
+    else:
+      s.status.line_buf_match_M1     //= 0
+      s.status.line_buf_set_match_M1 //= 0
+
+    # Early restart: a read miss is answered from the beat that holds its
+    # data. The response waits in cwf_resp_Y until the pipeline leaves the
+    # response port free; ctrl then drops the response of its replay.
+    if p.critical_word_first:
+      s.cwf_offset_Y    = Wire(p.BitsOffset)
+      s.cwf_last_byte_Y = Wire(p.BitsOffset)
+      s.cwf_req_words_Y = Wire(p.bitwidth_dirty)
+      s.cwf_offset_Y //= s.MSHR_dealloc_out.addr[0:p.bitwidth_offset]
+
+      @update
+      def cwf_req_words_logic_Y():
+        if s.MSHR_dealloc_out.len == 0:
+          s.cwf_last_byte_Y @= s.cwf_offset_Y + (p.bitwidth_data // 8 - 1)
+        else:
+          s.cwf_last_byte_Y @= s.cwf_offset_Y + zext(s.MSHR_dealloc_out.len, p.bitwidth_offset) - 1
+        for i in range( p.bitwidth_dirty ):
+          s.cwf_req_words_Y[i] @= ( ( s.cwf_offset_Y >> 2 ) <= i ) & \
+                                  ( i <= ( s.cwf_last_byte_Y >> 2 ) )
+
+      # The beat has to hold every word of the request, and none of them
+      # may be dirty in the cache (a miss to a line left dirty by INV keeps
+      # its dirty words over the refill)
+      s.status.cwf_word_hit_Y //= lambda: ( s.cwf_req_words_Y &
+        ( ~s.memresp_Y.wr_mask | s.MSHR_dealloc_out.dirty_bits ) ) == 0
+
+      s.data_size_mux_Y = m = FastDataSelectMux(p)
+      m.in_    //= s.memresp_Y.data
+      m.en     //= 1
+      m.amo    //= 0
+      m.len_   //= s.MSHR_dealloc_out.len
+      m.offset //= s.cwf_offset_Y
+
+      s.cwf_resp_msg_Y = Wire(p.CacheRespType)
+      s.cwf_resp_msg_Y.type_  //= s.MSHR_dealloc_out.type_
+      s.cwf_resp_msg_Y.opaque //= s.MSHR_dealloc_out.opaque
+      s.cwf_resp_msg_Y.test   //= 0
+      s.cwf_resp_msg_Y.len    //= s.MSHR_dealloc_out.len
+      s.cwf_resp_msg_Y.data   //= s.data_size_mux_Y.out
+
+      s.cwf_resp_Y = m = RegEn(p.CacheRespType)
+      m.in_ //= s.cwf_resp_msg_Y
+      m.en  //= s.ctrl.cwf_resp_en_Y
+
+      s.cwf_resp_mux = m = Mux(p.CacheRespType, 2)
+      m.in_[1] //= s.cwf_resp_Y.out
+      m.sel    //= s.ctrl.cwf_resp_send
+      m.out    //= s.cacheresp_M2
+      cacheresp_out = s.cwf_resp_mux.in_[0]
+    else:
+      s.status.cwf_word_hit_Y //= 0
+      cacheresp_out = s.cacheresp_M2
+
+    if p.early_read_hit:
+      cacheresp_out //= s.cacheresp_mux_M2.out
+    else:
+      cacheresp_out //= s.cacheresp_msg_M2
 
   def line_trace( s ):
     msg = ""
@@ -36,6 +36,8 @@ def req( CacheReqType, type_, opaque, addr, len, data ):
   elif type_ == 'mx': type_ = MemMsgType.AMO_MAX
   elif type_ == 'xu': type_ = MemMsgType.AMO_MAXU
   elif type_ == 'xo': type_ = MemMsgType.AMO_XOR
+  elif type_ == 'lr': type_ = MemMsgType.LR
+  elif type_ == 'sc': type_ = MemMsgType.SC
   elif type_ == 'inv': type_ = MemMsgType.INV
   elif type_ == 'fl':  type_ = MemMsgType.FLUSH
   return CacheReqType( type_, opaque, addr, len, data )
@@ -53,6 +55,8 @@ def resp( CacheRespType, type_, opaque, test, len, data ):
   elif type_ == 'mx': type_ = MemMsgType.AMO_MAX
   elif type_ == 'xu': type_ = MemMsgType.AMO_MAXU
   elif type_ == 'xo': type_ = MemMsgType.AMO_XOR
+  elif type_ == 'lr': type_ = MemMsgType.LR
+  elif type_ == 'sc': type_ = MemMsgType.SC
   elif type_ == 'inv': type_ = MemMsgType.INV
   elif type_ == 'fl':  type_ = MemMsgType.FLUSH
   return CacheRespType( type_, opaque, test, len, data )
@@ -82,9 +86,15 @@ AMO_FUNS = { MemMsgType.AMO_ADD  : lambda m,a : m+a,
 # in an FL model
 
 class HitMissTracker:
-  def __init__(self, size, nways, nbanks, linesize):
+  def __init__(self, size, nways, nbanks, linesize, policy='lru', victim_entries=0,
+               write_through=False, uncached_ranges=(), amo_in_cache=False,
+               data_banks=1, sectors=1):
     # Compute various sizes
     self.nways = nways
+    self.policy = policy
+    self.write_through = write_through
+    self.amo_in_cache = amo_in_cache
+    self.uncached_ranges = uncached_ranges
     self.linesize = linesize
     self.nlines = int(size // linesize)
     self.nsets = int(self.nlines // self.nways)
@@ -103,14 +113,30 @@ class HitMissTracker:
     self.tag_start = self.idx_end
     self.tag_end = 32
 
+    # The data array banks of the RTL are interleaved on the low bits of
+    # the index, so they do not change the sets. bank_accesses counts the
+    # requests that read or write the lines of each bank.
+    self.data_banks = data_banks
+    self.bank_accesses = [0 for n in range(data_banks)]
+
+    # Lines split into sectors keep a valid bit per sector, as a mask in
+    # sec[idx][way]. A line only hits if the sector of the offset is valid
+    # and a miss on another sector refills it into the same way.
+    self.sectors = sectors
+    self.sector_bytes = linesize // 8 // sectors
+
     # Initialize the tag and valid array
     # Both arrays are of the form line[idx][way]
     # Note that line[idx] is a one-element array for a direct-mapped cache
     self.line = []
     self.valid = []
+    self.dirty = []
+    self.sec = []
     for n in range(self.nlines):
       self.line.insert(n, [Bits(32, 0) for x in range(nways)])
       self.valid.insert(n, [False for x in range(nways)])
+      self.dirty.insert(n, [False for x in range(nways)])
+      self.sec.insert(n, [0 for x in range(nways)])
 
     # Initialize the LRU array
     # Implemented as an array for each set index
@@ -120,6 +146,19 @@ class HitMissTracker:
     for n in range(self.nsets):
       self.lru.insert(n, [x for x in range(nways)])
 
+    # Tree pseudo-LRU bits, one int per set index. Bit k is node k of the
+    # tree (children 2k+1 and 2k+2) and points to the half with the victim
+    # (0 = lower ways, 1 = upper ways), same as the RTL
+    self.plru = [0 for n in range(self.nsets)]
+
+    # Victim buffer entries, each holding the (tag, idx) of a replaced
+    # line or None. Lines are captured into the first free entry, or the
+    # one at victim_ptr (round robin) when it is full, same as the RTL.
+    # victim_hit tells whether the last miss was refilled from the buffer
+    self.victims = [None for n in range(victim_entries)]
+    self.victim_ptr = 0
+    self.victim_hit = False
+
   # Generate the components of an address
   # Ignores the bank bits, since they don't affect the behavior
   # (and may not even exist)
@@ -130,72 +169,224 @@ class HitMissTracker:
     tag = addr[self.tag_start:self.tag_end]
     return (tag, idx, offset)
 
+  # Valid bit of the sector holding a line offset
+  def sector_bit(self, offset):
+    return 1 << (int(offset) // self.sector_bytes)
+
+  # Data array bank holding the lines of a set index
+  def data_bank(self, idx):
+    return int(idx) % self.data_banks
+
+  # Nodes on the tree pseudo-LRU path to a way, and the bit that points
+  # towards the way at each node
+  def plru_path(self, way):
+    path = []
+    node, lo, hi = 0, 0, self.nways
+    while hi - lo > 1:
+      mid = (lo + hi) // 2
+      if way < mid:
+        path.append((node, 0))
+        node, hi = 2*node + 1, mid
+      else:
+        path.append((node, 1))
+        node, lo = 2*node + 2, mid
+    return path
+
+  # Point every node on the path to way towards it (or away from it)
+  def plru_point(self, idx, way, towards):
+    for node, bit in self.plru_path(way):
+      if not towards:
+        bit = 1 - bit
+      self.plru[idx] = (self.plru[idx] & ~(1 << node)) | (bit << node)
+
   # Update the LRU status, given that a hit just occurred
   def lru_hit(self, idx, way):
-    self.lru[idx].remove(way)
-    self.lru[idx].insert(0, way)
+    if self.policy == 'plru':
+      self.plru_point(idx, way, False)
+    else:
+      self.lru[idx].remove(way)
+      self.lru[idx].insert(0, way)
 
   # Get the least recently used way for an index
   # The LRU is always the last element in the list
   def lru_get(self, idx):
+    if self.policy == 'plru':
+      node, lo, hi = 0, 0, self.nways
+      while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if (self.plru[idx] >> node) & 1:
+          node, lo = 2*node + 2, mid
+        else:
+          node, hi = 2*node + 1, mid
+      return lo
     return self.lru[idx][-1]
 
   # Perform a tag check, and update lru if a hit occurs
-  def tag_check(self, tag, idx):
+  def tag_check(self, tag, idx, sec=1):
     for way in range(self.nways):
-      if self.valid[idx][way] and self.line[idx][way] == tag:
+      if (self.valid[idx][way] and self.line[idx][way] == tag and
+          self.sec[idx][way] & sec):
         # Whenever tag check hits, update the set's lru array
         self.lru_hit(idx, way)
         return True
     return False
 
-  # Update the tag array due to a value getting fetched from memory
-  def refill(self, tag, idx):
-    victim = self.lru_get(idx)
+  # Find an invalidated line that still holds dirty data for this tag.
+  # The cache refills into that way (keeping the dirty data) instead of
+  # the LRU way
+  def inval_dirty_way(self, tag, idx):
+    for way in range(self.nways):
+      if (not self.valid[idx][way] and self.dirty[idx][way] and
+          self.line[idx][way] == tag):
+        return way
+    return None
+
+  # Find the valid line of this tag that misses on a sector
+  def sector_miss_way(self, tag, idx):
+    for way in range(self.nways):
+      if self.valid[idx][way] and self.line[idx][way] == tag:
+        return way
+    return None
+
+  # Drop the victim buffer copy of a line
+  def victim_drop(self, tag, idx):
+    for n in range(len(self.victims)):
+      if self.victims[n] == (int(tag), int(idx)):
+        self.victims[n] = None
+
+  # Keep a replaced line in the victim buffer
+  def victim_capture(self, tag, idx):
+    if self.victims:
+      self.victim_drop(tag, idx)
+      if None in self.victims:
+        self.victims[self.victims.index(None)] = (int(tag), int(idx))
+      else:
+        self.victims[self.victim_ptr] = (int(tag), int(idx))
+        self.victim_ptr = (self.victim_ptr + 1) % len(self.victims)
+
+  # Update the tag array due to a value getting fetched from memory. Init
+  # writes allocate the line without reading it, so they neither capture
+  # the replaced line nor look in the victim buffer
+  def refill(self, tag, idx, is_init=False, sec=1):
+    victim = self.sector_miss_way(tag, idx)
+    if victim is None:
+      victim = self.inval_dirty_way(tag, idx)
+      if victim is None:
+        victim = self.lru_get(idx)
+        if self.valid[idx][victim] and not is_init:
+          self.victim_capture(self.line[idx][victim], idx)
+        self.dirty[idx][victim] = False
+      self.sec[idx][victim] = 0
+    self.sec[idx][victim] |= (1 << self.sectors) - 1 if is_init else sec
+    if not is_init and (int(tag), int(idx)) in self.victims:
+      self.victim_drop(tag, idx)
+      self.victim_hit = True
     self.line[idx][victim] = tag
     self.valid[idx][victim] = True
     self.lru_hit(idx, victim)
 
+  # Reads and writes to the uncached ranges bypass the cache
+  def is_uncached(self, addr):
+    return any(base <= int(addr) < base + size for base, size in self.uncached_ranges)
+
   # Simulate accessing an address. Returns True if a hit occurred,
   # False on miss
-  def access_address(self, addr):
+  def access_address(self, addr, is_write=False, is_init=False):
     (tag, idx, offset) = self.split_address(addr)
-    hit = self.tag_check(tag, idx)
+    self.victim_hit = False
+    if not is_init and self.is_uncached(addr):
+      return False
+    self.bank_accesses[self.data_bank(idx)] += 1
+    sec = self.sector_bit(offset)
+    hit = self.tag_check(tag, idx, sec)
+    if is_write and self.write_through:
+      # Writes go to memory, hits stay clean and misses do not allocate
+      # (unless the line was left dirty by INV)
+      if hit or self.inval_dirty_way(tag, idx) is None:
+        return hit
     if not hit:
-      self.refill(tag, idx)
+      self.refill(tag, idx, is_init, sec)
+    if is_write:
+      for way in range(self.nways):
+        if self.valid[idx][way] and self.line[idx][way] == tag:
+          self.dirty[idx][way] = True
     return hit
 
+  # Make way the next one to be replaced
   def lru_set(self, idx, way):
-    self.lru[idx].remove(way)
-    self.lru[idx].append(way)
+    if self.policy == 'plru':
+      self.plru_point(idx, way, True)
+    else:
+      self.lru[idx].remove(way)
+      self.lru[idx].append(way)
 
   def amo_req(self, addr):
+    # AMOs are done in memory, so the line is written back and cleared.
+    # With amo_in_cache, AMOs that hit are done on the line, which stays
+    # valid and becomes dirty. Returns True on such a hit
     (tag, idx, offset) = self.split_address(addr)
-    for way in range(self.nways):
-      if self.valid[idx][way] and self.line[idx][way] == tag:
-        self.valid[idx][way] = False
-        self.lru_set( idx, way )
-        break
+    self.bank_accesses[self.data_bank(idx)] += 1
+    if self.amo_in_cache and self.tag_check(tag, idx, self.sector_bit(offset)):
+      for way in range(self.nways):
+        if self.valid[idx][way] and self.line[idx][way] == tag:
+          self.dirty[idx][way] = True
+      return True
+    self.victim_drop(tag, idx)
+    way = self.inval_dirty_way(tag, idx)
+    for w in range(self.nways):
+      if self.valid[idx][w] and self.line[idx][w] == tag:
+        way = w
+    if way is not None:
+      self.valid[idx][way] = False
+      self.dirty[idx][way] = False
+      self.lru_set( idx, way )
+    return False
   
-  def invalidate(self):
-    # invalidates all the cachelines
+  # Set indices covered by nbytes from addr. A length of 0 covers the
+  # whole cache, as does a range that spans or wraps around all the sets
+  def range_sets(self, addr, nbytes):
+    nbytes = int(nbytes)
+    if nbytes == 0 or nbytes >= self.nsets * self.linesize // 8:
+      return range(self.nsets)
+    first = (int(addr) >> self.idx_start) % self.nsets
+    last  = (((int(addr) + nbytes - 1) & 0xffffffff) >> self.idx_start) % self.nsets
+    if last < first:
+      return range(self.nsets)
+    return range(first, last + 1)
+
+  def invalidate(self, addr=0, nbytes=0):
+    # invalidates the cachelines of the range, dirty data stays in the cache
     for way in range(self.nways):
-      for idx in range(self.nsets):
+      for idx in self.range_sets(addr, nbytes):
         self.valid[idx][way] = False
+    # the victim buffer is cleared as well
+    self.victims = [None for n in self.victims]
+
+  def flush(self, addr=0, nbytes=0):
+    # writes back the dirty data of the range, the lines stay valid
+    for way in range(self.nways):
+      for idx in self.range_sets(addr, nbytes):
+        self.dirty[idx][way] = False
 
 class ModelCache:
-  def __init__(self, size, nways, nbanks, CacheReqType, CacheRespType, MemReqType, MemRespType, mem=None):
+  def __init__(self, size, nways, nbanks, CacheReqType, CacheRespType, MemReqType, MemRespType, mem=None,
+               policy='lru', victim_entries=0, write_through=False, uncached_ranges=(),
+               amo_in_cache=False, data_banks=1, sectors=1):
     # The hit/miss tracker
     self.mem_bitwidth_data = MemReqType.get_field_type("data").nbits
     self.cache_bitwidth_data = CacheReqType.get_field_type("data").nbits
     self.BitsData = mk_bits(self.cache_bitwidth_data)
     size = size*8
-    self.tracker = HitMissTracker(size, nways, nbanks, self.mem_bitwidth_data)
+    self.tracker = HitMissTracker(size, nways, nbanks, self.mem_bitwidth_data, policy,
+                                  victim_entries, write_through, uncached_ranges,
+                                  amo_in_cache, data_banks, sectors)
   
     # The transactions list contains the requests and responses for
     # the stream of read/write calls on this model
     self.transactions = []
     self.opaque = 0
+    # Line reserved by the last LR, None when there is no reservation
+    self.reservation = None
     self.CacheReqType = CacheReqType
     self.CacheRespType = CacheRespType
     self.MemReqType = MemReqType
@@ -225,15 +416,18 @@ class ModelCache:
         # assume word mem declarations
         self.mem[addr][ offset*8 : (offset+4)*8 ] = value
 
-  def check_hit(self, addr):
+  def check_hit(self, addr, is_write=False, is_init=False):
     # Tracker returns boolean, need to convert to 1 or 0 to use
-    # in the "test" field of the response
-    if self.tracker.access_address(addr):
+    # in the "test" field of the response. Misses refilled from the
+    # victim buffer are 2
+    if self.tracker.access_address(addr, is_write, is_init):
       return 1
+    elif self.tracker.victim_hit:
+      return 2
     else:
       return 0
 
-  def read(self, addr, opaque, len_):
+  def read(self, addr, opaque, len_, type_='rd'):
     hit = self.check_hit(addr)
     new_addr = int(addr[self.offset_end:32])
     offset = int(addr[self.offset_start:self.offset_end])
@@ -245,12 +439,12 @@ class ModelCache:
       value = self.mem[new_addr][offset*8 : (offset + int(len_))*8 ]
     
     value = zext(value, self.cache_bitwidth_data)
-    self.transactions.append(req (self.CacheReqType, 'rd', opaque, addr, len_, 0))
-    self.transactions.append(resp(self.CacheRespType,'rd', opaque, hit,  len_, value))
+    self.transactions.append(req (self.CacheReqType, type_, opaque, addr, len_, 0))
+    self.transactions.append(resp(self.CacheRespType,type_, opaque, hit,  len_, value))
     self.opaque += 1
 
-  def write(self, addr, value, opaque, len_):
-    hit = self.check_hit(addr)
+  def write(self, addr, value, opaque, len_, type_='wr'):
+    hit = self.check_hit(addr, True)
     new_addr = int(addr[self.offset_end:32])
     offset = int(addr[self.offset_start:self.offset_end])
     value = Bits(self.cache_bitwidth_data, value)
@@ -261,12 +455,29 @@ class ModelCache:
     else:
       self.mem[new_addr][offset*8 : (offset + int(len_))*8] = value[0 : int(len_)*8 ]
 
-    self.transactions.append(req (self.CacheReqType, 'wr', opaque, addr, len_, value))
-    self.transactions.append(resp(self.CacheRespType,'wr', opaque, hit,  len_, 0))
+    self.transactions.append(req (self.CacheReqType, type_, opaque, addr, len_, value))
+    self.transactions.append(resp(self.CacheRespType,type_, opaque, hit,  len_, 0))
     self.opaque += 1
 
+  # LR reads the word and reserves its line. SC writes the word and
+  # responds with 0 if the line is still reserved, otherwise it leaves the
+  # cache alone and responds with 1. Any SC and INV drop the reservation
+  def load_reserved(self, addr, opaque, len_):
+    self.read(addr, opaque, len_, 'lr')
+    self.reservation = int(addr[self.offset_end:32])
+
+  def store_conditional(self, addr, value, opaque, len_):
+    reserved = self.reservation == int(addr[self.offset_end:32])
+    self.reservation = None
+    if reserved:
+      self.write(addr, value, opaque, len_, 'sc')
+    else:
+      self.transactions.append(req (self.CacheReqType, 'sc', opaque, addr, len_, value))
+      self.transactions.append(resp(self.CacheRespType,'sc', opaque, 0,    len_, 1))
+      self.opaque += 1
+
   def init(self, addr, value, opaque, len_):
-    hit = self.check_hit(addr)
+    hit = self.check_hit(addr, is_init=True)
     new_addr = int(addr[self.offset_end:32])
     offset = int(addr[self.offset_start:self.offset_end])
     value = Bits(self.cache_bitwidth_data, value)
@@ -281,8 +492,9 @@ class ModelCache:
     self.opaque += 1
 
   def amo(self, addr, value, opaque, len_, func):
-    # AMO operations are on the word level only
-    self.tracker.amo_req(addr)
+    # AMO operations are on the word level only. AMOs done in the cache
+    # respond with a hit
+    hit = 1 if self.tracker.amo_req(addr) else 0
     new_addr = addr[self.offset_end:32]
     offset = int(addr[self.offset_start:self.offset_end])
     if new_addr not in self.mem:
@@ -296,17 +508,21 @@ class ModelCache:
     self.mem[new_addr.int()][offset * 8 : (offset + 4) * 8] = amo_out
     
     self.transactions.append(req (self.CacheReqType, func, opaque, addr, len_, value))
-    self.transactions.append(resp(self.CacheRespType,func, opaque, 0,    len_, ret))
+    self.transactions.append(resp(self.CacheRespType,func, opaque, hit,  len_, ret))
     self.opaque += 1
 
-  def invalidate(self, opaque):
-    self.tracker.invalidate()
-    self.transactions.append(req (self.CacheReqType, 'inv', opaque, 0, 0, 0))
+  # INV and FLUSH apply to nbytes from addr, or to the whole cache when
+  # nbytes is 0
+  def invalidate(self, opaque, addr=0, nbytes=0):
+    self.tracker.invalidate(addr, nbytes)
+    self.reservation = None
+    self.transactions.append(req (self.CacheReqType, 'inv', opaque, addr, 0, nbytes))
     self.transactions.append(resp(self.CacheRespType, 'inv', opaque, 0, 0, 0))
     self.opaque += 1
 
-  def flush(self, opaque):
-    self.transactions.append(req (self.CacheReqType, 'fl', opaque, 0, 0, 0))
+  def flush(self, opaque, addr=0, nbytes=0):
+    self.tracker.flush(addr, nbytes)
+    self.transactions.append(req (self.CacheReqType, 'fl', opaque, addr, 0, nbytes))
     self.transactions.append(resp(self.CacheRespType, 'fl', opaque, 0, 0, 0))
     self.opaque += 1
 
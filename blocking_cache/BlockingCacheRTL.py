@@ -11,15 +11,26 @@ Date   : 20 February 2020
 
 from pymtl3                 import *
 from pymtl3.stdlib.mem      import MemMasterIfcRTL, MemMinionIfcRTL
+from constants.constants    import *
 from .BlockingCacheCtrlRTL  import BlockingCacheCtrlRTL
 from .BlockingCacheDpathRTL import BlockingCacheDpathRTL
 from .CacheDerivedParams    import CacheDerivedParams
+from .units.StoreBuffer     import StoreBuffer
+from .units.Prefetcher      import Prefetcher
+from .units.VictimBuffer    import VictimBuffer
+from .units.PerfCounters    import PerfCounters
 
 
 class BlockingCacheRTL ( Component ):
 
   def construct( s, CacheReqType, CacheRespType, MemReqType, MemRespType,
-                 num_bytes=4096, associativity=2 ):
+                 num_bytes=4096, associativity=2, mshr_entries=1, policy='lru',
+                 store_buffer_entries=0, fast_flush=False, flash_inv=False,
+                 stats=False, behavioral_sram=False, mshr_merge=False,
+                 early_read_hit=False, way_pred=False, prefetch_degree=0,
+                 critical_word_first=False, victim_entries=0, write_through=False,
+                 uncached_ranges=(), amo_in_cache=False, dirty_bits_reg=False,
+                 tag_1r1w=False, data_banks=1, sectors=1 ):
     """
       Parameters
       ----------
@@ -34,11 +45,124 @@ class BlockingCacheRTL ( Component ):
       num_bytes     : int
           Cache size in bytes
       associativity : int
+      mshr_entries  : int
+          Number of MSHR entries. With more than one entry the cache keeps
+          serving hits (and misses to other sets) while misses are
+          outstanding. Responses can then come back out of order.
+      policy        : str
+          Replacement policy for associativity > 2: 'lru' for true LRU or
+          'plru' for tree pseudo-LRU (fewer bits per set). Both are the
+          same for a 2-way cache.
+      store_buffer_entries : int
+          Number of entries in the store buffer in front of the pipeline
+          (see units/StoreBuffer.py). 0 leaves it out.
+      fast_flush    : bool
+          Keep a per-set dirty summary so that FLUSH skips the clean sets,
+          and send the flush writebacks without waiting for each write ack.
+      flash_inv     : bool
+          Keep the valid bits in flip-flops instead of the tag SRAMs so that
+          INV clears all of them in a single cycle.
+      stats         : bool
+          Add the performance counters (see units/PerfCounters.py). They
+          are read from the stats port and cleared with stats_clear.
+      behavioral_sram : bool
+          Use the faster behavioral model for the tag and data arrays (see
+          sram/SramBehavioralPRTL.py). Python simulation only, the cache
+          cannot be translated with it.
+      mshr_merge    : bool
+          Let reads and writes that miss on a set with an outstanding miss
+          (secondary misses) wait in the MSHR behind it without blocking
+          the requests that follow, and replay them right after its refill.
+          Responses can then come back out of order. Needs more than one
+          MSHR entry.
+      early_read_hit : bool
+          Keep the last line read in a line buffer and respond to read hits
+          to it from M1, one cycle earlier. Leave it off to keep the 3-stage
+          timing (the buffer compare is on the M1 critical path).
+      way_pred      : bool
+          Read only the tag array of the most recently used way of the set
+          on reads and writes, and redo the lookup with all the ways on a
+          mispredict (one extra cycle). Needs associativity > 1.
+      prefetch_degree : int
+          Number of lines the prefetcher between the cache and memory
+          fetches ahead of each refill into its prefetch buffer (see
+          units/Prefetcher.py). 0 leaves it out.
+      critical_word_first : bool
+          Ask memory for the requested word of a refill first and accept
+          the line in beats (memory marks the words of each beat in the
+          response write mask). A read miss is answered as soon as its beat
+          arrives, before the rest of the line. Needs one MSHR entry and
+          no prefetcher.
+      victim_entries : int
+          Number of lines in the victim buffer between the cache and memory
+          (see units/VictimBuffer.py), which keeps the lines replaced on
+          misses. Responses to misses refilled from it have the second test
+          bit set. Meant for direct mapped caches. Needs one MSHR entry, no
+          prefetcher and whole line refills. 0 leaves it out.
+      write_through : bool
+          Write through without write allocate. Every write is sent to
+          memory (whole words as line writes with the words set in the write
+          mask, subwords with their len), write hits update the line without
+          dirtying it and write misses do not refill.
+      uncached_ranges : list
+          Address ranges, as (base, size) tuples of whole lines, whose reads
+          and writes bypass the cache (e.g. MMIO). They go to memory with
+          their own addr and len, never touch the arrays and respond with a
+          miss. WRITE_INIT and AMOs to them behave as usual. Cannot be used
+          with critical word first refills.
+      amo_in_cache  : bool
+          Do AMOs that hit in the cache on the line with a single-cycle ALU
+          instead of writing back and invalidating the line and sending the
+          AMO to memory. The line stays valid and becomes dirty, and the
+          AMO responds with a hit. The result is written in a second pass
+          like the dirty bit of a write hit to a clean word, so the next
+          request waits a cycle. AMO misses still go to memory. AMOs are
+          on 32-bit words. Needs write back.
+      dirty_bits_reg : bool
+          Keep the dirty bits in flip-flops next to the tag SRAMs, with a
+          second write port that sets the dirty bits of a write hit in M1.
+          A write to a clean word then no longer needs the second pass
+          through M0 and does not hold up the next request. The dirty bits
+          read from the tag SRAM are not used.
+      tag_1r1w      : bool
+          Use 1R1W SRAMs (sram/Sram1R1WPRTL.py) for the tag arrays. Lookups
+          use the read port and tag writes the write port, so a write hit
+          to a clean word sets its dirty bits from M1 in the same cycle as
+          the lookup of the next request, unless M0 may write the tags in
+          that cycle (refills, replays, INV, FLUSH and WRITE_INIT). Cannot
+          be used with dirty_bits_reg.
+      data_banks    : int
+          Split the data array into this many SRAM banks (sram/
+          BankedSramPRTL.py) interleaved on the low bits of the index, so
+          that each access only enables one smaller bank. Power of two, 1
+          keeps a single data array.
+      sectors       : int
+          Split each line into this many sectors with their own valid bits
+          in the tag array. A miss only asks memory for the sector it needs
+          (with the len of the memreq) and a miss on another sector of a
+          valid line refills that sector in place. Power of two, each
+          sector at least 64 bits and a whole request. Needs write back,
+          whole line refills and no prefetcher or MSHR merging. 1 keeps
+          whole lines.
     """
 
     # Generate additional constants and bitstructs from the given parameters
     s.param = p = CacheDerivedParams( CacheReqType, CacheRespType, MemReqType,
-                                      MemRespType, num_bytes, associativity )
+                                      MemRespType, num_bytes, associativity,
+                                      mshr_entries, policy, fast_flush,
+                                      flash_inv, stats, behavioral_sram,
+                                      mshr_merge, early_read_hit, way_pred,
+                                      critical_word_first, victim_entries,
+                                      write_through, uncached_ranges,
+                                      amo_in_cache, dirty_bits_reg, tag_1r1w,
+                                      data_banks, sectors )
+    assert not ( critical_word_first and prefetch_degree > 0 ), \
+      "The prefetcher expects whole lines from memory"
+    assert not ( victim_entries > 0 and prefetch_degree > 0 ), \
+      "Only one of the prefetcher and the victim buffer fits between the cache and memory"
+    assert not ( sectors > 1 and prefetch_degree > 0 ), \
+      "The prefetcher expects whole lines from memory"
+
 
     #---------------------------------------------------------------------
     # Interface
@@ -48,29 +172,64 @@ class BlockingCacheRTL ( Component ):
     s.mem_minion_ifc = MemMinionIfcRTL( CacheReqType, CacheRespType )
     # Memory-Master Interface (e.g. cache <-> main memory or lower-level cache)
     s.mem_master_ifc = MemMasterIfcRTL( MemReqType, MemRespType )
+    # Performance counters
+    if stats:
+      s.stats       = OutPort( p.StructStats )
+      s.stats_clear = InPort()
 
     #---------------------------------------------------------------------
     # Structural Composition
     #---------------------------------------------------------------------
 
+    if store_buffer_entries > 0:
+      s.store_buffer = StoreBuffer( p, store_buffer_entries )
+      s.store_buffer.proc //= s.mem_minion_ifc
+      minion_ifc = s.store_buffer.cache
+    else:
+      minion_ifc = s.mem_minion_ifc
+
+    if prefetch_degree > 0:
+      s.prefetcher = Prefetcher( p, prefetch_degree )
+      s.prefetcher.mem   //= s.mem_master_ifc
+      s.prefetcher.clear //= lambda: ( s.mem_minion_ifc.req.en &
+                                       ( s.mem_minion_ifc.req.msg.type_ == INV ) )
+      master_ifc = s.prefetcher.cache
+    elif victim_entries > 0:
+      s.victim_buffer = VictimBuffer( p, victim_entries )
+      s.victim_buffer.mem   //= s.mem_master_ifc
+      s.victim_buffer.clear //= lambda: ( s.mem_minion_ifc.req.en &
+                                          ( s.mem_minion_ifc.req.msg.type_ == INV ) )
+      master_ifc = s.victim_buffer.cache
+    else:
+      master_ifc = s.mem_master_ifc
+
     s.cacheDpath = m = BlockingCacheDpathRTL( p )
-    m.cachereq_Y   //= s.mem_minion_ifc.req.msg
-    m.cacheresp_M2 //= s.mem_minion_ifc.resp.msg
-    m.memresp_Y    //= s.mem_master_ifc.resp.msg
-    m.memreq_M2    //= s.mem_master_ifc.req.msg
+    m.cachereq_Y   //= minion_ifc.req.msg
+    m.cacheresp_M2 //= minion_ifc.resp.msg
+    m.memresp_Y    //= master_ifc.resp.msg
+    m.memreq_M2    //= master_ifc.req.msg
 
     s.cacheCtrl = m = BlockingCacheCtrlRTL( p )
-    m.cachereq_en   //= s.mem_minion_ifc.req.en
-    m.cachereq_rdy  //= s.mem_minion_ifc.req.rdy
-    m.memresp_en    //= s.mem_master_ifc.resp.en
-    m.memresp_rdy   //= s.mem_master_ifc.resp.rdy
-    m.cacheresp_en  //= s.mem_minion_ifc.resp.en
-    m.cacheresp_rdy //= s.mem_minion_ifc.resp.rdy
-    m.memreq_en     //= s.mem_master_ifc.req.en
-    m.memreq_rdy    //= s.mem_master_ifc.req.rdy
+    m.cachereq_en   //= minion_ifc.req.en
+    m.cachereq_rdy  //= minion_ifc.req.rdy
+    m.memresp_en    //= master_ifc.resp.en
+    m.memresp_rdy   //= master_ifc.resp.rdy
+    m.cacheresp_en  //= minion_ifc.resp.en
+    m.cacheresp_rdy //= minion_ifc.resp.rdy
+    m.memreq_en     //= master_ifc.req.en
+    m.memreq_rdy    //= master_ifc.req.rdy
     m.status        //= s.cacheDpath.status
     m.ctrl          //= s.cacheDpath.ctrl
 
+    if victim_entries > 0:
+      s.victim_buffer.capture //= s.cacheCtrl.ctrl.memreq_victim_M2
+
+    if stats:
+      s.perf_counters = m = PerfCounters( p )
+      m.events //= s.cacheCtrl.stats_events
+      m.clear  //= s.stats_clear
+      m.stats  //= s.stats
+
   # Line tracing
   def line_trace( s, level=2 ):
     if level == 1:
@@ -18,11 +18,18 @@ class CacheDerivedParams:
            f"{self.MemReqType}_{self.MemRespType}_{self.num_bytes}_{self.associativity}"
 
   def __str__( self ):
-    return f"BlockingCache_{self.num_bytes}_{self.bitwidth_cacheline}_{self.bitwidth_addr}_"\
+    name = "NonBlockingCache" if self.mshr_merge else "BlockingCache"
+    return f"{name}_{self.num_bytes}_{self.bitwidth_cacheline}_{self.bitwidth_addr}_"\
            f"{self.bitwidth_data}_{self.associativity}"
 
   def __init__( self, CacheReqType, CacheRespType, MemReqType, MemRespType,
-                num_bytes, associativity ):
+                num_bytes, associativity, mshr_entries=1, policy='lru',
+                fast_flush=False, flash_inv=False, stats=False,
+                behavioral_sram=False, mshr_merge=False, early_read_hit=False,
+                way_pred=False, critical_word_first=False, victim_entries=0,
+                write_through=False, uncached_ranges=(), amo_in_cache=False,
+                dirty_bits_reg=False, tag_1r1w=False, data_banks=1,
+                sectors=1 ):
 
     self.num_bytes     = num_bytes
     self.CacheReqType  = CacheReqType
@@ -30,6 +37,51 @@ class CacheDerivedParams:
     self.MemReqType    = MemReqType
     self.MemRespType   = MemRespType
     self.associativity = associativity
+    self.num_mshr_entries = mshr_entries
+    self.mshr_merge    = mshr_merge
+    self.replacement_policy = policy
+    self.fast_flush    = fast_flush
+    self.flash_inv     = flash_inv
+    self.stats         = stats
+    self.behavioral_sram = behavioral_sram
+    self.early_read_hit  = early_read_hit
+    self.way_pred        = way_pred
+    self.critical_word_first = critical_word_first
+    self.victim_entries  = victim_entries
+    self.write_through   = write_through
+    self.uncached_ranges = tuple( uncached_ranges ) # ( base, size ) in bytes
+    self.amo_in_cache    = amo_in_cache
+    self.dirty_bits_reg  = dirty_bits_reg
+    self.tag_1r1w        = tag_1r1w
+    self.data_banks      = data_banks
+    self.sectors         = sectors
+
+    assert policy in ( 'lru', 'plru' ), f"Unknown replacement policy: {policy}"
+    assert not mshr_merge or mshr_entries > 1, "Merging misses needs more than one MSHR entry"
+    assert not way_pred or associativity > 1, "Way prediction needs more than one way"
+    assert not critical_word_first or mshr_entries == 1, \
+      "Critical word first refills need a single MSHR entry"
+    assert not victim_entries or mshr_entries == 1, \
+      "The victim buffer needs a single MSHR entry"
+    assert not ( victim_entries and critical_word_first ), \
+      "The victim buffer expects whole lines from memory"
+
+    line_bytes = MemReqType.get_field_type("data").nbits // 8
+    for base, size in self.uncached_ranges:
+      assert size > 0 and base % line_bytes == 0 and size % line_bytes == 0, \
+        "Uncached ranges must be made of whole lines"
+    assert not ( self.uncached_ranges and critical_word_first ), \
+      "Uncached reads expect a single memresp"
+    assert not ( amo_in_cache and write_through ), \
+      "AMOs done in the cache would leave dirty lines behind a write through"
+    assert not ( dirty_bits_reg and tag_1r1w ), \
+      "Both set the dirty bits of write hits from M1, pick one"
+    assert sectors >= 1 and sectors & ( sectors - 1 ) == 0, \
+      "The lines need a power of two sectors"
+    if sectors > 1:
+      assert not critical_word_first and not victim_entries and not write_through, \
+        "Sectored lines need write back and refills of a single memresp"
+      assert not mshr_merge, "Merged misses may be to another sector of the line"
 
     #--------------------------------------------------------------------------
     # Bitwidths
@@ -62,14 +114,42 @@ class CacheDerivedParams:
     else:
       self.bitwidth_clog_asso      = clog2( self.associativity )
     self.bitwidth_mem_len          = clog2( self.bitwidth_cacheline // 8 )
+    # Replacement state per set (see units/ReplacementPolicy.py)
+    if self.associativity <= 2:
+      self.bitwidth_rep            = 1
+    elif self.replacement_policy == 'plru':
+      self.bitwidth_rep            = self.associativity - 1                          # tree nodes
+    else:
+      self.bitwidth_rep            = self.associativity * self.bitwidth_clog_asso    # age per way
 
     self.bitwidth_dirty            = self.bitwidth_cacheline // 32  # 1 dirty bit per 32-bit word
     self.bitwidth_val              = 1                              # Valid bit
 
+    # Sectored lines have one valid bit per sector next to the line valid
+    # bit. Each request has to fall in a single sector.
+    if sectors > 1:
+      self.bitwidth_sec            = sectors
+      self.bitwidth_sector         = self.bitwidth_cacheline // sectors
+      assert self.bitwidth_sector >= max( 64, self.bitwidth_data ), \
+        "A sector must hold a whole request"
+    else:
+      self.bitwidth_sec            = 0
+      self.bitwidth_sector         = self.bitwidth_cacheline
+    self.bitwidth_sector_offset    = clog2( self.bitwidth_sector // 8 )        # offset within a sector
+
     # sum of the tag bitwidth, valid, and dirty bit per word 
-    self.bitwidth_tag_array        = self.bitwidth_tag + self.bitwidth_val + self.bitwidth_dirty
+    self.bitwidth_tag_array        = ( self.bitwidth_tag + self.bitwidth_val +
+                                       self.bitwidth_dirty + self.bitwidth_sec )
     self.bitwidth_tag_wben         = self.bitwidth_tag_array # Tag array write byte bitwidth
 
+    # Data array banks are interleaved on the low bits of the index, so the
+    # bank bits sit right above the offset and the sets do not change
+    assert data_banks >= 1 and data_banks & ( data_banks - 1 ) == 0, \
+      "The data array needs a power of two banks"
+    assert data_banks < self.nblocks_per_way, "Each data array bank needs more than one set"
+    self.bitwidth_bank             = clog2( data_banks )
+    self.nblocks_per_bank          = self.total_num_cachelines // data_banks
+
     #--------------------------------------------------------------------
     # Make Bits object
     #--------------------------------------------------------------------
@@ -94,10 +174,13 @@ class CacheDerivedParams:
     self.BitsClogNlines    = mk_bits( clog2(self.total_num_cachelines) )
     self.BitsNlinesPerWay  = mk_bits( self.nblocks_per_way )
     self.BitsMemLen        = mk_bits( self.bitwidth_mem_len )
+    self.BitsRep           = mk_bits( self.bitwidth_rep )
 
     # Cifer Bits objects
     self.BitsVal           = mk_bits( self.bitwidth_val )
     self.BitsDirty         = mk_bits( self.bitwidth_dirty )
+    if sectors > 1:
+      self.BitsSec         = mk_bits( self.bitwidth_sec )
 
     #--------------------------------------------------------------------
     # Specialize structs
@@ -126,4 +209,9 @@ class CacheDerivedParams:
 
     # Structs local to the ctrl
     self.CtrlMsg = mk_ctrl_pipeline_struct()
+
+    # Performance counters
+    self.bitwidth_stats    = 32
+    self.StructStatsEvents = mk_stats_struct( 1 )
+    self.StructStats       = mk_stats_struct( self.bitwidth_stats )
     self.BitsCtrlStates = mk_bits(clog2(6))
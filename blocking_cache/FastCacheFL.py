@@ -0,0 +1,311 @@
+"""
+=========================================================================
+ FastCacheFL.py
+=========================================================================
+A fast function level hit/miss model for replaying long request traces.
+Makes the same hit/miss decisions as HitMissTracker in BlockingCacheFL.py
+but keeps the tag, valid and replacement state in NumPy arrays indexed by
+set. NumPy decodes the whole trace at once; the replay itself is an
+int-based loop since every request depends on the state left by the ones
+before it. The speedup over HitMissTracker comes from working on plain
+ints instead of Bits, not from vectorizing the replay.
+
+Date   : 18 October 2026
+"""
+
+import numpy as np
+
+from mem_ifcs.MemMsg import MemMsgType
+
+class FastHitMissTracker:
+  """
+  Same geometry and arguments as HitMissTracker. Replacement state is an
+  age per way for 'lru' (0 is the most recently used) or the tree bits
+  for 'plru', laid out the same way as the RTL.
+  """
+  def __init__( self, size, nways, nbanks, linesize, policy='lru',
+                victim_entries=0, write_through=False, uncached_ranges=(),
+                amo_in_cache=False, data_banks=1, sectors=1 ):
+    assert policy in ( 'lru', 'plru' ), f"Unknown replacement policy: {policy}"
+    self.nways    = nways
+    self.policy   = policy
+    self.linesize = linesize
+    self.write_through   = write_through
+    self.uncached_ranges = uncached_ranges
+    self.amo_in_cache    = amo_in_cache
+    self.nlines   = int( size // linesize )
+    self.nsets    = int( self.nlines // self.nways )
+    self.nbanks   = nbanks
+
+    # Compute how the address is sliced
+    self.idx_start = int( np.log2( linesize // 8 ) )
+    if nbanks > 0:
+      self.idx_start += int( np.log2( nbanks ) )
+    self.tag_start = self.idx_start + int( np.log2( self.nsets ) )
+    self.idx_mask  = self.nsets - 1
+
+    # Requests to the lines of each data array bank, as in HitMissTracker
+    self.data_banks    = data_banks
+    self.bank_accesses = np.zeros( data_banks, dtype=np.int64 )
+
+    # Valid sectors of each line as a mask, as in HitMissTracker
+    self.sectors      = sectors
+    self.sector_start = int( np.log2( linesize // 8 // sectors ) )
+
+    # State arrays are of the form array[idx][way]
+    self.tags  = np.zeros( ( self.nsets, nways ), dtype=np.int64 )
+    self.valid = np.zeros( ( self.nsets, nways ), dtype=np.bool_ )
+    self.dirty = np.zeros( ( self.nsets, nways ), dtype=np.bool_ )
+    self.sec   = np.zeros( ( self.nsets, nways ), dtype=np.int64 )
+    self.age   = np.tile( np.arange( nways, dtype=np.int64 ), ( self.nsets, 1 ) )
+    self.plru  = np.zeros( self.nsets, dtype=np.int64 )
+
+    # Victim buffer entries as ( tag, idx ) or None, filled the same way as
+    # HitMissTracker. victim_hits marks the refills of the last
+    # access_many that came from the buffer
+    self.victims     = [ None ] * victim_entries
+    self.victim_ptr  = 0
+    self.victim_hits = np.zeros( 0, dtype=np.bool_ )
+
+    # Tree pseudo-LRU path for each way as ( node, bit towards the way )
+    self.plru_paths = []
+    for way in range( nways ):
+      path = []
+      node, lo, hi = 0, 0, nways
+      while hi - lo > 1:
+        mid = ( lo + hi ) // 2
+        if way < mid:
+          path.append( ( node, 0 ) )
+          node, hi = 2*node + 1, mid
+        else:
+          path.append( ( node, 1 ) )
+          node, lo = 2*node + 2, mid
+      self.plru_paths.append( path )
+
+  def split_addresses( self, addrs ):
+    """Returns the tag and set index arrays for an array of addresses"""
+    addrs = np.asarray( addrs, dtype=np.int64 ) & 0xffffffff
+    return addrs >> self.tag_start, ( addrs >> self.idx_start ) & self.idx_mask
+
+  def range_sets( self, addr, nbytes ):
+    """Set indices covered by nbytes from addr, same as HitMissTracker"""
+    if nbytes == 0 or nbytes >= self.nsets * self.linesize // 8:
+      return range( self.nsets )
+    first = ( addr >> self.idx_start ) & self.idx_mask
+    last  = ( ( ( addr + nbytes - 1 ) & 0xffffffff ) >> self.idx_start ) & self.idx_mask
+    if last < first:
+      return range( self.nsets )
+    return range( first, last + 1 )
+
+  def uncached( self, addrs ):
+    """Returns a bool array marking the addresses in the uncached ranges"""
+    addrs = np.asarray( addrs, dtype=np.int64 ) & 0xffffffff
+    out = np.zeros( len( addrs ), dtype=np.bool_ )
+    for base, size in self.uncached_ranges:
+      out |= ( addrs >= base ) & ( addrs < base + size )
+    return out
+
+  def victim_drop( self, tag, idx ):
+    for n in range( len( self.victims ) ):
+      if self.victims[n] == ( tag, idx ):
+        self.victims[n] = None
+
+  def victim_capture( self, tag, idx ):
+    self.victim_drop( tag, idx )
+    if None in self.victims:
+      self.victims[ self.victims.index( None ) ] = ( tag, idx )
+    else:
+      self.victims[ self.victim_ptr ] = ( tag, idx )
+      self.victim_ptr = ( self.victim_ptr + 1 ) % len( self.victims )
+
+  def invalidate( self, addr=0, nbytes=0 ):
+    sets = self.range_sets( int( addr ), int( nbytes ) )
+    self.valid[ sets.start:sets.stop ] = False
+    self.victims = [ None ] * len( self.victims )
+
+  def flush( self, addr=0, nbytes=0 ):
+    sets = self.range_sets( int( addr ), int( nbytes ) )
+    self.dirty[ sets.start:sets.stop ] = False
+
+  def access_many( self, addrs, types=None, nbytes=None ):
+    """
+    Replays a trace of requests and returns a bool array with the
+    hit/miss decision of each one. types holds the MemMsgType of each
+    request (default all READ). READ, WRITE and WRITE_INIT look up and
+    refill the cache like HitMissTracker.access_address, including the
+    write-through, victim buffer and uncached range options. AMOs
+    invalidate the line like HitMissTracker.amo_req, or with amo_in_cache
+    hit and dirty it if it is valid. INV clears the valid
+    bits and FLUSH the dirty bits of the nbytes from their address
+    (default 0, the whole cache); these are reported as misses.
+    """
+    tags_in, idxs_in = self.split_addresses( addrs )
+    n = len( tags_in )
+    if types is None:
+      types = np.full( n, MemMsgType.READ, dtype=np.int64 )
+    types = np.asarray( types, dtype=np.int64 )
+    assert len( types ) == n, "Need one type per address"
+    if nbytes is None:
+      nbytes = np.zeros( n, dtype=np.int64 )
+    nbytes = np.asarray( nbytes, dtype=np.int64 ).tolist()
+    assert len( nbytes ) == n, "Need one length per address"
+    addrs_in = ( np.asarray( addrs, dtype=np.int64 ) & 0xffffffff ).tolist()
+    secs_in  = ( 1 << ( ( np.asarray( addrs, dtype=np.int64 ) >> self.sector_start ) &
+                        ( self.sectors - 1 ) ) ).tolist()
+    all_secs = ( 1 << self.sectors ) - 1
+
+    # Address decoding is done for the whole trace at once but each request
+    # depends on the ones before it, so replay on plain ints and store the
+    # state back into the arrays at the end
+    hits  = [ False ] * n
+    victim_hits = [ False ] * n
+    tags  = self.tags.tolist()
+    valid = self.valid.tolist()
+    dirty = self.dirty.tolist()
+    sec   = self.sec.tolist()
+    age   = self.age.tolist()
+    plru  = self.plru.tolist()
+    nways = self.nways
+    is_lru = self.policy == 'lru'
+    paths = self.plru_paths
+    access_types = np.isin( types, [ MemMsgType.READ, MemMsgType.WRITE,
+                                     MemMsgType.WRITE_INIT ] ).tolist()
+    amo_types = ( ( types >= MemMsgType.AMO_ADD ) &
+                  ( types <= MemMsgType.AMO_XOR ) ).tolist()
+    inv_types = ( types == MemMsgType.INV ).tolist()
+    flush_types = ( types == MemMsgType.FLUSH ).tolist()
+    write_types = ( types == MemMsgType.WRITE ).tolist()
+    init_types = ( types == MemMsgType.WRITE_INIT ).tolist()
+    uncached = self.uncached( addrs ).tolist()
+    write_through = self.write_through
+    amo_in_cache  = self.amo_in_cache
+    data_banks    = self.data_banks
+    bank_accesses = self.bank_accesses.tolist()
+
+    for i, ( tag, idx ) in enumerate( zip( tags_in.tolist(), idxs_in.tolist() ) ):
+      if inv_types[i]:
+        for set_ in self.range_sets( addrs_in[i], nbytes[i] ):
+          valid[set_] = [ False ] * nways
+        self.victims = [ None ] * len( self.victims )
+        continue
+      if flush_types[i]:
+        for set_ in self.range_sets( addrs_in[i], nbytes[i] ):
+          dirty[set_] = [ False ] * nways
+        continue
+      if not ( access_types[i] or amo_types[i] ):
+        continue
+      if access_types[i] and uncached[i] and not init_types[i]:
+        continue
+      bank_accesses[idx % data_banks] += 1
+
+      tag_row   = tags[idx]
+      valid_row = valid[idx]
+      dirty_row = dirty[idx]
+      sec_row   = sec[idx]
+      way = -1
+      sec_way   = -1 # valid line missing the sector
+      inval_way = -1 # invalidated line that still has dirty data
+      for w in range( nways ):
+        if tag_row[w] == tag:
+          if valid_row[w] and sec_row[w] & secs_in[i]:
+            way = w
+          elif valid_row[w]:
+            sec_way = w
+          elif dirty_row[w] and inval_way < 0:
+            inval_way = w
+
+      if amo_types[i] and amo_in_cache and way >= 0:
+        # Done on the line, which becomes dirty
+        hits[i] = True
+        dirty_row[way] = True
+        towards = False
+      elif amo_types[i]:
+        # Write back and clear the line and make its way the next victim
+        if self.victims:
+          self.victim_drop( tag, idx )
+        if way < 0:
+          way = sec_way if sec_way >= 0 else inval_way
+        if way < 0:
+          continue
+        valid_row[way] = False
+        dirty_row[way] = False
+        towards = True
+      else:
+        hits[i] = way >= 0
+        # Write-through writes stay clean and misses do not allocate,
+        # unless the line was left dirty by INV
+        wt_write = write_types[i] and write_through and \
+                   ( way >= 0 or inval_way < 0 )
+        if wt_write and way < 0:
+          continue
+        refill = way < 0
+        if way < 0 and sec_way >= 0:
+          # Refill the sector into the line
+          way = sec_way
+        elif way < 0 and inval_way >= 0:
+          # Refill into the line holding the dirty data
+          way = inval_way
+          valid_row[way] = True
+          sec_row[way]   = 0
+        elif way < 0:
+          # Refill into the victim way
+          if is_lru:
+            age_row = age[idx]
+            way = age_row.index( nways - 1 )
+          else:
+            node, lo, hi = 0, 0, nways
+            state = plru[idx]
+            while hi - lo > 1:
+              mid = ( lo + hi ) // 2
+              if ( state >> node ) & 1:
+                node, lo = 2*node + 2, mid
+              else:
+                node, hi = 2*node + 1, mid
+            way = lo
+          if self.victims and valid_row[way] and not init_types[i]:
+            self.victim_capture( tag_row[way], idx )
+          tag_row[way]   = tag
+          valid_row[way] = True
+          dirty_row[way] = False
+          sec_row[way]   = 0
+        if refill:
+          sec_row[way] |= all_secs if init_types[i] else secs_in[i]
+        if refill and self.victims and not init_types[i] and \
+           ( tag, idx ) in self.victims:
+          self.victim_drop( tag, idx )
+          victim_hits[i] = True
+        if write_types[i] and not wt_write:
+          dirty_row[way] = True
+        towards = False
+
+      # Update the replacement state: most recently used, or next victim
+      if is_lru:
+        age_row = age[idx]
+        curr = age_row[way]
+        for w in range( nways ):
+          if towards and age_row[w] > curr:
+            age_row[w] -= 1
+          elif not towards and age_row[w] < curr:
+            age_row[w] += 1
+        age_row[way] = nways - 1 if towards else 0
+      else:
+        state = plru[idx]
+        for node, bit in paths[way]:
+          if not towards:
+            bit = 1 - bit
+          state = ( state & ~( 1 << node ) ) | ( bit << node )
+        plru[idx] = state
+
+    self.tags[:]  = tags
+    self.valid[:] = valid
+    self.dirty[:] = dirty
+    self.sec[:]   = sec
+    self.age[:]   = age
+    self.plru[:]  = plru
+    self.bank_accesses[:] = bank_accesses
+    self.victim_hits = np.array( victim_hits, dtype=np.bool_ )
+    return np.array( hits, dtype=np.bool_ )
+
+  def access_address( self, addr ):
+    """Single READ access, same as HitMissTracker.access_address"""
+    return bool( self.access_many( [ int( addr ) ] )[0] )
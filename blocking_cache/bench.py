@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+#=========================================================================
+# bench.py
+#=========================================================================
+# Measures how fast the Blocking Cache RTL simulates. Fixed synthetic
+# workloads are run through the single cache TestHarness and the number
+# of simulated cycles per wall-clock second is reported for each backend,
+# workload and cache configuration. The results can be saved as baselines
+# and later runs are checked against them to catch simulator slowdowns.
+#
+# Date   : 18 October 2026
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+file_path   = os.path.abspath( __file__ )
+dir_path    = os.path.dirname( file_path )
+parent_path = os.path.dirname( dir_path )
+sys.path.insert( 0, parent_path )
+baselines_file = os.path.join( dir_path, 'bench_baselines.json' )
+
+from pymtl3 import *
+from mem_ifcs.MemMsg import MemMsgType
+
+from blocking_cache.BlockingCacheRTL import BlockingCacheRTL
+from test.sim_utils import (
+  TestHarness, SingleCacheTestParams, gen_req_resp, rand_mem, setup_sim
+)
+
+workloads = [ 'stream_rd', 'rand_rw', 'amo', 'flush' ]
+backends  = [ 'python', 'verilator' ]
+# ( cache size in bytes, associativity )
+configs   = [ (256, 1), (256, 2), (4096, 2), (4096, 4) ]
+
+amo_types = [ MemMsgType.AMO_ADD, MemMsgType.AMO_AND, MemMsgType.AMO_OR,
+              MemMsgType.AMO_SWAP, MemMsgType.AMO_MIN, MemMsgType.AMO_MINU,
+              MemMsgType.AMO_MAX, MemMsgType.AMO_MAXU, MemMsgType.AMO_XOR ]
+
+#=========================================================================
+# Command line processing
+#=========================================================================
+
+def parse_cmdline():
+  p = argparse.ArgumentParser(description='Benchmark the cache simulation speed')
+  p.add_argument( "--backend", default=['python'], nargs='+', choices=backends )
+  p.add_argument( "--workload", default=workloads, nargs='+', choices=workloads )
+  p.add_argument( "--config", default=None, nargs='+', type=str,
+                  help="cache configs as <size>x<asso>, e.g. 4096x2" )
+  p.add_argument( "--behavioral-sram", action='store_true',
+                  help="use the behavioral SRAM model (python backend only)" )
+  p.add_argument( "--ntrans", default=500, type=int, help="transactions per workload" )
+  p.add_argument( "--nruns", default=2, type=int, help="best of this many runs is kept" )
+  p.add_argument( "--baselines", default=baselines_file, type=str )
+  p.add_argument( "--save", action='store_true', help="store the results as the new baselines" )
+  p.add_argument( "--tolerance", default=0.25, type=float,
+                  help="allowed slowdown against the baselines before failing" )
+  opts = p.parse_args()
+  return opts
+
+#=========================================================================
+# Workloads
+#=========================================================================
+# Every workload is deterministic so that the simulated cycle count only
+# changes when the cache itself changes. Expected responses come from the
+# FL model, so the benchmark also checks that the cache is still correct.
+
+def gen_workload( name, size, asso, ntrans ):
+  rng = random.Random( 0xdeadbeef )
+  tp  = SingleCacheTestParams( False, None, asso, 128, 32, size )
+  # Touch about four times the cache capacity
+  max_addr = size * 4 - 4
+  tp.mem   = rand_mem( 0, max_addr )
+
+  def rand_addr():
+    return rng.randint( 0, max_addr ) & 0xfffffffc
+
+  reqs = []
+  for i in range( ntrans ):
+    opq = i & 0xff
+    if name == 'stream_rd':
+      reqs.append( (MemMsgType.READ, opq, (i * 4) % (max_addr + 4), 0, 0) )
+    elif name == 'rand_rw':
+      type_ = rng.choice( [MemMsgType.READ, MemMsgType.WRITE] )
+      reqs.append( (type_, opq, rand_addr(), 0, rng.randint(0, 0xffffffff)) )
+    elif name == 'amo':
+      if rng.random() < 0.7:
+        type_ = rng.choice( amo_types )
+      else:
+        type_ = rng.choice( [MemMsgType.READ, MemMsgType.WRITE] )
+      reqs.append( (type_, opq, rand_addr(), 0, rng.randint(0, 0xffffffff)) )
+    elif name == 'flush':
+      if i % 8 == 7:
+        reqs.append( (MemMsgType.FLUSH, opq, 0, 0, 0) )
+      else:
+        reqs.append( (MemMsgType.WRITE, opq, rand_addr(), 0, rng.randint(0, 0xffffffff)) )
+
+  reqs = [ tp.CacheReqType( *r ) for r in reqs ]
+  tp.msg = gen_req_resp( reqs, tp.mem, tp.CacheReqType, tp.CacheRespType,
+                         tp.MemReqType, tp.MemRespType, tp.associativity, tp.size )
+  return tp
+
+#=========================================================================
+# Run one benchmark
+#=========================================================================
+# Elaboration and translation are not timed, only the ticks.
+
+def run_bench( backend, tp, max_cycles, cache_args=None ):
+  th = TestHarness( tp.msg[::2], tp.msg[1::2], 0, 1, 0, 0, BlockingCacheRTL,
+                    tp.CacheReqType, tp.CacheRespType, tp.MemReqType,
+                    tp.MemRespType, tp.size, tp.associativity, cache_args )
+  th.elaborate()
+  th.load( tp.mem[::2], tp.mem[1::2] )
+
+  cmdline_opts = {
+    'test_verilog': 'zeros' if backend == 'verilator' else False,
+    'dump_vcd'    : False,
+    'dump_vtb'    : False,
+  }
+  th = setup_sim( th, cmdline_opts, False, linetrace=False )
+
+  start = time.perf_counter()
+  while not th.done() and th.sim_cycle_count() < max_cycles:
+    th.sim_tick()
+  elapsed = time.perf_counter() - start
+
+  assert th.done(), f"Benchmark did not finish within {max_cycles} cycles"
+  return th.sim_cycle_count(), elapsed
+
+#=========================================================================
+# Main
+#=========================================================================
+
+def main( opts ):
+  cfgs = configs
+  if opts.config:
+    cfgs = [ tuple( int(x) for x in c.split('x') ) for c in opts.config ]
+  cache_args = { 'behavioral_sram': opts.behavioral_sram }
+  model      = '+bsram' if opts.behavioral_sram else ''
+
+  baselines = {}
+  if os.path.isfile( opts.baselines ):
+    with open( opts.baselines ) as f:
+      baselines = json.load( f )
+
+  results     = {}
+  regressions = []
+  print( f"{'benchmark':<42} {'cycles':>8} {'time(s)':>8} {'cyc/s':>10} {'baseline':>10}" )
+  for backend in opts.backend:
+    for name in opts.workload:
+      for size, asso in cfgs:
+        # Cycle counts and rates only compare for the same trace length
+        key = f"{backend}{model}/{name}/{size}B_{asso}way/{opts.ntrans}trans"
+        tp  = gen_workload( name, size, asso, opts.ntrans )
+        best = None
+        for _ in range( opts.nruns ):
+          cycles, elapsed = run_bench( backend, tp, opts.ntrans * 100, cache_args )
+          if best is None or elapsed < best[1]:
+            best = ( cycles, elapsed )
+        cycles, elapsed = best
+        rate = cycles / elapsed
+        results[key] = { 'cycles': cycles, 'cycles_per_sec': round( rate, 1 ) }
+
+        base = baselines.get( key )
+        note = f"{base['cycles_per_sec']:>10.1f}" if base else f"{'-':>10}"
+        if base:
+          if base['cycles'] != cycles:
+            note += f"  cycles changed from {base['cycles']}"
+          if rate < base['cycles_per_sec'] * ( 1 - opts.tolerance ):
+            note += "  SLOWER"
+            regressions.append( key )
+        print( f"{key:<42} {cycles:>8} {elapsed:>8.3f} {rate:>10.1f} {note}" )
+
+  if opts.save:
+    baselines.update( results )
+    with open( opts.baselines, 'w' ) as f:
+      json.dump( baselines, f, indent=2, sort_keys=True )
+      f.write( '\n' )
+    print( f"\nBaselines saved to {opts.baselines}" )
+
+  if regressions:
+    print( f"\n{len(regressions)} benchmark(s) more than {opts.tolerance:.0%} slower than the baselines" )
+    return 1
+  return 0
+
+if __name__ == "__main__":
+  opts = parse_cmdline()
+  sys.exit( main( opts ) )
@@ -15,23 +15,40 @@ def mk_dpath_status_struct( p ):
              f"{p.bitwidth_data}_{p.associativity}"
   req_cls = mk_bitstruct( cls_name, {
 
+    # Y Dpath Signals
+    'memresp_last_Y'          : Bits1, # memresp completes the line
+    'cwf_word_hit_Y'          : Bits1, # memresp beat holds the MSHR req data
+    'cachereq_init_Y'         : Bits1, # incoming cachereq is a WRITE_INIT
+
     # M0 Dpath Signals
     'cachereq_type_M0'        : p.BitsType,
     'memresp_type_M0'         : p.BitsType,
+    'memresp_victim_M0'       : Bits1, # refill came from the victim buffer
     'offset_M0'               : p.BitsOffset,
     'amo_hit_M0'              : Bits1,
+    'uncached_M0'             : Bits1, # MSHR req is to an uncached range
+    'dirty_sets_M0'           : p.BitsNlinesPerWay, # sets that may hold dirty lines
+    'way_pred_M0'             : p.BitsAssoclog2,    # MRU way of the set
+    'range_all_M0'            : Bits1, # INV/FLUSH applies to all the lines
+    'range_start_line_M0'     : p.BitsClogNlines,   # first line INV/FLUSH walks
+    'range_end_line_M0'       : p.BitsClogNlines,   # last line INV/FLUSH walks
 
     # M1 Dpath Signals
     'cachereq_type_M1'        : p.BitsType,
     # Tag PU outputs
     'ctrl_bit_dty_rd_line_M1' : p.BitsAssoc,
     'ctrl_bit_dty_rd_word_M1' : p.BitsAssoc,
+    'ctrl_bit_val_rd_line_M1' : p.BitsAssoc,
     'hit_M1'                  : Bits1,
     'inval_hit_M1'            : Bits1,
+    'uncached_M1'             : Bits1, # req is to an uncached range
     'hit_way_M1'              : p.BitsAssoclog2,
     ## Signals for multiway associativity
-    'ctrl_bit_rep_rd_M1'      : p.BitsAssoclog2,
+    'ctrl_bit_rep_rd_M1'      : p.BitsRep,
     'amo_hit_way_M1'          : p.BitsAssoclog2,
+    'line_buf_match_M1'       : Bits1, # M1 req is to the buffered line
+    'line_buf_set_match_M1'   : Bits1, # data array access is to its set
+    'reservation_match_M1'    : Bits1, # req is to the line reserved by LR
 
     # M2 Dpath Signals
     'cachereq_type_M2'        : p.BitsType,
@@ -41,6 +58,11 @@ def mk_dpath_status_struct( p ):
     'MSHR_empty'              : Bits1,
     'MSHR_type'               : p.BitsType,
     'MSHR_ptr'                : p.BitsAssoclog2,
+    'MSHR_park_val'           : Bits1,
+    'MSHR_park_ready'         : Bits1,
+    'MSHR_park_block'         : Bits1,
+    'MSHR_primary_empty'      : Bits1,
+    'MSHR_conflict_M1'        : Bits1,
 
 
   })
@@ -52,6 +74,11 @@ def mk_ctrl_signals_struct( p ):
 
   req_cls = mk_bitstruct( cls_name, {
 
+    # Y Ctrl Signals
+    'refill_beat_en_Y'            : Bits1,
+    'cwf_resp_en_Y'               : Bits1,
+    'cwf_resp_send'               : Bits1,
+
     # M0 Ctrl Signals
     'reg_en_M0'                   : Bits1,
     'cachereq_memresp_mux_sel_M0' : Bits1,
@@ -61,12 +88,16 @@ def mk_ctrl_signals_struct( p ):
     'update_tag_way_M0'           : p.BitsAssoclog2,
     'tag_array_type_M0'           : Bits1,
     'tag_array_wben_M0'           : p.BitsTagWben,
-    'ctrl_bit_rep_wr_M0'          : Bits1,
+    'ctrl_bit_rep_wr_M0'          : p.BitsRep,
     'update_tag_cmd_M0'           : Bits3,
     'update_tag_sel_M0'           : Bits1,
     'tag_array_idx_sel_M0'        : Bits1,
     'tag_array_init_idx_M0'       : p.BitsIdx,
     'is_amo_M0'                   : Bits1,
+    'memresp_reg_en_M0'           : Bits1,
+    'MSHR_dealloc_park_M0'        : Bits1,
+    'dirty_sets_clear_M0'         : Bits1,
+    'valid_clear_M0'              : Bits1,
 
     # M1 Ctrl Signals
     'reg_en_M1'            : Bits1,
@@ -83,6 +114,15 @@ def mk_ctrl_signals_struct( p ):
     'dirty_evict_mask_M1'  : p.BitsDirty,
     'wben_cmd_M1'          : Bits2,
     'tag_processing_en_M1' : Bits1,
+    'MSHR_park_M1'         : Bits1,
+    'MSHR_conflict_park_M1': Bits1,
+    'early_resp_M1'        : Bits1,
+    'tag_way_mask_M1'      : p.BitsAssoc,
+    'way_pred_wen_M1'      : Bits1,
+    'way_pred_wway_M1'     : p.BitsAssoclog2,
+    'amo_write_M1'         : Bits1, # data array write of an AMO done in the cache
+    'reserve_M1'           : Bits1, # LR reserves the line of the M1 req
+    'dirty_wr_M1'          : Bits1, # write hit sets its dirty bits from M1
 
     # M2 Ctrl Signals
     'reg_en_M2'            : Bits1,
@@ -94,10 +134,45 @@ def mk_ctrl_signals_struct( p ):
     'MSHR_alloc_en'        : Bits1,
     'MSHR_dealloc_en'      : Bits1,
     'is_amo_M2'            : Bits1,
+    'line_buf_fill_M2'     : Bits1,
+    'memreq_victim_M2'     : Bits1, # memreq is the writeback of a valid victim
+    'memreq_wt_M2'         : Bits1, # memreq is a write through
+    'memreq_uncached_M2'   : Bits1, # memreq is an uncached read
+    'uncached_resp_M2'     : Bits1, # resp data is the memresp of an uncached read
+    'amo_hit_M2'           : Bits1, # resp data is the old word of an AMO done in the cache
+    'sc_fail_M2'           : Bits1, # resp data is 1 for an SC without a reservation
 
   })
   return req_cls
 
+# =========================================================================
+#  statsStructs.py
+# =========================================================================
+# Performance counters, one field per counter. The ctrl sends a one-bit
+# event for each of them and units/PerfCounters.py counts them.
+
+stats_fields = [
+  'hits',            # read/write hits
+  'misses',          # read/write misses
+  'evictions',       # misses that write back a dirty victim
+  'writebacks',      # all writes to memory, including flush writebacks
+  'amos',            # AMO requests
+  'stall_mem',       # cycles M2 waits on memreq rdy
+  'stall_resp',      # cycles M2 waits on cacheresp rdy
+  'stall_clean_hit', # cycles spent setting the dirty bit on a write hit
+  'stall_evict',     # cycles M1 stalls for an eviction
+  'miss_cycles',     # cycles with at least one miss outstanding
+  'inv_cycles',      # cycles spent on INV
+  'flush_cycles',    # cycles spent on FLUSH
+  'way_pred_hits',   # reads/writes that hit in the predicted way
+  'way_pred_misses', # reads/writes that needed a full tag lookup
+]
+
+def mk_stats_struct( nbits ):
+  BitsStat = mk_bits( nbits )
+  return mk_bitstruct( f"StructStats_{nbits}",
+                       { name : BitsStat for name in stats_fields } )
+
 # =========================================================================
 #  ctrlStructs.py
 # =========================================================================
@@ -160,7 +235,7 @@ def mk_MSHR_msg( p ):
       p.BitsAssoclog2(self.repl)
     )
 
-  req_cls = mk_bitstruct( cls_name, {
+  fields = {
     'type_':   p.BitsType,
     'opaque':  p.BitsOpaque,
     'addr':    p.BitsAddr,
@@ -169,7 +244,13 @@ def mk_MSHR_msg( p ):
     'repl':    p.BitsAssoclog2,
     'amo_hit': Bits1,
     'dirty_bits': p.BitsDirty
-  },
+  }
+  # Valid sectors of the line a sector miss refills
+  if p.sectors > 1:
+    cls_name += f"_{p.bitwidth_sec}"
+    fields['sec_bits'] = p.BitsSec
+
+  req_cls = mk_bitstruct( cls_name, fields,
   namespace = {
     '__str__' : req_to_str
   })
@@ -186,6 +267,15 @@ def mk_addr_struct( p ):
   return struct
 
 def mk_tag_array_struct( p ):
+  if p.sectors > 1:
+    # Sectored lines keep a valid bit per sector below the line valid bit
+    return mk_bitstruct( f"StructTagArray_{p.bitwidth_val}_{p.bitwidth_sec}_"
+                         f"{p.bitwidth_dirty}_{p.bitwidth_tag}", {
+      'val': p.BitsVal,
+      'sec': p.BitsSec,
+      'dty': p.BitsDirty,
+      'tag': p.BitsTag,
+    } )
   struct = mk_bitstruct( f"StructTagArray_{p.bitwidth_val}_{p.bitwidth_dirty}_{p.bitwidth_tag}", {
     'val': p.BitsVal,
     'dty': p.BitsDirty,  # n bits for cifer, 1 bit otherwise
@@ -39,6 +39,7 @@ UpdateTagArrayUnit_CMD_WR_REFILL = b3(3) # Refill on a write
 UpdateTagArrayUnit_CMD_RD_REFILL = b3(4) # Refill on a read
 UpdateTagArrayUnit_CMD_INV       = b3(5) # Invalidate this cache line
 UpdateTagArrayUnit_CMD_FLUSH     = b3(6) # Flush this cache line
+UpdateTagArrayUnit_CMD_INIT      = b3(7) # WRITE_INIT, same as a read refill
 
 #-------------------------------------------------------------------------
 # WriteBitEnGen
@@ -11,9 +11,10 @@ from mem_ifcs.MemMsg   import MemMsgType, mk_mem_msg
 from ..BlockingCacheFL import ModelCache
 from .GenericTestCases import GenericTestCases
 from .AmoTests         import AmoTests
+from .LrScTests        import LrScTests
 from .InvFlushTests    import InvFlushTests
 
-class CacheFL_Tests( GenericTestCases, InvFlushTests, AmoTests ):
+class CacheFL_Tests( GenericTestCases, InvFlushTests, AmoTests, LrScTests ):
   def run_test( s, msgs, mem, CacheReqType, CacheRespType, MemReqType, MemRespType,
                 associativity, cacheSize, stall_prob, latency, src_delay, 
                 sink_delay, cmdline_opts, trace ):
@@ -31,10 +32,14 @@ class CacheFL_Tests( GenericTestCases, InvFlushTests, AmoTests ):
         cache.init(trans.addr, trans.data, trans.opaque, trans.len)
       elif trans.type_ >= MemMsgType.AMO_ADD and trans.type_ <= MemMsgType.AMO_XOR:
         cache.amo(trans.addr, trans.data, trans.opaque, trans.len, trans.type_)
+      elif trans.type_ == MemMsgType.LR:
+        cache.load_reserved(trans.addr, trans.opaque, trans.len)
+      elif trans.type_ == MemMsgType.SC:
+        cache.store_conditional(trans.addr, trans.data, trans.opaque, trans.len)
       elif trans.type_ == MemMsgType.INV:
-        cache.invalidate(trans.opaque)
+        cache.invalidate(trans.opaque, trans.addr, trans.data)
       elif trans.type_ == MemMsgType.FLUSH:
-        cache.flush(trans.opaque)
+        cache.flush(trans.opaque, trans.addr, trans.data)
     resps = cache.get_transactions()[1::2]
     print("")
     for i in range(len(sink)):
@@ -7,28 +7,730 @@ Tests for Pipelined Blocking Cache RTL model
 Author : Xiaoyu Yan (xy97), Eric Tang (et396)
 Date   : 23 December 2019
 """
-from test.sim_utils     import run_sim, TestHarness
+import pytest
+import random
+
+from test.sim_utils     import ( run_sim, setup_sim, TestHarness, SingleCacheTestParams,
+                                 gen_req_resp, rand_mem )
+from mem_ifcs.MemMsg    import MemMsgType
 from ..BlockingCacheRTL import BlockingCacheRTL
-from .GenericTestCases  import GenericTestCases
+from .GenericTestCases  import GenericTestCases, gen_mem
 from .AmoTests          import AmoTests
+from .LrScTests         import LrScTests
 from .InvFlushTests     import InvFlushTests
 from .RandomTestCases   import RandomTests
 from .HypothesisTest    import HypothesisTests
 from .OtherCiferTests   import OtherCiferTests
+from .HitUnderMissTests import HitUnderMissTests, hum_mem
+from .SecondaryMissTests import SecondaryMissTests
+from .StoreBufferTests  import StoreBufferTests, buffered_write_resps
+
+# The expected responses with the hit bits the FL model gives for options
+# that change which requests hit
+
+model_options = ( 'policy', 'victim_entries', 'write_through', 'uncached_ranges',
+                  'amo_in_cache', 'sectors' )
+
+def model_hit_bits( msgs, mem, CacheReqType, CacheRespType, MemReqType, MemRespType,
+                    associativity, cacheSize, cache_args ):
+  model_args = { k: v for k, v in cache_args.items() if k in model_options }
+  model = gen_req_resp( msgs[::2], mem, CacheReqType, CacheRespType, MemReqType,
+                        MemRespType, associativity, cacheSize, **model_args )
+  return [ CacheRespType( resp.type_, resp.opaque, model_resp.test, resp.len, resp.data )
+           for resp, model_resp in zip( msgs[1::2], model[1::2] ) ]
+
+#-------------------------------------------------------------------------
+# CacheOptionTests
+#-------------------------------------------------------------------------
+# run_test for the classes that rerun the shared test cases with some
+# cache options set. Subclasses set cache_args to the options under test,
+# which the args of a test case add to or override. model_hits takes the
+# expected hit bits from the FL model, for options that change which
+# requests hit. mem_args configures the test memory, ordered tells whether
+# the responses must come back in order and python_only skips the tests
+# when translating to Verilog.
+
+class CacheOptionTests:
+
+  cache_args  = {}
+  mem_args    = None
+  model_hits  = False
+  ordered     = True
+  python_only = False
 
-class BlockingCacheRTL_Tests( GenericTestCases, InvFlushTests, AmoTests,
-                              HypothesisTests, RandomTests, OtherCiferTests ):
+  def option_args( s, associativity, nsets, line_nbits, data_nbits ):
+    return s.cache_args
+
+  def expected_resps( s, msgs, mem, CacheReqType, CacheRespType, MemReqType,
+                      MemRespType, associativity, cacheSize, cache_args ):
+    if s.model_hits:
+      return model_hit_bits( msgs, mem, CacheReqType, CacheRespType, MemReqType,
+                             MemRespType, associativity, cacheSize, cache_args )
+    return msgs[1::2]
 
   def run_test( s, msgs, mem, CacheReqType, CacheRespType, MemReqType, MemRespType,
                 associativity, cacheSize, stall_prob, latency, src_delay,
-                sink_delay, cmdline_opts, trace ):
+                sink_delay, cmdline_opts, trace, ordered=None, cache_args=None ):
 
-    th = TestHarness( msgs[::2], msgs[1::2], stall_prob, latency,
+    if s.python_only and cmdline_opts['test_verilog']:
+      pytest.skip( "options are Python simulation only" )
+    line_nbits = MemReqType.get_field_type( "data" ).nbits
+    data_nbits = CacheReqType.get_field_type( "data" ).nbits
+    nsets      = cacheSize * 8 // line_nbits // associativity
+    cache_args = { **s.option_args( associativity, nsets, line_nbits, data_nbits ),
+                   **(cache_args if cache_args else {}) }
+    ordered = s.ordered if ordered is None else ordered
+    resps = s.expected_resps( msgs, mem, CacheReqType, CacheRespType, MemReqType,
+                              MemRespType, associativity, cacheSize, cache_args )
+    th = TestHarness( msgs[::2], resps, stall_prob, latency,
                            src_delay, sink_delay, BlockingCacheRTL,
                            CacheReqType, CacheRespType, MemReqType,
-                           MemRespType, cacheSize, associativity )
+                           MemRespType, cacheSize, associativity, cache_args,
+                           ordered, s.mem_args )
     th.elaborate()
     if mem != None:
       th.load( mem[::2], mem[1::2] )
     sram_wrapper = True if cacheSize == 4096 else False
-    run_sim( th, cmdline_opts, trace, sram_wrapper )
+    return run_sim( th, cmdline_opts, trace, sram_wrapper )
+
+class BlockingCacheRTL_Tests( CacheOptionTests, GenericTestCases, InvFlushTests,
+                              AmoTests, LrScTests, HypothesisTests, RandomTests,
+                              OtherCiferTests ):
+
+  pass
+
+class BlockingCacheRTL_MultiMSHR_Tests( CacheOptionTests, GenericTestCases,
+                                        InvFlushTests, AmoTests, LrScTests,
+                                        RandomTests, HitUnderMissTests ):
+
+  cache_args = { 'mshr_entries': 4 }
+  ordered    = False
+
+class BlockingCacheRTL_MshrMerge_Tests( CacheOptionTests, GenericTestCases,
+                                        InvFlushTests, AmoTests, LrScTests,
+                                        RandomTests, HitUnderMissTests,
+                                        SecondaryMissTests ):
+
+  cache_args = { 'mshr_entries': 4, 'mshr_merge': True }
+  ordered    = False
+
+#-------------------------------------------------------------------------
+# Overlapping secondary misses
+#-------------------------------------------------------------------------
+# With mshr_merge, secondary misses no longer hold up the misses to other
+# sets behind them, so the cache finishes earlier with the same number of
+# MSHR entries.
+
+def test_secondary_miss_overlap( cmdline_opts, line_trace ):
+  msg = []
+  for i, base in enumerate([ 0x1000, 0x0010, 0x0020, 0x0030 ]):
+    msg += [
+      ( 'rd', 2*i,   base,     0, 0 ), ( 'rd', 2*i,   0, 0, base      ),
+      ( 'rd', 2*i+1, base + 4, 0, 0 ), ( 'rd', 2*i+1, 1, 0, base + 4  ),
+    ]
+  p = SingleCacheTestParams( msg, hum_mem + [ 0x00000014, 0x14, 0x00000034, 0x34 ],
+                             associativity=1, bitwidth_mem_data=128,
+                             bitwidth_cache_data=32, cache_size=64 )
+  cycles = []
+  for mshr_merge in [ False, True ]:
+    th = TestHarness( p.msg[::2], p.msg[1::2], 0, 10, 0, 0, BlockingCacheRTL,
+                      p.CacheReqType, p.CacheRespType, p.MemReqType,
+                      p.MemRespType, p.size, p.associativity,
+                      { 'mshr_entries': 4, 'mshr_merge': mshr_merge }, False )
+    th.elaborate()
+    th.load( p.mem[::2], p.mem[1::2] )
+    th = run_sim( th, cmdline_opts, line_trace, False )
+    cycles.append( th.sim_cycle_count() )
+  assert cycles[1] < cycles[0]
+
+class BlockingCacheRTL_StoreBuffer_Tests( CacheOptionTests, GenericTestCases,
+                                          InvFlushTests, AmoTests, RandomTests,
+                                          StoreBufferTests ):
+
+  cache_args = { 'store_buffer_entries': 4 }
+
+  def expected_resps( s, msgs, *args ):
+    return buffered_write_resps( msgs[1::2] )
+
+#-------------------------------------------------------------------------
+# Store buffer
+#-------------------------------------------------------------------------
+# Stores to the words of a clean line, two to each word. The cache stalls
+# a cycle for each clean write hit, while the buffer takes one store per
+# cycle and drains them in the background.
+
+def test_store_buffer_stream( cmdline_opts, line_trace ):
+  p = SingleCacheTestParams( False, gen_mem, associativity=1, bitwidth_mem_data=128,
+                             bitwidth_cache_data=32 )
+  reqs = [ p.CacheReqType( MemMsgType.READ, 0, 0x1000, 0, 0 ) ]
+  for i in range( 16 ):
+    addr = 0x1000 + 4 * ( ( i // 2 ) % 4 )
+    reqs.append( p.CacheReqType( MemMsgType.WRITE, i + 1, addr, 0, i ) )
+  p.msg = gen_req_resp( reqs, p.mem, p.CacheReqType, p.CacheRespType,
+                        p.MemReqType, p.MemRespType, p.associativity, p.size )
+  cycles = []
+  for entries in [ 0, 4 ]:
+    resps = buffered_write_resps( p.msg[1::2] ) if entries else p.msg[1::2]
+    th = TestHarness( p.msg[::2], resps, 0, 1, 0, 0, BlockingCacheRTL,
+                      p.CacheReqType, p.CacheRespType, p.MemReqType,
+                      p.MemRespType, p.size, p.associativity,
+                      { 'store_buffer_entries': entries } )
+    th.elaborate()
+    th.load( p.mem[::2], p.mem[1::2] )
+    th = setup_sim( th, cmdline_opts, False, line_trace )
+    # Cycle in which each response arrives
+    arrivals = []
+    while not th.done() and th.sim_cycle_count() < 200:
+      th.sim_tick()
+      if th.sink.idx > len( arrivals ):
+        arrivals.append( th.sim_cycle_count() )
+    assert th.done()
+    cycles.append( arrivals[-1] - arrivals[1] )
+  # With the buffer the stores respond in back to back cycles
+  assert cycles[1] == len( reqs ) - 2
+  assert cycles[1] < cycles[0]
+
+class BlockingCacheRTL_FastFlush_Tests( CacheOptionTests, GenericTestCases,
+                                        InvFlushTests, AmoTests, RandomTests ):
+
+  cache_args = { 'fast_flush': True }
+
+class BlockingCacheRTL_FlashInv_Tests( CacheOptionTests, GenericTestCases,
+                                       InvFlushTests, AmoTests, RandomTests ):
+
+  cache_args = { 'flash_inv': True }
+
+class BlockingCacheRTL_BehavioralSram_Tests( CacheOptionTests, GenericTestCases,
+                                             InvFlushTests, AmoTests, RandomTests ):
+
+  cache_args = { 'behavioral_sram': True }
+
+  # The behavioral SRAM model is not translatable
+  python_only = True
+
+class BlockingCacheRTL_EarlyReadHit_Tests( CacheOptionTests, GenericTestCases,
+                                           InvFlushTests, AmoTests, RandomTests ):
+
+  cache_args = { 'early_read_hit': True }
+
+#-------------------------------------------------------------------------
+# Early read hits
+#-------------------------------------------------------------------------
+# Reads after the first one to a line are answered from the line buffer a
+# cycle earlier. A write to the buffered line in between must invalidate
+# it.
+
+def test_early_read_hit_latency( cmdline_opts, line_trace ):
+  msg = [
+    #    type  opq  addr       len data                type  opq test len data
+    ( 'rd', 0x0, 0x00001000, 0, 0          ), ( 'rd', 0x0, 0, 0, 0x01020304 ),
+    ( 'rd', 0x1, 0x00001004, 0, 0          ), ( 'rd', 0x1, 1, 0, 0x05060708 ),
+    ( 'rd', 0x2, 0x00001008, 1, 0          ), ( 'rd', 0x2, 1, 1, 0x0000000c ),
+    ( 'rd', 0x3, 0x0000100c, 0, 0          ), ( 'rd', 0x3, 1, 0, 0x0d0e0f10 ),
+    ( 'wr', 0x4, 0x00001004, 0, 0xabcdef01 ), ( 'wr', 0x4, 1, 0, 0          ),
+    ( 'rd', 0x5, 0x00001004, 0, 0          ), ( 'rd', 0x5, 1, 0, 0xabcdef01 ),
+    ( 'rd', 0x6, 0x00001006, 2, 0          ), ( 'rd', 0x6, 1, 2, 0x0000abcd ),
+  ]
+  p = SingleCacheTestParams( msg, gen_mem, associativity=1, bitwidth_mem_data=128,
+                             bitwidth_cache_data=32 )
+  cycles = []
+  for early in [ False, True ]:
+    th = TestHarness( p.msg[::2], p.msg[1::2], 0, 1, 2, 0, BlockingCacheRTL,
+                      p.CacheReqType, p.CacheRespType, p.MemReqType,
+                      p.MemRespType, p.size, p.associativity,
+                      { 'early_read_hit': early } )
+    th.elaborate()
+    th.load( p.mem[::2], p.mem[1::2] )
+    th = run_sim( th, cmdline_opts, line_trace, False )
+    cycles.append( th.sim_cycle_count() )
+  assert cycles[1] < cycles[0]
+
+class BlockingCacheRTL_WayPred_Tests( CacheOptionTests, GenericTestCases,
+                                      InvFlushTests, AmoTests, LrScTests,
+                                      RandomTests ):
+
+  # Direct mapped caches have nothing to predict
+  def option_args( s, associativity, nsets, line_nbits, data_nbits ):
+    return { 'way_pred': associativity > 1 }
+
+class BlockingCacheRTL_Prefetch_Tests( CacheOptionTests, GenericTestCases,
+                                       InvFlushTests, AmoTests, RandomTests ):
+
+  cache_args = { 'prefetch_degree': 2 }
+
+#-------------------------------------------------------------------------
+# Prefetching
+#-------------------------------------------------------------------------
+# A sequential stream and a stream touching every third line, with writes
+# in between so that dirty lines are written back under the prefetcher.
+
+@pytest.mark.parametrize( "degree", [ 1, 2, 4 ] )
+def test_prefetch_stream( degree, cmdline_opts, line_trace ):
+  p = SingleCacheTestParams( False, None, associativity=2, bitwidth_mem_data=128,
+                             bitwidth_cache_data=32, cache_size=256 )
+  p.mem = rand_mem( 0, 0x7fc )
+  addrs  = list( range( 0, 0x400, 4 ) ) + list( range( 0x400, 0x800, 0x30 ) )
+  reqs = []
+  for i, addr in enumerate( addrs ):
+    if i % 7 == 6:
+      reqs.append( p.CacheReqType( MemMsgType.WRITE, i & 0xff, addr, 0, i ) )
+    else:
+      reqs.append( p.CacheReqType( MemMsgType.READ, i & 0xff, addr, 0, 0 ) )
+  p.msg = gen_req_resp( reqs, p.mem, p.CacheReqType, p.CacheRespType,
+                        p.MemReqType, p.MemRespType, p.associativity, p.size )
+  cycles = []
+  for prefetch_degree in [ 0, degree ]:
+    th = TestHarness( p.msg[::2], p.msg[1::2], 0, 10, 0, 0, BlockingCacheRTL,
+                      p.CacheReqType, p.CacheRespType, p.MemReqType,
+                      p.MemRespType, p.size, p.associativity,
+                      { 'prefetch_degree': prefetch_degree } )
+    th.elaborate()
+    th.load( p.mem[::2], p.mem[1::2] )
+    th = run_sim( th, cmdline_opts, line_trace, False )
+    cycles.append( th.sim_cycle_count() )
+  assert cycles[1] < cycles[0]
+
+class BlockingCacheRTL_CriticalWord_Tests( CacheOptionTests, GenericTestCases,
+                                           InvFlushTests, AmoTests, RandomTests ):
+
+  # Memory returns lines one word at a time, requested word first
+  cache_args = { 'critical_word_first': True }
+  mem_args   = { 'beat_nbits': 32 }
+
+#-------------------------------------------------------------------------
+# Critical word first
+#-------------------------------------------------------------------------
+# A read miss to the last word of its line. Memory sends the line in one
+# word beats; without critical word first the cache has to wait for the
+# whole line, which we model as a memory that takes the extra beats to
+# respond with it. We count the cycles until the response arrives.
+
+def test_critical_word_first_latency( cmdline_opts, line_trace ):
+  msg = [
+    #    type  opq  addr       len data                type  opq test len data
+    ( 'rd', 0x0, 0x0000100c, 0, 0          ), ( 'rd', 0x0, 0, 0, 0x0d0e0f10 ),
+    ( 'rd', 0x1, 0x00001000, 0, 0          ), ( 'rd', 0x1, 1, 0, 0x01020304 ),
+  ]
+  p = SingleCacheTestParams( msg, gen_mem, associativity=1, bitwidth_mem_data=128,
+                             bitwidth_cache_data=32 )
+  cycles = []
+  for cwf, latency, mem_args in [ ( False, 13, None ),
+                                  ( True,  10, { 'beat_nbits': 32 } ) ]:
+    th = TestHarness( p.msg[::2], p.msg[1::2], 0, latency, 0, 0, BlockingCacheRTL,
+                      p.CacheReqType, p.CacheRespType, p.MemReqType,
+                      p.MemRespType, p.size, p.associativity,
+                      { 'critical_word_first': cwf }, mem_args=mem_args )
+    th.elaborate()
+    th.load( p.mem[::2], p.mem[1::2] )
+    th = setup_sim( th, cmdline_opts, False, line_trace )
+    while th.sink.idx == 0 and th.sim_cycle_count() < 100:
+      th.sim_tick()
+    cycles.append( th.sim_cycle_count() )
+    while not th.done() and th.sim_cycle_count() < 100:
+      th.sim_tick()
+    assert th.done()
+  assert cycles[1] < cycles[0]
+
+class BlockingCacheRTL_Victim_Tests( CacheOptionTests, GenericTestCases,
+                                     InvFlushTests, AmoTests, RandomTests ):
+
+  # Misses refilled from the victim buffer come back with test 2
+  cache_args = { 'victim_entries': 2 }
+  model_hits = True
+
+#-------------------------------------------------------------------------
+# Victim buffer
+#-------------------------------------------------------------------------
+# 0x1000, 0x2000 and 0x3000 conflict in the direct mapped cache. Once
+# replaced, the clean and dirty lines ping-ponging between the cache and
+# the two victim buffer entries are refilled from the buffer (test 2)
+# until a third line pushes them out. INV empties the buffer.
+
+def test_victim_buffer_conflicts( cmdline_opts, line_trace ):
+  msg = [
+    #    type  opq  addr       len data                type  opq test len data
+    ( 'rd', 0x0, 0x00001000, 0, 0          ), ( 'rd', 0x0, 0, 0, 0x01020304 ),
+    ( 'wr', 0x1, 0x00002004, 0, 0xaa       ), ( 'wr', 0x1, 0, 0, 0          ),
+    ( 'rd', 0x2, 0x00001004, 0, 0          ), ( 'rd', 0x2, 2, 0, 0x05060708 ),
+    ( 'rd', 0x3, 0x00002004, 0, 0          ), ( 'rd', 0x3, 2, 0, 0xaa       ),
+    ( 'rd', 0x4, 0x00003000, 0, 0          ), ( 'rd', 0x4, 0, 0, 0          ),
+    ( 'rd', 0x5, 0x00002004, 0, 0          ), ( 'rd', 0x5, 2, 0, 0xaa       ), # 0x1000 out
+    ( 'rd', 0x6, 0x00003000, 0, 0          ), ( 'rd', 0x6, 2, 0, 0          ),
+    ( 'rd', 0x7, 0x00001000, 0, 0          ), ( 'rd', 0x7, 0, 0, 0x01020304 ),
+    ( 'inv',0x8, 0x00000000, 0, 0          ), ( 'inv',0x8, 0, 0, 0          ),
+    ( 'rd', 0x9, 0x00002004, 0, 0          ), ( 'rd', 0x9, 0, 0, 0xaa       ),
+  ]
+  p = SingleCacheTestParams( msg, gen_mem, associativity=1, bitwidth_mem_data=128,
+                             bitwidth_cache_data=32 )
+  for latency in [ 1, 10 ]:
+    th = TestHarness( p.msg[::2], p.msg[1::2], 0, latency, 0, 0, BlockingCacheRTL,
+                      p.CacheReqType, p.CacheRespType, p.MemReqType,
+                      p.MemRespType, p.size, p.associativity,
+                      { 'victim_entries': 2 } )
+    th.elaborate()
+    th.load( p.mem[::2], p.mem[1::2] )
+    run_sim( th, cmdline_opts, line_trace, False )
+
+class BlockingCacheRTL_WriteThrough_Tests( CacheOptionTests, GenericTestCases,
+                                           InvFlushTests, AmoTests, RandomTests ):
+
+  # Write misses do not allocate, so later accesses to the line miss
+  cache_args = { 'write_through': True }
+  model_hits = True
+
+#-------------------------------------------------------------------------
+# Write through
+#-------------------------------------------------------------------------
+# Write misses go straight to memory and write hits update both the line
+# and memory, so INV (which keeps dirty words) cannot lose any of them.
+
+def test_write_through( cmdline_opts, line_trace ):
+  msg = [
+    #    type  opq  addr       len data                type  opq test len data
+    ( 'wr', 0x0, 0x00001004, 0, 0xaa       ), ( 'wr', 0x0, 0, 0, 0          ), # no refill
+    ( 'rd', 0x1, 0x00001004, 0, 0          ), ( 'rd', 0x1, 0, 0, 0xaa       ),
+    ( 'wr', 0x2, 0x00001008, 0, 0xbb       ), ( 'wr', 0x2, 1, 0, 0          ),
+    ( 'wr', 0x3, 0x00001001, 1, 0xcc       ), ( 'wr', 0x3, 1, 1, 0          ), # subword
+    ( 'wr', 0x4, 0x00002000, 2, 0xdddd     ), ( 'wr', 0x4, 0, 2, 0          ),
+    ( 'inv',0x5, 0x00000000, 0, 0          ), ( 'inv',0x5, 0, 0, 0          ),
+    ( 'rd', 0x6, 0x00001008, 0, 0          ), ( 'rd', 0x6, 0, 0, 0xbb       ),
+    ( 'rd', 0x7, 0x00001000, 0, 0          ), ( 'rd', 0x7, 1, 0, 0x0102cc04 ),
+    ( 'rd', 0x8, 0x00002000, 0, 0          ), ( 'rd', 0x8, 0, 0, 0x00fadddd ),
+  ]
+  p = SingleCacheTestParams( msg, gen_mem, associativity=1, bitwidth_mem_data=128,
+                             bitwidth_cache_data=32 )
+  for latency in [ 1, 10 ]:
+    th = TestHarness( p.msg[::2], p.msg[1::2], 0, latency, 0, 0, BlockingCacheRTL,
+                      p.CacheReqType, p.CacheRespType, p.MemReqType,
+                      p.MemRespType, p.size, p.associativity,
+                      { 'write_through': True } )
+    th.elaborate()
+    th.load( p.mem[::2], p.mem[1::2] )
+    run_sim( th, cmdline_opts, line_trace, False )
+
+# A stream of writes to lines that are not in the cache, as when writing
+# out a buffer. Write back write allocate refills every line first.
+
+def test_write_through_stream( cmdline_opts, line_trace ):
+  p = SingleCacheTestParams( False, None, associativity=2, bitwidth_mem_data=128,
+                             bitwidth_cache_data=32, cache_size=256 )
+  p.mem = rand_mem( 0, 0x3fc )
+  reqs = [ p.CacheReqType( MemMsgType.WRITE, i & 0xff, 4*i, 0, i ) for i in range( 0x100 ) ]
+  cycles = []
+  for write_through in [ False, True ]:
+    p.msg = gen_req_resp( reqs, p.mem, p.CacheReqType, p.CacheRespType, p.MemReqType,
+                          p.MemRespType, p.associativity, p.size,
+                          write_through=write_through )
+    th = TestHarness( p.msg[::2], p.msg[1::2], 0, 10, 0, 0, BlockingCacheRTL,
+                      p.CacheReqType, p.CacheRespType, p.MemReqType,
+                      p.MemRespType, p.size, p.associativity,
+                      { 'write_through': write_through } )
+    th.elaborate()
+    th.load( p.mem[::2], p.mem[1::2] )
+    th = run_sim( th, cmdline_opts, line_trace, False )
+    cycles.append( th.sim_cycle_count() )
+  assert cycles[1] < cycles[0]
+
+#-------------------------------------------------------------------------
+# AMOs in the cache
+#-------------------------------------------------------------------------
+# AMOs that hit are done on the line, so the line stays in the cache and
+# later accesses to it hit
+
+class BlockingCacheRTL_AmoInCache_Tests( CacheOptionTests, GenericTestCases,
+                                         InvFlushTests, AmoTests, RandomTests ):
+
+  cache_args = { 'amo_in_cache': True }
+  model_hits = True
+
+def test_amo_in_cache( cmdline_opts, line_trace ):
+  msg = [
+    #    type  opq  addr       len data                type  opq test len data
+    ( 'rd', 0x0, 0x00001000, 0, 0          ), ( 'rd', 0x0, 0, 0, 0x01020304 ),
+    ( 'ad', 0x1, 0x00001000, 0, 0x1        ), ( 'ad', 0x1, 1, 0, 0x01020304 ),
+    ( 'rd', 0x2, 0x00001000, 0, 0          ), ( 'rd', 0x2, 1, 0, 0x01020305 ),
+    ( 'an', 0x3, 0x00001004, 0, 0xff       ), ( 'an', 0x3, 1, 0, 0x05060708 ),
+    ( 'mi', 0x4, 0x00001008, 0, 0xffffffff ), ( 'mi', 0x4, 1, 0, 0x090a0b0c ),
+    ( 'xu', 0x5, 0x0000100c, 0, 0xffffffff ), ( 'xu', 0x5, 1, 0, 0x0d0e0f10 ),
+    ( 'rd', 0x6, 0x00001004, 0, 0          ), ( 'rd', 0x6, 1, 0, 0x08       ),
+    ( 'rd', 0x7, 0x00001008, 0, 0          ), ( 'rd', 0x7, 1, 0, 0xffffffff ),
+    ( 'rd', 0x8, 0x0000100c, 0, 0          ), ( 'rd', 0x8, 1, 0, 0xffffffff ),
+    ( 'sw', 0x9, 0x00002000, 0, 0xaa       ), ( 'sw', 0x9, 0, 0, 0x00facade ), # miss
+    ( 'rd', 0xa, 0x00002000, 0, 0          ), ( 'rd', 0xa, 0, 0, 0xaa       ),
+  ]
+  p = SingleCacheTestParams( msg, gen_mem, associativity=2, bitwidth_mem_data=128,
+                             bitwidth_cache_data=32 )
+  for latency in [ 1, 10 ]:
+    th = TestHarness( p.msg[::2], p.msg[1::2], 0, latency, 0, 0, BlockingCacheRTL,
+                      p.CacheReqType, p.CacheRespType, p.MemReqType,
+                      p.MemRespType, p.size, p.associativity,
+                      { 'amo_in_cache': True } )
+    th.elaborate()
+    th.load( p.mem[::2], p.mem[1::2] )
+    run_sim( th, cmdline_opts, line_trace, False )
+
+# A loop of AMOs to a few counters read into the cache first. Sending each
+# AMO to memory takes the line out of the cache, so every AMO misses.
+
+def test_amo_in_cache_counters( cmdline_opts, line_trace ):
+  p = SingleCacheTestParams( False, None, associativity=2, bitwidth_mem_data=128,
+                             bitwidth_cache_data=32, cache_size=256 )
+  p.mem = rand_mem( 0, 0x3fc )
+  reqs  = [ p.CacheReqType( MemMsgType.READ, i, 0x40*i, 0, 0 ) for i in range( 4 ) ]
+  reqs += [ p.CacheReqType( MemMsgType.AMO_ADD, i & 0xff, 0x40*(i % 4), 0, 1 )
+            for i in range( 4, 0x44 ) ]
+  cycles = []
+  for amo_in_cache in [ False, True ]:
+    p.msg = gen_req_resp( reqs, p.mem, p.CacheReqType, p.CacheRespType, p.MemReqType,
+                          p.MemRespType, p.associativity, p.size,
+                          amo_in_cache=amo_in_cache )
+    th = TestHarness( p.msg[::2], p.msg[1::2], 0, 10, 0, 0, BlockingCacheRTL,
+                      p.CacheReqType, p.CacheRespType, p.MemReqType,
+                      p.MemRespType, p.size, p.associativity,
+                      { 'amo_in_cache': amo_in_cache } )
+    th.elaborate()
+    th.load( p.mem[::2], p.mem[1::2] )
+    th = run_sim( th, cmdline_opts, line_trace, False )
+    cycles.append( th.sim_cycle_count() )
+  assert cycles[1] < cycles[0]
+
+#-------------------------------------------------------------------------
+# LR and SC
+#-------------------------------------------------------------------------
+# Incrementing a shared counter with an LR/SC pair stays in the cache once
+# the line is there, while an AMO to memory writes back and refills it
+# every time.
+
+def test_lr_sc_counter( cmdline_opts, line_trace ):
+  p = SingleCacheTestParams( False, None, associativity=2, bitwidth_mem_data=128,
+                             bitwidth_cache_data=32, cache_size=256 )
+  p.mem = rand_mem( 0, 0x3fc )
+  lr_sc = []
+  for i in range( 0x10 ):
+    lr_sc += [ p.CacheReqType( MemMsgType.LR, 2*i,   0x40, 0, 0 ),
+               p.CacheReqType( MemMsgType.SC, 2*i+1, 0x40, 0, i ) ]
+  amo = [ p.CacheReqType( MemMsgType.AMO_ADD, i, 0x40, 0, 1 ) for i in range( 0x10 ) ]
+  cycles = []
+  for reqs in [ amo, lr_sc ]:
+    p.msg = gen_req_resp( reqs, p.mem, p.CacheReqType, p.CacheRespType, p.MemReqType,
+                          p.MemRespType, p.associativity, p.size )
+    th = TestHarness( p.msg[::2], p.msg[1::2], 0, 10, 0, 0, BlockingCacheRTL,
+                      p.CacheReqType, p.CacheRespType, p.MemReqType,
+                      p.MemRespType, p.size, p.associativity )
+    th.elaborate()
+    th.load( p.mem[::2], p.mem[1::2] )
+    th = run_sim( th, cmdline_opts, line_trace, False )
+    cycles.append( th.sim_cycle_count() )
+  assert cycles[1] < cycles[0]
+
+#-------------------------------------------------------------------------
+# Uncached accesses
+#-------------------------------------------------------------------------
+# The generic tests fill the cache with WRITE_INIT, which does not bypass
+# it, so only the tests without init run with uncached ranges
+
+class BlockingCacheRTL_Uncached_Tests( CacheOptionTests, InvFlushTests, AmoTests,
+                                       RandomTests ):
+
+  cache_args = { 'uncached_ranges': [ ( 0x0, 0x10 ), ( 0x800, 0x400 ) ] }
+  model_hits = True
+
+# 0x2000 is uncached and maps to the same set as 0x1000 in the direct
+# mapped cache, which it never replaces
+
+def test_uncached( cmdline_opts, line_trace ):
+  msg = [
+    #    type  opq  addr       len data                type  opq test len data
+    ( 'rd', 0x0, 0x00001000, 0, 0          ), ( 'rd', 0x0, 0, 0, 0x01020304 ),
+    ( 'rd', 0x1, 0x00002000, 0, 0          ), ( 'rd', 0x1, 0, 0, 0x00facade ),
+    ( 'rd', 0x2, 0x00001004, 0, 0          ), ( 'rd', 0x2, 1, 0, 0x05060708 ),
+    ( 'rd', 0x3, 0x00002002, 1, 0          ), ( 'rd', 0x3, 0, 1, 0xfa       ),
+    ( 'wr', 0x4, 0x00002004, 0, 0xaa       ), ( 'wr', 0x4, 0, 0, 0          ),
+    ( 'wr', 0x5, 0x00002005, 1, 0xbb       ), ( 'wr', 0x5, 0, 1, 0          ),
+    ( 'rd', 0x6, 0x00002004, 0, 0          ), ( 'rd', 0x6, 0, 0, 0x0000bbaa ),
+    ( 'wr', 0x7, 0x00001008, 0, 0xcc       ), ( 'wr', 0x7, 1, 0, 0          ),
+    ( 'rd', 0x8, 0x00002004, 2, 0          ), ( 'rd', 0x8, 0, 2, 0xbbaa     ),
+    ( 'rd', 0x9, 0x00001008, 0, 0          ), ( 'rd', 0x9, 1, 0, 0xcc       ),
+    ( 'ad', 0xa, 0x00002000, 0, 0x1        ), ( 'ad', 0xa, 0, 0, 0x00facade ),
+    ( 'rd', 0xb, 0x00002000, 0, 0          ), ( 'rd', 0xb, 0, 0, 0x00facadf ),
+  ]
+  p = SingleCacheTestParams( msg, gen_mem, associativity=1, bitwidth_mem_data=128,
+                             bitwidth_cache_data=32 )
+  for latency in [ 1, 10 ]:
+    th = TestHarness( p.msg[::2], p.msg[1::2], 0, latency, 0, 0, BlockingCacheRTL,
+                      p.CacheReqType, p.CacheRespType, p.MemReqType,
+                      p.MemRespType, p.size, p.associativity,
+                      { 'uncached_ranges': [ ( 0x2000, 0x1000 ) ] } )
+    th.elaborate()
+    th.load( p.mem[::2], p.mem[1::2] )
+    run_sim( th, cmdline_opts, line_trace, False )
+
+#-------------------------------------------------------------------------
+# Range INV and FLUSH
+#-------------------------------------------------------------------------
+# Handing a 64B buffer over after writing it: flushing and invalidating
+# just the buffer walks 4 of the 128 sets, so it finishes well before
+# flushing and invalidating the whole cache
+
+def test_inv_flush_range_handoff( cmdline_opts, line_trace ):
+  p = SingleCacheTestParams( False, None, associativity=2, bitwidth_mem_data=128,
+                             bitwidth_cache_data=32, cache_size=4096 )
+  p.mem = rand_mem( 0, 0x3fc )
+  cycles = []
+  for nbytes in [ 0, 0x40 ]:
+    reqs  = [ p.CacheReqType( MemMsgType.WRITE, i, 0x200 + 4*i, 0, i ) for i in range( 0x10 ) ]
+    reqs += [ p.CacheReqType( MemMsgType.FLUSH, 0x10, 0x200, 0, nbytes ),
+              p.CacheReqType( MemMsgType.INV,   0x11, 0x200, 0, nbytes ) ]
+    p.msg = gen_req_resp( reqs, p.mem, p.CacheReqType, p.CacheRespType, p.MemReqType,
+                          p.MemRespType, p.associativity, p.size )
+    th = TestHarness( p.msg[::2], p.msg[1::2], 0, 1, 0, 0, BlockingCacheRTL,
+                      p.CacheReqType, p.CacheRespType, p.MemReqType,
+                      p.MemRespType, p.size, p.associativity )
+    th.elaborate()
+    th.load( p.mem[::2], p.mem[1::2] )
+    th = run_sim( th, cmdline_opts, line_trace, False )
+    cycles.append( th.sim_cycle_count() )
+  assert cycles[1] < cycles[0]
+
+#-------------------------------------------------------------------------
+# Dirty bits in flip-flops
+#-------------------------------------------------------------------------
+# Write hits to clean words set the dirty bits from M1 instead of taking a
+# second pass through M0
+
+class BlockingCacheRTL_DirtyBitsReg_Tests( CacheOptionTests, GenericTestCases,
+                                           InvFlushTests, AmoTests, LrScTests,
+                                           RandomTests, OtherCiferTests ):
+
+  cache_args = { 'dirty_bits_reg': True }
+
+class BlockingCacheRTL_DirtyBitsRegFastFlush_Tests( CacheOptionTests, InvFlushTests,
+                                                    RandomTests ):
+
+  cache_args = { 'dirty_bits_reg': True, 'fast_flush': True }
+
+# Random reads and writes to 1KB that fits in the cache, half of them
+# writes. Without the option, every write hit to a clean word stalls the
+# next request for a cycle.
+
+def random_writes_cycles( cmdline_opts, line_trace, cache_args_list ):
+  p = SingleCacheTestParams( False, None, associativity=2, bitwidth_mem_data=128,
+                             bitwidth_cache_data=32, cache_size=4096 )
+  p.mem = rand_mem( 0, 0x3fc )
+  rng   = random.Random( 0xdeadbeef )
+  reqs  = [ p.CacheReqType( rng.choice( [ MemMsgType.READ, MemMsgType.WRITE ] ),
+                            i & 0xff, 4*rng.randrange( 0x100 ), 0,
+                            rng.randrange( 0x100000000 ) ) for i in range( 0x200 ) ]
+  p.msg = gen_req_resp( reqs, p.mem, p.CacheReqType, p.CacheRespType, p.MemReqType,
+                        p.MemRespType, p.associativity, p.size )
+  cycles = []
+  for cache_args in cache_args_list:
+    th = TestHarness( p.msg[::2], p.msg[1::2], 0, 1, 0, 0, BlockingCacheRTL,
+                      p.CacheReqType, p.CacheRespType, p.MemReqType,
+                      p.MemRespType, p.size, p.associativity, cache_args )
+    th.elaborate()
+    th.load( p.mem[::2], p.mem[1::2] )
+    th = run_sim( th, cmdline_opts, line_trace, False )
+    cycles.append( th.sim_cycle_count() )
+  return cycles
+
+def test_dirty_bits_reg_random_writes( cmdline_opts, line_trace ):
+  cycles = random_writes_cycles( cmdline_opts, line_trace,
+                                 [ {}, { 'dirty_bits_reg': True } ] )
+  assert cycles[1] < cycles[0]
+
+#-------------------------------------------------------------------------
+# Banked data array
+#-------------------------------------------------------------------------
+# Four banks, or as many as the sets allow on the small caches
+
+class BlockingCacheRTL_DataBanks_Tests( CacheOptionTests, GenericTestCases,
+                                        InvFlushTests, AmoTests, RandomTests,
+                                        OtherCiferTests ):
+
+  def option_args( s, associativity, nsets, line_nbits, data_nbits ):
+    return { 'data_banks': min( 4, nsets // 2 ) }
+
+#-------------------------------------------------------------------------
+# Sectored lines
+#-------------------------------------------------------------------------
+# Up to four sectors of at least 64 bits. Misses on another sector of a
+# line hit in the whole-line cache, so the hit bits come from the model.
+
+class BlockingCacheRTL_Sectors_Tests( CacheOptionTests, GenericTestCases,
+                                      InvFlushTests, AmoTests, LrScTests,
+                                      RandomTests, OtherCiferTests ):
+
+  model_hits = True
+
+  def option_args( s, associativity, nsets, line_nbits, data_nbits ):
+    return { 'sectors': min( 4, line_nbits // max( 64, data_nbits ) ) }
+
+class BlockingCacheRTL_SectorsAmoInCache_Tests( CacheOptionTests, AmoTests,
+                                                RandomTests ):
+
+  model_hits = True
+
+  def option_args( s, associativity, nsets, line_nbits, data_nbits ):
+    return { 'sectors': min( 4, line_nbits // max( 64, data_nbits ) ),
+             'amo_in_cache': True }
+
+# Reading one word of each of 16 lines asks memory for a quarter of the
+# bytes with four sectors, and reading the rest of the lines then refills
+# the other sectors in place
+
+def test_sectors_refill_bytes( cmdline_opts, line_trace ):
+  p = SingleCacheTestParams( False, None, associativity=2, bitwidth_mem_data=256,
+                             bitwidth_cache_data=32, cache_size=4096 )
+  p.mem = rand_mem( 0, 0x1fc )
+  line_nbytes = 256 // 8
+  addrs = [ line_nbytes*i for i in range( 16 ) ]
+  addrs = addrs + [ addr + 4*j for addr in addrs for j in range( 1, 8 ) ]
+  reqs  = [ p.CacheReqType( MemMsgType.READ, i & 0xff, addr, 0, 0 )
+            for i, addr in enumerate( addrs ) ]
+  nbytes = []
+  for sectors in [ 1, 4 ]:
+    p.msg = gen_req_resp( reqs, p.mem, p.CacheReqType, p.CacheRespType, p.MemReqType,
+                          p.MemRespType, p.associativity, p.size, sectors=sectors )
+    th = TestHarness( p.msg[::2], p.msg[1::2], 0, 1, 0, 0, BlockingCacheRTL,
+                      p.CacheReqType, p.CacheRespType, p.MemReqType,
+                      p.MemRespType, p.size, p.associativity, { 'sectors': sectors } )
+    th.elaborate()
+    th.load( p.mem[::2], p.mem[1::2] )
+    th = setup_sim( th, cmdline_opts, False, line_trace )
+    # Bytes read from memory by the first 16 reads and by all of them
+    first_nbytes = None
+    read_nbytes  = 0
+    memreq = th.cache.mem_master_ifc.req
+    while not th.done() and th.sim_cycle_count() < 2000:
+      if memreq.en and memreq.msg.type_ == MemMsgType.READ:
+        read_nbytes += int( memreq.msg.len ) or line_nbytes
+      th.sim_tick()
+      if first_nbytes is None and th.sink.idx == 16:
+        first_nbytes = read_nbytes
+    assert th.done()
+    nbytes.append( ( first_nbytes, read_nbytes ) )
+  assert nbytes[1][0] * 4 == nbytes[0][0]
+  assert nbytes[1][1] == nbytes[0][1]
+
+#-------------------------------------------------------------------------
+# 1R1W tag arrays
+#-------------------------------------------------------------------------
+# Write hits to clean words set the dirty bits through the write port of
+# the tag arrays while the next request reads them
+
+class BlockingCacheRTL_Tag1R1W_Tests( CacheOptionTests, GenericTestCases,
+                                      InvFlushTests, AmoTests, LrScTests,
+                                      RandomTests, OtherCiferTests ):
+
+  cache_args = { 'tag_1r1w': True }
+
+class BlockingCacheRTL_Tag1R1WFastFlush_Tests( CacheOptionTests, InvFlushTests,
+                                               RandomTests ):
+
+  cache_args = { 'tag_1r1w': True, 'fast_flush': True }
+
+def test_tag_1r1w_random_writes( cmdline_opts, line_trace ):
+  cycles = random_writes_cycles( cmdline_opts, line_trace,
+                                 [ {}, { 'tag_1r1w': True } ] )
+  assert cycles[1] < cycles[0]
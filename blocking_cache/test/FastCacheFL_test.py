@@ -0,0 +1,97 @@
+"""
+=========================================================================
+ FastCacheFL_test.py
+=========================================================================
+Checks that the fast FL hit/miss model agrees with HitMissTracker
+
+Date   : 18 October 2026
+"""
+
+import random
+import pytest
+
+from pymtl3 import *
+from mem_ifcs.MemMsg import MemMsgType
+
+from ..BlockingCacheFL import HitMissTracker
+from ..FastCacheFL     import FastHitMissTracker
+
+def random_trace( rng, size, num_trans ):
+  type_choices = [ (MemMsgType.READ,       0.45),
+                   (MemMsgType.WRITE,      0.40),
+                   (MemMsgType.WRITE_INIT, 0.05),
+                   (MemMsgType.AMO_ADD,    0.05),
+                   (MemMsgType.INV,        0.02),
+                   (MemMsgType.FLUSH,      0.03),
+                   ]
+  types = rng.choices(
+      population = [ choices for choices,weights in type_choices ],
+      weights = [ weights for choices,weights in type_choices ],
+      k = num_trans )
+  addrs = [ rng.randint( 0, size * 3 ) & 0xfffffffc for _ in range( num_trans ) ]
+  # INV and FLUSH cover a random range half of the time
+  nbytes = [ rng.choice( [ 0, rng.randint( 1, size ) ] ) for _ in range( num_trans ) ]
+  return addrs, types, nbytes
+
+def reference_hits( tracker, addrs, types, nbytes ):
+  hits = []
+  victim_hits = []
+  for addr, type_, nbytes_ in zip( addrs, types, nbytes ):
+    hit = False
+    tracker.victim_hit = False
+    if type_ in ( MemMsgType.READ, MemMsgType.WRITE, MemMsgType.WRITE_INIT ):
+      hit = tracker.access_address( addr, type_ == MemMsgType.WRITE,
+                                    type_ == MemMsgType.WRITE_INIT )
+    elif type_ >= MemMsgType.AMO_ADD and type_ <= MemMsgType.AMO_XOR:
+      hit = tracker.amo_req( addr )
+    elif type_ == MemMsgType.INV:
+      tracker.invalidate( addr, nbytes_ )
+    elif type_ == MemMsgType.FLUSH:
+      tracker.flush( addr, nbytes_ )
+    hits.append( hit )
+    victim_hits.append( tracker.victim_hit )
+  return hits, victim_hits
+
+@pytest.mark.parametrize(
+  " size, nways, linesize, policy, args", [
+  ( 64,   1,     128,      'lru',   {}                                 ),
+  ( 128,  2,     128,      'lru',   {}                                 ),
+  ( 128,  2,     64,       'plru',  {}                                 ),
+  ( 256,  4,     128,      'lru',   {}                                 ),
+  ( 256,  4,     128,      'plru',  {}                                 ),
+  ( 512,  8,     128,      'lru',   {}                                 ),
+  ( 512,  8,     128,      'plru',  {}                                 ),
+  ( 4096, 2,     128,      'lru',   {}                                 ),
+  ( 64,   1,     128,      'lru',   {'victim_entries':2}               ),
+  ( 256,  4,     128,      'plru',  {'victim_entries':4}               ),
+  ( 128,  2,     128,      'lru',   {'write_through':True}             ),
+  ( 128,  2,     128,      'lru',   {'uncached_ranges':[(0x80,0x40)]}  ),
+  ( 256,  4,     128,      'plru',  {'amo_in_cache':True}              ),
+  ( 512,  2,     128,      'lru',   {'data_banks':4}                   ),
+  ( 256,  2,     256,      'lru',   {'sectors':4}                      ),
+  ( 256,  4,     128,      'plru',  {'sectors':2, 'amo_in_cache':True} ),
+])
+def test_fast_tracker_random( size, nways, linesize, policy, args ):
+  rng = random.Random( 0xdeadbeef )
+  addrs, types, nbytes = random_trace( rng, size, 2000 )
+  ref  = HitMissTracker( size*8, nways, 0, linesize, policy, **args )
+  fast = FastHitMissTracker( size*8, nways, 0, linesize, policy, **args )
+  expected, expected_victim = reference_hits( ref, addrs, types, nbytes )
+  # Replay in two batches to check that the state carries over
+  hits = list( fast.access_many( addrs[:1000], types[:1000], nbytes[:1000] ) )
+  victim_hits = list( fast.victim_hits )
+  hits += list( fast.access_many( addrs[1000:], types[1000:], nbytes[1000:] ) )
+  victim_hits += list( fast.victim_hits )
+  assert hits == expected
+  assert victim_hits == expected_victim
+  assert list( fast.bank_accesses ) == ref.bank_accesses
+
+def test_fast_tracker_reads():
+  fast = FastHitMissTracker( 128*8, 2, 0, 128 )
+  hits = fast.access_many( [ 0x0, 0x4, 0x40, 0x0, 0x80, 0x0, 0x40 ] )
+  assert list( hits ) == [ False, True, False, True, False, True, False ]
+  assert fast.access_address( 0x0 )
+  fast.invalidate( 0x10, 4 )
+  assert fast.access_address( 0x0 )
+  fast.invalidate()
+  assert not fast.access_address( 0x0 )
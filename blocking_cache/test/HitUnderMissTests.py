@@ -0,0 +1,157 @@
+"""
+=========================================================================
+ HitUnderMissTests.py
+=========================================================================
+Directed tests for caches with more than one MSHR entry, where hits (and
+misses to other sets) are served while a miss is outstanding
+
+Date   : 18 October 2026
+"""
+
+import pytest
+from test.sim_utils import SingleCacheTestParams
+
+hum_mem = [
+  0x00000000, 0x00,
+  0x00000004, 0x04,
+  0x00000010, 0x10,
+  0x00000014, 0x14,
+  0x00000020, 0x20,
+  0x00000024, 0x24,
+  0x00000030, 0x30,
+  0x00000034, 0x34,
+  0x00001000, 0x1000,
+  0x00001004, 0x1004,
+  0x00002000, 0x2000,
+  0x00002004, 0x2004,
+  0x00002020, 0x2020,
+  0x00002024, 0x2024,
+]
+
+#-------------------------------------------------------------------------
+# Test cases
+#-------------------------------------------------------------------------
+# Responses are listed in the order they are expected to come back
+
+def hit_under_miss():
+  msg = [
+    #    type  opq  addr       len data                type  opq test len data
+    ( 'in', 0x0, 0x00000010, 0, 0xcafe ), ( 'in', 0x0, 0,   0, 0      ),
+    ( 'rd', 0x1, 0x00001000, 0, 0      ), ( 'rd', 0x2, 1,   0, 0xcafe ), # hit goes first
+    ( 'rd', 0x2, 0x00000010, 0, 0      ), ( 'rd', 0x1, 0,   0, 0x1000 ),
+  ]
+  return SingleCacheTestParams( msg, hum_mem, associativity=1, bitwidth_mem_data=128,
+                                bitwidth_cache_data=32, cache_size=64 )
+
+def miss_under_miss():
+  msg = [
+    #    type  opq  addr       len data                type  opq test len data
+    ( 'rd', 0x1, 0x00001000, 0, 0      ), ( 'rd', 0x1, 0,   0, 0x1000 ),
+    ( 'rd', 0x2, 0x00000020, 0, 0      ), ( 'rd', 0x2, 0,   0, 0x20   ), # other set
+    ( 'rd', 0x3, 0x00000034, 0, 0      ), ( 'rd', 0x3, 0,   0, 0x34   ), # other set
+    ( 'rd', 0x4, 0x00002004, 0, 0      ), ( 'rd', 0x4, 0,   0, 0x2004 ), # same set as 0x1000
+    ( 'rd', 0x5, 0x00000024, 0, 0      ), ( 'rd', 0x5, 1,   0, 0x24   ),
+  ]
+  return SingleCacheTestParams( msg, hum_mem, associativity=1, bitwidth_mem_data=128,
+                                bitwidth_cache_data=32, cache_size=64 )
+
+def same_line_under_miss():
+  msg = [
+    #    type  opq  addr       len data                type  opq test len data
+    ( 'rd', 0x1, 0x00001000, 0, 0      ), ( 'rd', 0x1, 0,   0, 0x1000 ),
+    ( 'wr', 0x2, 0x00001004, 0, 0xbeef ), ( 'wr', 0x2, 1,   0, 0      ), # waits for refill
+    ( 'rd', 0x3, 0x00001004, 0, 0      ), ( 'rd', 0x3, 1,   0, 0xbeef ),
+  ]
+  return SingleCacheTestParams( msg, hum_mem, associativity=1, bitwidth_mem_data=128,
+                                bitwidth_cache_data=32, cache_size=64 )
+
+def wr_hit_under_miss():
+  msg = [
+    #    type  opq  addr       len data                type  opq test len data
+    ( 'in', 0x0, 0x00000010, 0, 0x10   ), ( 'in', 0x0, 0,   0, 0      ),
+    ( 'rd', 0x1, 0x00001000, 0, 0      ), ( 'wr', 0x2, 1,   0, 0      ),
+    ( 'wr', 0x2, 0x00000010, 0, 0xaa   ), ( 'wr', 0x3, 1,   0, 0      ), # hit clean
+    ( 'wr', 0x3, 0x00000014, 0, 0xbb   ), ( 'rd', 0x4, 1,   0, 0xaa   ), # hit clean
+    ( 'rd', 0x4, 0x00000010, 0, 0      ), ( 'rd', 0x1, 0,   0, 0x1000 ),
+    ( 'rd', 0x5, 0x00000014, 0, 0      ), ( 'rd', 0x5, 1,   0, 0xbb   ),
+  ]
+  return SingleCacheTestParams( msg, hum_mem, associativity=1, bitwidth_mem_data=128,
+                                bitwidth_cache_data=32, cache_size=64 )
+
+def evict_under_miss():
+  msg = [
+    #    type  opq  addr       len data                type  opq test len data
+    ( 'wr', 0x1, 0x00000020, 0, 0x99   ), ( 'wr', 0x1, 0,   0, 0      ), # dirty line
+    ( 'rd', 0x2, 0x00001000, 0, 0      ), ( 'rd', 0x2, 0,   0, 0x1000 ),
+    ( 'rd', 0x3, 0x00002020, 0, 0      ), ( 'rd', 0x3, 0,   0, 0x2020 ), # evicts 0x20
+    ( 'rd', 0x4, 0x00000020, 0, 0      ), ( 'rd', 0x4, 0,   0, 0x99   ),
+  ]
+  return SingleCacheTestParams( msg, hum_mem, associativity=1, bitwidth_mem_data=128,
+                                bitwidth_cache_data=32, cache_size=64 )
+
+def others_under_miss():
+  msg = [
+    #    type   opq  addr       len data               type   opq test len data
+    ( 'in',  0x0, 0x00000010, 0, 0x10 ), ( 'in',  0x0, 0,   0, 0      ),
+    ( 'rd',  0x1, 0x00001000, 0, 0    ), ( 'rd',  0x1, 0,   0, 0x1000 ),
+    ( 'ad',  0x2, 0x00000010, 0, 0x1  ), ( 'ad',  0x2, 0,   0, 0x10   ), # waits in MSHR
+    ( 'rd',  0x3, 0x00002000, 0, 0    ), ( 'rd',  0x3, 0,   0, 0x2000 ),
+    ( 'inv', 0x4, 0x00000000, 0, 0    ), ( 'inv', 0x4, 0,   0, 0      ),
+    ( 'rd',  0x5, 0x00000020, 0, 0    ), ( 'rd',  0x5, 0,   0, 0x20   ),
+    ( 'fl',  0x6, 0x00000000, 0, 0    ), ( 'fl',  0x6, 0,   0, 0      ),
+    ( 'rd',  0x7, 0x00000010, 0, 0    ), ( 'rd',  0x7, 0,   0, 0x11   ),
+  ]
+  return SingleCacheTestParams( msg, hum_mem, associativity=1, bitwidth_mem_data=128,
+                                bitwidth_cache_data=32, cache_size=64 )
+
+def asso_under_miss():
+  msg = [
+    #    type  opq  addr       len data                type  opq test len data
+    ( 'rd', 0x1, 0x00001000, 0, 0      ), ( 'rd', 0x1, 0,   0, 0x1000 ),
+    ( 'rd', 0x2, 0x00002000, 0, 0      ), ( 'rd', 0x2, 0,   0, 0x2000 ), # same set
+    ( 'rd', 0x3, 0x00000010, 0, 0      ), ( 'rd', 0x3, 0,   0, 0x10   ),
+    ( 'rd', 0x4, 0x00001004, 0, 0      ), ( 'rd', 0x4, 1,   0, 0x1004 ),
+    ( 'rd', 0x5, 0x00002004, 0, 0      ), ( 'rd', 0x5, 1,   0, 0x2004 ),
+  ]
+  return SingleCacheTestParams( msg, hum_mem, associativity=2, bitwidth_mem_data=128,
+                                bitwidth_cache_data=32, cache_size=128 )
+
+#-------------------------------------------------------------------------
+# Test driver
+#-------------------------------------------------------------------------
+
+class HitUnderMissTests:
+
+  @pytest.mark.parametrize(
+    " name,   test,        stall_prob,latency,src_delay,sink_delay", [
+    ("64B-1", hit_under_miss, 0,      1,      0,        0   ),
+    ("64B-1", hit_under_miss, 0,      4,      0,        0   ),
+  ])
+  def test_HitUnderMissOrder( s, name, test, stall_prob, latency, src_delay,
+                              sink_delay, cmdline_opts, line_trace ):
+    p = test()
+    s.run_test( p.msg, p.mem, p.CacheReqType, p.CacheRespType, p.MemReqType, p.MemRespType,
+                p.associativity, p.size, stall_prob, latency, src_delay, sink_delay,
+                cmdline_opts, line_trace, ordered=True )
+
+  @pytest.mark.parametrize(
+    " name,   test,                stall_prob,latency,src_delay,sink_delay", [
+    ("64B-1", miss_under_miss,     0,         1,      0,        0   ),
+    ("64B-1", same_line_under_miss,0,         1,      0,        0   ),
+    ("64B-1", wr_hit_under_miss,   0,         1,      0,        0   ),
+    ("64B-1", evict_under_miss,    0,         1,      0,        0   ),
+    ("64B-1", others_under_miss,   0,         1,      0,        0   ),
+    ("128B-2",asso_under_miss,     0,         1,      0,        0   ),
+    ("64B-1", miss_under_miss,     0.5,       3,      1,        2   ),
+    ("64B-1", same_line_under_miss,0.5,       3,      1,        2   ),
+    ("64B-1", wr_hit_under_miss,   0.5,       3,      1,        2   ),
+    ("64B-1", evict_under_miss,    0.5,       3,      1,        2   ),
+    ("64B-1", others_under_miss,   0.5,       3,      1,        2   ),
+    ("128B-2",asso_under_miss,     0.5,       3,      1,        2   ),
+  ])
+  def test_HitUnderMiss( s, name, test, stall_prob, latency, src_delay,
+                         sink_delay, cmdline_opts, line_trace ):
+    p = test()
+    s.run_test( p.msg, p.mem, p.CacheReqType, p.CacheRespType, p.MemReqType, p.MemRespType,
+                p.associativity, p.size, stall_prob, latency, src_delay, sink_delay,
+                cmdline_opts, line_trace )
@@ -143,6 +143,76 @@ def flush_last_line2():
   return SingleCacheTestParams( msg, inv_flush_mem, associativity=1, bitwidth_mem_data=128, 
                                 bitwidth_cache_data=32 )
 
+def flush_many_dirty():
+  # dirty lines in both ways of some sets, clean sets in between, and a
+  # second flush with nothing left to write back
+  msg =  [
+    #    type   opq addr        len data               type   opq test len data
+    ( 'wr',  1,  0x00000000, 0,  0xa0),       ( 'wr',  1,  0,   0,  0 ),
+    ( 'wr',  2,  0x00000010, 0,  0xa1),       ( 'wr',  2,  0,   0,  0 ),
+    ( 'rd',  3,  0x00000020, 0,  0),          ( 'rd',  3,  0,   0,  0x21 ),
+    ( 'wr',  4,  0x00000030, 0,  0xa3),       ( 'wr',  4,  0,   0,  0 ),
+    ( 'wr',  5,  0x00020000, 0,  0xb0),       ( 'wr',  5,  0,   0,  0 ),
+    ( 'wr',  6,  0x00020014, 0,  0xb1),       ( 'wr',  6,  0,   0,  0 ),
+    ( 'wr',  7,  0x0000005c, 0,  0xc5),       ( 'wr',  7,  0,   0,  0 ),
+    ( 'fl',  8,  0,          0,  0),          ( 'fl',  8,  0,   0,  0 ),
+    ( 'fl',  9,  0,          0,  0),          ( 'fl',  9,  0,   0,  0 ),
+    ( 'inv', 10, 0,          0,  0),          ( 'inv', 10, 0,   0,  0 ),
+    ( 'rd',  11, 0x00000000, 0,  0),          ( 'rd',  11, 0,   0,  0xa0 ),
+    ( 'rd',  12, 0x00000004, 0,  0),          ( 'rd',  12, 1,   0,  0x02 ),
+    ( 'rd',  13, 0x00000010, 0,  0),          ( 'rd',  13, 0,   0,  0xa1 ),
+    ( 'rd',  14, 0x00000020, 0,  0),          ( 'rd',  14, 0,   0,  0x21 ),
+    ( 'rd',  15, 0x00000030, 0,  0),          ( 'rd',  15, 0,   0,  0xa3 ),
+    ( 'rd',  16, 0x00020000, 0,  0),          ( 'rd',  16, 0,   0,  0xb0 ),
+    ( 'rd',  17, 0x00020010, 0,  0),          ( 'rd',  17, 0,   0,  0x09 ),
+    ( 'rd',  18, 0x00020014, 0,  0),          ( 'rd',  18, 1,   0,  0xb1 ),
+    ( 'rd',  19, 0x0000005c, 0,  0),          ( 'rd',  19, 0,   0,  0xc5 ),
+  ]
+  return SingleCacheTestParams( msg, inv_flush_mem, associativity=2, bitwidth_mem_data=128,
+                                bitwidth_cache_data=32, cache_size=256 )
+
+# INV and FLUSH on address ranges (data is the length in bytes); 8 sets
+def inv_range():
+  msg =  [
+    #    type   opq addr        len data               type   opq test len data
+    ( 'rd',  1,  0x00000000, 0,  0),          ( 'rd',  1,  0,   0,  0x01 ),
+    ( 'rd',  2,  0x00000010, 0,  0),          ( 'rd',  2,  0,   0,  0x11 ),
+    ( 'rd',  3,  0x00000020, 0,  0),          ( 'rd',  3,  0,   0,  0x21 ),
+    ( 'rd',  4,  0x00000030, 0,  0),          ( 'rd',  4,  0,   0,  0x31 ),
+    ( 'inv', 5,  0x00000010, 0,  0x20),       ( 'inv', 5,  0,   0,  0 ),          # sets 1 and 2
+    ( 'rd',  6,  0x00000000, 0,  0),          ( 'rd',  6,  1,   0,  0x01 ),
+    ( 'rd',  7,  0x00000010, 0,  0),          ( 'rd',  7,  0,   0,  0x11 ),
+    ( 'rd',  8,  0x00000024, 0,  0),          ( 'rd',  8,  0,   0,  0x22 ),
+    ( 'rd',  9,  0x00000030, 0,  0),          ( 'rd',  9,  1,   0,  0x31 ),
+    ( 'inv', 10, 0x0000003c, 0,  0x4),        ( 'inv', 10, 0,   0,  0 ),          # single line
+    ( 'rd',  11, 0x00000030, 0,  0),          ( 'rd',  11, 0,   0,  0x31 ),
+    ( 'rd',  12, 0x00000000, 0,  0),          ( 'rd',  12, 1,   0,  0x01 ),
+    ( 'inv', 13, 0x00000070, 0,  0x20),       ( 'inv', 13, 0,   0,  0 ),          # wraps around
+    ( 'rd',  14, 0x00000010, 0,  0),          ( 'rd',  14, 0,   0,  0x11 ),
+  ]
+  return SingleCacheTestParams( msg, inv_flush_mem, associativity=2, bitwidth_mem_data=128,
+                                bitwidth_cache_data=32, cache_size=256 )
+
+def flush_range():
+  msg =  [
+    #    type   opq addr        len data               type   opq test len data
+    ( 'wr',  1,  0x00000000, 0,  0xa0),       ( 'wr',  1,  0,   0,  0 ),
+    ( 'wr',  2,  0x00000010, 0,  0xa1),       ( 'wr',  2,  0,   0,  0 ),
+    ( 'wr',  3,  0x00020000, 0,  0xb0),       ( 'wr',  3,  0,   0,  0 ),
+    ( 'wr',  4,  0x00000030, 0,  0xa3),       ( 'wr',  4,  0,   0,  0 ),
+    ( 'fl',  5,  0x00000010, 0,  0x10),       ( 'fl',  5,  0,   0,  0 ),          # set 1
+    ( 'fl',  6,  0x00000000, 0,  0x1),        ( 'fl',  6,  0,   0,  0 ),          # set 0
+    ( 'wr',  7,  0x00000034, 0,  0xa4),       ( 'wr',  7,  1,   0,  0 ),
+    ( 'fl',  8,  0x00000020, 0,  0x20),       ( 'fl',  8,  0,   0,  0 ),          # sets 2 and 3
+    ( 'inv', 9,  0,          0,  0),          ( 'inv', 9,  0,   0,  0 ),
+    ( 'rd',  10, 0x00000000, 0,  0),          ( 'rd',  10, 0,   0,  0xa0 ),
+    ( 'rd',  11, 0x00000010, 0,  0),          ( 'rd',  11, 0,   0,  0xa1 ),
+    ( 'rd',  12, 0x00000034, 0,  0),          ( 'rd',  12, 0,   0,  0xa4 ),
+    ( 'rd',  13, 0x00020000, 0,  0),          ( 'rd',  13, 0,   0,  0xb0 ),
+  ]
+  return SingleCacheTestParams( msg, inv_flush_mem, associativity=2, bitwidth_mem_data=128,
+                                bitwidth_cache_data=32, cache_size=256 )
+
 def inv_flush_short():
   msg =  [
     #    type   opq addr        len data               type   opq test len data
@@ -358,6 +428,11 @@ class InvFlushTests:
     ("32B-1",  flush_last_line1,    0,         1,      0,        0   ),
     ("32B-1",  flush_last_line2,    0,         1,      0,        0   ),
     ("256B-2", inv_flush_short,     0,         1,      0,        0   ),
+    ("256B-2", flush_many_dirty,    0,         1,      0,        0   ),
+    ("256B-2", flush_many_dirty,    0.5,       3,      1,        2   ),
+    ("256B-2", inv_range,           0,         1,      0,        0   ),
+    ("256B-2", flush_range,         0,         1,      0,        0   ),
+    ("256B-2", flush_range,         0.5,       3,      1,        2   ),
     ("64B-2",  inv_simple1,         0,         1,      0,        0   ),
     ("64B-2",  inv_simple2,         0,         1,      0,        0   ),
     ("64B-2",  inv_simple3,         0,         1,      0,        0   ),
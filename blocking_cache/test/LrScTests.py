@@ -0,0 +1,111 @@
+"""
+=========================================================================
+ LrScTests.py
+=========================================================================
+Load-reserved and store-conditional tests. SC responds with 0 when it
+wrote and with 1 when it found no reservation.
+"""
+
+import pytest
+from test.sim_utils import SingleCacheTestParams
+from .AmoTests      import amo_mem
+
+#-------------------------------------------------------------------------
+# Test cases
+#-------------------------------------------------------------------------
+
+def lr_sc():
+  msg =  [
+    #    type  opq   addr       len data         type  opq test len  data
+    ( 'lr', 0x00, 0x00000000, 0, 0),    ( 'lr', 0x00, 0,  0,  0x01 ),
+    ( 'sc', 0x01, 0x00000000, 0, 0xaa), ( 'sc', 0x01, 1,  0,  0    ),
+    ( 'rd', 0x02, 0x00000000, 0, 0),    ( 'rd', 0x02, 1,  0,  0xaa ),
+    ( 'sc', 0x03, 0x00000000, 0, 0xbb), ( 'sc', 0x03, 0,  0,  1    ), # reservation used up
+    ( 'rd', 0x04, 0x00000000, 0, 0),    ( 'rd', 0x04, 1,  0,  0xaa ),
+  ]
+  return SingleCacheTestParams( msg, amo_mem, associativity=1, bitwidth_mem_data=128,
+                                bitwidth_cache_data=32 )
+
+def sc_no_reservation():
+  msg =  [
+    #    type  opq   addr       len data         type  opq test len  data
+    ( 'sc', 0x00, 0x00000004, 0, 0xaa), ( 'sc', 0x00, 0,  0,  1    ),
+    ( 'rd', 0x01, 0x00000004, 0, 0),    ( 'rd', 0x01, 0,  0,  0x02 ), # no refill
+    ( 'lr', 0x02, 0x00000008, 0, 0),    ( 'lr', 0x02, 1,  0,  0x03 ),
+    ( 'sc', 0x03, 0x00000004, 0, 0xbb), ( 'sc', 0x03, 1,  0,  0    ), # same line
+    ( 'rd', 0x04, 0x00000004, 0, 0),    ( 'rd', 0x04, 1,  0,  0xbb ),
+  ]
+  return SingleCacheTestParams( msg, amo_mem, associativity=1, bitwidth_mem_data=128,
+                                bitwidth_cache_data=32 )
+
+def sc_other_line():
+  msg =  [
+    #    type  opq   addr       len data         type  opq test len  data
+    ( 'lr', 0x00, 0x00000000, 0, 0),    ( 'lr', 0x00, 0,  0,  0x01 ),
+    ( 'sc', 0x01, 0x00000010, 0, 0xaa), ( 'sc', 0x01, 0,  0,  1    ),
+    ( 'sc', 0x02, 0x00000000, 0, 0xbb), ( 'sc', 0x02, 0,  0,  1    ),
+    ( 'rd', 0x03, 0x00000010, 0, 0),    ( 'rd', 0x03, 0,  0,  0x11 ),
+    ( 'rd', 0x04, 0x00000000, 0, 0),    ( 'rd', 0x04, 1,  0,  0x01 ),
+  ]
+  return SingleCacheTestParams( msg, amo_mem, associativity=1, bitwidth_mem_data=128,
+                                bitwidth_cache_data=32 )
+
+def lr_inv_sc():
+  msg =  [
+    #    type  opq   addr       len data         type  opq test len  data
+    ( 'lr', 0x00, 0x00000000, 0, 0),    ( 'lr', 0x00, 0,  0,  0x01 ),
+    ( 'inv',0x01, 0x00000000, 0, 0),    ( 'inv',0x01, 0,  0,  0    ),
+    ( 'sc', 0x02, 0x00000000, 0, 0xaa), ( 'sc', 0x02, 0,  0,  1    ),
+    ( 'rd', 0x03, 0x00000000, 0, 0),    ( 'rd', 0x03, 0,  0,  0x01 ),
+  ]
+  return SingleCacheTestParams( msg, amo_mem, associativity=1, bitwidth_mem_data=128,
+                                bitwidth_cache_data=32 )
+
+def lr_evict_sc():
+  # The reservation is kept when the line is replaced, so the SC misses
+  msg =  [
+    #    type  opq   addr       len data         type  opq test len  data
+    ( 'lr', 0x00, 0x00000000, 0, 0),    ( 'lr', 0x00, 0,  0,  0x01 ),
+    ( 'rd', 0x01, 0x00000020, 0, 0),    ( 'rd', 0x01, 0,  0,  0x21 ),
+    ( 'sc', 0x02, 0x00000000, 0, 0xaa), ( 'sc', 0x02, 0,  0,  0    ),
+    ( 'rd', 0x03, 0x00000000, 0, 0),    ( 'rd', 0x03, 1,  0,  0xaa ),
+    ( 'rd', 0x04, 0x00000020, 0, 0),    ( 'rd', 0x04, 0,  0,  0x21 ),
+  ]
+  return SingleCacheTestParams( msg, amo_mem, associativity=1, bitwidth_mem_data=128,
+                                bitwidth_cache_data=32 )
+
+def lr_sc_2way():
+  # SC after the LR line was dirtied and evicted, and LR to a dirty line
+  msg =  [
+    #    type  opq   addr       len data         type  opq test len  data
+    ( 'wr', 0x00, 0x00000000, 0, 0xaa), ( 'wr', 0x00, 0,  0,  0    ),
+    ( 'lr', 0x01, 0x00000004, 0, 0),    ( 'lr', 0x01, 1,  0,  0x02 ),
+    ( 'wr', 0x02, 0x00020000, 0, 0xbb), ( 'wr', 0x02, 0,  0,  0    ),
+    ( 'rd', 0x03, 0x00030000, 0, 0),    ( 'rd', 0x03, 0,  0,  0x0d ), # evicts 0x0
+    ( 'sc', 0x04, 0x00000008, 0, 0xcc), ( 'sc', 0x04, 0,  0,  0    ),
+    ( 'rd', 0x05, 0x00000000, 0, 0),    ( 'rd', 0x05, 1,  0,  0xaa ),
+    ( 'rd', 0x06, 0x00000008, 0, 0),    ( 'rd', 0x06, 1,  0,  0xcc ),
+    ( 'lr', 0x07, 0x00020000, 0, 0),    ( 'lr', 0x07, 0,  0,  0xbb ),
+    ( 'sc', 0x08, 0x00020000, 0, 0xdd), ( 'sc', 0x08, 1,  0,  0    ),
+    ( 'rd', 0x09, 0x00020000, 0, 0),    ( 'rd', 0x09, 1,  0,  0xdd ),
+  ]
+  return SingleCacheTestParams( msg, amo_mem, associativity=2, bitwidth_mem_data=128,
+                                bitwidth_cache_data=32 )
+
+class LrScTests:
+  @pytest.mark.parametrize(
+    " name,   test,              stall_prob,latency,src_delay,sink_delay", [
+    ("32B-1", lr_sc,             0,         1,      0,        0   ),
+    ("32B-1", sc_no_reservation, 0,         1,      0,        0   ),
+    ("32B-1", sc_other_line,     0,         1,      0,        0   ),
+    ("32B-1", lr_inv_sc,         0,         1,      0,        0   ),
+    ("32B-1", lr_evict_sc,       0,         1,      0,        0   ),
+    ("64B-2", lr_sc_2way,        0,         1,      0,        0   ),
+    ("64B-2", lr_sc_2way,        0.5,       2,      2,        2   ),
+  ])
+  def test_LRSC( s, name, test, stall_prob, latency, src_delay, sink_delay,
+                 cmdline_opts, line_trace ):
+    p = test()
+    s.run_test( p.msg, p.mem, p.CacheReqType, p.CacheRespType, p.MemReqType, p.MemRespType,
+                p.associativity, p.size, stall_prob, latency, src_delay, sink_delay,
+                cmdline_opts, line_trace )
@@ -127,3 +127,26 @@ class MultiCacheTestCases:
                           MemRespType, associativities, cache_sizes, stall_prob,
                           latency, src_delay, sink_delay )
     s.run_test( tp, cmdline_opts, line_trace )
+
+  @pytest.mark.parametrize(
+    " name,   test,      nbanks,occupancy,bandwidth,latency", [
+    ("SIMP",  rd_wr_2c,  1,     1,        0,        1   ),
+    ("SIMP",  rd_wr_2c,  2,     4,        0,        2   ),
+    ("AMO",   amo_2c,    2,     2,        1,        1   ),
+    ("INVFL", inv_fl_2c, 4,     3,        0,        1   ),
+    ("INVFL", inv_fl_4c, 2,     2,        1,        1   ),
+    ("INVFL", inv_fl_4c, 4,     1,        2,        2   ),
+    ])
+  def test_banked_mem( s, name, test, nbanks, occupancy, bandwidth, latency,
+                       cmdline_opts, line_trace ):
+    mem = multicache_mem()
+    associativities, cache_sizes, msgs = test()
+    tp = CacheTestParams( msgs, mem, CacheReqType, CacheRespType, MemReqType,
+                          MemRespType, associativities, cache_sizes, 0.0,
+                          latency, 0, 0, nbanks, occupancy, bandwidth )
+    th = s.run_test( tp, cmdline_opts, line_trace )
+    stats = th.mem_stats()
+    assert len( stats['bank_accesses'] ) == nbanks
+    assert sum( stats['bank_accesses'] ) > 0
+    if bandwidth == 0:
+      assert stats['bw_stalls'] == 0
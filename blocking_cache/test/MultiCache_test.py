@@ -20,4 +20,4 @@ class MultiCache_Tests( MultiCacheTestCases ):
     if tp.mem != None:
       harness.load()
     sram_wrapper = False
-    run_sim( harness, cmdline_opts, trace, sram_wrapper )
+    return run_sim( harness, cmdline_opts, trace, sram_wrapper )
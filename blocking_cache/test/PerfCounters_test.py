@@ -0,0 +1,99 @@
+"""
+=========================================================================
+ PerfCounters_test.py
+=========================================================================
+Tests for the performance counters of the pipelined blocking cache
+
+Date   : 18 October 2026
+"""
+
+import pytest
+from test.sim_utils     import run_sim, TestHarness, SingleCacheTestParams
+from ..BlockingCacheRTL import BlockingCacheRTL
+
+stats_mem = [
+  0x00000000, 0x01,
+  0x00000004, 0x02,
+  0x00000100, 0x03,
+  0x00000200, 0x04,
+  0x00000300, 0x05,
+]
+
+def stats_mix():
+  # 256B 2-way cache: 0x000, 0x100, 0x200 and 0x300 all map to set 0
+  msg = [
+    #    type   opq  addr       len data           type   opq test len data
+    ( 'rd',  0x1, 0x00000000, 0, 0    ), ( 'rd',  0x1, 0,   0, 0x01 ), # miss
+    ( 'rd',  0x2, 0x00000004, 0, 0    ), ( 'rd',  0x2, 1,   0, 0x02 ), # hit
+    ( 'wr',  0x3, 0x00000008, 0, 0x0a ), ( 'wr',  0x3, 1,   0, 0    ), # clean hit
+    ( 'wr',  0x4, 0x00000008, 0, 0x0b ), ( 'wr',  0x4, 1,   0, 0    ), # hit
+    ( 'rd',  0x5, 0x00000100, 0, 0    ), ( 'rd',  0x5, 0,   0, 0x03 ), # miss
+    ( 'rd',  0x6, 0x00000200, 0, 0    ), ( 'rd',  0x6, 0,   0, 0x04 ), # evicts 0x000
+    ( 'ad',  0x7, 0x00000300, 0, 0x01 ), ( 'ad',  0x7, 0,   0, 0x05 ),
+    ( 'inv', 0x8, 0,          0, 0    ), ( 'inv', 0x8, 0,   0, 0    ),
+    ( 'fl',  0x9, 0,          0, 0    ), ( 'fl',  0x9, 0,   0, 0    ),
+    ( 'rd',  0xa, 0x00000008, 0, 0    ), ( 'rd',  0xa, 0,   0, 0x0b ), # miss
+  ]
+  return SingleCacheTestParams( msg, stats_mem, associativity=2, bitwidth_mem_data=128,
+                                bitwidth_cache_data=32, cache_size=256 )
+
+def run_stats_test( p, stall_prob, latency, src_delay, sink_delay, cmdline_opts,
+                    line_trace, cache_args=None ):
+  cache_args = { 'stats': True, **(cache_args if cache_args else {}) }
+  th = TestHarness( p.msg[::2], p.msg[1::2], stall_prob, latency, src_delay,
+                    sink_delay, BlockingCacheRTL, p.CacheReqType, p.CacheRespType,
+                    p.MemReqType, p.MemRespType, p.size, p.associativity,
+                    cache_args )
+  th.elaborate()
+  th.load( p.mem[::2], p.mem[1::2] )
+  return run_sim( th, cmdline_opts, line_trace, False )
+
+@pytest.mark.parametrize(
+  " stall_prob,latency,src_delay,sink_delay", [
+  ( 0,         1,      0,        0   ),
+  ( 0.5,       3,      1,        2   ),
+])
+def test_stats_counts( stall_prob, latency, src_delay, sink_delay, cmdline_opts,
+                       line_trace ):
+  th = run_stats_test( stats_mix(), stall_prob, latency, src_delay, sink_delay,
+                       cmdline_opts, line_trace )
+  stats = th.cache.stats
+  assert stats.hits            == 3
+  assert stats.misses          == 4
+  assert stats.evictions       == 1
+  assert stats.writebacks      == 1
+  assert stats.amos            == 1
+  assert stats.stall_clean_hit >= 1
+  assert stats.miss_cycles     >  0
+  assert stats.inv_cycles      >  0
+  assert stats.flush_cycles    >  0
+  if stall_prob == 0:
+    assert stats.stall_clean_hit == 1
+    assert stats.stall_mem  == 0
+    assert stats.stall_resp == 0
+
+def test_stats_multi_mshr( cmdline_opts, line_trace ):
+  th = run_stats_test( stats_mix(), 0, 1, 0, 0, cmdline_opts, line_trace,
+                       { 'mshr_entries': 4 } )
+  assert th.cache.stats.hits   == 3
+  assert th.cache.stats.misses == 4
+
+def test_stats_clear( cmdline_opts, line_trace ):
+  th = run_stats_test( stats_mix(), 0, 1, 0, 0, cmdline_opts, line_trace )
+  assert th.cache.stats.hits == 3
+  th.stats_clear @= 1
+  th.sim_tick()
+  th.stats_clear @= 0
+  th.sim_tick()
+  assert th.cache.stats.hits   == 0
+  assert th.cache.stats.misses == 0
+
+def test_stats_way_pred( cmdline_opts, line_trace ):
+  # Misses are always mispredicts since they need the full lookup. The
+  # three hits are all to the MRU way of set 0.
+  th = run_stats_test( stats_mix(), 0, 1, 0, 0, cmdline_opts, line_trace,
+                       { 'way_pred': True } )
+  assert th.cache.stats.hits            == 3
+  assert th.cache.stats.misses          == 4
+  assert th.cache.stats.way_pred_hits   == 3
+  assert th.cache.stats.way_pred_misses == 4
@@ -33,7 +33,7 @@ random_memory = rand_mem( 0, 0xffff )
 # iterative_memory = iterative_mem( 0, 0xffff )
 
 def random_test_generator( mem, associativity, bitwidth_mem_data, bitwidth_cache_data, 
-                           size, num_trans = 200 ):
+                           size, num_trans = 200, policy = 'lru' ):
   tp = SingleCacheTestParams( False, mem, associativity, bitwidth_mem_data, 
                               bitwidth_cache_data, size )
   max_addr = int( size // 4 * 3 * tp.associativity )
@@ -58,9 +58,13 @@ def random_test_generator( mem, associativity, bitwidth_mem_data, bitwidth_cache
   reqs = []
   for i in range( num_trans ):
     if types[i] == MemMsgType.INV or types[i] == MemMsgType.FLUSH:
+      # Whole cache half of the time, an address range otherwise
       data = 0
       len_ = 0
       addr = 0
+      if random.random() < 0.5:
+        data = random.randint(1, size)
+        addr = Bits32(random.randint(0, max_addr))
     else:
       data = random.randint(0, 0xffffffff)
       addr = Bits32(random.randint(0, max_addr))
@@ -90,7 +94,7 @@ def random_test_generator( mem, associativity, bitwidth_mem_data, bitwidth_cache
   reqs = mk_req( tp.CacheReqType, reqs )
 
   tp.msg = gen_req_resp( reqs, tp.mem, tp.CacheReqType, tp.CacheRespType, tp.MemReqType,
-                        tp.MemRespType, tp.associativity, tp.size )
+                        tp.MemRespType, tp.associativity, tp.size, policy )
   # print stats
   hits = 0
   for i in range( 1, num_trans, 2 ):
@@ -130,6 +134,21 @@ def dmap_size4096_lineb128_datab128():
 def dmap_size4096_lineb128_datab32():
   return random_test_generator(random_memory, 1, 128, 32, 4096, 200)
 
+def asso4_size128_lineb128_datab32_lru():
+  return random_test_generator(random_memory, 4, 128, 32, 128, 500, 'lru')
+
+def asso4_size128_lineb128_datab32_plru():
+  return random_test_generator(random_memory, 4, 128, 32, 128, 500, 'plru')
+
+def asso8_size256_lineb128_datab32_lru():
+  return random_test_generator(random_memory, 8, 128, 32, 256, 500, 'lru')
+
+def asso8_size256_lineb128_datab32_plru():
+  return random_test_generator(random_memory, 8, 128, 32, 256, 500, 'plru')
+
+def asso4_size4096_lineb128_datab32_plru():
+  return random_test_generator(random_memory, 4, 128, 32, 4096, 200, 'plru')
+
 #-------------------------------------------------------------------------
 # Test driver
 #-------------------------------------------------------------------------
@@ -163,3 +182,20 @@ class RandomTests:
     s.run_test( p.msg, p.mem, p.CacheReqType, p.CacheRespType, p.MemReqType, p.MemRespType, 
                 p.associativity, p.size, stall_prob, latency, src_delay, sink_delay, 
                 cmdline_opts, line_trace )
+
+  @pytest.mark.parametrize(
+    " name,  test,                                policy, stall_prob,latency,src_delay,sink_delay", [
+    ("128B", asso4_size128_lineb128_datab32_lru,  'lru',  0,         1,      0,        0   ),
+    ("128B", asso4_size128_lineb128_datab32_plru, 'plru', 0,         1,      0,        0   ),
+    ("256B", asso8_size256_lineb128_datab32_lru,  'lru',  0,         1,      0,        0   ),
+    ("256B", asso8_size256_lineb128_datab32_plru, 'plru', 0,         1,      0,        0   ),
+    ("4KB",  asso4_size4096_lineb128_datab32_plru,'plru', 0,         1,      0,        0   ),
+    ("128B", asso4_size128_lineb128_datab32_lru,  'lru',  0,         2,      1,        2   ),
+    ("128B", asso4_size128_lineb128_datab32_plru, 'plru', 0,         2,      1,        2   ),
+  ])
+  def test_random_replacement( s, name, test, policy, stall_prob, latency, src_delay,
+                               sink_delay, cmdline_opts, line_trace ):
+    p = test()
+    s.run_test( p.msg, p.mem, p.CacheReqType, p.CacheRespType, p.MemReqType, p.MemRespType, 
+                p.associativity, p.size, stall_prob, latency, src_delay, sink_delay, 
+                cmdline_opts, line_trace, cache_args={'policy': policy} )
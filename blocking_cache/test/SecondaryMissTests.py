@@ -0,0 +1,109 @@
+"""
+=========================================================================
+ SecondaryMissTests.py
+=========================================================================
+Directed tests for secondary misses, which are merged into the MSHR behind
+the outstanding miss to their set with mshr_merge
+
+Date   : 18 October 2026
+"""
+
+import pytest
+from test.sim_utils import SingleCacheTestParams
+from .HitUnderMissTests import hum_mem
+
+#-------------------------------------------------------------------------
+# Test cases
+#-------------------------------------------------------------------------
+# 64B direct mapped cache: 0x0000, 0x1000 and 0x2000 map to set 0
+
+def secondary_reads():
+  msg = [
+    #    type  opq  addr       len data                type  opq test len data
+    ( 'rd', 0x1, 0x00001000, 0, 0      ), ( 'rd', 0x1, 0,   0, 0x1000 ),
+    ( 'rd', 0x2, 0x00001004, 0, 0      ), ( 'rd', 0x2, 1,   0, 0x1004 ), # secondary
+    ( 'rd', 0x3, 0x00001000, 0, 0      ), ( 'rd', 0x3, 1,   0, 0x1000 ), # secondary
+    ( 'rd', 0x4, 0x00000020, 0, 0      ), ( 'rd', 0x4, 0,   0, 0x20   ), # other set
+    ( 'rd', 0x5, 0x00000024, 0, 0      ), ( 'rd', 0x5, 1,   0, 0x24   ), # secondary
+  ]
+  return SingleCacheTestParams( msg, hum_mem, associativity=1, bitwidth_mem_data=128,
+                                bitwidth_cache_data=32, cache_size=64 )
+
+def secondary_writes():
+  msg = [
+    #    type  opq  addr       len data                type  opq test len data
+    ( 'rd', 0x1, 0x00001000, 0, 0      ), ( 'rd', 0x1, 0,   0, 0x1000 ),
+    ( 'wr', 0x2, 0x00001004, 0, 0xaa   ), ( 'wr', 0x2, 1,   0, 0      ), # secondary
+    ( 'wr', 0x3, 0x00001004, 0, 0xbb   ), ( 'wr', 0x3, 1,   0, 0      ), # in order
+    ( 'rd', 0x4, 0x00001004, 0, 0      ), ( 'rd', 0x4, 1,   0, 0xbb   ),
+    ( 'rd', 0x5, 0x00000030, 0, 0      ), ( 'rd', 0x5, 0,   0, 0x30   ), # other set
+  ]
+  return SingleCacheTestParams( msg, hum_mem, associativity=1, bitwidth_mem_data=128,
+                                bitwidth_cache_data=32, cache_size=64 )
+
+def secondary_other_tag():
+  msg = [
+    #    type  opq  addr       len data                type  opq test len data
+    ( 'wr', 0x1, 0x00001004, 0, 0xaa   ), ( 'wr', 0x1, 0,   0, 0      ),
+    ( 'rd', 0x2, 0x00002000, 0, 0      ), ( 'rd', 0x2, 0,   0, 0x2000 ), # evicts 0x1000
+    ( 'rd', 0x3, 0x00001004, 0, 0      ), ( 'rd', 0x3, 0,   0, 0xaa   ), # evicts 0x2000
+    ( 'rd', 0x4, 0x00002004, 0, 0      ), ( 'rd', 0x4, 0,   0, 0x2004 ),
+    ( 'rd', 0x5, 0x00000010, 0, 0      ), ( 'rd', 0x5, 0,   0, 0x10   ),
+  ]
+  return SingleCacheTestParams( msg, hum_mem, associativity=1, bitwidth_mem_data=128,
+                                bitwidth_cache_data=32, cache_size=64 )
+
+def secondary_then_amo():
+  msg = [
+    #    type  opq  addr       len data                type  opq test len data
+    ( 'rd', 0x1, 0x00001000, 0, 0      ), ( 'rd', 0x1, 0,   0, 0x1000 ),
+    ( 'wr', 0x2, 0x00001004, 0, 0x5    ), ( 'wr', 0x2, 1,   0, 0      ), # secondary
+    ( 'ad', 0x3, 0x00001004, 0, 0x1    ), ( 'ad', 0x3, 0,   0, 0x5    ), # waits for all
+    ( 'rd', 0x4, 0x00001004, 0, 0      ), ( 'rd', 0x4, 0,   0, 0x6    ),
+  ]
+  return SingleCacheTestParams( msg, hum_mem, associativity=1, bitwidth_mem_data=128,
+                                bitwidth_cache_data=32, cache_size=64 )
+
+def secondary_asso():
+  msg = [
+    #    type  opq  addr       len data                type  opq test len data
+    ( 'rd', 0x1, 0x00001000, 0, 0      ), ( 'rd', 0x1, 0,   0, 0x1000 ),
+    ( 'rd', 0x2, 0x00002004, 0, 0      ), ( 'rd', 0x2, 0,   0, 0x2004 ), # same set
+    ( 'rd', 0x3, 0x00001004, 0, 0      ), ( 'rd', 0x3, 1,   0, 0x1004 ), # secondary
+    ( 'wr', 0x4, 0x00002000, 0, 0xcc   ), ( 'wr', 0x4, 1,   0, 0      ), # secondary
+    ( 'rd', 0x5, 0x00002000, 0, 0      ), ( 'rd', 0x5, 1,   0, 0xcc   ),
+    ( 'rd', 0x6, 0x00000010, 0, 0      ), ( 'rd', 0x6, 0,   0, 0x10   ),
+  ]
+  return SingleCacheTestParams( msg, hum_mem, associativity=2, bitwidth_mem_data=128,
+                                bitwidth_cache_data=32, cache_size=128 )
+
+#-------------------------------------------------------------------------
+# Test driver
+#-------------------------------------------------------------------------
+
+class SecondaryMissTests:
+
+  @pytest.mark.parametrize(
+    " name,   test,                stall_prob,latency,src_delay,sink_delay", [
+    ("64B-1", secondary_reads,     0,         1,      0,        0   ),
+    ("64B-1", secondary_writes,    0,         1,      0,        0   ),
+    ("64B-1", secondary_other_tag, 0,         1,      0,        0   ),
+    ("64B-1", secondary_then_amo,  0,         1,      0,        0   ),
+    ("128B-2",secondary_asso,      0,         1,      0,        0   ),
+    ("64B-1", secondary_reads,     0,         8,      0,        0   ),
+    ("64B-1", secondary_writes,    0,         8,      0,        0   ),
+    ("64B-1", secondary_other_tag, 0,         8,      0,        0   ),
+    ("64B-1", secondary_then_amo,  0,         8,      0,        0   ),
+    ("128B-2",secondary_asso,      0,         8,      0,        0   ),
+    ("64B-1", secondary_reads,     0.5,       3,      1,        2   ),
+    ("64B-1", secondary_writes,    0.5,       3,      1,        2   ),
+    ("64B-1", secondary_other_tag, 0.5,       3,      1,        2   ),
+    ("64B-1", secondary_then_amo,  0.5,       3,      1,        2   ),
+    ("128B-2",secondary_asso,      0.5,       3,      1,        2   ),
+  ])
+  def test_SecondaryMiss( s, name, test, stall_prob, latency, src_delay,
+                          sink_delay, cmdline_opts, line_trace ):
+    p = test()
+    s.run_test( p.msg, p.mem, p.CacheReqType, p.CacheRespType, p.MemReqType, p.MemRespType,
+                p.associativity, p.size, stall_prob, latency, src_delay, sink_delay,
+                cmdline_opts, line_trace )
@@ -0,0 +1,122 @@
+"""
+=========================================================================
+ StoreBufferTests.py
+=========================================================================
+Directed tests for caches with a store buffer in front of the pipeline
+
+Date   : 18 October 2026
+"""
+
+import copy
+import pytest
+from mem_ifcs.MemMsg import MemMsgType
+from test.sim_utils  import SingleCacheTestParams
+
+def buffered_write_resps( resps ):
+  """
+  Writes are answered by the store buffer before they reach the cache so
+  their responses always have the test bit low
+  """
+  resps = [ copy.deepcopy( resp ) for resp in resps ]
+  for resp in resps:
+    if resp.type_ == MemMsgType.WRITE:
+      resp.test = 0
+  return resps
+
+sb_mem = [
+  0x00000000, 0x00,
+  0x00000004, 0x04,
+  0x00000010, 0x10,
+  0x00000014, 0x14,
+  0x00001000, 0x1000,
+  0x00001004, 0x1004,
+]
+
+#-------------------------------------------------------------------------
+# Test cases
+#-------------------------------------------------------------------------
+
+def merge_same_word():
+  msg = [
+    #    type  opq  addr       len data                type  opq test len data
+    ( 'wr', 0x1, 0x00000000, 0, 0x11   ), ( 'wr', 0x1, 0,   0, 0      ),
+    ( 'wr', 0x2, 0x00000000, 0, 0x22   ), ( 'wr', 0x2, 0,   0, 0      ), # merged
+    ( 'wr', 0x3, 0x00000000, 0, 0x33   ), ( 'wr', 0x3, 0,   0, 0      ), # merged
+    ( 'wr', 0x4, 0x00000004, 0, 0x44   ), ( 'wr', 0x4, 0,   0, 0      ),
+    ( 'rd', 0x5, 0x00000000, 0, 0      ), ( 'rd', 0x5, 1,   0, 0x33   ),
+    ( 'rd', 0x6, 0x00000004, 0, 0      ), ( 'rd', 0x6, 1,   0, 0x44   ),
+  ]
+  return SingleCacheTestParams( msg, sb_mem, associativity=1, bitwidth_mem_data=128,
+                                bitwidth_cache_data=32, cache_size=64 )
+
+def merge_subword():
+  msg = [
+    #    type  opq  addr       len data                type  opq test len data
+    ( 'wr', 0x1, 0x00000011, 1, 0xaa   ), ( 'wr', 0x1, 0,   1, 0      ),
+    ( 'wr', 0x2, 0x00000011, 1, 0xbb   ), ( 'wr', 0x2, 0,   1, 0      ), # merged
+    ( 'wr', 0x3, 0x00000012, 2, 0xccdd ), ( 'wr', 0x3, 0,   2, 0      ), # not covered
+    ( 'rd', 0x4, 0x00000010, 0, 0      ), ( 'rd', 0x4, 1,   0, 0xccddbb10 ),
+    ( 'wr', 0x5, 0x00000014, 1, 0xee   ), ( 'wr', 0x5, 0,   1, 0      ),
+    ( 'wr', 0x6, 0x00000014, 0, 0x1234 ), ( 'wr', 0x6, 0,   0, 0      ), # merged
+    ( 'rd', 0x7, 0x00000014, 0, 0      ), ( 'rd', 0x7, 1,   0, 0x1234 ),
+  ]
+  return SingleCacheTestParams( msg, sb_mem, associativity=1, bitwidth_mem_data=128,
+                                bitwidth_cache_data=32, cache_size=64 )
+
+def fill_buffer():
+  msg = [
+    #    type  opq  addr       len data                type  opq test len data
+    ( 'wr', 0x1, 0x00000000, 0, 0x01   ), ( 'wr', 0x1, 0,   0, 0      ),
+    ( 'wr', 0x2, 0x00001000, 0, 0x02   ), ( 'wr', 0x2, 0,   0, 0      ), # evicts 0x0
+    ( 'wr', 0x3, 0x00000004, 0, 0x03   ), ( 'wr', 0x3, 0,   0, 0      ), # evicts 0x1000
+    ( 'wr', 0x4, 0x00001004, 0, 0x04   ), ( 'wr', 0x4, 0,   0, 0      ),
+    ( 'wr', 0x5, 0x00000010, 0, 0x05   ), ( 'wr', 0x5, 0,   0, 0      ),
+    ( 'wr', 0x6, 0x00000014, 0, 0x06   ), ( 'wr', 0x6, 0,   0, 0      ),
+    ( 'rd', 0x7, 0x00000000, 0, 0      ), ( 'rd', 0x7, 0,   0, 0x01   ),
+    ( 'rd', 0x8, 0x00001000, 0, 0      ), ( 'rd', 0x8, 0,   0, 0x02   ),
+    ( 'rd', 0x9, 0x00000004, 0, 0      ), ( 'rd', 0x9, 0,   0, 0x03   ),
+    ( 'rd', 0xa, 0x00001004, 0, 0      ), ( 'rd', 0xa, 0,   0, 0x04   ),
+    ( 'rd', 0xb, 0x00000014, 0, 0      ), ( 'rd', 0xb, 1,   0, 0x06   ),
+  ]
+  return SingleCacheTestParams( msg, sb_mem, associativity=1, bitwidth_mem_data=128,
+                                bitwidth_cache_data=32, cache_size=64 )
+
+def drain_before_others():
+  msg = [
+    #    type   opq  addr       len data               type   opq test len data
+    ( 'wr',  0x1, 0x00000000, 0, 0x10 ), ( 'wr',  0x1, 0,   0, 0      ),
+    ( 'ad',  0x2, 0x00000000, 0, 0x1  ), ( 'ad',  0x2, 0,   0, 0x10   ),
+    ( 'wr',  0x3, 0x00000004, 0, 0x20 ), ( 'wr',  0x3, 0,   0, 0      ),
+    ( 'fl',  0x4, 0x00000000, 0, 0    ), ( 'fl',  0x4, 0,   0, 0      ),
+    ( 'wr',  0x5, 0x00001000, 0, 0x30 ), ( 'wr',  0x5, 0,   0, 0      ),
+    ( 'inv', 0x6, 0x00000000, 0, 0    ), ( 'inv', 0x6, 0,   0, 0      ),
+    ( 'rd',  0x7, 0x00000000, 0, 0    ), ( 'rd',  0x7, 0,   0, 0x11   ),
+    ( 'rd',  0x8, 0x00000004, 0, 0    ), ( 'rd',  0x8, 1,   0, 0x20   ),
+    ( 'rd',  0x9, 0x00001000, 0, 0    ), ( 'rd',  0x9, 0,   0, 0x30   ),
+  ]
+  return SingleCacheTestParams( msg, sb_mem, associativity=2, bitwidth_mem_data=128,
+                                bitwidth_cache_data=32, cache_size=128 )
+
+#-------------------------------------------------------------------------
+# Test driver
+#-------------------------------------------------------------------------
+
+class StoreBufferTests:
+
+  @pytest.mark.parametrize(
+    " name,   test,               stall_prob,latency,src_delay,sink_delay", [
+    ("64B-1", merge_same_word,    0,         1,      0,        0   ),
+    ("64B-1", merge_subword,      0,         1,      0,        0   ),
+    ("64B-1", fill_buffer,        0,         1,      0,        0   ),
+    ("128B-2",drain_before_others,0,         1,      0,        0   ),
+    ("64B-1", merge_same_word,    0.5,       3,      1,        2   ),
+    ("64B-1", merge_subword,      0.5,       3,      1,        2   ),
+    ("64B-1", fill_buffer,        0.5,       3,      1,        2   ),
+    ("128B-2",drain_before_others,0.5,       3,      1,        2   ),
+  ])
+  def test_StoreBuffer( s, name, test, stall_prob, latency, src_delay,
+                        sink_delay, cmdline_opts, line_trace ):
+    p = test()
+    s.run_test( p.msg, p.mem, p.CacheReqType, p.CacheRespType, p.MemReqType, p.MemRespType,
+                p.associativity, p.size, stall_prob, latency, src_delay, sink_delay,
+                cmdline_opts, line_trace )
@@ -11,6 +11,7 @@ import argparse
 import os
 import sys
 import fileinput
+import re
 import subprocess
 
 file_path   = os.path.abspath( __file__ )
@@ -45,6 +46,7 @@ def parse_cmdline():
   p.add_argument( "--obw", default=8, type=int )
   p.add_argument( "--asso", default=2, type=int )
   p.add_argument( '--replace-sram', action='store_true', help="Replace SRAM model with real SRAM wrapper" )
+  p.add_argument( '--tag-1r1w', action='store_true', help="Use 1R1W SRAMs for the tag arrays" )
   opts = p.parse_args()
   return opts
 
@@ -52,6 +54,8 @@ def parse_cmdline():
 # Replace SRAM
 #=========================================================================
 
+sram_1r1w = re.compile( r"SramGeneric1R1WPRTL__num_bits_(\d+)__num_words_(\d+) sram" )
+
 def replace_sram( file_name ):
 
   with fileinput.input( file_name, inplace=True ) as f:
@@ -72,6 +76,10 @@ def replace_sram( file_name ):
         new_line = line.replace( "SramGenericPRTL__num_bits_128__num_words_512 sram",
                                  "SramGenericPRTL #(.num_bits(128) , .num_words(512)) sram" )
         print( new_line, end='' )
+      elif sram_1r1w.search( line ):
+        # The 1R1W wrapper picks the SRAM by its parameters, for any size
+        print( sram_1r1w.sub( r"SramGeneric1R1WPRTL #(.num_bits(\1) , .num_words(\2)) sram",
+                              line ), end='' )
       else:
         print( line, end='' )
 
@@ -84,7 +92,7 @@ def main( opts ):
   MemReqType, MemRespType = mk_mem_msg(opts.obw, opts.abw, opts.clw)
   # Instantiate the cache
   dut = BlockingCacheRTL( CacheReqType, CacheRespType, MemReqType,
-                          MemRespType, opts.size, opts.asso )
+                          MemRespType, opts.size, opts.asso, tag_1r1w=opts.tag_1r1w )
   success = False
   module_name = f"BlockingCache_{opts.size}_{opts.clw}_{opts.abw}_{opts.dbw}_{opts.asso}"
   file_name = module_name + ".v"
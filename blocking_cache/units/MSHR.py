@@ -18,11 +18,24 @@ class MSHR(Component):
   Miss Status Hit Register - keeps track of outstanding misses
   Blocks if all entries all filled
 
-  For blocking cache, it is 1 entry
+  For blocking cache, it is 1 entry. With more than one entry, each
+  outstanding miss is tracked by its entry id, which is sent to memory as
+  the memreq opaque and used to look the entry back up on the memresp.
+  An entry can also be allocated as "parked": a request that could not
+  proceed under an outstanding miss and is waiting to be replayed. Parked
+  entries never send a memreq and do not count as conflicts.
+
+  Without merge, a single parked request is replayed once all misses are
+  done. With merge, any number of reads and writes can be parked behind
+  the miss to their set (secondary misses) and each is replayed as soon as
+  that set has no older parked request and no outstanding miss, which
+  is right after the refill of its primary miss. Other parked requests
+  (AMO, INV, FLUSH, INIT) still wait for everything older to finish.
   """
-  def construct( s, p, entries ):
+  def construct( s, p, entries, merge=False ):
     s.alloc_en    = InPort ()
     s.alloc_in    = InPort (p.MSHRMsg)
+    s.alloc_park  = InPort ()
     s.full        = OutPort()
     s.alloc_id    = OutPort(p.bitwidth_opaque)
 
@@ -31,6 +44,16 @@ class MSHR(Component):
     s.dealloc_out = OutPort(p.MSHRMsg)
     s.empty       = OutPort() # high when no more secondary misses?
 
+    # Hit-under-miss signals (only meaningful for more than one entry)
+    s.conflict_idx  = InPort (p.bitwidth_index)
+    s.conflict_park = InPort () # parked requests also count as conflicts
+    s.conflict      = OutPort() # outstanding miss to the same set
+    s.park_val      = OutPort() # holds a parked request
+    s.park_ready    = OutPort() # a parked request can be replayed
+    s.park_block    = OutPort() # new requests must wait for a parked one
+    s.park_id       = OutPort(p.bitwidth_opaque)
+    s.primary_empty = OutPort() # no outstanding misses (parked ones aside)
+
     # Number of free MSHR Entries
     bitwidth_entries = clog2(entries + 1)
     s.num_entries_in  = Wire(bitwidth_entries)
@@ -39,9 +62,9 @@ class MSHR(Component):
 
     @update
     def entry_logic():
-      if s.alloc_en:    # No parallel alloc/dealloc
+      if s.alloc_en & ~s.dealloc_en:
         s.num_entries_in @= s.num_entries_reg.out + 1
-      elif s.dealloc_en:
+      elif s.dealloc_en & ~s.alloc_en:
         s.num_entries_in @= s.num_entries_reg.out - 1
       else:
         s.num_entries_in @= s.num_entries_reg.out
@@ -61,6 +84,143 @@ class MSHR(Component):
 
       s.alloc_id //= s.alloc_in.opaque
 
+      s.conflict      //= 0
+      s.park_val      //= 0
+      s.park_ready    //= 0
+      s.park_block    //= 0
+      s.park_id       //= 0
+      s.primary_empty //= s.empty
+
+    else:
+      assert entries <= 2**p.bitwidth_opaque, \
+        "MSHR entry id must fit in the memreq opaque field"
+
+      BitsEntries = mk_bits( entries )
+      idx_lo = p.bitwidth_offset
+      idx_hi = p.bitwidth_offset + p.bitwidth_index
+
+      s.storage_en   = Wire( BitsEntries )
+      s.storage_regs = [ RegEnRst( p.MSHRMsg, p.MSHRMsg() )
+                         for _ in range(entries) ]
+      for i, m in enumerate(s.storage_regs):
+        m.in_ //= s.alloc_in
+        m.en  //= s.storage_en[i]
+
+      # Per-entry valid and parked bits
+      s.val_reg  = RegRst( BitsEntries )
+      s.park_reg = RegRst( BitsEntries )
+
+      @update
+      def alloc_id_logic():
+        # Allocate the lowest free entry
+        s.alloc_id @= 0
+        for i in range(entries-1, -1, -1):
+          if ~s.val_reg.out[i]:
+            s.alloc_id @= i
+
+      @update
+      def val_park_logic():
+        s.val_reg.in_  @= s.val_reg.out
+        s.park_reg.in_ @= s.park_reg.out
+        s.storage_en   @= 0
+        for i in range(entries):
+          if s.dealloc_en & (s.dealloc_id == i):
+            s.val_reg.in_[i]  @= 0
+            s.park_reg.in_[i] @= 0
+          if s.alloc_en & (s.alloc_id == i):
+            s.storage_en[i]   @= 1
+            s.val_reg.in_[i]  @= 1
+            s.park_reg.in_[i] @= s.alloc_park
+
+      @update
+      def dealloc_out_logic():
+        s.dealloc_out @= s.storage_regs[0].out
+        for i in range(entries):
+          if s.dealloc_id == i:
+            s.dealloc_out @= s.storage_regs[i].out
+
+      if not merge:
+        @update
+        def hit_under_miss_logic():
+          s.conflict      @= 0
+          s.park_val      @= 0
+          s.park_id       @= 0
+          s.primary_empty @= 1
+          for i in range(entries):
+            if s.val_reg.out[i]:
+              if s.park_reg.out[i]:
+                s.park_val @= 1
+                s.park_id  @= i
+              else:
+                s.primary_empty @= 0
+                if s.storage_regs[i].out.addr[idx_lo:idx_hi] == s.conflict_idx:
+                  s.conflict @= 1
+
+        s.park_ready //= lambda: s.park_val & s.primary_empty
+        s.park_block //= s.park_val
+
+      else:
+        # Age matrix: bit j of older[i] is set if entry j was allocated
+        # before entry i
+        s.older = [ RegRst( BitsEntries ) for _ in range(entries) ]
+
+        @update
+        def age_logic():
+          for i in range(entries):
+            s.older[i].in_ @= s.older[i].out
+            if s.alloc_en & (s.alloc_id == i):
+              s.older[i].in_ @= s.val_reg.out
+            elif s.alloc_en:
+              s.older[i].in_[s.alloc_id] @= 0
+
+        s.primary     = Wire( BitsEntries )
+        s.parked      = Wire( BitsEntries )
+        s.same_set    = [ Wire( BitsEntries ) for _ in range(entries) ]
+        s.entry_ready = Wire( BitsEntries )
+
+        @update
+        def merge_status_logic():
+          s.primary @= s.val_reg.out & ~s.park_reg.out
+          s.parked  @= s.val_reg.out &  s.park_reg.out
+          for i in range(entries):
+            for j in range(entries):
+              s.same_set[i][j] @= ( s.storage_regs[i].out.addr[idx_lo:idx_hi] ==
+                                    s.storage_regs[j].out.addr[idx_lo:idx_hi] )
+
+        @update
+        def merge_ready_logic():
+          s.entry_ready @= 0
+          for i in range(entries):
+            if ( (s.storage_regs[i].out.type_ == READ) |
+                 (s.storage_regs[i].out.type_ == WRITE) ):
+              # Secondary miss: waits for the primary miss to its set and
+              # for the requests parked before it in the same set
+              s.entry_ready[i] @= ( s.parked[i] &
+                ( (s.primary & s.same_set[i]) == 0 ) &
+                ( (s.parked & s.older[i].out & s.same_set[i]) == 0 ) )
+            else:
+              s.entry_ready[i] @= ( s.parked[i] & (s.primary == 0) &
+                                    ( (s.parked & s.older[i].out) == 0 ) )
+
+        @update
+        def merge_hit_under_miss_logic():
+          s.conflict      @= 0
+          s.park_val      @= s.parked != 0
+          s.park_ready    @= s.entry_ready != 0
+          s.park_block    @= 0
+          s.park_id       @= 0
+          s.primary_empty @= s.primary == 0
+          for i in range(entries-1, -1, -1):
+            if s.entry_ready[i]:
+              s.park_id @= i
+          for i in range(entries):
+            if s.parked[i] & ( (s.storage_regs[i].out.type_ != READ) &
+                               (s.storage_regs[i].out.type_ != WRITE) ):
+              s.park_block @= 1
+            if ( ( s.primary[i] | (s.parked[i] & s.conflict_park) ) &
+                 (s.storage_regs[i].out.addr[idx_lo:idx_hi] == s.conflict_idx) ):
+              s.conflict @= 1
+
   def line_trace(s):
     msg = ""
     msg += f" c:{s.num_entries_reg.out}"
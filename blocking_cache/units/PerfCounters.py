@@ -0,0 +1,36 @@
+"""
+=========================================================================
+ PerfCounters.py
+=========================================================================
+Optional performance counters of the cache
+
+Date   : 18 October 2026
+"""
+
+from pymtl3 import *
+
+from ..cacheStructs import stats_fields
+from .counters      import CounterEnRst
+
+class PerfCounters( Component ):
+  """
+  One counter for every field in stats_fields. Each counter counts the
+  cycles its event bit is high and wraps around when it overflows. All the
+  counters are cleared together with clear.
+  """
+  def construct( s, p ):
+
+    s.events = InPort ( p.StructStatsEvents )
+    s.clear  = InPort ()
+    s.stats  = OutPort( p.StructStats )
+
+    s.counters = [ CounterEnRst( p.bitwidth_stats ) for _ in stats_fields ]
+    for name, m in zip( stats_fields, s.counters ):
+      m.en         //= getattr( s.events, name )
+      m.load       //= s.clear
+      m.load_value //= 0
+      m.count_down //= 0
+      m.out        //= getattr( s.stats, name )
+
+  def line_trace( s ):
+    return f"hit:{s.stats.hits} miss:{s.stats.misses}"
@@ -0,0 +1,285 @@
+"""
+=========================================================================
+ Prefetcher.py
+=========================================================================
+Next-line and stride prefetcher with a prefetch buffer that sits between
+the cache and memory
+
+Date   : 18 October 2026
+"""
+
+from pymtl3                  import *
+from pymtl3.stdlib.mem       import MemMasterIfcRTL, MemMinionIfcRTL
+from pymtl3.stdlib.basic_rtl import RegEn, RegRst
+from pymtl3.stdlib.queues    import BypassQueueRTL, NormalQueueRTL
+from constants.constants     import *
+
+class Prefetcher( Component ):
+  """
+  Every refill read the cache sends out trains the prefetcher, which then
+  requests the next `degree` lines into a small fully associative prefetch
+  buffer. The lines are one apart, or the stride between the last refills
+  once the same nonzero stride has been seen twice in a row, and never
+  leave the page of the refill. Prefetches are only sent in cycles where
+  the cache is not using the memory port.
+
+  A refill to a line in the buffer is answered from the buffer and the line
+  leaves the buffer; a refill to a line that is still in flight waits for
+  it, as it does for the responses to the requests passed to memory
+  before it, since the cache expects its responses in order (a writeback
+  is acked before the refill behind it returns). Memory responds in order,
+  so a queue with one bit per request in flight tells the responses to
+  prefetches apart; their opaque holds the buffer entry. Any other request the cache sends to memory
+  (writebacks, AMOs) drops the buffered copy of its line, as does `clear`,
+  which the cache raises on INV so that data written by other caches is
+  seen. Requests and responses that are not prefetches pass through
+  unchanged.
+  """
+  def construct( s, p, degree, entries=0, page_nbytes=4096 ):
+    assert degree > 0
+    if entries == 0:
+      entries = max( 2, 2 * degree )
+    assert entries <= 2**p.bitwidth_opaque
+    inflight = entries + 4
+
+    s.cache = MemMinionIfcRTL( p.MemReqType, p.MemRespType )
+    s.mem   = MemMasterIfcRTL( p.MemReqType, p.MemRespType )
+    s.clear = InPort()
+
+    BitsLine    = mk_bits( p.bitwidth_addr - p.bitwidth_offset )
+    BitsPtr     = mk_bits( max( 1, clog2( entries ) ) )
+    BitsCount   = mk_bits( clog2( degree + 1 ) )
+    BitsEntries = mk_bits( entries )
+    BitsPending = mk_bits( clog2( inflight + 1 ) )
+    line_lo = p.bitwidth_offset
+    addr_hi = p.bitwidth_addr
+    page_lo = clog2( page_nbytes ) - p.bitwidth_offset # within the line addr
+    assert 0 < page_lo < BitsLine.nbits
+
+    # Buffer entries. An entry is pending from the prefetch request until
+    # its response comes back; a pending entry that lost its valid bit
+    # drops the response.
+    s.valid   = RegRst( BitsEntries )
+    s.pending = RegRst( BitsEntries )
+    s.addr_en = Wire( BitsEntries )
+    s.data_en = Wire( BitsEntries )
+    s.line_addr = [ RegEn( BitsLine ) for _ in range( entries ) ]
+    s.line_data = [ RegEn( p.BitsCacheline ) for _ in range( entries ) ]
+    s.alloc_ptr = RegRst( BitsPtr )
+
+    # Requests in flight, whether each one is a prefetch
+    s.order_q = NormalQueueRTL( Bits1, inflight )
+
+    # Requests passed to memory waiting on a response
+    s.fwd_pending = RegRst( BitsPending )
+
+    # Responses to buffer hits
+    s.hit_q = NormalQueueRTL( p.MemRespType, 2 )
+
+    # Cache requests, so that accepting one does not depend on whether it
+    # hits in the buffer (the cache changes its request when stalled)
+    s.req_q = m = BypassQueueRTL( p.MemReqType, 1 )
+    m.enq.en  //= s.cache.req.en
+    m.enq.rdy //= s.cache.req.rdy
+    m.enq.msg //= s.cache.req.msg
+
+    # Memory responses, so that accepting one does not depend on whether
+    # it is a prefetch
+    s.resp_q = m = BypassQueueRTL( p.MemRespType, 2 )
+    m.enq.en  //= s.mem.resp.en
+    m.enq.rdy //= s.mem.resp.rdy
+    m.enq.msg //= s.mem.resp.msg
+
+    #---------------------------------------------------------------------
+    # Lookup
+    #---------------------------------------------------------------------
+
+    s.req_line  = Wire( BitsLine )
+    s.is_refill = Wire()
+    s.match     = Wire( BitsEntries ) # valid entries holding the req line
+    s.hit_ptr   = Wire( BitsPtr )
+    s.hit_data  = Wire( p.BitsCacheline )
+    s.hit       = Wire()
+    s.hit_ready = Wire()
+    s.local_en  = Wire()
+    s.fwd_en    = Wire()
+    s.refill_en = Wire()
+
+    @update
+    def lookup_logic():
+      s.req_line  @= s.req_q.deq.ret.addr[ line_lo:addr_hi ]
+      s.is_refill @= ( s.req_q.deq.ret.type_ == READ ) & ( s.req_q.deq.ret.len == 0 )
+      s.hit_ptr   @= 0
+      s.hit_data  @= s.line_data[0].out
+      for i in range( entries ):
+        s.match[i] @= s.valid.out[i] & ( s.line_addr[i].out == s.req_line )
+        if s.match[i]:
+          s.hit_ptr  @= i
+          s.hit_data @= s.line_data[i].out
+      s.hit       @= s.is_refill & ( s.match != 0 )
+      s.hit_ready @= s.hit & ~s.pending.out[ s.hit_ptr ] & ( s.fwd_pending.out == 0 )
+
+      s.local_en  @= s.req_q.deq.rdy & s.hit & s.hit_ready & s.hit_q.enq.rdy
+      s.fwd_en    @= s.req_q.deq.rdy & ~s.hit & s.mem.req.rdy & s.order_q.enq.rdy
+      s.refill_en @= ( s.local_en | s.fwd_en ) & s.is_refill
+      s.req_q.deq.en @= s.local_en | s.fwd_en
+
+    @update
+    def hit_resp_logic():
+      s.hit_q.enq.en         @= s.local_en
+      s.hit_q.enq.msg.type_  @= READ
+      s.hit_q.enq.msg.opaque @= s.req_q.deq.ret.opaque
+      s.hit_q.enq.msg.test   @= 0
+      s.hit_q.enq.msg.len    @= 0
+      s.hit_q.enq.msg.data   @= s.hit_data
+
+    #---------------------------------------------------------------------
+    # Stride detection
+    #---------------------------------------------------------------------
+
+    s.stride = Wire( BitsLine )
+
+    s.last_line = m = RegEn( BitsLine )
+    m.in_ //= s.req_line
+    m.en  //= s.refill_en
+
+    s.last_stride = m = RegEn( BitsLine )
+    m.in_ //= s.stride
+    m.en  //= s.refill_en
+
+    s.stride //= lambda: s.req_line - s.last_line.out
+
+    # Next line to prefetch is gen_line + gen_stride, gen_count more to go
+    s.gen_line   = RegRst( BitsLine )
+    s.gen_stride = RegRst( BitsLine )
+    s.gen_count  = RegRst( BitsCount )
+    s.gen_target = Wire( BitsLine )
+    s.gen_dup    = Wire() # already in the buffer
+    s.gen_cross  = Wire() # in the next page
+    s.pf_en      = Wire()
+
+    s.gen_target //= lambda: s.gen_line.out + s.gen_stride.out
+    s.gen_cross  //= lambda: ( s.gen_target[ page_lo:BitsLine.nbits ] !=
+                               s.gen_line.out[ page_lo:BitsLine.nbits ] )
+
+    @update
+    def gen_logic():
+      s.gen_line.in_   @= s.gen_line.out
+      s.gen_stride.in_ @= s.gen_stride.out
+      s.gen_count.in_  @= s.gen_count.out
+      if s.refill_en:
+        s.gen_line.in_ @= s.req_line
+        if ( s.stride == s.last_stride.out ) & ( s.stride != 0 ):
+          s.gen_stride.in_ @= s.stride
+        else:
+          s.gen_stride.in_ @= 1
+        s.gen_count.in_ @= degree
+      elif s.gen_cross:
+        s.gen_count.in_ @= 0
+      elif ( s.gen_count.out != 0 ) & ( s.pf_en | s.gen_dup ):
+        s.gen_line.in_  @= s.gen_target
+        s.gen_count.in_ @= s.gen_count.out - 1
+
+    #---------------------------------------------------------------------
+    # Memory requests
+    #---------------------------------------------------------------------
+
+    @update
+    def memreq_logic():
+      s.gen_dup @= 0
+      for i in range( entries ):
+        if s.valid.out[i] & ( s.line_addr[i].out == s.gen_target ):
+          s.gen_dup @= 1
+
+      # The cache has priority on the memory port
+      s.pf_en @= ( s.gen_count.out != 0 ) & ~s.gen_dup & ~s.gen_cross & \
+                 ~s.fwd_en & ~s.clear & \
+                 ~s.pending.out[ s.alloc_ptr.out ] & s.mem.req.rdy & s.order_q.enq.rdy
+
+      s.mem.req.en      @= s.fwd_en | s.pf_en
+      s.order_q.enq.en  @= s.fwd_en | s.pf_en
+      s.order_q.enq.msg @= s.pf_en
+      if s.fwd_en:
+        s.mem.req.msg @= s.req_q.deq.ret
+      else:
+        s.mem.req.msg        @= p.MemReqType()
+        s.mem.req.msg.type_  @= READ
+        s.mem.req.msg.opaque @= zext( s.alloc_ptr.out, p.bitwidth_opaque )
+        s.mem.req.msg.addr   @= concat( s.gen_target, p.BitsOffset(0) )
+
+      s.addr_en @= 0
+      if s.pf_en:
+        s.addr_en[ s.alloc_ptr.out ] @= 1
+
+      s.alloc_ptr.in_ @= s.alloc_ptr.out
+      if s.pf_en:
+        if s.alloc_ptr.out == entries - 1:
+          s.alloc_ptr.in_ @= 0
+        else:
+          s.alloc_ptr.in_ @= s.alloc_ptr.out + 1
+
+    for i in range( entries ):
+      s.line_addr[i].in_ //= s.gen_target
+      s.line_addr[i].en  //= s.addr_en[i]
+      s.line_data[i].in_ //= s.resp_q.deq.ret.data
+      s.line_data[i].en  //= s.data_en[i]
+
+    #---------------------------------------------------------------------
+    # Memory responses
+    #---------------------------------------------------------------------
+
+    s.resp_is_pf = Wire()
+    s.fill_en    = Wire()
+    s.fill_ptr   = Wire( BitsPtr )
+
+    @update
+    def memresp_logic():
+      s.resp_is_pf @= s.order_q.deq.ret
+      s.fill_en    @= s.resp_q.deq.rdy & s.resp_is_pf
+      s.fill_ptr   @= s.resp_q.deq.ret.opaque[ 0:BitsPtr.nbits ]
+
+      # Buffer hits go first
+      s.hit_q.deq.en @= s.hit_q.deq.rdy & s.cache.resp.rdy
+      if s.hit_q.deq.rdy:
+        s.cache.resp.en  @= s.cache.resp.rdy
+        s.cache.resp.msg @= s.hit_q.deq.ret
+      else:
+        s.cache.resp.en  @= s.resp_q.deq.rdy & ~s.resp_is_pf & s.cache.resp.rdy
+        s.cache.resp.msg @= s.resp_q.deq.ret
+      s.resp_q.deq.en  @= s.fill_en | ( s.cache.resp.en & ~s.hit_q.deq.rdy )
+      s.order_q.deq.en @= s.resp_q.deq.en
+
+      s.data_en @= 0
+      if s.fill_en:
+        s.data_en[ s.fill_ptr ] @= 1
+
+    s.fwd_resp_en = Wire()
+
+    @update
+    def fwd_pending_logic():
+      s.fwd_resp_en @= s.cache.resp.en & ~s.hit_q.deq.rdy
+      s.fwd_pending.in_ @= s.fwd_pending.out
+      if s.fwd_en & ~s.fwd_resp_en:
+        s.fwd_pending.in_ @= s.fwd_pending.out + 1
+      elif ~s.fwd_en & s.fwd_resp_en:
+        s.fwd_pending.in_ @= s.fwd_pending.out - 1
+
+    @update
+    def state_logic():
+      s.valid.in_   @= s.valid.out
+      s.pending.in_ @= s.pending.out
+      if s.fill_en:
+        s.pending.in_[ s.fill_ptr ] @= 0
+      # Lines handed to the cache and lines the cache writes to leave
+      if s.local_en:
+        s.valid.in_[ s.hit_ptr ] @= 0
+      if s.fwd_en & ( s.req_q.deq.ret.type_ != READ ):
+        s.valid.in_ @= s.valid.in_ & ~s.match
+      if s.clear:
+        s.valid.in_ @= 0
+      if s.pf_en:
+        s.valid.in_  [ s.alloc_ptr.out ] @= 1
+        s.pending.in_[ s.alloc_ptr.out ] @= 1
+
+  def line_trace( s ):
+    return f"pf:{s.valid.out}"
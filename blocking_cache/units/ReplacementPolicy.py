@@ -11,42 +11,176 @@ Date   : 12/23/19
 from pymtl3                  import *
 from pymtl3.stdlib.basic_rtl import RegEnRst, RegRst
 
+#-------------------------------------------------------------------------
+# Replacement state encoding
+#-------------------------------------------------------------------------
+# Each set keeps p.bitwidth_rep bits of replacement state.
+#
+# 2-way: a single bit that points at the way to replace (both policies are
+#   the same for two ways)
+# plru : tree pseudo-LRU with one bit per node of a binary tree over the
+#   ways. Node k has children 2k+1 and 2k+2 and its bit points to the half
+#   that holds the victim (0 = lower ways, 1 = upper ways).
+# lru  : true LRU with a clog2(associativity)-bit age per way. The most
+#   recently used way has age 0 and the victim has the largest age.
+
+def plru_tree_paths( nways ):
+  """
+  Returns the node mask and the node bits that point towards each way in a
+  tree pseudo-LRU state
+  """
+  masks = []
+  paths = []
+  for way in range( nways ):
+    mask = 0
+    path = 0
+    node = 0
+    lo, hi = 0, nways
+    while hi - lo > 1:
+      mid = (lo + hi) // 2
+      mask |= 1 << node
+      if way < mid:
+        node, hi = 2 * node + 1, mid
+      else:
+        path |= 1 << node
+        node, lo = 2 * node + 2, mid
+    masks.append( mask )
+    paths.append( path )
+  return masks, paths
+
+def replacement_reset_state( p ):
+  """
+  Replacement state of a set after reset. True LRU starts with way i having
+  age i so that the state is always a permutation of the ways.
+  """
+  if p.associativity > 2 and p.replacement_policy == 'lru':
+    return sum( i << (i * p.bitwidth_clog_asso) for i in range(p.associativity) )
+  return 0
+
 class ReplacementPolicy (Component):
   """
   Given an input of histories for past accesses (LRU bits),
   output the way number that should have its cache line
-  replaced.
+  replaced and the updated histories.
 
-  Latency sensitive - do not expect to be problems?
-  Base two associativity only
+  The updated state either marks a way as the most recently used (the hit
+  way on a hit, the victim on a miss) or, when repreq_demote is set, as
+  the next victim (e.g., an AMO has just invalidated that way).
+  Supports any power of two associativity: direct mapped needs no state,
+  2-way keeps one pointer bit and higher associativities use the 'plru'
+  tree or the 'lru' ages selected by p.replacement_policy.
   """
-  def construct(s, p, policy = 0):
-    # policy 0 = LRU policy
-    # More area efficient policies include FIFO
+  def construct(s, p):
     s.repreq_en      = InPort()
     s.repreq_rdy     = OutPort()
     s.repreq_hit_ptr = InPort(p.bitwidth_clog_asso)
     s.repreq_is_hit  = InPort()
-    s.repreq_ptr     = InPort(p.bitwidth_clog_asso)
-    s.represp_ptr    = OutPort(p.bitwidth_clog_asso)
-    
+    s.repreq_demote  = InPort()
+    s.repreq_state   = InPort(p.bitwidth_rep)   # Replacement state of the set
+    s.represp_victim = OutPort(p.bitwidth_clog_asso)
+    s.represp_state  = OutPort(p.bitwidth_rep)  # Updated replacement state
+
     s.repreq_rdy //= 1
 
-    if p.associativity == 2:
-      # if policy == 0: # LRU - flip bit when hit or miss
+    nways = p.associativity
+    BitsRep = p.BitsRep
+
+    if nways == 1:
+      s.represp_victim //= 0
+      s.represp_state  //= 0
+
+    elif nways == 2:
       # LRU for 2 way is extra simple since we don't need
       # to keep track
+      s.represp_victim //= s.repreq_state
       @update
       def pointer_logic():
-        s.represp_ptr @= s.repreq_ptr
+        s.represp_state @= s.repreq_state
         if s.repreq_en:
-          if ~s.repreq_is_hit:
-            s.represp_ptr @= ~s.repreq_ptr
+          if s.repreq_demote:
+            s.represp_state @= s.repreq_hit_ptr
+          elif ~s.repreq_is_hit:
+            s.represp_state @= ~s.repreq_state
           elif s.repreq_is_hit:
-            s.represp_ptr @= ~s.repreq_hit_ptr
+            s.represp_state @= ~s.repreq_hit_ptr
+
+    elif p.replacement_policy == 'plru':
+      # Tree pseudo-LRU. Updating a way only rewrites the nodes on its path
+      masks, paths = plru_tree_paths( nways )
+      s.path_mask = [ Wire(BitsRep) for _ in range(nways) ]
+      s.path_bits = [ Wire(BitsRep) for _ in range(nways) ]
+      for i in range(nways):
+        s.path_mask[i] //= masks[i]
+        s.path_bits[i] //= paths[i]
+
+      s.update_ptr = Wire(p.bitwidth_clog_asso)
+
+      @update
+      def plru_victim_logic():
+        s.represp_victim @= 0
+        for i in range(nways):
+          if (s.repreq_state & s.path_mask[i]) == s.path_bits[i]:
+            s.represp_victim @= i
+
+      @update
+      def plru_update_logic():
+        s.update_ptr @= s.represp_victim
+        if s.repreq_is_hit | s.repreq_demote:
+          s.update_ptr @= s.repreq_hit_ptr
+
+        s.represp_state @= s.repreq_state
+        if s.repreq_en:
+          if s.repreq_demote:
+            # Point every node on the path towards this way
+            s.represp_state @= ( (s.repreq_state & ~s.path_mask[s.update_ptr]) |
+                                 s.path_bits[s.update_ptr] )
+          else:
+            # Point every node on the path away from this way
+            s.represp_state @= ( (s.repreq_state & ~s.path_mask[s.update_ptr]) |
+                                 (~s.path_bits[s.update_ptr] & s.path_mask[s.update_ptr]) )
+
     else:
-      # Real difficult to implement LRU here
-      s.represp_ptr //= 0
+      # True LRU with one age per way
+      nbits = p.bitwidth_clog_asso
+      BitsAge = mk_bits( nbits )
+      s.age      = [ Wire(BitsAge) for _ in range(nways) ]
+      s.age_next = [ Wire(BitsAge) for _ in range(nways) ]
+      for i in range(nways):
+        s.age[i]      //= s.repreq_state[i*nbits:(i+1)*nbits]
+        s.represp_state[i*nbits:(i+1)*nbits] //= s.age_next[i]
+
+      s.update_ptr = Wire(p.bitwidth_clog_asso)
+      s.update_age = Wire(BitsAge)
+
+      @update
+      def lru_victim_logic():
+        s.represp_victim @= 0
+        for i in range(nways):
+          if s.age[i] == nways - 1:
+            s.represp_victim @= i
+
+      @update
+      def lru_update_logic():
+        s.update_ptr @= s.represp_victim
+        if s.repreq_is_hit | s.repreq_demote:
+          s.update_ptr @= s.repreq_hit_ptr
+        s.update_age @= s.age[s.update_ptr]
+
+        for i in range(nways):
+          s.age_next[i] @= s.age[i]
+          if s.repreq_en:
+            if s.repreq_demote:
+              # Way becomes the oldest, younger ways age by one less
+              if i == s.update_ptr:
+                s.age_next[i] @= nways - 1
+              elif s.age[i] > s.update_age:
+                s.age_next[i] @= s.age[i] - 1
+            else:
+              # Way becomes the youngest, ways younger than it age by one
+              if i == s.update_ptr:
+                s.age_next[i] @= 0
+              elif s.age[i] < s.update_age:
+                s.age_next[i] @= s.age[i] + 1
 
   def line_trace( s ):
     msg = ""
@@ -0,0 +1,189 @@
+"""
+=========================================================================
+ StoreBuffer.py
+=========================================================================
+Store buffer with same-word write merging that sits in front of the cache
+pipeline
+
+Date   : 18 October 2026
+"""
+
+from pymtl3                  import *
+from pymtl3.stdlib.mem       import MemMasterIfcRTL, MemMinionIfcRTL
+from pymtl3.stdlib.basic_rtl import RegEn, RegRst
+from pymtl3.stdlib.queues    import NormalQueueRTL
+from constants.constants     import *
+
+class StoreBuffer( Component ):
+  """
+  Writes are retired into the buffer and answered right away, so a stream
+  of stores goes at one request per cycle while the cache absorbs the clean
+  hit stalls and write misses in the background. Buffered writes drain into
+  the cache in order. Merging is limited to the word of the youngest entry:
+  a write to that word that sets every byte the entry does (a whole word,
+  or the same bytes) replaces it instead of taking a new entry. Writes are
+  not combined into lines, since the cache request has no byte mask to
+  carry a partial line write.
+
+  Every other request waits until the buffer has drained and is then passed
+  through to the cache, so the cache sees the same requests in the same
+  order (minus the merged writes). Writes wait for passed-through requests
+  to respond so responses stay in order. Buffered writes respond with the
+  test bit low and the cache's responses to the drained writes are dropped.
+  """
+  def construct( s, p, entries ):
+    assert entries > 0
+
+    s.proc  = MemMinionIfcRTL( p.CacheReqType, p.CacheRespType )
+    s.cache = MemMasterIfcRTL( p.CacheReqType, p.CacheRespType )
+
+    BitsPtr     = mk_bits( max( 1, clog2( entries ) ) )
+    BitsCount   = mk_bits( clog2( entries + 1 ) )
+    BitsPending = mk_bits( clog2( p.num_mshr_entries + 8 ) )
+    word_lo = p.bitwidth_len
+    addr_hi = p.bitwidth_addr
+
+    # Incoming requests are registered so that rdy does not depend on the
+    # type of the request
+    s.req_q = m = NormalQueueRTL( p.CacheReqType, 2 )
+    m.enq.en  //= s.proc.req.en
+    m.enq.rdy //= s.proc.req.rdy
+    m.enq.msg //= s.proc.req.msg
+
+    # Responses to buffered writes
+    s.resp_q = NormalQueueRTL( p.CacheRespType, 2 )
+
+    # Buffer storage, a circular queue from head to tail
+    s.head_ptr = RegRst( BitsPtr )
+    s.tail_ptr = RegRst( BitsPtr )
+    s.count    = RegRst( BitsCount )
+    s.entry_en = Wire( mk_bits( entries ) )
+    s.entries  = [ RegEn( p.CacheReqType ) for _ in range( entries ) ]
+    for i, m in enumerate( s.entries ):
+      m.in_ //= s.req_q.deq.ret
+      m.en  //= s.entry_en[i]
+
+    # Passed-through requests waiting on a response from the cache
+    s.pending = RegRst( BitsPending )
+
+    s.last_ptr   = Wire( BitsPtr )
+    s.head_entry = Wire( p.CacheReqType )
+    s.last_entry = Wire( p.CacheReqType )
+
+    @update
+    def entry_select_logic():
+      if s.tail_ptr.out == 0:
+        s.last_ptr @= entries - 1
+      else:
+        s.last_ptr @= s.tail_ptr.out - 1
+      s.head_entry @= s.entries[0].out
+      s.last_entry @= s.entries[0].out
+      for i in range( entries ):
+        if s.head_ptr.out == i:
+          s.head_entry @= s.entries[i].out
+        if s.last_ptr == i:
+          s.last_entry @= s.entries[i].out
+
+    s.empty    = Wire()
+    s.full     = Wire()
+    s.is_write = Wire()
+    s.covers   = Wire()
+    s.merge    = Wire()
+    s.drain_en = Wire()
+    s.pass_en  = Wire()
+    s.write_en = Wire()
+    s.alloc_en = Wire()
+
+    @update
+    def req_logic():
+      s.empty    @= s.count.out == 0
+      s.full     @= s.count.out == entries
+      s.is_write @= s.req_q.deq.rdy & ( s.req_q.deq.ret.type_ == WRITE )
+      # Same word, and the new write sets every byte the old one did
+      s.covers   @= ( s.req_q.deq.ret.addr[word_lo:addr_hi] ==
+                      s.last_entry.addr[word_lo:addr_hi] ) & \
+                    ( ( s.req_q.deq.ret.len == 0 ) |
+                      ( ( s.req_q.deq.ret.addr == s.last_entry.addr ) &
+                        ( s.req_q.deq.ret.len == s.last_entry.len ) ) )
+
+      s.drain_en @= ~s.empty & s.cache.req.rdy
+      # Cannot merge into the entry that is draining this cycle
+      s.merge    @= s.is_write & ~s.empty & s.covers & \
+                    ~( s.drain_en & ( s.count.out == 1 ) )
+      s.write_en @= s.is_write & ( s.pending.out == 0 ) & s.resp_q.enq.rdy & \
+                    ( s.merge | ~s.full )
+      s.alloc_en @= s.write_en & ~s.merge
+      s.pass_en  @= s.req_q.deq.rdy & ~s.is_write & s.empty & s.cache.req.rdy
+
+      s.req_q.deq.en @= s.write_en | s.pass_en
+
+      s.cache.req.en @= s.drain_en | s.pass_en
+      if s.empty:
+        s.cache.req.msg @= s.req_q.deq.ret
+      else:
+        s.cache.req.msg @= s.head_entry
+
+      s.entry_en @= 0
+      for i in range( entries ):
+        if s.write_en & s.merge & ( s.last_ptr == i ):
+          s.entry_en[i] @= 1
+        if s.alloc_en & ( s.tail_ptr.out == i ):
+          s.entry_en[i] @= 1
+
+    @update
+    def ptr_logic():
+      s.head_ptr.in_ @= s.head_ptr.out
+      if s.drain_en:
+        if s.head_ptr.out == entries - 1:
+          s.head_ptr.in_ @= 0
+        else:
+          s.head_ptr.in_ @= s.head_ptr.out + 1
+
+      s.tail_ptr.in_ @= s.tail_ptr.out
+      if s.alloc_en:
+        if s.tail_ptr.out == entries - 1:
+          s.tail_ptr.in_ @= 0
+        else:
+          s.tail_ptr.in_ @= s.tail_ptr.out + 1
+
+      s.count.in_ @= s.count.out
+      if s.alloc_en & ~s.drain_en:
+        s.count.in_ @= s.count.out + 1
+      elif ~s.alloc_en & s.drain_en:
+        s.count.in_ @= s.count.out - 1
+
+    @update
+    def write_resp_logic():
+      s.resp_q.enq.en         @= s.write_en
+      s.resp_q.enq.msg.type_  @= s.req_q.deq.ret.type_
+      s.resp_q.enq.msg.opaque @= s.req_q.deq.ret.opaque
+      s.resp_q.enq.msg.test   @= 0
+      s.resp_q.enq.msg.len    @= s.req_q.deq.ret.len
+      s.resp_q.enq.msg.data   @= 0
+
+    s.cache_resp_write = Wire()
+
+    @update
+    def resp_logic():
+      # The buffer already answered the writes, so drop the cache's responses
+      s.cache_resp_write @= s.cache.resp.msg.type_ == WRITE
+      s.cache.resp.rdy   @= s.cache_resp_write | \
+                            ( ~s.resp_q.deq.rdy & s.proc.resp.rdy )
+      s.resp_q.deq.en    @= s.resp_q.deq.rdy & s.proc.resp.rdy
+      if s.resp_q.deq.rdy:
+        s.proc.resp.en  @= s.proc.resp.rdy
+        s.proc.resp.msg @= s.resp_q.deq.ret
+      else:
+        s.proc.resp.en  @= s.cache.resp.en & ~s.cache_resp_write
+        s.proc.resp.msg @= s.cache.resp.msg
+
+    @update
+    def pending_logic():
+      s.pending.in_ @= s.pending.out
+      if s.pass_en & ~( s.cache.resp.en & ~s.cache_resp_write ):
+        s.pending.in_ @= s.pending.out + 1
+      elif ~s.pass_en & s.cache.resp.en & ~s.cache_resp_write:
+        s.pending.in_ @= s.pending.out - 1
+
+  def line_trace( s ):
+    return f"sb:{s.count.out}"
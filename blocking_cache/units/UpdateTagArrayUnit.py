@@ -42,7 +42,8 @@ class UpdateTagArrayUnit( Component ):
         # set the dirty bits of two words
         if s.wr_len == 3:
           s.out.dty[ s.offset[2 : p.bitwidth_offset] + 1 ] @= 1
-      elif s.cmd == UpdateTagArrayUnit_CMD_RD_REFILL:
+      elif ( (s.cmd == UpdateTagArrayUnit_CMD_RD_REFILL) |
+             (s.cmd == UpdateTagArrayUnit_CMD_INIT) ):
         # Refill for a read, simply mark valid bit and clear the dirty
         # bits
         s.out.val @= CACHE_LINE_STATE_VALID
@@ -64,6 +65,28 @@ class UpdateTagArrayUnit( Component ):
         # For cache invalidation, leave the dirty bits as is, clear the
         # valid bit
         s.out.val @= CACHE_LINE_STATE_INVALID
+      elif s.cmd == UpdateTagArrayUnit_CMD_FLUSH:
+        # The line has been written back, so it is clean again
+        s.out.dty @= 0
+
+    # Sectored lines: a refill adds the sector it brought in to the valid
+    # sectors kept in the MSHR. WRITE_INIT makes the whole line valid.
+    if p.sectors > 1:
+      s.refill_sec = InPort(p.bitwidth_sec)
+      all_sec = p.BitsSec(-1)
+      sec_lo  = p.bitwidth_sector_offset
+
+      @update
+      def new_tag_array_sec_logic():
+        s.out.sec @= s.old_entries[s.way].sec
+        if ( (s.cmd == UpdateTagArrayUnit_CMD_WR_REFILL) |
+             (s.cmd == UpdateTagArrayUnit_CMD_RD_REFILL) ):
+          s.out.sec @= s.refill_sec
+          s.out.sec[ s.offset[sec_lo : p.bitwidth_offset] ] @= 1
+        elif s.cmd == UpdateTagArrayUnit_CMD_INIT:
+          s.out.sec @= all_sec
+        elif s.cmd == UpdateTagArrayUnit_CMD_CLEAR:
+          s.out.sec @= 0
 
   def line_trace( s ):
     msg = ""
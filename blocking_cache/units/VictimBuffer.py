@@ -0,0 +1,186 @@
+"""
+=========================================================================
+ VictimBuffer.py
+=========================================================================
+Small fully associative victim buffer that sits between the cache and
+memory
+
+Date   : 18 October 2026
+"""
+
+from pymtl3                  import *
+from pymtl3.stdlib.mem       import MemMasterIfcRTL, MemMinionIfcRTL
+from pymtl3.stdlib.basic_rtl import RegEn, RegRst
+from pymtl3.stdlib.queues    import BypassQueueRTL, NormalQueueRTL
+from constants.constants     import *
+
+class VictimBuffer( Component ):
+  """
+  The cache writes back every valid line it evicts on a miss, clean ones
+  included (with an empty write mask), and raises `capture` with the
+  writeback. The buffer keeps the whole line in the first free entry (or
+  the next one round robin when it is full), replacing any older copy of
+  it. Clean writebacks are acked here, dirty ones still go to memory.
+
+  A refill to a line in the buffer is answered from the buffer with test
+  set to 1 and the line leaves the buffer, since the cache holds it again.
+  Responses are kept in order with a queue that has one bit per request in
+  flight telling the local responses apart from the ones memory owes
+  (the cache expects the writeback ack before the refill behind it). Any
+  other request the cache sends to memory (flush writebacks, AMOs) drops
+  the buffered copy of its line, as does `clear`, which the cache raises
+  on INV so that data written by other caches is seen.
+  """
+  def construct( s, p, entries ):
+    assert entries > 0
+    inflight = 4
+
+    s.cache   = MemMinionIfcRTL( p.MemReqType, p.MemRespType )
+    s.mem     = MemMasterIfcRTL( p.MemReqType, p.MemRespType )
+    s.capture = InPort() # comes with cache.req
+    s.clear   = InPort()
+
+    BitsLine    = mk_bits( p.bitwidth_addr - p.bitwidth_offset )
+    BitsPtr     = mk_bits( max( 1, clog2( entries ) ) )
+    BitsEntries = mk_bits( entries )
+    line_lo = p.bitwidth_offset
+    addr_hi = p.bitwidth_addr
+
+    s.valid     = RegRst( BitsEntries )
+    s.line_en   = Wire( BitsEntries )
+    s.free      = Wire()
+    s.free_ptr  = Wire( BitsPtr )
+    s.line_addr = [ RegEn( BitsLine ) for _ in range( entries ) ]
+    s.line_data = [ RegEn( p.BitsCacheline ) for _ in range( entries ) ]
+    s.alloc_ptr = RegRst( BitsPtr )
+
+    # Requests in flight, whether each one is answered locally
+    s.order_q = NormalQueueRTL( Bits1, inflight )
+
+    # Local responses (buffer hits and clean writeback acks)
+    s.local_q = NormalQueueRTL( p.MemRespType, 2 )
+
+    # Cache requests, so that accepting one does not depend on whether it
+    # hits in the buffer (the cache changes its request when stalled)
+    s.req_q = m = BypassQueueRTL( p.MemReqType, 1 )
+    m.enq.en  //= s.cache.req.en
+    m.enq.rdy //= s.cache.req.rdy
+    m.enq.msg //= s.cache.req.msg
+
+    s.capture_q = m = BypassQueueRTL( Bits1, 1 )
+    m.enq.en  //= s.cache.req.en
+    m.enq.msg //= s.capture
+
+    #---------------------------------------------------------------------
+    # Lookup
+    #---------------------------------------------------------------------
+
+    s.req_line   = Wire( BitsLine )
+    s.is_refill  = Wire()
+    s.is_capture = Wire()
+    s.match      = Wire( BitsEntries ) # valid entries holding the req line
+    s.hit_data   = Wire( p.BitsCacheline )
+    s.hit        = Wire()
+    s.is_local   = Wire()
+    s.local_en   = Wire()
+    s.fwd_en     = Wire()
+    s.deq_en     = Wire()
+
+    @update
+    def lookup_logic():
+      s.req_line   @= s.req_q.deq.ret.addr[ line_lo:addr_hi ]
+      s.is_refill  @= ( s.req_q.deq.ret.type_ == READ ) & ( s.req_q.deq.ret.len == 0 )
+      s.is_capture @= s.capture_q.deq.ret & ( s.req_q.deq.ret.type_ == WRITE )
+      s.hit_data   @= s.line_data[0].out
+      for i in range( entries ):
+        s.match[i] @= s.valid.out[i] & ( s.line_addr[i].out == s.req_line )
+        if s.match[i]:
+          s.hit_data @= s.line_data[i].out
+      s.hit      @= s.is_refill & ( s.match != 0 )
+      s.is_local @= s.hit | ( s.is_capture & ( s.req_q.deq.ret.wr_mask == 0 ) )
+
+      s.local_en @= s.req_q.deq.rdy & s.is_local & s.local_q.enq.rdy & s.order_q.enq.rdy
+      s.fwd_en   @= s.req_q.deq.rdy & ~s.is_local & s.mem.req.rdy & s.order_q.enq.rdy
+      s.deq_en   @= s.local_en | s.fwd_en
+      s.req_q.deq.en     @= s.deq_en
+      s.capture_q.deq.en @= s.deq_en
+
+    @update
+    def local_resp_logic():
+      s.local_q.enq.en         @= s.local_en
+      s.local_q.enq.msg        @= p.MemRespType()
+      s.local_q.enq.msg.type_  @= s.req_q.deq.ret.type_
+      s.local_q.enq.msg.opaque @= s.req_q.deq.ret.opaque
+      if s.hit:
+        s.local_q.enq.msg.test @= 1
+        s.local_q.enq.msg.data @= s.hit_data
+
+    #---------------------------------------------------------------------
+    # Memory requests and responses
+    #---------------------------------------------------------------------
+
+    s.mem.req.en  //= s.fwd_en
+    s.mem.req.msg //= s.req_q.deq.ret
+
+    s.order_q.enq.en  //= s.deq_en
+    s.order_q.enq.msg //= s.is_local
+
+    @update
+    def resp_logic():
+      s.cache.resp.msg @= s.mem.resp.msg
+      s.mem.resp.rdy   @= 0
+      if s.order_q.deq.rdy & s.order_q.deq.ret:
+        s.cache.resp.msg @= s.local_q.deq.ret
+        s.cache.resp.en  @= s.local_q.deq.rdy & s.cache.resp.rdy
+      else:
+        s.mem.resp.rdy   @= s.order_q.deq.rdy & s.cache.resp.rdy
+        s.cache.resp.en  @= s.mem.resp.en
+      s.local_q.deq.en @= s.cache.resp.en & s.order_q.deq.ret
+      s.order_q.deq.en @= s.cache.resp.en
+
+    #---------------------------------------------------------------------
+    # Buffer state
+    #---------------------------------------------------------------------
+
+    for i in range( entries ):
+      s.line_addr[i].in_ //= s.req_line
+      s.line_addr[i].en  //= s.line_en[i]
+      s.line_data[i].in_ //= s.req_q.deq.ret.data
+      s.line_data[i].en  //= s.line_en[i]
+
+    # The entry of an older copy is free as well
+    @update
+    def free_logic():
+      s.free     @= 0
+      s.free_ptr @= 0
+      for i in range( entries - 1, -1, -1 ):
+        if ~s.valid.out[i] | s.match[i]:
+          s.free     @= 1
+          s.free_ptr @= i
+
+    @update
+    def state_logic():
+      s.valid.in_     @= s.valid.out
+      s.alloc_ptr.in_ @= s.alloc_ptr.out
+      s.line_en       @= 0
+      # Lines handed back to the cache and lines memory is about to change
+      # leave, and a captured line replaces its older copy
+      if s.deq_en & ~s.is_refill:
+        s.valid.in_ @= s.valid.out & ~s.match
+      if s.local_en & s.hit:
+        s.valid.in_ @= s.valid.out & ~s.match
+      if s.clear:
+        s.valid.in_ @= 0
+      if s.deq_en & s.is_capture & s.free:
+        s.valid.in_[ s.free_ptr ] @= 1
+        s.line_en  [ s.free_ptr ] @= 1
+      elif s.deq_en & s.is_capture:
+        s.valid.in_[ s.alloc_ptr.out ] @= 1
+        s.line_en  [ s.alloc_ptr.out ] @= 1
+        if s.alloc_ptr.out == entries - 1:
+          s.alloc_ptr.in_ @= 0
+        else:
+          s.alloc_ptr.in_ @= s.alloc_ptr.out + 1
+
+  def line_trace( s ):
+    return f"vb:{s.valid.out}"
@@ -19,12 +19,30 @@ from .MSHR import (
   MSHR
 )
 
+from .StoreBuffer import (
+  StoreBuffer
+)
+
+from .Prefetcher import (
+  Prefetcher
+)
+
+from .VictimBuffer import (
+  VictimBuffer
+)
+
 from .counters import (
   CounterEnRst,
   CounterUpDown
 )
 
+from .PerfCounters import (
+  PerfCounters
+)
+
 from .arithmetics import (
+  AddrRangeCheck,
+  AmoAlu,
   DataReplicator,
   Indexer,
   OffsetLenSelector,
@@ -33,5 +51,8 @@ from .arithmetics import (
 )
 
 from .registers import (
+  DirtyBitsReg,
   ReplacementBitsReg,
+  ValidBitsReg,
+  WayPredictorReg,
 )
@@ -273,6 +273,18 @@ class TagArrayRDataProcessUnit( Component ):
           if s.tag_array[i].dty[j] & s.en:
             s.line_dirty[i] @= y
 
+    # With sectored lines a valid line only hits if the sector of the
+    # offset is valid too. A miss on another sector of the line is flagged
+    # like an invalid dirty line so that the line is refilled in place.
+    s.sec_val = [ Wire() for _ in range(p.associativity) ]
+    if p.sectors > 1:
+      sec_lo = p.bitwidth_sector_offset
+      for i in range(p.associativity):
+        s.sec_val[i] //= lambda: s.tag_array[i].sec[ s.offset[sec_lo : p.bitwidth_offset] ]
+    else:
+      for i in range(p.associativity):
+        s.sec_val[i] //= 1
+
     @update
     def comparing_logic():
       s.hit       @= n
@@ -282,7 +294,10 @@ class TagArrayRDataProcessUnit( Component ):
         for i in range(p.associativity):
           if s.tag_array[i].val == CACHE_LINE_STATE_VALID:
             if s.tag_array[i].tag == s.addr_tag:
-              s.hit      @= y
+              if s.sec_val[i]:
+                s.hit       @= y
+              else:
+                s.inval_hit @= y
               s.hit_way  @= i
           if s.line_dirty[i] & (s.tag_array[i].val == CACHE_LINE_STATE_INVALID):
             # If not valid, then we check if the line is dirty at all
@@ -305,3 +320,80 @@ class TagArrayRDataProcessUnit( Component ):
   def line_trace( s ):
     msg = f'hit:{s.hit} hit_way:{s.hit_way} inv_hit:{s.inval_hit} wr_len:{s.wr_len} word_dirty:{s.word_dirty}'
     return msg
+
+class AmoAlu( Component ):
+  """
+  Single-cycle ALU for AMOs done in the cache. Applies the AMO to the word
+  at the offset of a cacheline read from the data array. Outputs the old
+  word, which the AMO responds with, and the new word replicated over the
+  cacheline so that the write bit enable of the word picks it out.
+
+  AMOs are always on 32-bit words
+  """
+  def construct( s, p ):
+    s.type_  = InPort(p.BitsType)
+    s.line   = InPort(p.bitwidth_cacheline)
+    s.offset = InPort(p.bitwidth_offset)
+    s.in_    = InPort(32) # operand from the request
+    s.old    = OutPort(p.bitwidth_data)
+    s.out    = OutPort(p.bitwidth_cacheline)
+
+    nwords = p.bitwidth_cacheline // 32
+    s.word_mux = m = Mux(32, nwords)
+    for i in range( nwords ):
+      m.in_[i] //= s.line[ 32*i : 32*(i+1) ]
+    m.sel //= s.offset[ 2 : p.bitwidth_offset ]
+
+    s.result = Wire(32)
+    sign = Bits32( 0x80000000 )
+
+    @update
+    def amo_logic():
+      s.result @= s.in_
+      if   s.type_ == AMO_ADD:  s.result @= s.word_mux.out + s.in_
+      elif s.type_ == AMO_AND:  s.result @= s.word_mux.out & s.in_
+      elif s.type_ == AMO_OR:   s.result @= s.word_mux.out | s.in_
+      elif s.type_ == AMO_XOR:  s.result @= s.word_mux.out ^ s.in_
+      elif s.type_ == AMO_MINU:
+        if s.word_mux.out < s.in_: s.result @= s.word_mux.out
+      elif s.type_ == AMO_MAXU:
+        if s.word_mux.out > s.in_: s.result @= s.word_mux.out
+      # Signed compares flip the sign bits and compare unsigned
+      elif s.type_ == AMO_MIN:
+        if ( s.word_mux.out ^ sign ) < ( s.in_ ^ sign ): s.result @= s.word_mux.out
+      elif s.type_ == AMO_MAX:
+        if ( s.word_mux.out ^ sign ) > ( s.in_ ^ sign ): s.result @= s.word_mux.out
+
+    s.old //= lambda: zext( s.word_mux.out, p.bitwidth_data )
+    for i in range( nwords ):
+      s.out[ 32*i : 32*(i+1) ] //= s.result
+
+  def line_trace( s ):
+    return f"{s.word_mux.out}>{s.result}"
+
+class AddrRangeCheck( Component ):
+  """
+  Checks whether the address falls in any of the ranges, each given as a
+  (base, size) tuple in bytes.
+  """
+  def construct( s, p, ranges ):
+
+    s.addr = InPort(p.bitwidth_addr)
+    s.out  = OutPort()
+
+    nranges  = len( ranges )
+    s.bases  = [ Wire(p.bitwidth_addr) for _ in range(nranges) ]
+    s.bounds = [ Wire(p.bitwidth_addr) for _ in range(nranges) ]
+    for i, ( base, size ) in enumerate( ranges ):
+      s.bases[i]  //= p.BitsAddr( base )
+      s.bounds[i] //= p.BitsAddr( base + size - 1 )
+
+    @update
+    def range_check_logic():
+      s.out @= 0
+      for i in range( nranges ):
+        if ( s.bases[i] <= s.addr ) & ( s.addr <= s.bounds[i] ):
+          s.out @= 1
+
+  def line_trace( s ):
+    return f"{s.addr}:{s.out}"
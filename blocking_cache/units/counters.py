@@ -25,6 +25,8 @@ class CounterEnRst( Component ):
     def counter_ff_logic():
       if s.reset:
         s.out <<= reset_value
+      elif s.load:
+        s.out <<= s.load_value
       elif s.en:
         if s.count_down:
           s.out <<= s.out - 1
@@ -10,36 +10,169 @@ Date   : 1 March 2020
 from pymtl3                  import *
 from pymtl3.stdlib.basic_rtl import RegEnRst, RegEn, RegRst
 
+from .ReplacementPolicy       import replacement_reset_state
+
 class ReplacementBitsReg( Component ):
   """
   Wrapper for the replacement bits register. We need it because we need more
   control on the bit level
-  Works for 2 way asso
+  Holds p.bitwidth_rep bits of replacement state for every set
   """
   def construct( s, p ):
 
-    s.wdata = InPort()
+    s.wdata = InPort( p.bitwidth_rep )
     s.wen   = InPort()
     s.waddr = InPort( p.BitsIdx )
     s.raddr = InPort( p.BitsIdx )
-    s.rdata = OutPort()
-
-    s.replacement_register = m = RegEnRst( p.BitsNlinesPerWay )
-    m.en //= s.wen
+    s.rdata = OutPort( p.bitwidth_rep )
 
     nblocks_per_way  = p.nblocks_per_way
+    nbits            = p.bitwidth_rep
+
+    reset_state = replacement_reset_state( p )
+    reset_value = 0
+    for i in range( nblocks_per_way ):
+      reset_value |= reset_state << (i * nbits)
+
+    s.replacement_register = m = RegEnRst( mk_bits( nblocks_per_way * nbits ),
+                                           reset_value )
+    m.en //= s.wen
 
     @update
     def update_register_bits():
       for i in range( nblocks_per_way ):
         if s.waddr == i:
-          s.replacement_register.in_[i] @= s.wdata
+          s.replacement_register.in_[i*nbits:(i+1)*nbits] @= s.wdata
         else:
-          s.replacement_register.in_[i] @= s.replacement_register.out[i]
+          s.replacement_register.in_[i*nbits:(i+1)*nbits] @= \
+            s.replacement_register.out[i*nbits:(i+1)*nbits]
 
-      s.rdata @= s.replacement_register.out[s.raddr]
+      s.rdata @= 0
+      for i in range( nblocks_per_way ):
+        if s.raddr == i:
+          s.rdata @= s.replacement_register.out[i*nbits:(i+1)*nbits]
 
   def line_trace( s ):
     msg = ""
     msg += f'bits[{s.replacement_register.out}]'
     return msg
+
+class ValidBitsReg( Component ):
+  """
+  Valid bits of one way of the tag array kept in flip-flops instead of the
+  tag SRAM so that all of them can be cleared in a single cycle. The port
+  mirrors the one of SramPRTL: the read data is registered and only changes
+  on a read, so it lines up with the tag SRAM read data in M1.
+  """
+  def construct( s, p ):
+
+    s.port0_val   = InPort()
+    s.port0_type  = InPort()
+    s.port0_idx   = InPort( p.BitsIdx )
+    s.port0_wdata = InPort()
+    s.port0_wben  = InPort()
+    s.port0_rdata = OutPort()
+    s.clear       = InPort() # Clear all the valid bits
+
+    nblocks_per_way = p.nblocks_per_way
+
+    s.valid_register = RegRst( mk_bits( nblocks_per_way ) )
+    s.rdata_register = RegRst( Bits1 )
+    s.port0_rdata //= s.rdata_register.out
+
+    @update
+    def update_valid_bits():
+      s.valid_register.in_ @= s.valid_register.out
+      if s.clear:
+        s.valid_register.in_ @= 0
+      elif s.port0_val & s.port0_type & s.port0_wben:
+        s.valid_register.in_[ s.port0_idx ] @= s.port0_wdata
+
+      s.rdata_register.in_ @= s.rdata_register.out
+      if s.port0_val & ~s.port0_type:
+        s.rdata_register.in_ @= s.valid_register.out[ s.port0_idx ]
+
+  def line_trace( s ):
+    return f'val[{s.valid_register.out}]'
+
+class DirtyBitsReg( Component ):
+  """
+  Dirty bits of one way of the tag array kept in flip-flops. Port 0
+  mirrors the tag SRAM port like ValidBitsReg. Port 1 sets the dirty bits
+  in wdata for the write hit in M1, so it does not need another pass
+  through M0. A port 0 read of the set port 1 writes in the same cycle
+  sees the new bits, since that is the request right behind the write.
+  """
+  def construct( s, p ):
+
+    s.port0_val   = InPort()
+    s.port0_type  = InPort()
+    s.port0_idx   = InPort( p.BitsIdx )
+    s.port0_wdata = InPort( p.bitwidth_dirty )
+    s.port0_wben  = InPort( p.bitwidth_dirty )
+    s.port0_rdata = OutPort( p.bitwidth_dirty )
+    s.port1_val   = InPort()
+    s.port1_idx   = InPort( p.BitsIdx )
+    s.port1_wdata = InPort( p.bitwidth_dirty )
+
+    nblocks_per_way = p.nblocks_per_way
+
+    s.dirty_regs     = [ RegRst( p.bitwidth_dirty ) for _ in range( nblocks_per_way ) ]
+    s.rdata_register = RegRst( p.bitwidth_dirty )
+    s.port0_rdata //= s.rdata_register.out
+
+    @update
+    def update_dirty_bits():
+      for i in range( nblocks_per_way ):
+        s.dirty_regs[i].in_ @= s.dirty_regs[i].out
+        if s.port0_val & s.port0_type & ( s.port0_idx == i ):
+          s.dirty_regs[i].in_ @= ( ( s.dirty_regs[i].out & ~s.port0_wben ) |
+                                   ( s.port0_wdata & s.port0_wben ) )
+        if s.port1_val & ( s.port1_idx == i ):
+          s.dirty_regs[i].in_ @= s.dirty_regs[i].in_ | s.port1_wdata
+
+      s.rdata_register.in_ @= s.rdata_register.out
+      if s.port0_val & ~s.port0_type:
+        for i in range( nblocks_per_way ):
+          if s.port0_idx == i:
+            s.rdata_register.in_ @= s.dirty_regs[i].out
+        if s.port1_val & ( s.port1_idx == s.port0_idx ):
+          s.rdata_register.in_ @= s.rdata_register.in_ | s.port1_wdata
+
+  def line_trace( s ):
+    return f'dty[{",".join( str(m.out) for m in s.dirty_regs )}]'
+
+class WayPredictorReg( Component ):
+  """
+  Most recently used way of every set, used to predict which tag array
+  holds the line so that only that one is read. Same ports as
+  ReplacementBitsReg.
+  """
+  def construct( s, p ):
+
+    s.wdata = InPort( p.bitwidth_clog_asso )
+    s.wen   = InPort()
+    s.waddr = InPort( p.BitsIdx )
+    s.raddr = InPort( p.BitsIdx )
+    s.rdata = OutPort( p.bitwidth_clog_asso )
+
+    nblocks_per_way = p.nblocks_per_way
+
+    s.mru_ways = [ RegEnRst( p.bitwidth_clog_asso ) for _ in range( nblocks_per_way ) ]
+    for m in s.mru_ways:
+      m.in_ //= s.wdata
+
+    @update
+    def write_mru_way():
+      for i in range( nblocks_per_way ):
+        s.mru_ways[i].en @= s.wen & ( s.waddr == i )
+
+    @update
+    def read_mru_way():
+      s.rdata @= 0
+      for i in range( nblocks_per_way ):
+        if s.raddr == i:
+          s.rdata @= s.mru_ways[i].out
+
+  def line_trace( s ):
+    return f'mru[{",".join( str(m.out) for m in s.mru_ways )}]'
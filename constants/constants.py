@@ -34,5 +34,7 @@ AMO_MINU = b4(MemMsgType.AMO_MINU)
 AMO_MAX  = b4(MemMsgType.AMO_MAX)
 AMO_MAXU = b4(MemMsgType.AMO_MAXU)
 AMO_XOR  = b4(MemMsgType.AMO_XOR)
+LR       = b4(MemMsgType.LR)
+SC       = b4(MemMsgType.SC)
 INV      = b4(MemMsgType.INV)
 FLUSH    = b4(MemMsgType.FLUSH)
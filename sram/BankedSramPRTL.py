@@ -0,0 +1,127 @@
+#=========================================================================
+# Banked SRAM RTL with custom low-level interface
+#=========================================================================
+# SRAM split into nbanks SramPRTL banks interleaved on the low bits of the
+# index, so consecutive words go to different banks and each access only
+# enables the bank it goes to. Bank b holds the words whose index has b in
+# its low clog2(nbanks) bits, at the row given by the rest of the index.
+#
+# With nports=2 there is a second port (port1_) and the two ports are
+# served in the same cycle when they go to different banks. On a bank
+# conflict port 0 wins and port 1 has to try again, port1_grant tells
+# whether port 1 got its bank.
+#
+# The read data of a port comes from the bank it read last and, like in
+# SramPRTL, only changes on a read of that bank. With two ports it is only
+# sure to be the data of the port's own read in the cycle after the read.
+#
+# The following list describes each port of this module.
+#
+#  Port Name     Direction  Description
+#  -----------------------------------------------------------------------
+#  port0_val     I          port enable (1 = enabled)
+#  port0_type    I          transaction type, 0 = read, 1 = write
+#  port0_idx     I          index
+#  port0_wdata   I          write data
+#  port0_wben    I          write bit enable (1 = enabled)
+#  port0_rdata   O          read data output
+#  port1_*                  same as port0_*, only with nports=2
+#  port1_grant   O          port 1 got its bank this cycle
+#
+
+from pymtl3                  import *
+from pymtl3.stdlib.basic_rtl import RegEnRst
+
+from .SramPRTL import SramPRTL
+
+class BankedSramPRTL( Component ):
+
+  def construct( s, num_bits = 32, num_words = 256, nbanks = 2, nports = 1,
+                 behavioral = False ):
+
+    assert nbanks > 1 and nbanks & ( nbanks - 1 ) == 0, "Need a power of two banks"
+    assert num_words % nbanks == 0 and num_words // nbanks > 1
+    assert nports in ( 1, 2 )
+
+    idx_nbits  = clog2( num_words )      # address width
+    bank_nbits = clog2( nbanks )
+    BitsBank   = mk_bits( bank_nbits )
+
+    s.port0_val   = InPort ()
+    s.port0_type  = InPort ()
+    s.port0_idx   = InPort ( mk_bits(idx_nbits) )
+    s.port0_wdata = InPort ( mk_bits(num_bits) )
+    s.port0_wben  = InPort ( mk_bits(num_bits) )
+    s.port0_rdata = OutPort( mk_bits(num_bits) )
+
+    if nports == 2:
+      s.port1_val   = InPort ()
+      s.port1_type  = InPort ()
+      s.port1_idx   = InPort ( mk_bits(idx_nbits) )
+      s.port1_wdata = InPort ( mk_bits(num_bits) )
+      s.port1_wben  = InPort ( mk_bits(num_bits) )
+      s.port1_rdata = OutPort( mk_bits(num_bits) )
+      s.port1_grant = OutPort()
+
+    s.banks = [ SramPRTL( num_bits, num_words // nbanks, behavioral )
+                for _ in range( nbanks ) ]
+
+    # Bank each port read last, selects its read data
+
+    s.port0_rd_bank = m = RegEnRst( BitsBank )
+    m.in_ //= s.port0_idx[0:bank_nbits]
+    m.en  //= lambda: s.port0_val & ~s.port0_type
+
+    @update
+    def port0_rdata_logic():
+      s.port0_rdata @= 0
+      for b in range( nbanks ):
+        if s.port0_rd_bank.out == b:
+          s.port0_rdata @= s.banks[b].port0_rdata
+
+    if nports == 1:
+
+      @update
+      def bank_inputs():
+        for b in range( nbanks ):
+          s.banks[b].port0_val   @= s.port0_val & ( s.port0_idx[0:bank_nbits] == b )
+          s.banks[b].port0_type  @= s.port0_type
+          s.banks[b].port0_idx   @= s.port0_idx[bank_nbits:idx_nbits]
+          s.banks[b].port0_wdata @= s.port0_wdata
+          s.banks[b].port0_wben  @= s.port0_wben
+
+    else:
+
+      # Fixed priority, port 0 always gets its bank
+      s.port1_grant //= lambda: s.port1_val & ( ~s.port0_val |
+        ( s.port0_idx[0:bank_nbits] != s.port1_idx[0:bank_nbits] ) )
+
+      @update
+      def bank_inputs():
+        for b in range( nbanks ):
+          if s.port0_val & ( s.port0_idx[0:bank_nbits] == b ):
+            s.banks[b].port0_val   @= 1
+            s.banks[b].port0_type  @= s.port0_type
+            s.banks[b].port0_idx   @= s.port0_idx[bank_nbits:idx_nbits]
+            s.banks[b].port0_wdata @= s.port0_wdata
+            s.banks[b].port0_wben  @= s.port0_wben
+          else:
+            s.banks[b].port0_val   @= s.port1_grant & ( s.port1_idx[0:bank_nbits] == b )
+            s.banks[b].port0_type  @= s.port1_type
+            s.banks[b].port0_idx   @= s.port1_idx[bank_nbits:idx_nbits]
+            s.banks[b].port0_wdata @= s.port1_wdata
+            s.banks[b].port0_wben  @= s.port1_wben
+
+      s.port1_rd_bank = m = RegEnRst( BitsBank )
+      m.in_ //= s.port1_idx[0:bank_nbits]
+      m.en  //= lambda: s.port1_grant & ~s.port1_type
+
+      @update
+      def port1_rdata_logic():
+        s.port1_rdata @= 0
+        for b in range( nbanks ):
+          if s.port1_rd_bank.out == b:
+            s.port1_rdata @= s.banks[b].port0_rdata
+
+  def line_trace( s ):
+    return "|".join( m.line_trace() for m in s.banks )
@@ -0,0 +1,72 @@
+#=========================================================================
+# 1R1W SRAM RTL with custom low-level interface
+#=========================================================================
+# Two-port version of SramPRTL with a read port and a write port that can
+# both be used in the same cycle. It contains an instance of either a
+# SRAM generated by a memory compiler or a generic SRAM RTL model
+# (SramGeneric1R1WPRTL). With behavioral=True the faster
+# SramBehavioral1R1WPRTL is used instead, which only simulates in Python.
+#
+# A read of the word being written in the same cycle returns the old
+# data, so the user has to bypass the write data if it needs the new one.
+#
+# The following list describes each port of this module.
+#
+#  Port Name     Direction  Description
+#  -----------------------------------------------------------------------
+#  port0_val     I          read port enable (1 = enabled)
+#  port0_idx     I          read index
+#  port0_rdata   O          read data output
+#  port1_val     I          write port enable (1 = enabled)
+#  port1_idx     I          write index
+#  port1_wdata   I          write data
+#  port1_wben    I          write bit enable (1 = enabled)
+#
+
+from pymtl3          import *
+
+from .SramGeneric1R1WPRTL    import SramGeneric1R1WPRTL
+from .SramBehavioral1R1WPRTL import SramBehavioral1R1WPRTL
+
+class Sram1R1WPRTL( Component ):
+
+  def construct( s, num_bits = 32, num_words = 256, behavioral = False ):
+
+    idx_nbits = clog2( num_words )       # address width
+
+    s.port0_val   = InPort ()
+    s.port0_idx   = InPort ( mk_bits(idx_nbits) )
+    s.port0_rdata = OutPort( mk_bits(num_bits) )
+
+    s.port1_val   = InPort ()
+    s.port1_idx   = InPort ( mk_bits(idx_nbits) )
+    s.port1_wdata = InPort ( mk_bits(num_bits) )
+    s.port1_wben  = InPort ( mk_bits(num_bits) )
+
+    # Inverters
+
+    s.port0_val_bar = Wire()
+    s.port1_val_bar = Wire()
+
+    @update
+    def inverters():
+      s.port0_val_bar @= ~s.port0_val
+      s.port1_val_bar @= ~s.port1_val
+
+    if behavioral:
+      s.sram = m = SramBehavioral1R1WPRTL( num_bits, num_words )
+    else:
+      s.sram = m = SramGeneric1R1WPRTL( num_bits, num_words )
+    connect( m.CE1,  s.clk           )
+    connect( m.CSB1, s.port0_val_bar ) # CSB1 low-active
+    connect( m.OEB1, 0               )
+    connect( m.A1,   s.port0_idx     )
+    connect( m.O1,   s.port0_rdata   )
+    connect( m.CE2,  s.clk           )
+    connect( m.CSB2, s.port1_val_bar ) # CSB2 low-active
+    connect( m.A2,   s.port1_idx     )
+    connect( m.I2,   s.port1_wdata   )
+    connect( m.WBM2, s.port1_wben    )
+
+  def line_trace( s ):
+    return s.sram.line_trace()
@@ -0,0 +1,55 @@
+#=========================================================================
+# Behavioral model of the 1R1W SRAM
+#=========================================================================
+# Drop-in replacement for SramGeneric1R1WPRTL for faster simulation, the
+# same way SramBehavioralPRTL replaces SramGenericPRTL. The read happens
+# before the write of the same cycle, so a read of the word being written
+# returns the old data. Python simulation only.
+
+from pymtl3 import *
+
+class SramBehavioral1R1WPRTL( Component ):
+
+  def construct( s, num_bits = 32, num_words = 256 ):
+
+    addr_width = clog2( num_words )      # address width
+    dtype      = mk_bits( num_bits )
+
+    # same ports as SramGeneric1R1WPRTL
+
+    s.CE1  = InPort ( Bits1 )               # clk
+    s.OEB1 = InPort ( Bits1 )               # bar( out en )
+    s.CSB1 = InPort ( Bits1 )               # bar( read en )
+    s.A1   = InPort ( mk_bits(addr_width) ) # read address
+    s.O1   = OutPort( dtype )               # read data
+
+    s.CE2  = InPort ( Bits1 )               # clk
+    s.CSB2 = InPort ( Bits1 )               # bar( write en )
+    s.A2   = InPort ( mk_bits(addr_width) ) # write address
+    s.I2   = InPort ( dtype )               # write data
+    s.WBM2 = InPort ( mk_bits( num_bits ) ) # bit-level write mask
+
+    # memory array
+
+    s.ram = [ 0 ] * num_words
+
+    # read path
+
+    s.dout = Wire( dtype )
+
+    @update_ff
+    def access():
+      if ~s.CSB1:
+        s.dout <<= dtype( s.ram[ s.A1 ] )
+      if ~s.CSB2:
+        s.write( int( s.A2 ), int( s.I2 ), int( s.WBM2 ) )
+
+    @update
+    def comb_logic():
+      s.O1 @= s.dout if ~s.OEB1 else 0
+
+  def write( s, addr, data, mask ):
+    s.ram[addr] = ( s.ram[addr] & ~mask ) | ( data & mask )
+
+  def line_trace( s ):
+    return f"(RE={~s.CSB1} A1={s.A1} O1={s.O1} WE={~s.CSB2} A2={s.A2} I2={s.I2} WBM2={s.WBM2})"
@@ -0,0 +1,56 @@
+#=========================================================================
+# Behavioral model of the SRAM
+#=========================================================================
+# Drop-in replacement for SramGenericPRTL for faster simulation. The
+# storage is a single Python list with one integer per word instead of
+# one Wire per word, and a word is only touched on the cycle it is
+# written. SramGenericPRTL copies every word into ram_next and loops over
+# each bit of the write mask every cycle, which dominates the simulation
+# time of large data arrays. This model is for Python simulation only and
+# cannot be translated to Verilog.
+
+from pymtl3 import *
+
+class SramBehavioralPRTL( Component ):
+
+  def construct( s, num_bits = 32, num_words = 256 ):
+
+    addr_width = clog2( num_words )      # address width
+    dtype      = mk_bits( num_bits )
+
+    # same ports as SramGenericPRTL
+
+    s.CE1  = InPort ( Bits1 )               # clk
+    s.WEB1 = InPort ( Bits1 )               # bar( write en )
+    s.OEB1 = InPort ( Bits1 )               # bar( out en )
+    s.CSB1 = InPort ( Bits1 )               # bar( whole SRAM en )
+    s.A1   = InPort ( mk_bits(addr_width) ) # address
+    s.I1   = InPort ( dtype )               # write data
+    s.O1   = OutPort( dtype )               # read data
+    s.WBM1 = InPort ( mk_bits( num_bits ) ) # bit-level write mask
+
+    # memory array
+
+    s.ram = [ 0 ] * num_words
+
+    # read path
+
+    s.dout = Wire( dtype )
+
+    @update_ff
+    def access():
+      if ~s.CSB1:
+        if s.WEB1:
+          s.dout <<= dtype( s.ram[ s.A1 ] )
+        else:
+          s.write( int( s.A1 ), int( s.I1 ), int( s.WBM1 ) )
+
+    @update
+    def comb_logic():
+      s.O1 @= s.dout if ~s.OEB1 else 0
+
+  def write( s, addr, data, mask ):
+    s.ram[addr] = ( s.ram[addr] & ~mask ) | ( data & mask )
+
+  def line_trace( s ):
+    return f"(WE={~s.WEB1} OE={~s.OEB1} A1={s.A1} I1A={s.I1} O1={s.O1} s.WBM1={s.WBM1})"
@@ -0,0 +1,69 @@
+#=========================================================================
+# Generic model of the 1R1W SRAM
+#=========================================================================
+# Two-port SRAM with a read port (port 1) and a write port (port 2) that
+# work in the same cycle. Like SramGenericPRTL it is meant to be
+# instantiated within a carefully named outer module so the outer module
+# corresponds to an SRAM generated by a memory compiler. A read of the
+# word being written in the same cycle returns the old data.
+
+from pymtl3 import *
+
+class SramGeneric1R1WPRTL( Component ):
+
+  def construct( s, num_bits = 32, num_words = 256 ):
+
+    addr_width = clog2( num_words )      # address width
+    dtype      = mk_bits( num_bits )
+
+    # read port
+
+    s.CE1  = InPort ( Bits1 )               # clk
+    s.OEB1 = InPort ( Bits1 )               # bar( out en )
+    s.CSB1 = InPort ( Bits1 )               # bar( read en )
+    s.A1   = InPort ( mk_bits(addr_width) ) # read address
+    s.O1   = OutPort( dtype )               # read data
+
+    # write port
+
+    s.CE2  = InPort ( Bits1 )               # clk
+    s.CSB2 = InPort ( Bits1 )               # bar( write en )
+    s.A2   = InPort ( mk_bits(addr_width) ) # write address
+    s.I2   = InPort ( dtype )               # write data
+    s.WBM2 = InPort ( mk_bits( num_bits ) ) # bit-level write mask
+
+    # memory array
+
+    s.ram      = [ Wire( dtype ) for x in range( num_words ) ]
+    s.ram_next = [ Wire( dtype ) for x in range( num_words ) ]
+
+    # read path
+
+    s.dout = Wire( dtype )
+    s.dout_next = Wire( dtype )
+
+    @update
+    def read_logic():
+      s.dout_next @= s.ram[ s.A1 ] if ~s.CSB1 else s.dout
+
+    # write path
+    @update
+    def write_logic():
+      for i in range( num_words ):
+        s.ram_next[i] @= s.ram[i]
+      for i in range( num_bits ):
+        if ~s.CSB2 & s.WBM2[i]:
+          s.ram_next[s.A2][i] @= s.I2[i]
+
+    @update
+    def comb_logic():
+      s.O1 @= s.dout if ~s.OEB1 else 0
+
+    @update_ff
+    def update_sram():
+      s.dout <<= s.dout_next
+      for i in range( num_words ):
+        s.ram[i] <<= s.ram_next[i]
+
+  def line_trace( s ):
+    return f"(RE={~s.CSB1} A1={s.A1} O1={s.O1} WE={~s.CSB2} A2={s.A2} I2={s.I2} WBM2={s.WBM2})"
@@ -3,7 +3,9 @@
 #=========================================================================
 # This is the SRAM RTL model with our own low-level interface. It contains
 # an instance of either a SRAM generated by CACTI memory compiler or a
-# generic SRAM RTL model (SramGenericPRTL).
+# generic SRAM RTL model (SramGenericPRTL). With behavioral=True the
+# faster SramBehavioralPRTL is used instead, which only simulates in
+# Python.
 #
 # The interface of this module are prefixed by port0_, meaning all reads
 # and writes happen through the only port. Multiported SRAMs have ports
@@ -23,11 +25,12 @@
 
 from pymtl3          import *
 
-from .SramGenericPRTL import SramGenericPRTL
+from .SramGenericPRTL    import SramGenericPRTL
+from .SramBehavioralPRTL import SramBehavioralPRTL
 
 class SramPRTL( Component ):
 
-  def construct( s, num_bits = 32, num_words = 256 ):
+  def construct( s, num_bits = 32, num_words = 256, behavioral = False ):
 
     idx_nbits = clog2( num_words )       # address width
 
@@ -48,7 +51,10 @@ class SramPRTL( Component ):
       s.port0_val_bar  @= ~s.port0_val
       s.port0_type_bar @= ~s.port0_type
 
-    s.sram = m = SramGenericPRTL( num_bits, num_words )
+    if behavioral:
+      s.sram = m = SramBehavioralPRTL( num_bits, num_words )
+    else:
+      s.sram = m = SramGenericPRTL( num_bits, num_words )
     connect( m.CE1,  s.clk            )
     connect( m.CSB1, s.port0_val_bar  ) # CSB1 low-active
     connect( m.OEB1, 0                )
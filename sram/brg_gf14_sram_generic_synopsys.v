@@ -92,6 +92,52 @@ module SramGenericPRTL
 
 endmodule
 
+module SramGeneric1R1WPRTL
+ #(parameter num_bits=28 , parameter num_words=256)
+(
+  input logic [($clog2(num_words))-1:0] A1 ,
+  input logic [($clog2(num_words))-1:0] A2 ,
+  input logic [0:0] CE1 ,
+  input logic [0:0] CE2 ,
+  input logic [0:0] CSB1 ,
+  input logic [0:0] CSB2 ,
+  input logic [num_bits-1:0] I2 ,
+  output logic [num_bits-1:0] O1 ,
+  input logic [0:0] OEB1 ,
+  input logic [num_bits-1:0] WBM2 ,
+  input logic [0:0] clk ,
+  input logic [0:0] reset
+);
+
+  logic [num_bits-1:0] q;
+
+  // No two-port SRAMs have been generated for this process yet. They go
+  // here by size like in SramGenericPRTL, until then we use the
+  // behavioral model. A read of the word being written returns the old
+  // data (CSB1 read enable, CSB2 write enable, both active low).
+  logic [num_bits-1:0] ram [0:num_words-1];
+
+  always_ff @(posedge clk) begin : update_sram
+    if ( !CSB1 )
+      q <= ram[A1];
+    if ( !CSB2 ) begin
+      for ( int i = 0; i < num_bits; i += 1 )
+        if ( WBM2[i] ) // Bit Mask
+          ram[A2][i] <= I2[i];
+    end
+  end
+
+// Enable the output
+ always_comb begin : comb_logic
+    if ( !OEB1 ) begin
+      O1 = q;
+    end
+    else
+      O1 = 0;
+  end
+
+endmodule
+
 module gf14_sram_256x128
    (
     input  clk,
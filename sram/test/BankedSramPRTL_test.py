@@ -0,0 +1,55 @@
+#=======================================================================
+# BankedSramPRTL_test.py
+#=======================================================================
+# Random reads and writes on one or two ports checked against a list of
+# words. The read data is checked the cycle after a read the port got
+# its bank for.
+
+import pytest
+import random
+
+from pymtl3              import *
+from sram.BankedSramPRTL import BankedSramPRTL
+
+@pytest.mark.parametrize( "num_bits,num_words,nbanks,nports", [
+  ( 32,  16,  2, 1 ),
+  ( 128, 64,  4, 1 ),
+  ( 32,  16,  2, 2 ),
+  ( 128, 64,  4, 2 ),
+])
+def test_read_and_write( num_bits, num_words, nbanks, nports ):
+  rng = random.Random( 0xdeadbeef )
+  m = BankedSramPRTL( num_bits, num_words, nbanks, nports, behavioral=True )
+  m.apply( DefaultPassGroup() )
+  m.sim_reset()
+
+  ports = [ 'port0', 'port1' ][:nports]
+  ram   = [ 0 ] * num_words
+  for _ in range( 500 ):
+    reqs = []
+    for port in ports:
+      val   = rng.random() < 0.8
+      type_ = rng.random() < 0.5
+      idx   = rng.randrange( num_words )
+      wdata = rng.getrandbits( num_bits )
+      wben  = rng.choice( [ (1 << num_bits) - 1, rng.getrandbits( num_bits ) ] )
+      for name, value in [ ( 'val', val ), ( 'type', type_ ), ( 'idx', idx ),
+                           ( 'wdata', wdata ), ( 'wben', wben ) ]:
+        getattr( m, f'{port}_{name}' ).__imatmul__( value )
+      reqs.append( ( val, type_, idx, wdata, wben ) )
+    m.sim_eval_combinational()
+
+    # Port 1 loses its bank to port 0 on a conflict
+    granted = [ reqs[0][0] ]
+    if nports == 2:
+      conflict = reqs[0][0] and reqs[0][2] % nbanks == reqs[1][2] % nbanks
+      granted.append( reqs[1][0] and not conflict )
+      assert m.port1_grant == granted[1]
+    m.sim_tick()
+
+    for port, grant, ( val, type_, idx, wdata, wben ) in zip( ports, granted, reqs ):
+      if grant and not type_:
+        assert getattr( m, f'{port}_rdata' ) == ram[idx]
+    for grant, ( val, type_, idx, wdata, wben ) in zip( granted, reqs ):
+      if grant and type_:
+        ram[idx] = ( ram[idx] & ~wben ) | ( wdata & wben )
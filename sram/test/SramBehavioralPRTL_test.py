@@ -0,0 +1,51 @@
+#=======================================================================
+# SramBehavioralPRTL_test.py
+#=======================================================================
+# Checks the behavioral SRAM model against the generic one by running
+# both with the same random stimulus.
+
+import pytest
+import random
+
+from pymtl3        import *
+from sram.SramPRTL import SramPRTL
+
+class SramPair( Component ):
+
+  def construct( s, num_bits, num_words ):
+    s.port0_val   = InPort ()
+    s.port0_type  = InPort ()
+    s.port0_idx   = InPort ( clog2(num_words) )
+    s.port0_wdata = InPort ( num_bits )
+    s.port0_wben  = InPort ( num_bits )
+
+    s.generic    = SramPRTL( num_bits, num_words )
+    s.behavioral = SramPRTL( num_bits, num_words, behavioral=True )
+    for m in [ s.generic, s.behavioral ]:
+      m.port0_val   //= s.port0_val
+      m.port0_type  //= s.port0_type
+      m.port0_idx   //= s.port0_idx
+      m.port0_wdata //= s.port0_wdata
+      m.port0_wben  //= s.port0_wben
+
+@pytest.mark.parametrize( "num_bits,num_words", [
+  ( 26,  128 ),
+  ( 128, 256 ),
+  ( 128, 512 ),
+])
+def test_behavioral_matches_generic( num_bits, num_words ):
+  rng = random.Random( 0xdeadbeef )
+  m = SramPair( num_bits, num_words )
+  m.apply( DefaultPassGroup() )
+  m.sim_reset()
+
+  # Keep the accesses to a few words so that reads hit written data
+  idxs = [ rng.randrange( num_words ) for _ in range( 8 ) ]
+  for _ in range( 500 ):
+    m.port0_val   @= rng.random() < 0.8
+    m.port0_type  @= rng.random() < 0.5
+    m.port0_idx   @= rng.choice( idxs )
+    m.port0_wdata @= rng.getrandbits( num_bits )
+    m.port0_wben  @= rng.choice( [ 0, (1 << num_bits) - 1, rng.getrandbits( num_bits ) ] )
+    m.sim_tick()
+    assert m.behavioral.port0_rdata == m.generic.port0_rdata
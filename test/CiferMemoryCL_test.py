@@ -0,0 +1,96 @@
+"""
+=========================================================================
+CiferMemoryCL_test.py
+=========================================================================
+Tests for the cifer test memory on a single cacheline-wide port
+"""
+
+import struct
+
+from pymtl3 import *
+from pymtl3.stdlib.test_utils import TestSrcCL, TestSinkCL
+
+from mem_ifcs.MemMsg import MemMsgType, mk_mem_msg
+
+from .MemoryCL import MemoryCL
+from .sim_utils import run_sim
+
+#-------------------------------------------------------------------------
+# TestHarness
+#-------------------------------------------------------------------------
+
+class TestHarness( Component ):
+
+  def construct( s, ReqType, RespType, src_msgs, sink_msgs, mem_args=None ):
+    # One src/sink pair per memory port
+    mem_args = mem_args if mem_args else {}
+    nports = len( src_msgs )
+    s.srcs  = [ TestSrcCL( ReqType, src_msgs[i] ) for i in range( nports ) ]
+    s.mem   = MemoryCL( nports, [(ReqType, RespType)]*nports, **mem_args )
+    s.sinks = [ TestSinkCL( RespType, sink_msgs[i] ) for i in range( nports ) ]
+
+    for i in range( nports ):
+      s.srcs[i].send    //= s.mem.ifc[i].req
+      s.mem.ifc[i].resp //= s.sinks[i].recv
+
+  def load( s, addrs, data_ints ):
+    for addr, data_int in zip( addrs, data_ints ):
+      s.mem.write_mem( addr, bytearray( struct.pack( "<I", data_int ) ) )
+
+  def done( s ):
+    return all( x.done() for x in s.srcs + s.sinks )
+
+  def mem_stats( s ):
+    return s.mem.stats()
+
+  def line_trace( s ):
+    return "|".join( x.line_trace() for x in s.srcs ) + " " + \
+      s.mem.line_trace() + " " + "|".join( x.line_trace() for x in s.sinks )
+
+ReqType, RespType = mk_mem_msg( 8, 32, 128, has_wr_mask=True )
+
+def rd( opaque, addr, len_, data ):
+  return [ ReqType ( MemMsgType.READ, opaque, addr, len_, 0, 0 ),
+           RespType( MemMsgType.READ, opaque, 0, len_, 0, data ) ]
+
+#-------------------------------------------------------------------------
+# Tests
+#-------------------------------------------------------------------------
+
+def test_subword_read( cmdline_opts ):
+  # Subword reads come back zero extended at the bottom of the data
+  msgs = rd( 0, 0x1004, 4, 0x0c0d0e0f ) \
+       + rd( 1, 0x1005, 1, 0x0e ) \
+       + rd( 2, 0x100a, 2, 0x0506 ) \
+       + rd( 3, 0x1000, 0, 0x08090a0b_05060708_0c0d0e0f_01020304 )
+  th = TestHarness( ReqType, RespType, [ msgs[::2] ], [ msgs[1::2] ] )
+  th.elaborate()
+  th.load( [ 0x1000, 0x1004, 0x1008, 0x100c ],
+           [ 0x01020304, 0x0c0d0e0f, 0x05060708, 0x08090a0b ] )
+  run_sim( th, cmdline_opts, False, False )
+
+def run_reads( cmdline_opts, addrs, mem_args ):
+  # Reads of the addrs of each port, all of them zero
+  msgs = [ sum( [ rd( j, addr, 0, 0 ) for j, addr in enumerate( port ) ], [] )
+           for port in addrs ]
+  th = TestHarness( ReqType, RespType, [ m[::2] for m in msgs ],
+                    [ m[1::2] for m in msgs ], mem_args )
+  th.elaborate()
+  return run_sim( th, cmdline_opts, False, False )
+
+def test_bank_conflicts( cmdline_opts ):
+  # The second read to bank 0 waits 2 cycles for the first one. The read
+  # to bank 1 goes through and hides one of the busy cycles of the second
+  # read from the last one, which waits a single cycle
+  th = run_reads( cmdline_opts, [ [ 0x00, 0x20, 0x10, 0x40 ] ],
+                  { 'nbanks':2, 'bank_occupancy':3 } )
+  assert th.mem_stats() == { 'bank_accesses':[ 3, 1 ], 'bank_conflicts':3,
+                             'bw_stalls':0 }
+
+def test_bandwidth_stalls( cmdline_opts ):
+  # Two ports share one request per cycle, so one of them loses the
+  # bandwidth in every cycle where both have a request
+  th = run_reads( cmdline_opts, [ [ 0x00, 0x10 ], [ 0x20, 0x30 ] ],
+                  { 'bandwidth':1 } )
+  assert th.mem_stats() == { 'bank_accesses':[], 'bank_conflicts':0,
+                             'bw_stalls':3 }
@@ -9,6 +9,19 @@ in the interface.
 
 Modified for Cifer Tapeout to include write bits
 
+Optionally the memory is split into nbanks address-interleaved banks. A
+bank is busy for bank_occupancy cycles after it accepts a request and at
+most bandwidth requests are accepted across all ports each cycle. Ports
+that lose a bank or the bandwidth wait in their request queue. Ports are
+served round-robin so no port is starved.
+
+With beat_nbits set, a line read (len 0) is answered in beats of that
+many bits, one per cycle, starting with the beat that holds the requested
+address and wrapping around the line. Every beat carries the full data
+field with only its own bits set, and the write mask of the response
+marks the words of the beat. A port sends the rest of its beats before
+it serves its next request.
+
 Author : Shunning Jiang, edited by Xiaoyu Yan (xy97)
 Date   : Mar 12, 2018
 """
@@ -29,14 +42,26 @@ class MemoryCL( Component ):
 
   # Actual stuff
   def construct( s, nports, mem_ifc_dtypes=[mk_mem_msg(8,32,32), mk_mem_msg(8,32,32)],
-                 stall_prob=0, latency=1, mem_nbytes=2**20 ):
+                 stall_prob=0, latency=1, mem_nbytes=2**20, nbanks=0,
+                 bank_occupancy=1, bandwidth=0, beat_nbits=0 ):
+    """
+    nbanks         : number of banks interleaved at the granularity of the
+                     port data width. 0 models one unbanked memory that
+                     serves every port each cycle
+    bank_occupancy : cycles a bank is busy after accepting a request
+    bandwidth      : max requests accepted per cycle. 0 is unlimited
+    beat_nbits     : bits returned per cycle for line reads. 0 returns the
+                     whole line at once
+    """
+    assert nbanks >= 0 and bank_occupancy >= 1 and bandwidth >= 0
+    assert beat_nbits >= 0 and beat_nbits % 32 == 0
 
     # Local constants
 
     s.nports = nports
     req_classes  = [ x for (x,y) in mem_ifc_dtypes ]
     resp_classes = [ y for (x,y) in mem_ifc_dtypes ]
-    
+
     s.mem = MagicMemoryFL( mem_nbytes )
 
     # Interface
@@ -59,13 +84,52 @@ class MemoryCL( Component ):
 
     data_nbits = req_classes[i].data_nbits
 
+    # Banks
+
+    s.nbanks         = nbanks
+    s.bank_occupancy = bank_occupancy
+    s.bandwidth      = bandwidth
+    s.bank_nbytes    = data_nbits >> 3
+    s.arbitrate      = nbanks > 0 or bandwidth > 0
+    s.cycle          = 0
+    s.prio           = 0
+    s.bank_free      = [ 0 ] * nbanks # first cycle each bank is free
+    s.bank_accesses  = [ 0 ] * nbanks
+    s.bank_conflicts = 0 # port cycles lost waiting on a busy bank
+    s.bw_stalls      = 0 # port cycles lost to the bandwidth limit
+
+    # Beats
+
+    s.beat_nbits = beat_nbits
+    s.beats      = [ [] for _ in range(nports) ] # beats left to send
+
     @update_once
     def up_mem():
 
-      for i in range(s.nports):
+      nserved = 0
+      for k in range(s.nports):
+        i = ( s.prio + k ) % s.nports
+
+        if s.beats[i]:
+          if s.resp_qs[i].enq.rdy():
+            s.resp_qs[i].enq( s.beats[i].pop(0) )
+          continue
 
         if s.req_qs[i].deq.rdy() and s.resp_qs[i].enq.rdy():
 
+          if s.arbitrate:
+            if s.bandwidth > 0 and nserved == s.bandwidth:
+              s.bw_stalls += 1
+              continue
+            if s.nbanks > 0:
+              bank = s.bank_of( s.req_qs[i].peek().addr )
+              if s.bank_free[bank] > s.cycle:
+                s.bank_conflicts += 1
+                continue
+              s.bank_free[bank] = s.cycle + s.bank_occupancy
+              s.bank_accesses[bank] += 1
+            nserved += 1
+
           # Dequeue memory request message
 
           req = s.req_qs[i].deq()
@@ -74,20 +138,33 @@ class MemoryCL( Component ):
 
           if   req.type_ == MemMsgType.READ:
             if hasattr( req, "wr_mask" ):
-              resp = resp_classes[i]( req.type_, req.opaque, 0, req.len,
-                                    req.wr_mask, s.mem.read( req.addr, len_ ) )
+              if int(req.len) == 0 and s.beat_nbits:
+                resp = s.read_beats( i, req, resp_classes[i] )
+              else:
+                # Line reads may start anywhere in the line, subword reads
+                # come back at the bottom of the data
+                addr = int(req.addr)
+                if int(req.len) == 0:
+                  addr = addr & ~( len_ - 1 )
+                data = zext( s.mem.read( addr, len_ ), req_classes[i].data_nbits )
+                resp = resp_classes[i]( req.type_, req.opaque, 0, req.len,
+                                      req.wr_mask, data )
             else:
               resp = resp_classes[i]( req.type_, req.opaque, 0, req.len,
                                     s.mem.read( req.addr, len_ ) )
           elif req.type_ == MemMsgType.WRITE:
 
-            if hasattr(req, "wr_mask"):
+            if hasattr(req, "wr_mask") and int(req.len) == 0:
               # check if the request has a word-level write mask (1 word = 32 bits)
               assert req.wr_mask.nbits == req.data.nbits // 32
               for j in range(req.wr_mask.nbits):
                 if req.wr_mask[j]:
                   s.mem.write( req.addr + 4 * j, 4, req.data[32*j:32*(j+1)] )
               resp = resp_classes[i]( req.type_, req.opaque, 0, 0, 0, 0 )
+            elif hasattr(req, "wr_mask"):
+              # subword writes carry their len instead of a write mask
+              s.mem.write( req.addr, len_, req.data[0:len_*8] )
+              resp = resp_classes[i]( req.type_, req.opaque, 0, 0, 0, 0 )
             else:
               # no write mask
               s.mem.write( req.addr, len_, req.data )
@@ -103,6 +180,40 @@ class MemoryCL( Component ):
 
           s.resp_qs[i].enq( resp )
 
+      if s.arbitrate:
+        s.prio = ( s.prio + 1 ) % s.nports
+      s.cycle += 1
+
+  def stats( s ):
+    # Bank and bandwidth counters, see the comments in construct
+    return { 'bank_accesses' : list( s.bank_accesses ),
+             'bank_conflicts': s.bank_conflicts,
+             'bw_stalls'     : s.bw_stalls }
+
+  def bank_of( s, addr ):
+    return ( int(addr) // s.bank_nbytes ) % s.nbanks
+
+  def read_beats( s, i, req, RespType ):
+    # Returns the first beat of a line read and queues the others
+    data_nbits  = RespType.data_nbits
+    beat_nbytes = s.beat_nbits >> 3
+    nbeats      = data_nbits // s.beat_nbits
+    nwords      = s.beat_nbits // 32
+    assert nbeats * s.beat_nbits == data_nbits
+
+    line_addr = int(req.addr) & ~( ( data_nbits >> 3 ) - 1 )
+    line      = s.mem.read( line_addr, data_nbits >> 3 )
+    first     = ( int(req.addr) - line_addr ) // beat_nbytes
+    beats     = []
+    for j in range( nbeats ):
+      b = ( first + j ) % nbeats
+      data_mask = Bits( data_nbits, ( ( 1 << s.beat_nbits ) - 1 ) << ( b * s.beat_nbits ) )
+      wr_mask   = ( ( 1 << nwords ) - 1 ) << ( b * nwords )
+      beats.append( RespType( req.type_, req.opaque, 0, req.len, wr_mask,
+                              line & data_mask ) )
+    s.beats[i] = beats[1:]
+    return beats[0]
+
   #-----------------------------------------------------------------------
   # line_trace
   #-----------------------------------------------------------------------
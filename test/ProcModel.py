@@ -28,13 +28,13 @@ class ProcModel( Component ):
     s.proc.resp.en   //= s.cache.resp.en
     # s.cache.resp.rdy //= s.proc.resp.rdy
 
-    s.trans_in_flight = RegRst(Bits2) # keeps track of transactions in flight
+    s.trans_in_flight = RegRst(Bits8) # keeps track of transactions in flight
 
     @update
     def signal_model():
       # If the cache request is not ready, then the processor's response rdy is
       # low.
-      if s.trans_in_flight.out == b2(0):
+      if s.trans_in_flight.out == b8(0):
         s.cache.resp.rdy @= s.proc.resp.rdy & s.cache.req.rdy
       else:
         s.cache.resp.rdy @= s.proc.resp.rdy
@@ -45,9 +45,9 @@ class ProcModel( Component ):
     def update_trans_in_flight():
       s.trans_in_flight.in_ @= s.trans_in_flight.out
       if s.cache.req.en and ~s.cache.resp.en:
-        s.trans_in_flight.in_ @= s.trans_in_flight.out + b2(1)
+        s.trans_in_flight.in_ @= s.trans_in_flight.out + b8(1)
       elif ~s.cache.req.en and s.cache.resp.en:
-        s.trans_in_flight.in_ @= s.trans_in_flight.out - b2(1)
+        s.trans_in_flight.in_ @= s.trans_in_flight.out - b8(1)
 
   def line_trace( s ):
     msg = ''
@@ -38,10 +38,34 @@ import subprocess
 #---------------------------------------------------------------------
 
 def run_sim( th, cmdline_opts, trace, sram_wrapper ):
+  max_cycles = cmdline_opts['max_cycles'] or 20000
+
+  th = setup_sim( th, cmdline_opts, sram_wrapper )
+
+  while not th.done() and th.sim_cycle_count() < max_cycles:
+    th.sim_tick()
+
+  # Check timeout
+  assert th.sim_cycle_count() < max_cycles
+
+  th.sim_tick()
+  th.sim_tick()
+  th.sim_tick()
+
+  # The translated harness replaces the one passed in
+  return th
+
+#----------------------------------------------------------------------
+# Set up the simulation
+#---------------------------------------------------------------------
+# Translates and imports the cache if asked to, then applies the default
+# passes and resets the harness. Returns the harness to tick. Line
+# tracing can be turned off when only the simulation speed matters.
+
+def setup_sim( th, cmdline_opts, sram_wrapper, linetrace=True ):
   test_verilog = cmdline_opts['test_verilog']
   dump_vcd     = cmdline_opts['dump_vcd']
   dump_vtb     = cmdline_opts['dump_vtb']
-  max_cycles   = cmdline_opts['max_cycles'] or 20000
 
   if dump_vcd:
     th.set_metadata( VcdGenerationPass.vcd_file_name, dump_vcd )
@@ -69,27 +93,22 @@ def run_sim( th, cmdline_opts, trace, sram_wrapper ):
       process = subprocess.Popen(bashCommand, stdout=subprocess.PIPE, shell=True)
       output, error = process.communicate()
 
-  th.apply( DefaultPassGroup( linetrace=True ) )
+  th.apply( DefaultPassGroup( linetrace=linetrace ) )
   th.sim_reset()
-
-  while not th.done() and th.sim_cycle_count() < max_cycles:
-    th.sim_tick()
-
-  # Check timeout
-  assert th.sim_cycle_count() < max_cycles
-
-  th.sim_tick()
-  th.sim_tick()
-  th.sim_tick()
+  return th
 
 #----------------------------------------------------------------------
 # Generate req/response pair from the requests using ref model
 #---------------------------------------------------------------------
 
 def gen_req_resp( reqs, mem, CacheReqType, CacheRespType, MemReqType, MemRespType,
-                  associativity, cacheSize ):
+                  associativity, cacheSize, policy='lru', victim_entries=0,
+                  write_through=False, uncached_ranges=(), amo_in_cache=False,
+                  sectors=1 ):
   cache = ModelCache( cacheSize, associativity, 0, CacheReqType, CacheRespType,
-                      MemReqType, MemRespType, mem )
+                      MemReqType, MemRespType, mem, policy, victim_entries,
+                      write_through, uncached_ranges, amo_in_cache,
+                      sectors=sectors )
   for request in reqs:
     if request.type_ == MemMsgType.READ:
       cache.read(request.addr, request.opaque, request.len)
@@ -99,10 +118,14 @@ def gen_req_resp( reqs, mem, CacheReqType, CacheRespType, MemReqType, MemRespTyp
       cache.init(request.addr, request.data, request.opaque, request.len)
     elif request.type_ >= MemMsgType.AMO_ADD and request.type_ <= MemMsgType.AMO_XOR:
       cache.amo(request.addr, request.data, request.opaque, request.len, request.type_)
+    elif request.type_ == MemMsgType.LR:
+      cache.load_reserved(request.addr, request.opaque, request.len)
+    elif request.type_ == MemMsgType.SC:
+      cache.store_conditional(request.addr, request.data, request.opaque, request.len)
     elif request.type_ == MemMsgType.INV:
-      cache.invalidate(request.opaque)
+      cache.invalidate(request.opaque, request.addr, request.data)
     elif request.type_ == MemMsgType.FLUSH:
-      cache.flush(request.opaque)
+      cache.flush(request.opaque, request.addr, request.data)
     else:
       assert False, "FL model: Undefined transaction type"
   return cache.get_transactions()
@@ -120,6 +143,39 @@ def rand_mem(addr_min=0, addr_max=0xfff):
     curr_addr += 4
   return mem
 
+#-------------------------------------------------------------------------
+# UnorderedTestSinkCL
+#-------------------------------------------------------------------------
+# Test sink that accepts the expected messages in any order. Used for
+# caches that can respond out of order (e.g., hit under miss).
+
+class UnorderedTestSinkCL( TestSinkCL ):
+
+  def construct( s, Type, msgs, initial_delay=0, interval_delay=0,
+                 cmp_fn=lambda a, b : a == b ):
+    super().construct( Type, msgs, initial_delay, interval_delay,
+                       cmp_fn=cmp_fn )
+    s.pending = list( msgs )
+
+  @non_blocking( lambda s: s.count==0 )
+  def recv( s, msg ):
+    assert s.count == 0, "Invalid en/rdy transaction! Sink is stalled (not ready), but receives a message."
+
+    match = [ i for i, m in enumerate( s.pending ) if s.cmp_fn( msg, m ) ]
+    if s.idx >= len( s.msgs ):
+      s.error_msg = ( 'Test Sink received more msgs than expected!\n'
+                      f'Received : {msg}' )
+    elif not match:
+      s.error_msg = (
+        f'Test sink {s} received WRONG message!\n'
+        f'Expected one of : { [ str(m) for m in s.pending ] }\n'
+        f'Received        : { msg }'
+      )
+    else:
+      s.pending.pop( match[0] )
+      s.idx += 1
+      s.recv_called = True
+
 #-------------------------------------------------------------------------
 # TestHarness
 #-------------------------------------------------------------------------
@@ -128,15 +184,24 @@ class TestHarness( Component ):
 
   def construct( s, src_msgs, sink_msgs, stall_prob, latency, src_delay,
                  sink_delay, CacheModel, CacheReqType, CacheRespType,
-                 MemReqType, MemRespType, cacheSize=128, associativity=1 ):
+                 MemReqType, MemRespType, cacheSize=128, associativity=1,
+                 cache_args=None, ordered=True, mem_args=None ):
+    # Extra parameters for the cache (e.g., number of MSHR entries)
+    cache_args = cache_args if cache_args else {}
+    # Extra parameters for the test memory (e.g., beat width)
+    mem_args   = mem_args if mem_args else {}
     # Instantiate models
     s.src   = TestSrcCL(CacheReqType, src_msgs, src_delay, src_delay)
     s.proc_model = ProcModel(CacheReqType, CacheRespType)
     s.cache = CacheModel(CacheReqType, CacheRespType, MemReqType, MemRespType,
-                         cacheSize, associativity)
+                         cacheSize, associativity, **cache_args)
     s.mem   = CiferMemoryCL( 1, [(MemReqType, MemRespType)],
-                             stall_prob=stall_prob, latency=latency) # Use our own modified mem
-    s.sink  = TestSinkCL(CacheRespType, sink_msgs, src_delay, sink_delay)
+                             stall_prob=stall_prob, latency=latency,
+                             **mem_args ) # Use our own modified mem
+    if ordered:
+      s.sink = TestSinkCL(CacheRespType, sink_msgs, src_delay, sink_delay)
+    else:
+      s.sink = UnorderedTestSinkCL(CacheRespType, sink_msgs, src_delay, sink_delay)
 
     # Set the test signals to better model the processor
 
@@ -149,6 +214,11 @@ class TestHarness( Component ):
     # Connect the cache req and resp ports to test memory
     s.mem.ifc[0] //= s.cache.mem_master_ifc
 
+    # Caches with performance counters are cleared from the harness
+    if hasattr( s.cache, 'stats_clear' ):
+      s.stats_clear = InPort()
+      s.cache.stats_clear //= s.stats_clear
+
   def load( s, addrs, data_ints ):
     for addr, data_int in zip( addrs, data_ints ):
       data_bytes_a = bytearray()
@@ -158,6 +228,9 @@ class TestHarness( Component ):
   def done( s ):
     return s.src.done() and s.sink.done()
 
+  def mem_stats( s ):
+    return s.mem.stats()
+
   def line_trace( s ):
     return s.src.line_trace() + " " + s.cache.line_trace() + " " \
         + s.proc_model.line_trace() + s.mem.line_trace()  + " " + s.sink.line_trace()
@@ -188,6 +261,8 @@ def decode_type( type_ ):
   elif type_ == 'mx':  type_ = MemMsgType.AMO_MAX
   elif type_ == 'xu':  type_ = MemMsgType.AMO_MAXU
   elif type_ == 'xo':  type_ = MemMsgType.AMO_XOR
+  elif type_ == 'lr':  type_ = MemMsgType.LR
+  elif type_ == 'sc':  type_ = MemMsgType.SC
   elif type_ == 'inv': type_ = MemMsgType.INV
   elif type_ == 'fl':  type_ = MemMsgType.FLUSH
   return type_ # as appropriate int
@@ -250,7 +325,8 @@ def mreq( cache, order, type_, opaque, addr, len, data ):
 class CacheTestParams:
   def __init__( self, msgs, mem, CacheReqType, CacheRespType, MemReqType,
                 MemRespType, associativity=[1], cache_size=[64], stall_prob=0,
-                latency=1, src_delay=0, sink_delay=0 ):
+                latency=1, src_delay=0, sink_delay=0, mem_nbanks=0,
+                mem_bank_occupancy=1, mem_bandwidth=0 ):
     assert isinstance(associativity, list) and len(associativity) > 0, \
       f'associativity must be an array, len={len(associativity)}'
     assert isinstance(associativity, list) and len(cache_size) > 0, \
@@ -269,6 +345,9 @@ class CacheTestParams:
     self.latency = latency
     self.src_delay = src_delay
     self.sink_delay = sink_delay
+    self.mem_nbanks = mem_nbanks
+    self.mem_bank_occupancy = mem_bank_occupancy
+    self.mem_bandwidth = mem_bandwidth
     self.ncaches = len(associativity)
     self.src_init_delay = 0
     self.sink_init_delay = 0
@@ -307,7 +386,10 @@ class MultiCacheTestHarness( Component ):
     # Module that integrates all the caches into one for easier translation
     s.cache = MultiCache( Cache, p )
     # L2 cache or main memory model
-    s.mem   = CiferMemoryCL( p.ncaches, [(p.MemReqType, p.MemRespType)]*p.ncaches, latency=p.latency )
+    s.mem   = CiferMemoryCL( p.ncaches, [(p.MemReqType, p.MemRespType)]*p.ncaches,
+                             latency=p.latency, nbanks=p.mem_nbanks,
+                             bank_occupancy=p.mem_bank_occupancy,
+                             bandwidth=p.mem_bandwidth )
     for i in range( p.ncaches ):
       connect( s.proc.mem_master_ifc[i],  s.cache.mem_minion_ifc[i] )
       # connect( s.cache.mem_master_ifc[i], s.mem.ifc[i]              )
@@ -324,6 +406,9 @@ class MultiCacheTestHarness( Component ):
   def done( s ):
     return s.proc.done()
 
+  def mem_stats( s ):
+    return s.mem.stats()
+
   def line_trace( s ):
     msg = ''
     # msg += s.cache.line_trace()